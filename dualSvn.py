@@ -26,6 +26,7 @@
 # Coded: November 2010
 
 import sys
+import multiprocessing
 
 from PyQt4.QtGui import QApplication
 
@@ -33,12 +34,17 @@ from dualitysvn import DualityWindow
 
 ###########################################
 # Launch Application
-
-app = QApplication(sys.argv)
-
-mainWin = DualityWindow()
-mainWin.show()
-
-sys.exit(app.exec_())
+# - worker processes (i.e. for hashing) import this file too on some platforms,
+#   so they mustn't end up launching the application as well
+
+if __name__ == '__main__':
+	multiprocessing.freeze_support()
+	
+	app = QApplication(sys.argv)
+	
+	mainWin = DualityWindow()
+	mainWin.show()
+	
+	sys.exit(app.exec_())
 
 ###########################################
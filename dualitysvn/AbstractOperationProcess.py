@@ -7,8 +7,55 @@
 
 from coreDefines import *
 
+from OperationFuture import *
+from WcOperationCoordinator import *
+
 from abc import *
 
+#########################################
+# Line Splitting
+
+# Splits chunks of output into lines, as output can arrive in arbitrarily-sized pieces
+# - the end of a chunk may be part of a line, which is held on to until the rest of it arrives
+# - both LF and CRLF line endings are handled, with the line endings being stripped off
+class LineSplitter(object):
+	__slots__ = (
+		'partial',	# (str) incomplete line from the end of the last chunk
+	);
+	
+	def __init__(self):
+		self.partial = "";
+	
+	# split the next chunk of output into lines
+	# < data: (str) chunk of output
+	# > return[0]: (list<str>) complete lines in the chunk (including the partial line held over)
+	def feed(self, data):
+		if not data:
+			return [];
+		
+		text = self.partial + data;
+		
+		lines = text.split("\n");
+		self.partial = lines.pop();
+		
+		if "\r" in text:
+			lines = [(line[:-1] if line.endswith("\r") else line) for line in lines];
+		
+		return lines;
+	
+	# get any partial line that's still being held on to (i.e. when the output has ended)
+	# > return[0]: (list<str>) the partial line, if there is one
+	def flush(self):
+		line = self.partial;
+		self.partial = "";
+		
+		if not line:
+			return [];
+		elif line.endswith("\r"):
+			return [line[:-1]];
+		else:
+			return [line];
+
 #########################################
 # Operation Object
 
@@ -37,11 +84,18 @@ class AbstractOperationProcess:
 		'silentErrors',		# (bool) don't broadcast errors with msgboxes
 		
 		# Callbacks -----------------------
-		'handleOutputCb',	# (fn(SvnOperationProcess, line:str)) handle line of output from process, for adding to model/target widget as needed
-		'handleErrorCb',	# (fn(SvnOperationProcess, line:str)) handle line of error output from process
+		'handleOutputCb',		# (fn(SvnOperationProcess, line:str)) handle line of output from process, for adding to model/target widget as needed
+		'handleOutputBatchCb',	# (fn(SvnOperationProcess, lines:list<str>)) handle all the lines of output read at once - used instead of handleOutputCb when set
+		'handleErrorCb',		# (fn(SvnOperationProcess, line:str)) handle line of error output from process
 		
 		'preStartCb',		# (fn(SvnOperationProcess)) operation to perform before starting process
-		'postEndCb'			# (fn(SvnOperationProcess)) operation to perform after process finished
+		'postEndCb',		# (fn(SvnOperationProcess)) operation to perform after process finished
+		
+		'future',			# (OperationFuture) result of the process, when started using startAsync()
+		
+		# Output Buffers ------------------
+		'outSplitter',		# (LineSplitter) splits standard output into lines
+		'errSplitter',		# (LineSplitter) splits standard error into lines
 	);
 	
 	# Internal Setup ==============================
@@ -64,11 +118,18 @@ class AbstractOperationProcess:
 		
 		# null-define the callbacks that users can bind
 		self.handleOutputCb = None;
+		self.handleOutputBatchCb = None;
 		self.handleErrorCb = None;
 		
 		self.preStartCb = None;
 		self.postEndCb = None;
 		
+		self.future = None;
+		
+		# output gets read in chunks, which need splitting into lines
+		self.outSplitter = LineSplitter();
+		self.errSplitter = LineSplitter();
+		
 		# setup process
 		self.setupProcess(process);
 		
@@ -101,6 +162,14 @@ class AbstractOperationProcess:
 		# NOTE: only end needs to be hooked up for now, since start will create this object usually...
 		self.wEnd.clicked.connect(self.endProcess);
 	
+	# Working Copy Access ---------------------------
+	
+	# get how this operation uses the working copy, for deciding what it can run alongside
+	# - operations are assumed to change it, unless they say otherwise
+	# > return[0]: (WcAccess.ACCESS_*)
+	def getWcAccess(self):
+		return WcAccess.ACCESS_WRITE;
+	
 	# Callbacks =================================
 	
 	# Exposed API -------------------------------
@@ -151,7 +220,26 @@ class AbstractOperationProcess:
 		# refresh
 		self.doneProcess();
 	
+	# Start process without waiting for it to finish
+	# - use this instead of runBlocking() on the GUI thread, as the window stays responsive in the meantime
+	# > return[0]: (OperationFuture) resolved with this process once it has ended (whether or not it succeeded)
+	def startAsync(self):
+		self.future = OperationFuture(self);
+		
+		# processes which can't be found never say that they've finished, so this has to be caught too
+		if isinstance(self.process, QProcess):
+			self.parent.connect(self.process, SIGNAL("error(QProcess::ProcessError)"), self.processError);
+		
+		self.startProcess();
+		
+		# it won't ever end if it couldn't be started
+		if self.status == ProcessStatus.STATUS_FAILED:
+			self.future.resolve(self);
+		
+		return self.future;
+	
 	# Run process in a blocking manner (for background helper-processes)
+	# ! nothing else can happen on the calling thread until this is done, so don't use this from the GUI (see startAsync())
 	def runBlocking(self):
 		# start running
 		# TODO: should we add return bool to this to check successs?
@@ -164,45 +252,50 @@ class AbstractOperationProcess:
 	# Internal (Reading) ------------------------
 	
 	# read output messages from process
+	# - everything available gets read at once, since by the time we get here, there may be
+	#   a lot more than a single line waiting (which would otherwise pile up until the end)
 	def readOutput(self):
-		line = str(self.process.readLine()).rstrip("\n");
-		
-		# output
-		if self.handleOutputCb:
-			self.handleOutputCb(self, line);
-		else:
-			print "StdOut>>", line
+		data = str(self.process.readAllStandardOutput());
+		self.handleOutputLines(self.outSplitter.feed(data));
 	
 	# read error messages from process
-	def readErrors(self, needsSwap=True):
-		# switch to stderr channel to read, then switch back
-		if needsSwap:
-			self.process.setReadChannel(QProcess.StandardError);
-		
-		line = str(self.process.readLine()).rstrip("\n");
-		
-		if self.handleErrorCb:
-			self.handleErrorCb(self, line);
-		else:
-			print "StdErr>>", line
-		
-		if needsSwap:
-			self.process.setReadChannel(QProcess.StandardOutput);
+	def readErrors(self):
+		data = str(self.process.readAllStandardError());
+		self.handleErrorLines(self.errSplitter.feed(data));
 		
 	# read rest of output from process
 	def readRemaining(self):
-		# standard output
-		while self.process.canReadLine():
-			self.readOutput();
+		# standard output - including any last line without a line ending
+		self.readOutput();
+		self.handleOutputLines(self.outSplitter.flush());
 			
 		# standard error
-		# 	-  need to change read channel so that we can read this 
-		self.process.setReadChannel(QProcess.StandardError);
+		self.readErrors();
+		self.handleErrorLines(self.errSplitter.flush());
 		
-		while self.process.canReadLine():
-			self.readErrors(False);
+	# pass on lines of output to the output callbacks
+	# < lines: (list<str>) lines of output, without line endings
+	def handleOutputLines(self, lines):
+		if not lines:
+			return;
 		
-		self.process.setReadChannel(QProcess.StandardOutput);
+		if self.handleOutputBatchCb:
+			self.handleOutputBatchCb(self, lines);
+		elif self.handleOutputCb:
+			for line in lines:
+				self.handleOutputCb(self, line);
+		else:
+			for line in lines:
+				print "StdOut>>", line
+	
+	# pass on lines of error output to the error callback
+	# < lines: (list<str>) lines of error output, without line endings
+	def handleErrorLines(self, lines):
+		for line in lines:
+			if self.handleErrorCb:
+				self.handleErrorCb(self, line);
+			else:
+				print "StdErr>>", line
 		
 	# Internal (Running) ------------------------
 		
@@ -233,6 +326,18 @@ class AbstractOperationProcess:
 		if self.postEndCb:
 			self.postEndCb(self);
 		
+		# let whoever is waiting on this know
+		if self.future:
+			self.future.resolve(self);
+		
+	# callback called when the process runs into trouble
+	# - only used for operations started using startAsync()
+	def processError(self, error):
+		# the rest end up in processEnded()
+		if (error == QProcess.FailedToStart) and (self.status == ProcessStatus.STATUS_WORKING):
+			self.status = ProcessStatus.STATUS_FAILED;
+			self.doneProcess();
+	
 	# callback called when svn operation process ends
 	def processEnded(self, exitCode, exitStatus=QProcess.NormalExit):
 		# grab rest of output
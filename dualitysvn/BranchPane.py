@@ -11,6 +11,11 @@ from . import *
 
 # Panel for day to day operations within a "branch"
 class BranchPanel(QWidget):
+	# Class Defines ========================================================
+	# Maximum number of directories whose whole subtree a targeted refresh will check,
+	# before it's not worth doing instead of refreshing everything
+	MAX_TARGETED_TREES = 64;
+	
 	# Instance Settings ====================================================
 	__slots__ = (
 		# Model .......................................................
@@ -24,6 +29,7 @@ class BranchPanel(QWidget):
 		'wUpdate',			# (QPushButton) svn update
 		'wApplyPatch',  	# (QPushButton) apply patch
 		
+		'wStatusLabel',		# (QLabel) label for status list - shows whether the list is out of date
 		'wRefreshStatus',  	# (QPushButton) refresh status of 'status' box
 		'wStatusView',		# (SvnStatusList) list view
 		
@@ -38,6 +44,13 @@ class BranchPanel(QWidget):
 		
 		# Refresh Stuff ................................................
 		'refreshProcess',	# (QProcess) process used to refresh the status list - only defined while in use
+		'statusBatcher',	# (SvnStatusListBatcher) buffer for adding refreshed items to the status list in chunks
+		
+		'statusLoaded',			# (bool) whether the status list has been fully populated, so partial refreshes can keep it up to date
+		'dirtyDirs',			# (set<str>) directories with changes that the status list hasn't caught up with yet
+		'dirtyRefreshProcess',	# (AbstractOperationProcess) process used for partial refreshes - only defined while in use
+		
+		'changedPaths',		# (dict<str, tuple>) paths changed by operations, waiting for a targeted refresh : (whole subtree, unversioned)
 	);
 	
 	# Setup ================================================================
@@ -59,6 +72,19 @@ class BranchPanel(QWidget):
 		self.setupUI();
 		self.updateActionWidgets();
 		
+		# status list items get added in chunks, as there can be a lot of them
+		self.statusBatcher = SvnStatusListBatcher(self.wStatusView.model, self);
+		
+		# changes to the working copy get picked up without needing to refresh everything
+		self.statusLoaded = False;
+		self.dirtyDirs = set();
+		self.dirtyRefreshProcess = None;
+		
+		# paths changed by operations get refreshed on their own too
+		self.changedPaths = {};
+		
+		self.connect(WorkingCopyWatcher.shared(), SIGNAL('dirtyDirs'), self.workingCopyChanged);
+		
 	# main widget init
 	def setupUI(self):
 		# -) little util defines
@@ -117,7 +143,8 @@ class BranchPanel(QWidget):
 		self.layout.addLayout(gbox);
 		
 		# 3.1a) "status" label
-		gbox.addWidget(QLabel("Status:"), 1,1); # r1 c1
+		self.wStatusLabel = QLabel("Status:");
+		gbox.addWidget(self.wStatusLabel, 1,1); # r1 c1
 		
 		# 3.1b) "toggle all" button
 		self.wToggleAllStatus = QPushButton("Toggle All");
@@ -154,7 +181,9 @@ class BranchPanel(QWidget):
 		self.wStatusView = SvnStatusList();
 		
 		self.wStatusView.clicked.connect(self.updateActionWidgets);
+		self.connect(self.wStatusView, SIGNAL('checkedChanged()'), self.updateActionWidgets);
 		self.connect(self.wStatusView, SIGNAL('skiplistChanged()'), self.svnRefreshStatus);
+		self.connect(self.wStatusView, SIGNAL('pathsChanged'), self.svnRefreshPaths);
 		
 		gbox.addWidget(self.wStatusView, 2,1, 1,4); # r2 c1, h1,w4
 		
@@ -253,6 +282,7 @@ class BranchPanel(QWidget):
 		#	  rather than requiring the user to do so, though this may cause performance
 		#	  troubles in the long run...
 		#self.wStatusView.model.clearAll();
+		self.loadStatusSnapshot();
 		self.svnRefreshStatus();
 		self.updateActionWidgets();
 	
@@ -272,13 +302,8 @@ class BranchPanel(QWidget):
 	# Working Copy Import ----------------------------------------------------
 	
 	def svnUpdate(self):
-		# abort the status list refresh process, in case the locks show up
-		if self.refreshProcess is not None:
-			# silence the error prompts so that no popup will appear here
-			self.refreshProcess.silentErrors = True;
-			
-			print "SVN Update: Aborting refresh status to avoid the svn locks"
-			self.refreshProcess.endProcess();
+		# NOTE: any status list refresh still running gets stopped when the update gets its turn
+		#       with the working copy (see WcOperationCoordinator), as it would run into the svn locks
 		
 		# setup process
 		p1 = SvnOperationProcess(self, "Update");
@@ -303,18 +328,85 @@ class BranchPanel(QWidget):
 		
 	
 	def svnApplyPatch(self):
-		self.unimplementedFeatureCb("Apply Patch");		
+		# get patch to apply
+		fileName = QFileDialog.getOpenFileName(self,
+			"Apply Patch",
+			".",
+			"Patch Files (*.patch *.diff *.patch.gz *.diff.gz);;All Files (*)");
+		fileName = str(fileName);
+		
+		if not fileName:
+			return;
+		
+		# find out what it changes
+		QApplication.setOverrideCursor(Qt.WaitCursor);
+		try:
+			applier = SvnPatchApplier(self.branchType, fileName);
+		except (IOError, OSError, ValueError), e:
+			QMessageBox.warning(self, "Apply Patch", "Could not read patch file '%s'\n%s" % (fileName, e));
+			return;
+		finally:
+			QApplication.restoreOverrideCursor();
+		
+		try:
+			if applier.isEmpty():
+				QMessageBox.warning(self, "Apply Patch", "There are no changes in '%s' that can be applied" % (fileName));
+				return;
+			
+			# added/deleted files and property changes need "svn patch", which may not be usable here
+			error = applier.checkSvnPatch();
+			if error:
+				QMessageBox.warning(self, "Apply Patch", "%s\n\nNothing has been changed." % (error));
+				return;
+			
+			# 1) check that all of it can be applied, without touching anything
+			dlg = SvnOperationDialog(self, "Check Patch");
+			try:
+				applier.addToDialog(dlg, dryRun=True);
+			except IOError, e:
+				QMessageBox.warning(self, "Apply Patch", "Could not prepare patch\n%s" % (e));
+				return;
+			dlg.go();
+			
+			if dlg.status != ProcessStatus.STATUS_DONE:
+				QMessageBox.warning(self, "Apply Patch",
+					"Patch cannot be applied cleanly (see the log for the hunks which failed), so nothing has been changed");
+				return;
+			
+			# 2) check that these changes should really be made
+			report = applier.getReport();
+			summary = report.getSummary() if report else "%d files changed by patch" % (applier.numFiles());
+			
+			reply = QMessageBox.question(self,
+				"Apply Patch",
+				"%s\n\nApply the changes in '%s' to the working copy?" % (summary, fileName),
+				QMessageBox.Yes | QMessageBox.No, QMessageBox.No);
+			
+			if reply != QMessageBox.Yes:
+				print "Cancelled applying patch..."
+				return;
+			
+			# 3) do it for real - hunks get matched again, in case anything changed in the meantime
+			dlg = SvnOperationDialog(self, "Apply Patch");
+			applier.addToDialog(dlg);
+			dlg.go();
+		finally:
+			applier.finish();
+		
+		# now schedule update to status list
+		self.svnRefreshStatus();
 		
 	# Status List Ops ---------------------------------------------------------
 	
 	# update action widgets in response to svn status list changes
 	def updateActionWidgets(self):
-		# get selection list from status list
-		files = self.statusListGetOperatable();
+		# get number of items selected in status list
+		# - no need to get a copy of the list itself, as this gets called on every click
+		numFiles = self.wStatusView.getOperationCount();
 		
 		# for now, enable or disable only based on whether there's anything in list
 		# TODO: advanced selective polling based on filtering certain stati
-		if len(files):
+		if numFiles:
 			# enabled
 			self.wAdd.setEnabled(True);
 			self.wDelete.setEnabled(True);
@@ -343,10 +435,28 @@ class BranchPanel(QWidget):
 	
 	# Status List Refresh ---------------------------------------------------------
 	
-	# refresh status list
-	def svnRefreshStatus(self):
+	# create process for getting the status of the working copy
+	# - the built-in status engine is used when possible, as it avoids spawning svn,
+	#   though svn is still needed for working copy formats that the engine doesn't understand
+	# < name: (str) user-visible name of the operation
+	# > return[0]: (AbstractOperationProcess) process, with output handling still to be set up
+	# > return[1]: (bool) whether the process is the built-in status engine
+	def createStatusProcess(self, name):
+		useEngine = project.builtinStatus and SvnWcStatusProcess.canHandle(self.branchType);
+		
+		if useEngine:
+			rp = SvnWcStatusProcess(self, name, self.branchType);
+		else:
+			rp = self.createSvnStatusProcess(name);
+		
+		return rp, useEngine;
+	
+	# create "svn status" process
+	# < name: (str) user-visible name of the operation
+	# > return[0]: (SvnOperationProcess) process, with output handling and targets still to be set up
+	def createSvnStatusProcess(self, name):
 		# setup svn process
-		self.refreshProcess = rp = SvnOperationProcess(self, "Refresh Status");
+		rp = SvnOperationProcess(self, name);
 		rp.setupEnv(self.branchType);
 		
 		rp.setOp("status");
@@ -356,17 +466,170 @@ class BranchPanel(QWidget):
 			# "ignore externals" option allows quicker updates on some repositories
 			rp.addArgs(['--ignore-externals']);
 		
+		return rp;
+	
+	# set up handling of the output of a status process, so that status list items get passed to the given callback
+	# ! must be called before any targets get added to the process, as this may add extra args
+	# < rp: (AbstractOperationProcess) process from createStatusProcess()
+	# < useEngine: (bool) whether the process is the built-in status engine
+	# < storeItem: (fn(sop, SvnStatusListItem)) callback for each item
+	# > return[0]: (SvnStatusXmlParser) parser which needs to be closed when the process is done, or None
+	def setupStatusOutput(self, rp, useEngine, storeItem):
+		parser = None;
+		
+		if useEngine:
+			# engine produces items directly
+			rp.handleOutputCb = storeItem;
+		elif project.xmlStatus:
+			# xml output is parsed incrementally, with items being added as soon as each entry is done
+			rp.addArgs(['--xml']);
+			parser = SvnStatusXmlParser(lambda item: storeItem(rp, item));
+			
+			# the parser can take everything that's been read at once
+			def storeLines(sop, lines):
+				parser.feed("\n".join(lines) + "\n");
+			rp.handleOutputBatchCb = storeLines;
+		else:
+			# all the items get created in the one store, rather than each having their own
+			itemStore = SvnStatusRecordStore();
+			
+			def store(sop, line):
+				if len(line):
+					# parse line to get a new status list item
+					storeItem(sop, SvnStatusListItem(line, store=itemStore));
+			rp.handleOutputCb = store;
+		
+		return parser;
+	
+	# Sharded Status ----------------------------------------------------------
+	
+	# work out how to split up the working copy between several status processes
+	# > return[0]: (list<list<str>>) top-level directories for each shard (besides the root's),
+	#			   or None when a single status process should be used
+	def planStatusShards(self):
+		if project.statusProcesses <= 1:
+			return None;
+		
+		# the built-in status engine doesn't need svn at all
+		if project.builtinStatus and SvnWcStatusProcess.canHandle(self.branchType):
+			return None;
+		
+		return SvnStatusShards.plan(SvnWcStatusProcess.adminName(self.branchType), project.statusProcesses);
+	
+	# add "svn status" processes for each shard to a process group
+	# - the first one covers the root and its immediate contents, while the others cover
+	#   their top-level directories in full
+	# < group: (OperationProcessGroup) group to add processes to
+	# < shards: (list<list<str>>) from planStatusShards()
+	# < storeItem: (fn(sop, SvnStatusListItem)) callback for each item
+	def setupStatusShards(self, group, shards, storeItem):
+		members = [(".", ['--depth=immediates', '.'], ())];
+		
+		for shard in shards:
+			if len(shard) == 1:
+				label = shard[0];
+			else:
+				label = "%s .. %s (%d dirs)" % (shard[0], shard[-1], len(shard));
+			members.append((label, shard, frozenset(shard)));
+		
+		for label, args, ownPaths in members:
+			sp = self.createSvnStatusProcess("%s [%s]" % (group.opName, label));
+			sp.model = group.model;
+			
+			# the top-level directories themselves are already reported by the root's shard
+			def storeShardItem(sop, item, ownPaths=ownPaths):
+				if item.path not in ownPaths:
+					storeItem(sop, item);
+			
+			parser = self.setupStatusOutput(sp, False, storeShardItem);
+			sp.addArgs(args);
+			
+			# flush out the last of the xml items (only when we've got a complete document)
+			def shardDone(sop, parser=parser):
+				if parser and (sop.status == ProcessStatus.STATUS_DONE):
+					parser.close();
+			sp.postEndCb = shardDone;
+			
+			group.addProcess(sp, label);
+	
+	# report how long each shard took, and use that to balance the shards next time
+	# < group: (OperationProcessGroup) group that has finished
+	# < shards: (list<list<str>>) from planStatusShards()
+	def reportStatusShards(self, group, shards):
+		print "%s - %d shards, %d at once:" % (group.opName, len(group.members), group.maxConcurrent)
+		for line in group.getTimingsReport():
+			print "\t%s" % (line)
+		
+		# only complete runs are representative
+		if group.status == ProcessStatus.STATUS_DONE:
+			weights = SvnStatusShards.loadWeights();
+			
+			# members are the root's shard, followed by one for each entry in shards
+			seconds = dict((label, secs) for label, secs, status in group.timings);
+			for label, shard in zip(group.labels[1:], shards):
+				SvnStatusShards.updateWeights(weights, shard, seconds[label]);
+			
+			SvnStatusShards.saveWeights(weights);
+	
+	# Status Refresh ----------------------------------------------------------
+	
+	# check if a refresh of the status list (full or partial) is in progress
+	def isRefreshingStatus(self):
+		for rp in (self.refreshProcess, self.dirtyRefreshProcess):
+			if (rp is not None) and (rp.status == ProcessStatus.STATUS_WORKING):
+				return True;
+		return False;
+	
+	# refresh status list
+	# - it waits for anything changing the working copy to finish first, and asking again
+	#   while it's still waiting doesn't add another one
+	def svnRefreshStatus(self):
+		WcOperationCoordinator.forWorkingCopy().request("Refresh Status", WcAccess.ACCESS_READ,
+			self.startRefreshStatus, key=("refresh", self.branchType), preemptible=True);
+	
+	# start refreshing the status list, now that it's its turn
+	# < ticket: (WcOperationTicket)
+	# > return[0]: (OperationFuture) done once the refresh is over
+	def startRefreshStatus(self, ticket):
+		# large working copies can be split up between several svn processes running at once
+		shards = self.planStatusShards();
+		
+		if shards:
+			rp = OperationProcessGroup(self, "Refresh Status", project.statusProcesses);
+			useEngine = False;
+		else:
+			rp, useEngine = self.createStatusProcess("Refresh Status");
+		self.refreshProcess = rp;
+		
 		rp.setControlWidgets(self.wRefreshStatus, self.wStopRefreshStatus);
 		rp.wTarget = self.wStatusView;
 		rp.model = self.wStatusView.model;
 		
 		rp.widgetVisibility = True; # allow cancelling operation by showing wStopRefreshStatus
 		
+		# a list from a snapshot stays on screen until the new results can be merged into it,
+		# instead of starting from scratch
+		reconcile = self.wStatusView.model.stale;
+		fresh = [];
+		
 		# setup callbacks
 		#	pre-start ..................
 		def setup(sop):
+			# a full refresh covers any changes waiting for a partial one
+			sop.parent.dirtyDirs.clear();
+			sop.parent.changedPaths.clear();
+			
+			# pristine copies may have changed since diffs were worked out (i.e. after commits and updates)
+			SvnWcDiffCache.shared().invalidate(sop.parent.branchType);
+			
+			if sop.parent.dirtyRefreshProcess is not None:
+				sop.parent.dirtyRefreshProcess.silentErrors = True;
+				sop.parent.dirtyRefreshProcess.endProcess();
+			
 			# start fresh
-			sop.model.clearAll();
+			sop.parent.statusBatcher.discard();
+			if not reconcile:
+				sop.model.clearAll();
 			
 			# we could be here a while
 			sop.parent.updateActionWidgets(); 
@@ -374,28 +637,323 @@ class BranchPanel(QWidget):
 		
 		# 	done .......................
 		def done(sop):
+			# flush out the last of the xml items (only when we've got a complete document)
+			if parser and (sop.status == ProcessStatus.STATUS_DONE):
+				parser.close();
+			
+			if shards:
+				sop.parent.reportStatusShards(sop, shards);
+			
+			# add whatever is still waiting to be shown
+			if not reconcile:
+				sop.parent.statusBatcher.flush();
+			elif sop.status == ProcessStatus.STATUS_DONE:
+				# snapshot can only be replaced by complete results (it stays stale otherwise)
+				sop.model.mergeItems(fresh, lambda path: True);
+				sop.model.setStale(False);
+				sop.parent.updateStaleWidgets();
+			
 			# hack: force sorting to be performed again now
 			sop.wTarget.setSortingEnabled(True);
 			
 			# update with new status
 			sop.parent.updateActionWidgets();
+			
+			# now that the list is complete, it can be kept up to date by only checking what changes
+			if sop.status == ProcessStatus.STATUS_DONE:
+				sop.parent.statusLoaded = True;
+				sop.parent.saveStatusSnapshot();
+				
+				if project.watchWorkingCopy:
+					WorkingCopyWatcher.shared().watch(project.workingCopyDir);
+			
+			# catch up on changes made while refreshing
+			if sop.parent.dirtyDirs:
+				QTimer.singleShot(0, sop.parent.svnRefreshDirty);
+			if sop.parent.changedPaths:
+				QTimer.singleShot(0, sop.parent.svnRefreshPaths);
 		rp.postEndCb = done;
 		
 		# 	get items..................
-		def store(sop, line):
-			if len(line):
-				# parse line to get a new status list item
-				item = SvnStatusListItem(line);
+		def storeItem(sop, item):
+			# only add item if it isn't to be shown 
+			# - user may have marked paths to not be included to maintain a set of local only changes
+			# TODO: note how many items are being skipped?
+			if item.path not in project.skiplist:
+				if reconcile:
+					fresh.append(item);
+				else:
+					sop.parent.statusBatcher.add(item);
+		
+		if shards:
+			# each shard has its own parser
+			parser = None;
+			self.setupStatusShards(rp, shards, storeItem);
+		else:
+			parser = self.setupStatusOutput(rp, useEngine, storeItem);
+		
+		# go!
+		return rp.startAsync();
+	
+	# Status Snapshots ------------------------------------------------------------
+	
+	# show the status list that was saved last time, until a refresh catches up
+	def loadStatusSnapshot(self):
+		# only when there's nothing better to show
+		if self.wStatusView.model.rowCount(None) or self.isRefreshingStatus():
+			return;
+		
+		listItems = SvnStatusSnapshot.load(self.branchType);
+		if listItems is not None:
+			self.wStatusView.model.setItems(listItems, stale=True);
+			self.updateStaleWidgets();
+	
+	# save the status list, so that it can be shown straight away next time
+	def saveStatusSnapshot(self):
+		# only complete + up to date lists are worth saving, and only for projects that have been saved
+		if self.statusLoaded and (not self.wStatusView.model.stale) and (not project.autofile):
+			SvnStatusSnapshot.save(self.branchType, self.wStatusView.model.listItems);
+	
+	# update widgets showing whether the status list is out of date
+	def updateStaleWidgets(self):
+		if self.wStatusView.model.stale:
+			self.wStatusLabel.setText("Status: <i>(cached)</i>");
+			self.wStatusLabel.setToolTip("Paths shown are from the last session, and may be out of date until the status refresh completes");
+		else:
+			self.wStatusLabel.setText("Status:");
+			self.wStatusLabel.setToolTip("");
+	
+	# Partial Status Refresh ------------------------------------------------------
+	
+	# working copy watcher callback - some directories have been changed
+	# < dirs: (list<str>) directories that have changed, relative to working copy root
+	# < overflowed: (bool) whether some changes may have been missed
+	def workingCopyChanged(self, dirs, overflowed):
+		# only keep the list up to date once it has been populated
+		if (not project.watchWorkingCopy) or (not self.statusLoaded):
+			return;
+		
+		if overflowed:
+			# no idea what changed, so everything needs checking
+			if (self.refreshProcess is None) or (self.refreshProcess.status != ProcessStatus.STATUS_WORKING):
+				self.svnRefreshStatus();
+			return;
+		
+		# changes get picked up once whatever is running finishes
+		self.dirtyDirs.update(dirs);
+		
+		if not self.isRefreshingStatus():
+			self.svnRefreshDirty();
+	
+	# refresh the status of only the directories which have changed, merging the results into the status list
+	def svnRefreshDirty(self):
+		if (not self.dirtyDirs) or self.isRefreshingStatus():
+			return;
+		
+		# changes arriving while it's still waiting get picked up by the one already waiting
+		WcOperationCoordinator.forWorkingCopy().request("Refresh Changed Paths", WcAccess.ACCESS_READ,
+			self.startRefreshDirty, key=("refresh-dirty", self.branchType), preemptible=True);
+	
+	# start refreshing the directories which have changed, now that it's its turn
+	# < ticket: (WcOperationTicket)
+	# > return[0]: (OperationFuture) done once the refresh is over, or None if there's nothing to refresh anymore
+	def startRefreshDirty(self, ticket):
+		# a full refresh may have got in first
+		if (not self.dirtyDirs) or self.isRefreshingStatus():
+			return None;
+		
+		# svn can only be asked about versioned directories
+		adminName = SvnWcStatusProcess.adminName(self.branchType);
+		dirs = sorted(set(nearestVersionedDir(project.workingCopyDir, d, adminName) for d in self.dirtyDirs));
+		
+		# rows from deep inside directories which have been deleted (or moved away) need removing too,
+		# but refreshing their parents only covers what was directly inside them
+		removedDirs = [d for d in self.dirtyDirs if d and not os.path.isdir(os.path.join(project.workingCopyDir, d))];
+		inScope = dirScopeChecker(dirs, removedDirs);
+		
+		self.dirtyDirs.clear();
+		
+		# setup process - this runs in the background, so errors shouldn't pop up
+		rp, useEngine = self.createStatusProcess("Refresh Changed Paths");
+		self.dirtyRefreshProcess = rp;
+		rp.model = self.wStatusView.model;
+		rp.silentErrors = True;
+		
+		# 	get items..................
+		fresh = [];
+		
+		def storeItem(sop, item):
+			if item.path not in project.skiplist:
+				fresh.append(item);
+		
+		parser = self.setupStatusOutput(rp, useEngine, storeItem);
+		
+		# 	done .......................
+		def done(sop):
+			# only complete results can be merged, as rows with no status get removed
+			if sop.status == ProcessStatus.STATUS_DONE:
+				if parser:
+					parser.close();
 				
-				# only add item if it isn't to be shown 
-				# - user may have marked paths to not be included to maintain a set of local only changes
-				# TODO: note how many items are being skipped?
-				if item.path not in project.skiplist:
-					sop.model.add(item);
-		rp.handleOutputCb = store;
+				sop.model.mergeItems(fresh, inScope);
+				SvnWcDiffCache.shared().invalidate(sop.parent.branchType, inScope);
+				sop.parent.updateActionWidgets();
+			
+			# more changes may have arrived in the meantime
+			if sop.parent.dirtyDirs:
+				QTimer.singleShot(0, sop.parent.svnRefreshDirty);
+		rp.postEndCb = done;
+		
+		# only the directories themselves + their immediate contents
+		if useEngine:
+			rp.addArgs(dirs);
+		else:
+			rp.addArgs(['--depth=immediates']);
+			rp.addArgs([d or "." for d in dirs]);
 		
 		# go!
-		rp.startProcess();
+		return rp.startAsync();
+	
+	# Targeted Status Refresh -----------------------------------------------------
+	
+	# refresh the status of only the paths that an operation worked on (and their parents),
+	# patching up their rows in the status list instead of rebuilding it
+	# - rows are updated in place, so checked paths and the scroll position are kept
+	# < (items): (iterable<SvnStatusListItem>) targets of the operation
+	def svnRefreshPaths(self, items=()):
+		for item in items:
+			path = str(item.path);
+			
+			# directories may have had their contents changed too (i.e. "svn add" on an unversioned directory),
+			# as may things which aren't there anymore, but which could have been directories
+			isTree = item.isDir() or ((item.kind is None) and not os.path.lexists(os.path.join(project.workingCopyDir, path)));
+			self.changedPaths[path] = (isTree, item.fileCode in ('?', 'I'));
+		
+		# the list can only be patched up once it's complete + up to date
+		if (not self.statusLoaded) or self.wStatusView.model.stale:
+			self.changedPaths.clear();
+			self.svnRefreshStatus();
+			return;
+		
+		# nothing more needed when everything is going to be checked anyway
+		# (a full refresh that's already running catches up on them once it's done)
+		coordinator = WcOperationCoordinator.forWorkingCopy();
+		if coordinator.isPending(("refresh", self.branchType)) or (not self.changedPaths):
+			return;
+		
+		# paths changed by later operations get picked up by the one already waiting
+		coordinator.request("Refresh Targets", WcAccess.ACCESS_READ,
+			self.startRefreshPaths, key=("refresh-paths", self.branchType), preemptible=True);
+	
+	# start refreshing the paths changed by operations, now that it's its turn
+	# < ticket: (WcOperationTicket)
+	# > return[0]: (OperationFuture) done once the refresh is over, or None if there's nothing to refresh anymore
+	def startRefreshPaths(self, ticket):
+		# a full refresh that's running covers them (or catches up on them once it's done)
+		if (not self.changedPaths) or ((self.refreshProcess is not None) and (self.refreshProcess.status == ProcessStatus.STATUS_WORKING)):
+			return None;
+		
+		changed = self.changedPaths;
+		self.changedPaths = {};
+		
+		# work out what needs checking
+		paths = set();	# paths checked on their own
+		trees = set();	# directories checked along with everything in them
+		gone = set();	# unversioned paths which aren't there anymore - their rows just need removing, as svn won't know about them
+		
+		for path, (isTree, isUnversioned) in changed.iteritems():
+			if isTree:
+				trees.add(path);
+			else:
+				paths.add(path);
+			
+			if isUnversioned and not os.path.lexists(os.path.join(project.workingCopyDir, path)):
+				gone.add(path);
+			
+			# the parent's own status may have changed too (i.e. once everything added in it is committed)
+			if path != ".":
+				paths.add(os.path.dirname(path) or ".");
+		
+		paths -= trees;
+		
+		# not any quicker than checking everything
+		if ("." in trees) or (len(trees - gone) > BranchPanel.MAX_TARGETED_TREES):
+			self.svnRefreshStatus();
+			return None;
+		
+		# rows for anything checked get replaced by what's found
+		treePrefixes = tuple(tree + os.sep for tree in trees);
+		
+		def inScope(path):
+			return (path in paths) or (path in trees) or path.startswith(treePrefixes);
+		
+		# 	get items..................
+		fresh = [];
+		
+		def storeItem(sop, item):
+			if item.path not in project.skiplist:
+				fresh.append(item);
+		
+		# setup processes - paths on their own, then the directory subtrees
+		# - these run in the background, so errors shouldn't pop up
+		processes = [];
+		
+		for args, targets in ((['--depth=empty'], sorted(paths - gone)), ([], sorted(trees - gone))):
+			if not targets:
+				continue;
+			
+			rp = self.createSvnStatusProcess("Refresh Targets");
+			rp.model = self.wStatusView.model;
+			rp.silentErrors = True;
+			
+			parser = self.setupStatusOutput(rp, False, storeItem);
+			
+			def processDone(sop, parser=parser):
+				# flush out the last of the xml items (only when we've got a complete document)
+				if parser and (sop.status == ProcessStatus.STATUS_DONE):
+					parser.close();
+			rp.postEndCb = processDone;
+			
+			# there can be a lot of paths after big commits, so these get passed in a file
+			rp.addArgs(args);
+			if args:
+				targetsList = SvnStatusListDatalist();
+				for path in targets:
+					item = SvnStatusListItem(store=targetsList.store);
+					item.path = path;
+					targetsList.append(item);
+				rp.setTargets(targetsList);
+			else:
+				rp.addArgs(targets);
+			
+			processes.append(rp);
+		
+		# 	done .......................
+		def done(value):
+			if all(rp.status == ProcessStatus.STATUS_DONE for rp in processes):
+				# a full refresh started in the meantime will have these already
+				if (self.refreshProcess is None) or (self.refreshProcess.status != ProcessStatus.STATUS_WORKING):
+					self.wStatusView.model.mergeItems(fresh, inScope);
+					SvnWcDiffCache.shared().invalidate(self.branchType, inScope);
+					self.updateActionWidgets();
+			elif any(rp.status == ProcessStatus.STATUS_CANCELLED for rp in processes):
+				# stopped to let something else have the working copy - these get checked once it's done
+				for path, info in changed.iteritems():
+					self.changedPaths.setdefault(path, info);
+			else:
+				# svn couldn't check them on their own, so fall back to checking everything
+				print "Refresh Targets: couldn't check the changed paths, so refreshing everything instead"
+				QTimer.singleShot(0, self.svnRefreshStatus);
+		
+		# go! - one after the other, stopping at the first that doesn't finish
+		if processes:
+			future = processes[0].startAsync();
+			for rp in processes[1:]:
+				future = future.then(lambda sop, rp=rp: rp.startAsync() if (sop.status == ProcessStatus.STATUS_DONE) else sop);
+		else:
+			future = OperationFuture.resolved();
+		
+		return future.addDoneCb(done);
 	
 	# Status List Dependent --------------------------------------------------
 	
@@ -423,7 +981,7 @@ class BranchPanel(QWidget):
 			return;
 		
 		# filter list of files to only include unversioned
-		files = files.getFiltered(lambda x: x.file_status == SvnStatusListItem.FileStatusMap['?']);
+		files = files.getFiltered(lambda x: x.fileCode == '?');
 		
 		# setup process
 		p1 = SvnOperationProcess(self, "Add");
@@ -440,8 +998,8 @@ class BranchPanel(QWidget):
 		
 		dlg.go();
 		
-		# now schedule update to status list
-		self.svnRefreshStatus();
+		# now schedule update to status list - only what was added can have changed
+		self.svnRefreshPaths(files);
 		
 	def svnDelete(self):
 		# get list of files to change
@@ -453,11 +1011,7 @@ class BranchPanel(QWidget):
 		# filter list of files to only include added, conflicted, modified, replaced, or missing
 		# i.e. those under version control
 		def filterPredicate(item):
-			for k in ('A', 'C', 'M', 'R', '!'):	
-				if item.file_status == SvnStatusListItem.FileStatusMap[k]:
-					return True;
-			else:
-				return False;
+			return item.fileCode in ('A', 'C', 'M', 'R', '!');
 		files = files.getFiltered(filterPredicate);
 		
 		# remove versioned files (those still in files list)?
@@ -511,9 +1065,9 @@ class BranchPanel(QWidget):
 				dlg.addProcess(p1);
 				
 				dlg.go();
-			
-		# now schedule update to status list
-		self.svnRefreshStatus();
+		
+		# now schedule update to status list - only what was deleted can have changed
+		self.svnRefreshPaths(files);
 		
 	def svnRevert(self):
 		# get list of files to change
@@ -524,11 +1078,7 @@ class BranchPanel(QWidget):
 		
 		# filter list of files to NOT include externals or unversioned
 		def filterPredicate(item):
-			for k in ('?', 'X'):	
-				if item.file_status == SvnStatusListItem.FileStatusMap[k]:
-					return False;
-			else:
-				return True;
+			return item.fileCode not in ('?', 'X');
 		files = files.getFiltered(filterPredicate);
 		
 		# user sanity check: user must prompt to allow this to happen,
@@ -560,8 +1110,8 @@ class BranchPanel(QWidget):
 			
 			dlg.go();
 			
-			# now schedule update to status list
-			self.svnRefreshStatus();
+			# now schedule update to status list - only what was reverted can have changed
+			self.svnRefreshPaths(files);
 		else:
 			print "Prevent accidental revert! Yay!"
 	
@@ -572,7 +1122,46 @@ class BranchPanel(QWidget):
 			self.noDataSelectedCb("Create Patch");
 			return;
 		
-		self.unimplementedFeatureCb("Create Patch");
+		# filter list of files to only include those with changes that can be diffed
+		def filterPredicate(item):
+			return (item.fileCode not in (' ', '?', 'I', 'X')) or (item.propCode != ' ');
+		files = files.getFiltered(filterPredicate);
+		
+		if len(files) == 0:
+			QMessageBox.warning(self, "Create Patch", "None of the selected paths have any changes to put in a patch");
+			return;
+		
+		# where to save it - compressed if a ".gz" name is given
+		fileName = QFileDialog.getSaveFileName(self,
+			"Create Patch",
+			".",
+			"Patch Files (*.patch *.diff);;Compressed Patch Files (*.patch.gz *.diff.gz)");
+		fileName = str(fileName);
+		
+		if not fileName:
+			return;
+		
+		# work out how to split up the diffing
+		QApplication.setOverrideCursor(Qt.WaitCursor);
+		try:
+			exporter = SvnPatchExporter(self.branchType, [str(item.path) for item in files], fileName);
+		finally:
+			QApplication.restoreOverrideCursor();
+		
+		# setup and run dialog
+		dlg = SvnOperationDialog(self, "Create Patch");
+		
+		try:
+			exporter.addToDialog(dlg);
+		except IOError, e:
+			QMessageBox.warning(self, "Create Patch", "Could not create patch file '%s'\n%s" % (fileName, e));
+			return;
+		
+		dlg.go();
+		
+		# only a complete patch gets kept - the dialog has already reported why, unless it was the saving that failed
+		if (not exporter.finish()) and (dlg.status == ProcessStatus.STATUS_DONE):
+			QMessageBox.warning(self, "Create Patch", "Could not save patch file '%s'" % (fileName));
 		
 	# perform SVN Commit
 	def svnCommit(self):
@@ -618,8 +1207,8 @@ class BranchPanel(QWidget):
 			else:
 				print "not clearing log file"
 			
-			# now schedule update to status list
-			self.svnRefreshStatus();
+			# now schedule update to status list - only what was committed can have changed
+			self.svnRefreshPaths(files);
 		else:
 			# TODO: cancel any lingering log messaes?
 			print "Commit cancelled..."
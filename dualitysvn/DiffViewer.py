@@ -5,11 +5,348 @@
 
 from coreDefines import *
 
+from AbstractOperationProcess import LineSplitter
+from SvnWcDiff import diffLines
+
+from array import array
+import bisect
+import mmap
+import re
+import tempfile
+
 #########################################
-# Diff Presentation Widget
+# Diff Styling
+#
+# Lines get colored by what they are (added, removed, hunk headers, etc.), and
+# for lines which were changed (i.e. a removed line followed by the line that
+# replaced it), the words which actually changed get picked out too.
+#
+# Only the lines being shown ever get styled. Working out which words changed
+# needs the whole group of lines around a line though, so that gets done for
+# a whole hunk at once, the first time any line in it gets shown.
 
-# FIXME: this is currently just a wrapper, but later this should get some
-# special drawing capabilities too!
+# Kinds of lines in a unified diff
+class DiffLineKind:
+	KIND_CONTEXT, KIND_ADDED, KIND_REMOVED, KIND_HUNK, KIND_HEADER, KIND_NOTE = range(6);
+	
+	# Colors (text, background, background for changed words) for each kind - None for the defaults
+	ColorMap = {
+		KIND_CONTEXT : (None, None, None),
+		KIND_ADDED   : (Qt.darkGreen, QColor(230, 255, 230), QColor(160, 240, 160)),
+		KIND_REMOVED : (Qt.darkRed, QColor(255, 235, 235), QColor(250, 180, 180)),
+		KIND_HUNK    : (Qt.darkMagenta, QColor(240, 235, 250), None),
+		KIND_HEADER  : (Qt.darkBlue, QColor(235, 240, 250), None),
+		KIND_NOTE    : (Qt.gray, None, None),
+	};
+
+# Splits lines into the words (and spaces, and punctuation) that changes within them get found in terms of
+WORD_PATTERN = re.compile(r'\w+|\s+|[^\w\s]', re.UNICODE);
+
+# Find the words which changed between a removed line and the line it was replaced with
+# < oldLine, newLine: (str/unicode) removed and added lines, including their +/- markers
+# > return[0]: (list<tuple>) (start, end) of changed parts of old line, or None if the lines are too different for that to be useful
+# > return[1]: (list<tuple>) (start, end) of changed parts of new line, or None
+def intraLineChanges(oldLine, newLine):
+	a = WORD_PATTERN.findall(oldLine, 1);
+	b = WORD_PATTERN.findall(newLine, 1);
+	
+	opcodes = diffLines(a, b);
+	
+	# when hardly anything is the same, the whole line has changed
+	same = sum(sum(len(word) for word in a[i1:i2]) for tag, i1, i2, j1, j2 in opcodes if tag == 'equal');
+	if same * 2 < max(len(oldLine), len(newLine)) - 1:
+		return None, None;
+	
+	# convert word ranges to character ranges (after the markers)
+	oldSpans = [];
+	newSpans = [];
+	oldPos = newPos = 1;
+	
+	for tag, i1, i2, j1, j2 in opcodes:
+		oldEnd = oldPos + sum(len(word) for word in a[i1:i2]);
+		newEnd = newPos + sum(len(word) for word in b[j1:j2]);
+		
+		if tag != 'equal':
+			if oldEnd > oldPos:
+				oldSpans.append((oldPos, oldEnd));
+			if newEnd > newPos:
+				newSpans.append((newPos, newEnd));
+		
+		oldPos, newPos = oldEnd, newEnd;
+	
+	return oldSpans, newSpans;
+
+# Works out how each line in a diff should be styled, only looking at the lines it needs to
+# - lines are read through a callback, so that this works for both text documents and line stores
+class DiffLineStyler(object):
+	# Class Defines =========================================
+	# Hunks with more lines than this don't get changed words picked out (as it would take too long)
+	MAX_HUNK_LINES = 2000;
+	
+	# Lines longer than this don't get changed words picked out
+	MAX_LINE_LENGTH = 500;
+	
+	# Instance Settings =====================================
+	__slots__ = (
+		'getLine',		# (fn(int) -> str) get the text of a line
+		'numLines',		# (fn() -> int) get the number of lines
+		
+		'hunkStarts',	# (list<int>) sorted lines that hunks whose changes have been found start on
+		'hunks',		# (dict<int, tuple>) start line : (end line, changed words for each line, number of lines when found if it ran up to the last line or None)
+	);
+	
+	# ctor
+	# < getLine: (fn(int) -> str) get the text of a line (without EOL chars)
+	# < numLines: (fn() -> int) get the number of lines
+	def __init__(self, getLine, numLines):
+		self.getLine = getLine;
+		self.numLines = numLines;
+		
+		self.hunkStarts = [];
+		self.hunks = {};
+	
+	# forget everything that was worked out, as the lines have changed
+	def reset(self):
+		self.hunkStarts = [];
+		self.hunks = {};
+	
+	# Line Kinds ============================================
+	
+	# get the kind of a line
+	# < index: (int) index of line
+	# < line: (str) text of line
+	# > return[0]: (DiffLineKind.KIND_*)
+	def getKind(self, index, line):
+		c = line[:1];
+		
+		if c == '+':
+			# file header, unless it's an added line that happens to start with "++"
+			if line.startswith('+++ ') and self.isFileHeader(index - 1):
+				return DiffLineKind.KIND_HEADER;
+			return DiffLineKind.KIND_ADDED;
+		elif c == '-':
+			if line.startswith('--- ') and self.isFileHeader(index):
+				return DiffLineKind.KIND_HEADER;
+			return DiffLineKind.KIND_REMOVED;
+		elif c in (' ', ''):
+			return DiffLineKind.KIND_CONTEXT;
+		elif line.startswith('@@'):
+			return DiffLineKind.KIND_HUNK;
+		elif c == '\\':
+			return DiffLineKind.KIND_NOTE;
+		else:
+			# "Index:", "=====", "Property changes on:", etc.
+			return DiffLineKind.KIND_HEADER;
+	
+	# check whether a "---" line is the start of a file header, instead of a removed line
+	# - headers are "--- old" + "+++ new", and get followed by a hunk, which can't
+	#   happen for a removed + added line (as hunks always end with some context,
+	#   except at the end of a file)
+	def isFileHeader(self, index):
+		if (index < 0) or (index + 2 >= self.numLines()):
+			return False;
+		
+		return (self.getLine(index).startswith('--- ') and
+		        self.getLine(index + 1).startswith('+++ ') and
+		        self.getLine(index + 2).startswith('@@'));
+	
+	# Changed Words =========================================
+	
+	# find the hunk that a line is in, out of the ones whose changes have been found
+	# > return[0]: (tuple) (start, end, changes, numLines) or None
+	def findKnownHunk(self, index):
+		pos = bisect.bisect_right(self.hunkStarts, index) - 1;
+		if pos < 0:
+			return None;
+		
+		start = self.hunkStarts[pos];
+		end, changes, numLines = self.hunks[start];
+		
+		if numLines is None:
+			return (start, end, changes, numLines) if index < end else None;
+		elif numLines == self.numLines():
+			return (start, end, changes, numLines);
+		else:
+			# more lines have come in since, which may be part of the hunk
+			del self.hunkStarts[pos];
+			del self.hunks[start];
+			return None;
+	
+	# check whether the changes found for a line won't change as more lines come in
+	def isSettled(self, index):
+		hunk = self.findKnownHunk(index);
+		return (hunk is None) or (hunk[3] is None);
+	
+	# get the parts of a line which changed
+	# < index: (int) index of an added/removed line
+	# > return[0]: (list<tuple>) (start, end) character ranges
+	def getChanges(self, index):
+		# already known?
+		hunk = self.findKnownHunk(index);
+		if hunk is not None:
+			return hunk[2].get(index, ());
+			
+		# find the start of the hunk the line is in
+		start = index - 1;
+		while (start >= 0) and (index - start <= DiffLineStyler.MAX_HUNK_LINES):
+			c = self.getLine(start)[:1];
+			
+			if c == '@':
+				return self.findHunkChanges(start).get(index, ());
+			elif c not in (' ', '+', '-', '\\', ''):
+				break;
+			
+			start -= 1;
+		
+		# not in a hunk, or it's too big
+		return ();
+	
+	# find the changed words for all the lines in a hunk
+	# < start: (int) index of hunk header line
+	# > return[0]: (dict<int, list<tuple>>) changed character ranges for each line that has any
+	def findHunkChanges(self, start):
+		numLines = self.numLines();
+		changes = {};
+		
+		# consecutive removed lines followed by the lines they were replaced with
+		removed = [];
+		added = [];
+		
+		index = start + 1;
+		while True:
+			line = self.getLine(index) if index < numLines else None;
+			c = line[:1] if line is not None else None;
+			
+			if (c == '-') and not added:
+				removed.append(index);
+			elif (c == '+') and removed:
+				added.append(index);
+			elif c != '\\':
+				# group over - pair up the lines in order
+				for oldIndex, newIndex in zip(removed, added):
+					oldLine = self.getLine(oldIndex);
+					newLine = self.getLine(newIndex);
+					
+					if max(len(oldLine), len(newLine)) > DiffLineStyler.MAX_LINE_LENGTH:
+						continue;
+					
+					oldSpans, newSpans = intraLineChanges(oldLine, newLine);
+					if oldSpans:
+						changes[oldIndex] = oldSpans;
+					if newSpans:
+						changes[newIndex] = newSpans;
+				
+				removed = [];
+				added = [];
+				
+				if c == '-':
+					removed.append(index);
+			
+			# end of hunk?
+			if (c not in (' ', '+', '-', '\\', '')) or (index - start > DiffLineStyler.MAX_HUNK_LINES):
+				break;
+			
+			index += 1;
+		
+		# a hunk that runs up to the last line may not have all come in yet, so it only stays valid until more lines arrive
+		bisect.insort(self.hunkStarts, start);
+		self.hunks[start] = (index, changes, numLines if index >= numLines else None);
+		
+		return changes;
+
+# Highlighter for diffs shown in a text document
+# - only the lines in view get highlighted (see DiffWidget.highlightVisible()), with
+#   the state of each block noting whether it has been done yet
+class DiffHighlighter(QSyntaxHighlighter):
+	# Class Defines =========================================
+	# Block states - blocks which haven't been highlighted (or were highlighted before
+	# the rest of their hunk came in) get done when they come into view
+	STATE_NONE, STATE_DONE, STATE_PARTIAL = -1, 1, 2;
+	
+	# Setup =================================================
+	
+	# ctor
+	# < widget: (DiffWidget) widget showing the document to highlight
+	def __init__(self, widget):
+		super(DiffHighlighter, self).__init__(widget.document());
+		
+		self.widget = widget;
+		self.styler = DiffLineStyler(self.getLine, widget.document().blockCount);
+		
+		# range of blocks in view
+		self.visibleFirst = 0;
+		self.visibleLast = 100;
+		
+		# formats for each kind of line, and for the changed words in them
+		self.formats = {};
+		self.changeFormats = {};
+		
+		for kind, (textColor, bgColor, changeColor) in DiffLineKind.ColorMap.iteritems():
+			if textColor is None:
+				continue;
+			
+			fmt = QTextCharFormat();
+			fmt.setForeground(textColor);
+			if bgColor is not None:
+				fmt.setBackground(bgColor);
+			if kind == DiffLineKind.KIND_HEADER:
+				fmt.setFontWeight(QFont.Bold);
+			self.formats[kind] = fmt;
+			
+			if changeColor is not None:
+				changeFmt = QTextCharFormat(fmt);
+				changeFmt.setBackground(changeColor);
+				self.changeFormats[kind] = changeFmt;
+		
+		# anything worked out before is no good once lines get removed or replaced
+		widget.document().contentsChange.connect(self.contentsChanged);
+	
+	# Methods ===============================================
+	
+	# get the text of a line in the document
+	def getLine(self, index):
+		return unicode(self.document().findBlockByNumber(index).text());
+	
+	# set the range of blocks in view
+	def setVisibleRange(self, first, last):
+		self.visibleFirst = first;
+		self.visibleLast = last;
+	
+	# document changed callback
+	def contentsChanged(self, position, charsRemoved, charsAdded):
+		if charsRemoved:
+			self.styler.reset();
+	
+	# QSyntaxHighlighter.highlightBlock()
+	def highlightBlock(self, text):
+		index = self.currentBlock().blockNumber();
+		
+		# nothing to do until it comes into view
+		if not (self.visibleFirst <= index <= self.visibleLast):
+			self.setCurrentBlockState(DiffHighlighter.STATE_NONE);
+			return;
+		
+		line = unicode(text);
+		kind = self.styler.getKind(index, line);
+		state = DiffHighlighter.STATE_DONE;
+		
+		fmt = self.formats.get(kind);
+		if fmt is not None:
+			self.setFormat(0, len(line), fmt);
+		
+		changeFmt = self.changeFormats.get(kind);
+		if changeFmt is not None:
+			for start, end in self.styler.getChanges(index):
+				self.setFormat(start, end - start, changeFmt);
+			
+			# the rest of the hunk may still be on its way
+			if not self.styler.isSettled(index):
+				state = DiffHighlighter.STATE_PARTIAL;
+		
+		self.setCurrentBlockState(state);
+
+#########################################
+# Diff Presentation Widget
 
 class DiffWidget(QTextBrowser):
 	def __init__(self, parent):
@@ -22,12 +359,272 @@ class DiffWidget(QTextBrowser):
 		font = QFont("Monospace");
 		font.setStyleHint(font.TypeWriter, font.PreferDefault);
 		self.setFont(font);
+		
+		# highlighting - only done for what's in view, so it gets redone when the view changes
+		self.highlighter = DiffHighlighter(self);
+		
+		self.highlightTimer = QTimer(self);
+		self.highlightTimer.setSingleShot(True);
+		self.highlightTimer.timeout.connect(self.highlightVisible);
+		
+		self.verticalScrollBar().valueChanged.connect(self.scheduleHighlight);
+		self.document().contentsChanged.connect(self.scheduleHighlight);
+	
+	# turn highlighting on/off (i.e. for text that isn't a unified diff)
+	def setHighlighting(self, enabled):
+		if enabled:
+			self.highlighter.setDocument(self.document());
+		else:
+			self.highlighter.setDocument(None);
+	
+	# highlight the blocks in view, once things have settled down
+	def scheduleHighlight(self, *args):
+		if not self.highlightTimer.isActive():
+			self.highlightTimer.start(0);
+	
+	# highlight the blocks in view which haven't been done yet
+	def highlightVisible(self):
+		if self.highlighter.document() is None:
+			return;
+		
+		first = self.cursorForPosition(QPoint(0, 0)).blockNumber();
+		last = self.cursorForPosition(QPoint(0, self.viewport().height())).blockNumber();
+		self.highlighter.setVisibleRange(first, last);
+		
+		block = self.document().findBlockByNumber(first);
+		while block.isValid() and (block.blockNumber() <= last):
+			if block.userState() != DiffHighlighter.STATE_DONE:
+				self.highlighter.rehighlightBlock(block);
+			block = block.next();
+	
+	def resizeEvent(self, event):
+		super(DiffWidget, self).resizeEvent(event);
+		self.scheduleHighlight();
+
+#########################################
+# Large Diffs
+#
+# Diffs of generated files can be many megabytes, which is far too much for a
+# QTextDocument to lay out. Instead, the lines get written out to a temp file,
+# with only the offset of each line being kept in memory, and the file gets
+# memory-mapped so that only the lines actually being shown need to be read.
+
+# Line-indexed storage for the text of a large diff
+class DiffLineStore(object):
+	__slots__ = (
+		'fileN',		# (str) path to the temp file that the lines are stored in
+		'file',			# (file) temp file, open for appending
+		'size',			# (int) number of bytes written to the file so far
+		
+		'starts',		# (array<long>) offset of the start of each line in the file
+		'maxLength',	# (int) length of the longest line (in characters, with tabs expanded)
+		
+		'map',			# (mmap) read-only mapping of the file, or None if nothing has been mapped yet
+		'mapSize',		# (int) number of bytes covered by the mapping
+	);
+	
+	# ctor
+	# ! may raise IOError/OSError if the temp file couldn't be created
+	def __init__(self):
+		fd, self.fileN = tempfile.mkstemp(prefix="duality-", suffix=".diff", dir=project.tempFileDir);
+		self.file = os.fdopen(fd, 'w+b');
+		self.size = 0;
+		
+		self.starts = array('L');
+		self.maxLength = 0;
+		
+		self.map = None;
+		self.mapSize = 0;
+	
+	# Methods ===============================================
+	
+	# get the number of lines stored
+	def numLines(self):
+		return len(self.starts);
+	
+	# add some lines to the end
+	# < lines: (list<str>) lines without EOL chars
+	def appendLines(self, lines):
+		offset = self.size;
+		
+		for line in lines:
+			self.starts.append(offset);
+			offset += len(line) + 1;
+			
+			if len(line) > self.maxLength:
+				self.maxLength = max(self.maxLength, len(line.expandtabs(4)));
+		
+		self.file.write("".join(line + '\n' for line in lines));
+		self.size = offset;
+	
+	# get the text of a line
+	# < index: (int) index of line
+	# > return[0]: (str) text of line, without EOL chars
+	def getLine(self, index):
+		# bring the mapping up to date with whatever has been added since
+		if self.mapSize != self.size:
+			self.file.flush();
+			
+			if self.map is not None:
+				self.map.close();
+			
+			self.map = mmap.mmap(self.file.fileno(), self.size, access=mmap.ACCESS_READ);
+			self.mapSize = self.size;
+		
+		start = self.starts[index];
+		if index + 1 < len(self.starts):
+			end = self.starts[index + 1] - 1;
+		else:
+			end = self.size - 1;
+		
+		return self.map[start:end];
+	
+	# release the temp file
+	def close(self):
+		if self.map is not None:
+			self.map.close();
+			self.map = None;
+		
+		if self.file is not None:
+			self.file.close();
+			self.file = None;
+			
+			try:
+				os.remove(self.fileN);
+			except OSError:
+				pass;
 
+# Shows the lines in a DiffLineStore, only ever drawing the lines that can be seen
+class DiffLineView(QAbstractScrollArea):
+	# Setup =================================================
+	
+	def __init__(self, parent):
+		super(DiffLineView, self).__init__(parent);
+		
+		# lines to show
+		self.store = None;
+		self.styler = None;
+		
+		# colors for each kind of line
+		self.textColors = {};
+		self.bgColors = {};
+		self.changeColors = {};
+		
+		for kind, (textColor, bgColor, changeColor) in DiffLineKind.ColorMap.iteritems():
+			self.textColors[kind] = QColor(textColor) if textColor is not None else None;
+			self.bgColors[kind] = QColor(bgColor) if bgColor is not None else None;
+			self.changeColors[kind] = QColor(changeColor) if changeColor is not None else None;
+		
+		# set monospaced fonts - looks more like code (and keeps all lines the same width per char)
+		font = QFont("Monospace");
+		font.setStyleHint(font.TypeWriter, font.PreferDefault);
+		self.setFont(font);
+		
+		self.viewport().setBackgroundRole(QPalette.Base);
+		self.viewport().setAutoFillBackground(True);
+	
+	# set the lines to show
+	# < store: (DiffLineStore) or None
+	def setStore(self, store):
+		self.store = store;
+		
+		if store is not None:
+			# tabs are expanded before anything gets worked out, so that changed words line up with what's drawn
+			self.styler = DiffLineStyler(lambda index: store.getLine(index).expandtabs(4), store.numLines);
+		else:
+			self.styler = None;
+			
+		self.verticalScrollBar().setValue(0);
+		self.horizontalScrollBar().setValue(0);
+		
+		self.linesAdded();
+	
+	# Methods ===============================================
+	
+	# get the height of each line
+	def lineHeight(self):
+		return self.fontMetrics().lineSpacing();
+	
+	# get the number of lines that fit in the view
+	def visibleLines(self):
+		return max(1, self.viewport().height() // self.lineHeight());
+	
+	# update for lines having been added to the store
+	def linesAdded(self):
+		numLines = self.store.numLines() if self.store else 0;
+		maxLength = self.store.maxLength if self.store else 0;
+		
+		# vertical scrolling is in lines, horizontal scrolling in pixels
+		vbar = self.verticalScrollBar();
+		vbar.setRange(0, max(0, numLines - self.visibleLines()));
+		vbar.setPageStep(self.visibleLines());
+		
+		hbar = self.horizontalScrollBar();
+		hbar.setRange(0, max(0, maxLength * self.fontMetrics().width('M') - self.viewport().width()));
+		hbar.setPageStep(self.viewport().width());
+		hbar.setSingleStep(self.fontMetrics().width('M') * 4);
+		
+		# only need to redraw if the new lines may be in view
+		if vbar.value() + self.visibleLines() + 1 >= numLines - 1:
+			self.viewport().update();
+	
+	# Events ================================================
+	
+	def resizeEvent(self, event):
+		super(DiffLineView, self).resizeEvent(event);
+		self.linesAdded();
+	
+	def scrollContentsBy(self, dx, dy):
+		self.viewport().update();
+	
+	def paintEvent(self, event):
+		if not self.store:
+			return;
+		
+		painter = QPainter(self.viewport());
+		painter.setFont(self.font());
+		
+		metrics = self.fontMetrics();
+		lineHeight = self.lineHeight();
+		ascent = metrics.ascent();
+		width = self.viewport().width();
+		xOffset = -self.horizontalScrollBar().value() + 2;
+		
+		first = self.verticalScrollBar().value();
+		last = min(self.store.numLines(), first + self.visibleLines() + 1);
+		
+		defaultColor = self.palette().color(QPalette.Text);
+		
+		for row, index in enumerate(xrange(first, last)):
+			line = self.store.getLine(index).expandtabs(4);
+			kind = self.styler.getKind(index, line);
+			y = row * lineHeight;
+			
+			# line background, with the changed words picked out
+			if self.bgColors[kind] is not None:
+				painter.fillRect(0, y, width, lineHeight, self.bgColors[kind]);
+			
+			if self.changeColors[kind] is not None:
+				for start, end in self.styler.getChanges(index):
+					x = xOffset + metrics.width(line[:start]);
+					painter.fillRect(x, y, metrics.width(line[start:end]), lineHeight, self.changeColors[kind]);
+			
+			painter.setPen(self.textColors[kind] or defaultColor);
+			painter.drawText(xOffset, y + ascent, line);
+		
+		painter.end();
 
 #########################################
 # Diff Viewer Window
 
 class DiffViewer(QMainWindow):
+	# Class Defines =========================================
+	# Maximum time (ms) that output is held back for before being shown (i.e. roughly a frame)
+	FLUSH_INTERVAL = 33;
+	
+	# Size at which diffs get shown using the line-indexed view instead of a text document
+	LARGE_DIFF_LINES = 20000;
+	LARGE_DIFF_BYTES = 2 * 1024 * 1024;
 	
 	# Setup ================================================
 	
@@ -39,10 +636,31 @@ class DiffViewer(QMainWindow):
 		self.setWindowTitle("Duality Diff Viewer");
 		self.setGeometry(150, 150, 700, 400);
 		
+		# process producing the diff (if it's being streamed)
+		self.process = None;
+		
+		# output which hasn't been shown yet
+		self.pending = [];
+		# output shown in the text document so far (needed again if the diff turns out to be large)
+		self.shown = [];
+		self.numLines = 0;
+		self.numBytes = 0;
+		
+		# storage for large diffs - only created once a diff turns out to be large
+		self.store = None;
+		
+		# differences found by the built-in diff engine (SvnWcDiffResult), which can be shown in different ways
+		self.result = None;
+		
+		# timer for showing what we've got so far
+		self.timer = QTimer(self);
+		self.timer.setSingleShot(True);
+		self.timer.timeout.connect(self.flush);
+		
 		# setup UI
 		self.setupUI();
 		
-	# set up main widgets 
+	# set up main widgets
 	def setupUI(self):
 		# dummy widget for MainWindow container
 		dw = QWidget();
@@ -52,22 +670,220 @@ class DiffViewer(QMainWindow):
 		self.layout = QVBoxLayout();
 		dw.setLayout(self.layout);
 		
+		# loading status - only shown while the diff is still coming in
+		self.wLoading = QWidget();
+		self.wLoading.setVisible(False);
+		
+		hbox = QHBoxLayout();
+		hbox.setContentsMargins(0, 0, 0, 0);
+		self.wLoading.setLayout(hbox);
+		
+		self.wLoadingLabel = QLabel("Loading diff...");
+		hbox.addWidget(self.wLoadingLabel);
+		
+		self.wLoadingBar = QProgressBar();
+		self.wLoadingBar.setRange(0, 0); # busy indicator - we don't know how much there'll be
+		hbox.addWidget(self.wLoadingBar, 1);
+		
+		self.wCancel = QPushButton("Cancel");
+		self.wCancel.clicked.connect(self.cancel);
+		hbox.addWidget(self.wCancel);
+		
+		self.layout.addWidget(self.wLoading);
+		
+		# display options - only available for diffs from the built-in diff engine
+		self.wSideBySide = QCheckBox("Side by Side");
+		self.wSideBySide.setVisible(False);
+		self.wSideBySide.toggled.connect(self.showResult);
+		
+		self.layout.addWidget(self.wSideBySide);
+		
 		# ..........
 		
-		# just have a big text-box showing the diff for now
+		# text-box showing the diff, or the line-indexed view for large ones
+		self.wStack = QStackedWidget();
+		self.layout.addWidget(self.wStack);
+		
 		self.wDisplay = DiffWidget(self);
+		self.wStack.addWidget(self.wDisplay);
 		
-		self.layout.addWidget(self.wDisplay);
+		self.wLargeDisplay = DiffLineView(self);
+		self.wStack.addWidget(self.wLargeDisplay);
 		
 	# Methods =============================================
 	
 	# display a diff obtained from internal actions
 	def displayDiff_fromString(self, txt):
 		# set as new contents
+		self.clear();
+		
+		splitter = LineSplitter();
+		self.addLines(None, splitter.feed(txt) + splitter.flush());
+		self.flush();
+	
+	# display the differences found by the built-in diff engine
+	# < result: (SvnWcDiffResult)
+	def displayDiffResult(self, result):
+		self.result = result;
+		self.wSideBySide.setVisible(True);
+		
+		self.showResult();
+	
+	# display the diff produced by a process, as it gets produced
+	# - the process gets started here, and can be cancelled from the viewer while it runs
+	# < process: (AbstractOperationProcess) process which will output the diff
+	def displayDiff_fromProcess(self, process):
+		self.clear();
+		
+		self.process = process;
+		process.handleOutputBatchCb = self.addLines;
+		process.postEndCb = self.processDone;
+		
+		self.wLoadingLabel.setText("Loading diff...");
+		self.wLoading.setVisible(True);
+		
+		process.startProcess();
+		
+		if process.status == ProcessStatus.STATUS_FAILED:
+			self.wLoading.setVisible(False);
+	
+	# cancel loading of the diff
+	def cancel(self):
+		if self.process:
+			# this ends up in processDone()
+			self.process.endProcess();
+	
+	# clear the diff being shown
+	def clear(self):
+		self.timer.stop();
+		
+		self.pending = [];
+		self.shown = [];
+		self.numLines = 0;
+		self.numBytes = 0;
+		
+		self.wDisplay.clear();
+		self.wLargeDisplay.setStore(None);
+		self.wStack.setCurrentWidget(self.wDisplay);
+		
+		if self.store:
+			self.store.close();
+			self.store = None;
+	
+	# Internal ============================================
+	
+	# show the result from the built-in diff engine in the chosen way
+	def showResult(self):
+		if self.result is None:
+			return;
+		
+		# side-by-side text isn't a unified diff, so there's nothing to highlight
+		self.clear();
+		self.wDisplay.setHighlighting(not self.wSideBySide.isChecked());
+		
+		if self.wSideBySide.isChecked():
+			self.displayDiff_fromString(self.formatSideBySide(self.result.getSideBySide()));
+		else:
+			self.displayDiff_fromString(self.result.getUnified());
+	
+	# lay out the rows of a side-by-side diff as text
+	# < rows: (list<tuple>) rows from SvnWcDiffResult.getSideBySide()
+	# > return[0]: (str)
+	@staticmethod
+	def formatSideBySide(rows):
+		markers = {'equal': " ", 'replace': "|", 'delete': "<", 'insert': ">"};
+		lineNo = lambda num: "%5d" % (num) if num is not None else "";
+		
+		# old side gets cut off when it's too wide, so that the new side doesn't end up off-screen
+		width = min(80, max([len(oldText.expandtabs(4)) for oldNum, oldText, newNum, newText, tag in rows] or [0]));
+		
+		return "\n".join("%5s %-*s %s %5s %s" % (lineNo(oldNum), width, oldText.expandtabs(4)[:width], markers[tag], lineNo(newNum), newText.expandtabs(4))
+		                 for oldNum, oldText, newNum, newText, tag in rows);
+	
+	# queue up lines of the diff (callback for process output)
+	# < sop: (AbstractOperationProcess) process that the lines came from
+	# < lines: (list<str>) lines without EOL chars
+	def addLines(self, sop, lines):
+		self.pending += lines;
+		self.numLines += len(lines);
+		self.numBytes += sum(len(line) + 1 for line in lines);
+		
+		# too much for a text document, so everything goes to the line-indexed view from now on
+		if (self.store is None) and ((self.numLines > DiffViewer.LARGE_DIFF_LINES) or (self.numBytes > DiffViewer.LARGE_DIFF_BYTES)):
+			self.switchToLargeView();
+		
+		if not self.timer.isActive():
+			self.timer.start(DiffViewer.FLUSH_INTERVAL);
+	
+	# show the lines of the diff that have been queued up
+	def flush(self):
+		self.timer.stop();
+		
+		if self.pending:
+			if self.store:
+				self.store.appendLines(self.pending);
+				self.wLargeDisplay.linesAdded();
+			else:
+				# add everything as a single edit - at the end, without moving the view
+				cursor = QTextCursor(self.wDisplay.document());
+				cursor.movePosition(QTextCursor.End);
+				cursor.beginEditBlock();
+				
+				if not self.wDisplay.document().isEmpty():
+					cursor.insertText('\n');
+				cursor.insertText('\n'.join(self.pending));
+				
+				cursor.endEditBlock();
+				
+				self.shown += self.pending;
+			
+			self.pending = [];
+		
+		if self.wLoading.isVisible():
+			self.wLoadingLabel.setText("Loading diff... %d lines" % (self.numLines));
+	
+	# move what's been shown so far to the line-indexed view
+	def switchToLargeView(self):
+		try:
+			self.store = DiffLineStore();
+		except (IOError, OSError), e:
+			print "Could not create temp file for large diff - %s" % (e)
+			return;
+		
+		# the lines that have been shown already need to go in too
+		self.pending = self.shown + self.pending;
+		self.shown = [];
+		
 		self.wDisplay.clear();
-		self.wDisplay.insertPlainText(txt);
 		
-		# now, scroll to start of text
-		self.wDisplay.moveCursor(QTextCursor.Start);
+		self.wLargeDisplay.setStore(self.store);
+		self.wStack.setCurrentWidget(self.wLargeDisplay);
+	
+	# callback for when the process producing the diff has ended
+	def processDone(self, sop):
+		# killed processes still report that they've finished afterwards, by which time
+		# this has already been done (and the viewer may have moved on, or been closed)
+		if sop is not self.process:
+			return;
+		
+		self.flush();
+		
+		if sop.status == ProcessStatus.STATUS_CANCELLED:
+			self.wLoadingLabel.setText("Cancelled - only the first %d lines were loaded" % (self.numLines));
+			self.wLoadingBar.setVisible(False);
+			self.wCancel.setVisible(False);
+		else:
+			self.wLoading.setVisible(False);
+		
+		self.process = None;
+	
+	# Events ================================================
+	
+	def closeEvent(self, event):
+		# no point carrying on with a diff nobody will see
+		self.cancel();
+		self.clear();
+		
+		super(DiffViewer, self).closeEvent(event);
 
 #########################################
@@ -16,33 +16,65 @@ from AbstractOperationProcess import *
 
 class ProcessOutputBuffer:
 	__slots__ = (
-		'archive',		# (list) output that has already been read from the buffer
-		'latest'		# (list) output that has just been added to the buffer but not yet read
+		'archive',		# (list) output that has already been read from the buffer, or None if read output isn't kept
+		'latest',		# (list) output that has just been added to the buffer but not yet read
+		
+		'mutex',		# (QMutex) lock for the buffers - output gets added from the thread, while being read from the GUI
 	);
 	
-	def __init__(self):
+	# < (keepArchive): (bool) whether output should be kept around after it has been read - this is off
+	#				   by default, as output only ever gets read once, and it can be a lot (i.e. whole diffs)
+	def __init__(self, keepArchive=False):
 		# init internal buffers
-		self.archive = [];
+		self.archive = [] if keepArchive else None;
 		self.latest = [];
 		
+		self.mutex = QMutex();
+	
 	# Add some text to the "unread" buffer
 	# FIXME: readline assumes that each entry is a new line...
 	def append(self, text):
-		self.latest.append(text);
-		
+		self.mutex.lock();
+		try:
+			self.latest.append(text);
+		finally:
+			self.mutex.unlock();
+	
 	# Checks if there is any content in the buffer to read
 	def canReadLine(self):
 		return len(self.latest) != 0;
-		
+	
 	# "Read" a line from the buffer, returning the line as a string for further usage
 	def readLine(self):
-		# move first line from start of "latest" to tail of "archive"
-		line = self.latest[0];
-		
-		del self.latest[0];
-		self.archive.append(line);
+		self.mutex.lock();
+		try:
+			# move first line from start of "latest" to tail of "archive"
+			line = self.latest[0];
+			
+			del self.latest[0];
+			if self.archive is not None:
+				self.archive.append(line);
+		finally:
+			self.mutex.unlock();
 		
 		return line;
+	
+	# "Read" everything that hasn't been read yet, returning the entries as they were added
+	def readEntries(self):
+		# swap in a new list, as more may get added from the thread while we're busy
+		self.mutex.lock();
+		try:
+			entries, self.latest = self.latest, [];
+			if self.archive is not None:
+				self.archive += entries;
+		finally:
+			self.mutex.unlock();
+		
+		return entries;
+	
+	# "Read" everything that hasn't been read yet as a single string, with each entry being a line
+	def readAll(self):
+		return "".join((text if text.endswith("\n") else text + "\n") for text in self.readEntries());
 
 ####################################
 # ThreadAsFauxProcess
@@ -55,6 +87,8 @@ class ProcessOutputBuffer:
 # 	- subclass and reimplement the run() method
 #	- use the write(out_txt) and error(err_txt) methods to produce any output
 #	- call done(exitCode) method run() method is done
+#	- check isStopping() every so often (i.e. between files), and call done(-1, QProcess.CrashExit)
+#	  as soon as it's safe to stop if it returns True, as that means that the process was killed
 
 class ThreadAsFauxProcess(QThread):
 	__slots__ = (
@@ -68,6 +102,8 @@ class ThreadAsFauxProcess(QThread):
 		'_outBuf',		# (ProcessOutputBuffer) 
 		'_errBuf',		# (ProcessOutputBuffer)
 		'_bufChannel',	# (QProcess.ProcessChannel) which one of these readers we use
+		
+		'_stopping',	# (bool) whether the thread has been asked to stop (see kill())
 	);
 	
 	# Setup ================================================================
@@ -91,6 +127,9 @@ class ThreadAsFauxProcess(QThread):
 		self._outBuf = ProcessOutputBuffer();
 		self._errBuf = ProcessOutputBuffer();
 		
+		# stop request
+		self._stopping = False;
+		
 	# QProcess API =========================================================
 		
 	# QProcess-style "state" polling
@@ -107,11 +146,16 @@ class ThreadAsFauxProcess(QThread):
 		self._state = QProcess.Running;
 		
 	# QProcess-style "kill"
+	# - terminating a thread that's running Python code can leave things (i.e. the interpreter lock)
+	#   in a state that nothing can recover from, so this only asks the thread to stop, and it ends
+	#   (with done() getting called as usual) once it gets to a point where it's safe to do so
+	# - this doesn't wait for that, so that the GUI doesn't hang in the meantime
 	def kill(self):
-		# nasty, but the closest we can get to kill a process is to terminate the thread
-		# XXX: careful! otherwise, may hang?
-		self.terminate();
-		self.done(-1, QProcess.CrashExit); # XXX? 
+		self._stopping = True;
+	
+	# Check whether the thread has been asked to stop
+	def isStopping(self):
+		return self._stopping;
 		
 	# QProcess-style "run blocking"
 	def waitForFinished(self, dummyArg):
@@ -155,6 +199,18 @@ class ThreadAsFauxProcess(QThread):
 	def readLine(self):
 		return self.getReadBuffer().readLine();
 	
+	# QProcess-style "readAllStandardOutput" (to get all unread content from the output buffer)
+	def readAllStandardOutput(self):
+		return self._outBuf.readAll();
+	
+	# QProcess-style "readAllStandardError" (to get all unread content from the error buffer)
+	def readAllStandardError(self):
+		return self._errBuf.readAll();
+	
+	# Get all unread output entries, as they were written (i.e. for output that isn't text)
+	def readOutputEntries(self):
+		return self._outBuf.readEntries();
+	
 	# QThread API ===========================================================
 	
 	# QThread.run() - this is where the bulk of things go
@@ -237,5 +293,25 @@ class InternalOperationProcess(AbstractOperationProcess):
 	# Overrides the basic stub in the abstract baseclass
 	def _start(self):
 		self.process.start(self.args);
+	
+	# Abort process prematurely
+	# - the thread only stops once it's safe for it to (see ThreadAsFauxProcess.kill()), so the
+	#   cleanup gets done once it has actually ended, in processEnded()
+	def endProcess(self):
+		# sanity check: only need to do this for "running" processes
+		if self.status != ProcessStatus.STATUS_WORKING:
+			return;
+		
+		self.status = ProcessStatus.STATUS_CANCELLED;
+		self.process.kill();
+	
+	# callback called when the thread ends
+	def processEnded(self, exitCode, exitStatus=QProcess.NormalExit):
+		if self.status == ProcessStatus.STATUS_CANCELLED:
+			# stopping isn't an error, but whatever was done before it stopped still gets passed on
+			self.readRemaining();
+			self.doneProcess();
+		else:
+			super(InternalOperationProcess, self).processEnded(exitCode, exitStatus);
 
 ####################################
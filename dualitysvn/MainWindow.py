@@ -133,10 +133,39 @@ class DualityWindow(QMainWindow):
 		# tools ----------------------------------
 		self.aCleanup = QAction("&Cleanup (Fix SVN Errors)",
 			self, triggered=self.branchCleanup);
+		
+		self.aResyncMetadata = QAction("&Resync Duality Metadata...",
+			self, triggered=self.resyncMetadata);
+		
+		self.aResyncMetadataFull = QAction("Resync Duality Metadata (Compare Contents)...",
+			self, triggered=lambda: self.resyncMetadata(checkContents=True));
+		
+		self.aVerifyMetadata = QAction("&Verify Duality Metadata",
+			self, triggered=self.verifyMetadata);
 			
 		self.aOptIgnoreExterns = QAction("Ignore Externals",
 			self, triggered=self.toggleIgnoreWarnings);
 		self.aOptIgnoreExterns.setCheckable(True);
+		
+		self.aOptXmlStatus = QAction("Use XML Status Output",
+			self, triggered=self.toggleXmlStatus);
+		self.aOptXmlStatus.setCheckable(True);
+		self.aOptXmlStatus.setChecked(project.xmlStatus);
+		
+		self.aOptBuiltinStatus = QAction("Use Built-in Status Engine",
+			self, triggered=self.toggleBuiltinStatus);
+		self.aOptBuiltinStatus.setCheckable(True);
+		self.aOptBuiltinStatus.setChecked(project.builtinStatus);
+		
+		self.aOptBuiltinDiff = QAction("Use Built-in Diff Engine",
+			self, triggered=self.toggleBuiltinDiff);
+		self.aOptBuiltinDiff.setCheckable(True);
+		self.aOptBuiltinDiff.setChecked(project.builtinDiff);
+		
+		self.aOptWatchWorkingCopy = QAction("Refresh Changed Paths Automatically",
+			self, triggered=self.toggleWatchWorkingCopy);
+		self.aOptWatchWorkingCopy.setCheckable(True);
+		self.aOptWatchWorkingCopy.setChecked(project.watchWorkingCopy);
 			
 		# help -----------------------------------
 		self.aAbout = QAction("&About",
@@ -164,11 +193,18 @@ class DualityWindow(QMainWindow):
 		# 2) branch/tool menu
 		self.mToolMenu = self.menuBar().addMenu("&Tools");
 		self.mToolMenu.addAction(self.aOptIgnoreExterns);
+		self.mToolMenu.addAction(self.aOptXmlStatus);
+		self.mToolMenu.addAction(self.aOptBuiltinStatus);
+		self.mToolMenu.addAction(self.aOptBuiltinDiff);
+		self.mToolMenu.addAction(self.aOptWatchWorkingCopy);
 		
 		self.mToolMenu.addSeparator();
 		
 		#self.mToolMenu.addAction("Show Log"); # FIXME: placeholder
 		self.mToolMenu.addAction(self.aCleanup);
+		self.mToolMenu.addAction(self.aResyncMetadata);
+		self.mToolMenu.addAction(self.aResyncMetadataFull);
+		self.mToolMenu.addAction(self.aVerifyMetadata);
 		#self.mToolMenu.addAction("Edit Conflicts"); # FIXME: placeholder
 		
 		# 3) help menu
@@ -190,6 +226,12 @@ class DualityWindow(QMainWindow):
 		else:
 			return None;
 	
+	# Get the panels for all the branches being shown
+	# > return[0]: (list<BranchPane>)
+	def getBranchTabs(self):
+		panes = [self.wTabs.widget(i) for i in range(self.wTabs.count())];
+		return [pane for pane in panes if isinstance(pane, BranchPanel)];
+	
 	# Callbacks ========================================== 
 	
 	# Update settings ------------------------------------
@@ -209,6 +251,10 @@ class DualityWindow(QMainWindow):
 		# directory
 		self.wDirectory.setText(project.workingCopyDir);
 		
+		# changes to some other working copy are no longer of interest
+		if WorkingCopyWatcher.shared().rootDir not in (None, project.workingCopyDir):
+			WorkingCopyWatcher.shared().stop();
+		
 		# branches
 		self.updateVisibleBranches();
 		
@@ -381,6 +427,14 @@ class DualityWindow(QMainWindow):
 	# override window close to prompt for saving
 	def closeEvent(self, event):
 		if self.promptSave():
+			# keep the latest status lists for next time
+			for pane in (self.pTrunk, self.pBranch):
+				if pane is not None:
+					pane.saveStatusSnapshot();
+			
+			# background work can't be left running once the app goes
+			SvnWcDiffPrefetcher.shutdown();
+			
 			# accept close event, and exit
 			# 	- file will already have been saved, as handled by promptSave()
 			event.accept();
@@ -440,6 +494,63 @@ class DualityWindow(QMainWindow):
 		if branch:
 			branch.svnCleanup();
 	
+	# bring the "_svn" metadata back in line with ".svn", after showing what will be changed
+	# < (checkContents): (bool) compare the contents of metadata files which look the same too
+	def resyncMetadata(self, checkContents=False):
+		# 1) dry run, to find out what needs doing
+		preview = SvnMetadataSyncThread(dryRun=True, checkContents=checkContents);
+		
+		p1 = InternalOperationProcess(self, "Resync Duality Metadata (Preview)", preview);
+		p1.addArgs([project.workingCopyDir]);
+		
+		dlg = SvnOperationDialog(self, "Resync Duality Metadata (Preview)");
+		dlg.addProcess(p1);
+		dlg.go();
+		
+		if (p1.status != ProcessStatus.STATUS_DONE) or (preview.plan is None):
+			return;
+		
+		if preview.plan.isEmpty():
+			QMessageBox.information(self,
+				"Resync Duality Metadata",
+				"Metadata is already in sync. Nothing needs to be changed.");
+			return;
+		
+		# 2) check that these changes should really be made
+		reply = QMessageBox.question(self,
+			"Resync Duality Metadata",
+			"%s\n\nCopy the working copy metadata (%s, the source - %s) over the trunk-reference metadata (%s - %s), "
+			"making the changes listed in the preview?" % (
+				preview.plan.getSummary(),
+				SVN_DIRNAME_BRANCH1, preview.plan.srcUrl or "unknown URL",
+				SVN_DIRNAME_BRANCH2, preview.plan.dstUrl or "not created yet"),
+			QMessageBox.Yes | QMessageBox.No, QMessageBox.No);
+		
+		if reply != QMessageBox.Yes:
+			print "Cancelled metadata resync..."
+			return;
+		
+		# 3) do it for real - the changes get worked out again, in case anything changed in the meantime
+		p2 = InternalOperationProcess(self, "Resync Duality Metadata", SvnMetadataSyncThread(checkContents=checkContents));
+		p2.addArgs([project.workingCopyDir]);
+		
+		dlg = SvnOperationDialog(self, "Resync Duality Metadata");
+		dlg.addProcess(p2);
+		dlg.go();
+		
+		# status of the trunk-reference copy may have changed
+		for branch in self.getBranchTabs():
+			branch.svnRefreshStatus();
+	
+	# check the ".svn" and "_svn" metadata for problems (missing twins, leftover locks, corrupt pristines)
+	def verifyMetadata(self):
+		p1 = InternalOperationProcess(self, "Verify Duality Metadata", SvnMetadataVerifyThread());
+		p1.addArgs([project.workingCopyDir]);
+		
+		dlg = SvnOperationDialog(self, "Verify Duality Metadata");
+		dlg.addProcess(p1);
+		dlg.go();
+	
 	# System Info ---------------------------------------
 	
 	# about box
@@ -458,6 +569,25 @@ class DualityWindow(QMainWindow):
 	def toggleIgnoreWarnings(self):
 		# just update this setting - property binding
 		project.ignoreExternals = self.aOptIgnoreExterns.isChecked();
+		
+	def toggleXmlStatus(self):
+		# just update this setting - property binding
+		project.xmlStatus = self.aOptXmlStatus.isChecked();
+		
+	def toggleBuiltinStatus(self):
+		# just update this setting - property binding
+		project.builtinStatus = self.aOptBuiltinStatus.isChecked();
+	
+	def toggleBuiltinDiff(self):
+		# just update this setting - property binding
+		project.builtinDiff = self.aOptBuiltinDiff.isChecked();
+		
+	def toggleWatchWorkingCopy(self):
+		project.watchWorkingCopy = self.aOptWatchWorkingCopy.isChecked();
+		
+		# watching starts again after the next refresh of the status list
+		if not project.watchWorkingCopy:
+			WorkingCopyWatcher.shared().stop();
 	
 
 #########################################
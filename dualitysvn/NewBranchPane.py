@@ -157,13 +157,22 @@ class NewBranchPanel(QWidget):
 			def run(self):
 				srcdir = self.args[0];
 				
-				errors = duplicateSvnMetadata(srcdir); # FIXME: just inline this...
+				try:
+					# progress gets shown in the operation log as it goes
+					errors = duplicateSvnMetadata(srcdir, lambda progress: self.write(str(progress)));
+				except Exception, e:
+					self.error("Could not copy svn metadata: %s" % (e));
+					self.done(1);
+					return;
 				
 				for err in errors:
 					self.error(str(err));
+				
+				# any files which didn't get copied leave the new branch's metadata broken
+				self.done(1 if errors else 0);
 		
 		dp = InternalOperationProcess(self, "Setup Working Copy Duality", DuplicateSvnMetadata());
-		dp.addArgs(srcdir);
+		dp.addArgs([srcdir]);
 		
 		
 		# perform an "svn copy" operation to make a new branch on the repository
@@ -188,12 +197,16 @@ class NewBranchPanel(QWidget):
 		
 		
 		# setup dialog to perform operations
+		# - the branch commit reads the same metadata that's being copied (and svn may
+		#   lock it while doing so), so it must wait until the copy is done - this also
+		#   means that the branch doesn't get made on the server if the copy failed
+		# - the switch changes the metadata, so it must wait until the copy is done too
 		dlg = SvnOperationDialog(self, "Create New Branch");
 		
-		dlg.addProcess(cp);
-		dlg.addProcess(dp);
-		dlg.addProcess(bp);
-		dlg.addProcess(sp);
+		dlg.addProcess(cp, [], [OperationResource.WC_LOCK, OperationResource.DISK]);
+		dlg.addProcess(dp, [cp], [OperationResource.DISK]);
+		dlg.addProcess(bp, [dp], [OperationResource.WC_LOCK, OperationResource.NETWORK]);
+		dlg.addProcess(sp, [dp, bp], [OperationResource.WC_LOCK, OperationResource.NETWORK]);
 		
 		dlg.go();
 		
@@ -0,0 +1,164 @@
+# Duality SVN
+# Original Author: Joshua Leung
+#
+# Operation Future - handle for the result of an operation that is still running,
+# so that GUI code can carry on once it's done instead of blocking until it is
+
+from coreDefines import *
+
+#########################################
+# Future
+
+# Result of an operation which may not have finished yet
+#
+# Instead of waiting for an operation to finish (which freezes the whole window, as
+# nothing else can happen on the GUI thread in the meantime), callbacks get added
+# to be run once it is done. These get run from the event loop, like everything else.
+#
+# Futures can be chained using then(), where the callback may start another
+# operation and return its future, in which case the chained future is only done
+# once that second operation is done too:
+#
+#	p1.startAsync().then(lambda sop: p2.startAsync()).addDoneCb(finishedCb);
+#
+# ! Callbacks are run whether or not the operation succeeded, so they should check
+#   the status of the process they get passed (or use succeeded()) where it matters
+class OperationFuture(object):
+	# Class Defines ======================================
+	# Futures of operations which are still running
+	# - keeps the operations alive until they're done, as nothing else may be holding on to them
+	_pending = set();
+	
+	# Instance Settings ==================================
+	__slots__ = (
+		'process',		# (AbstractOperationProcess) operation that this is the result of, or None
+		'upstream',		# (OperationFuture) future that this was chained from (using then()), if any
+		
+		'done',			# (bool) whether the result is available yet
+		'value',		# result - the process itself for operations, otherwise whatever the then() callback returned
+		
+		'callbacks',	# (list<fn(value)>) callbacks to run once done
+	);
+	
+	# ctor
+	# < (process): (AbstractOperationProcess) operation that this is the result of
+	def __init__(self, process=None):
+		self.process = process;
+		self.upstream = None;
+		
+		self.done = False;
+		self.value = None;
+		
+		self.callbacks = [];
+		
+		if process is not None:
+			OperationFuture._pending.add(self);
+	
+	# get a future which is already done
+	# < value: result to give
+	@classmethod
+	def resolved(cls, value=None):
+		future = cls();
+		future.resolve(value);
+		return future;
+	
+	# get a future which is done once all of the given ones are
+	# < futures: (list<OperationFuture>)
+	# > return[0]: (OperationFuture) future whose value is the list of their values
+	@classmethod
+	def gather(cls, futures):
+		futures = list(futures);
+		result = cls();
+		
+		def oneDone(value):
+			if all(future.done for future in futures):
+				result.resolve([future.value for future in futures]);
+		
+		if futures:
+			for future in futures:
+				future.addDoneCb(oneDone);
+		else:
+			result.resolve([]);
+		
+		return result;
+	
+	# Status =============================================
+	
+	# check whether the result is available yet
+	def isDone(self):
+		return self.done;
+	
+	# check whether this finished successfully
+	# - for chained futures, this is whether the last operation in the chain did
+	def succeeded(self):
+		if not self.done:
+			return False;
+		elif self.process is not None:
+			return self.process.status == ProcessStatus.STATUS_DONE;
+		else:
+			return True;
+	
+	# Callbacks ==========================================
+	
+	# add a callback to run once done - it's run straight away if this is done already
+	# < cb: (fn(value))
+	# > return[0]: (OperationFuture) this future, so that calls can be chained
+	def addDoneCb(self, cb):
+		if self.done:
+			cb(self.value);
+		else:
+			self.callbacks.append(cb);
+		
+		return self;
+	
+	# add a step to run once done
+	# < cb: (fn(value) -> value/OperationFuture) step to run - it may start another operation and return its future
+	# > return[0]: (OperationFuture) future which is done once the step is (including any operation it started)
+	def then(self, cb):
+		future = OperationFuture();
+		future.upstream = self;
+		
+		def chain(value):
+			result = cb(value);
+			
+			if isinstance(result, OperationFuture):
+				# cancelling the chain now cancels this operation
+				future.process = result.process;
+				future.upstream = result;
+				
+				result.addDoneCb(future.resolve);
+			else:
+				future.resolve(result);
+		
+		self.addDoneCb(chain);
+		return future;
+	
+	# Control ============================================
+	
+	# set the result, and run the callbacks
+	# - only the first result counts (i.e. killed processes may still report that they've finished afterwards)
+	def resolve(self, value):
+		if self.done:
+			return;
+		
+		self.done = True;
+		self.value = value;
+		
+		OperationFuture._pending.discard(self);
+		
+		callbacks, self.callbacks = self.callbacks, [];
+		for cb in callbacks:
+			cb(value);
+	
+	# stop the operation that this is waiting on
+	def cancel(self):
+		if self.done:
+			return;
+		
+		if (self.process is not None) and (self.process.status == ProcessStatus.STATUS_WORKING):
+			# this ends up in resolve() via the process's doneProcess()
+			self.process.endProcess();
+		elif self.upstream is not None:
+			self.upstream.cancel();
+
+#########################################
@@ -0,0 +1,316 @@
+# Duality SVN
+# Original Author: Joshua Leung
+#
+# Operation Process Group - runs several operation processes concurrently
+# (up to a limit), while presenting them as a single operation
+
+from coreDefines import *
+
+from OperationFuture import *
+from WcOperationCoordinator import *
+
+import time
+
+#########################################
+# Process Group
+
+# Group of processes that are run as a single operation
+#
+# - Up to maxConcurrent member processes are run at once, with the rest
+#   starting as earlier ones finish.
+# - Output is handed to each member's own output callbacks in member order:
+#   the first unfinished member's output is passed on straight away, while
+#   the output of the members after it is held back until it is their turn.
+#   Each member's postEndCb is run at the same point, after its output.
+# - Stopping the group stops all of its members.
+#
+# The group mimics the parts of AbstractOperationProcess used by owners
+# (status, control widgets, callbacks, start/end), so it can be used in place
+# of a single process.
+class OperationProcessGroup(object):
+	__slots__ = (
+		# Process -------------------------
+		'members',			# (list<AbstractOperationProcess>) processes in the group, in output order
+		'labels',			# (list<str>) user-visible name of each member
+		'maxConcurrent',	# (int) maximum number of members running at once
+		
+		'status', 			# (ProcessStatus.STATUS_*) state of the group as a whole
+		'opName',			# (str) user-visible name of action we're doing
+		
+		# Affected Widgets ----------------
+		'wStart',			# (QPushButton) button used to start group
+		'wEnd',				# (QPushButton) button used to abort group
+		
+		'wTarget',			# (QWidget) widget where results may be sent, OR
+		'model',			# object where data may go
+		'parent',			# (QWidget?) widget or standard object that this was called from
+		
+		# Widget Settings -----------------
+		'widgetVisibility',	# (bool) toggle visibility of widgets instead of enabled status (if widgets available)
+		'silentErrors',		# (bool) don't broadcast errors with msgboxes
+		
+		# Callbacks -----------------------
+		'preStartCb',		# (fn(OperationProcessGroup)) operation to perform before starting any members
+		'postEndCb',		# (fn(OperationProcessGroup)) operation to perform after all members have finished
+		
+		'future',			# (OperationFuture) result of the group, when started using startAsync()
+		
+		# Bookkeeping ---------------------
+		'outputCbs',		# (list<tuple<fn, fn>>) original output callbacks (per-line, batch) of each member
+		'endCbs',			# (list<fn>) original post-end callback of each member
+		'heldOutput',		# (list<list<str>>) output held back for each member until it is their turn
+		
+		'nextToStart',		# (int) index of next member to start
+		'nextToRelease',	# (int) index of first member whose output is still being held back/passed on
+		'finished',			# (list<bool>) whether each member has finished
+		
+		'startTimes',		# (list<float>) time each member started
+		'timings',			# (list<tuple>) (label, seconds, status) for each member that finished
+	);
+	
+	# Setup =======================================
+	
+	# ctor
+	# < parent: (QWidget) owner of the group (and its members)
+	# < name: (str) user-visible name of the operation
+	# < maxConcurrent: (int) maximum number of members to run at once
+	def __init__(self, parent, name, maxConcurrent):
+		self.members = [];
+		self.labels = [];
+		self.maxConcurrent = max(1, maxConcurrent);
+		
+		self.status = ProcessStatus.STATUS_SETUP;
+		self.opName = name;
+		
+		self.wStart = self.wEnd = None;
+		self.wTarget = None;
+		self.model = None;
+		self.parent = parent;
+		
+		self.widgetVisibility = False;
+		self.silentErrors = False;
+		
+		self.preStartCb = None;
+		self.postEndCb = None;
+		
+		self.future = None;
+		
+		self.outputCbs = [];
+		self.endCbs = [];
+		self.heldOutput = [];
+		
+		self.nextToStart = 0;
+		self.nextToRelease = 0;
+		self.finished = [];
+		
+		self.startTimes = [];
+		self.timings = [];
+	
+	# add a process to the group
+	# ! callbacks for the process must already be set up, as they get wrapped here
+	# < proc: (AbstractOperationProcess) process to add
+	# < (label): (str) user-visible name for the process (i.e. for reporting timings)
+	def addProcess(self, proc, label=None):
+		index = len(self.members);
+		
+		self.members.append(proc);
+		self.labels.append(label or "%s #%d" % (self.opName, index + 1));
+		
+		# errors are collected and reported for the group as a whole
+		proc.silentErrors = True;
+		
+		# hook up our wrappers for ordering the output
+		self.endCbs.append(proc.postEndCb);
+		self.heldOutput.append([]);
+		self.finished.append(False);
+		self.startTimes.append(None);
+		
+		self.outputCbs.append((proc.handleOutputCb, proc.handleOutputBatchCb));
+		
+		proc.handleOutputCb = None;
+		proc.handleOutputBatchCb = lambda sop, lines: self.memberOutput(index, lines);
+		proc.postEndCb = lambda sop: self.memberEnded(index);
+	
+	# set start/end widgets, and connect them
+	def setControlWidgets(self, start, end):
+		self.wStart = start;
+		self.wEnd = end;
+		
+		self.wEnd.clicked.connect(self.endProcess);
+	
+	# get how the group uses the working copy - it only reads it if all of its members do
+	# > return[0]: (WcAccess.ACCESS_*)
+	def getWcAccess(self):
+		if all(proc.getWcAccess() == WcAccess.ACCESS_READ for proc in self.members):
+			return WcAccess.ACCESS_READ;
+		else:
+			return WcAccess.ACCESS_WRITE;
+	
+	# Exposed API =================================
+	
+	# start running the group
+	def startProcess(self):
+		if self.preStartCb:
+			self.preStartCb(self);
+		
+		self.status = ProcessStatus.STATUS_WORKING;
+		self.setControlWidgetsRunning(True);
+		
+		if self.members:
+			self.startMembers();
+		else:
+			self.doneProcess();
+	
+	# start running the group without waiting for it to finish
+	# > return[0]: (OperationFuture) resolved with this group once it has ended
+	def startAsync(self):
+		self.future = OperationFuture(self);
+		self.startProcess();
+		
+		return self.future;
+	
+	# abort all members
+	def endProcess(self):
+		# sanity check: only need to do this for "running" groups
+		if self.status != ProcessStatus.STATUS_WORKING:
+			return;
+		
+		# mark as cancelled first, so that members ending don't start any others
+		self.status = ProcessStatus.STATUS_CANCELLED;
+		
+		for index, proc in enumerate(self.members):
+			if (index < self.nextToStart) and (not self.finished[index]):
+				proc.endProcess();
+		
+		self.doneProcess();
+	
+	# Internal ====================================
+	
+	# start as many members as we're allowed to
+	def startMembers(self):
+		numRunning = self.nextToStart - sum(self.finished[:self.nextToStart]);
+		
+		while (numRunning < self.maxConcurrent) and (self.nextToStart < len(self.members)):
+			index = self.nextToStart;
+			self.nextToStart += 1;
+			
+			self.startTimes[index] = time.time();
+			
+			proc = self.members[index];
+			proc.startProcess();
+			
+			if proc.status == ProcessStatus.STATUS_FAILED:
+				# couldn't even start, so it won't report that it has ended
+				self.memberEnded(index);
+			else:
+				numRunning += 1;
+	
+	# output from a member - passed on if it's that member's turn, otherwise held back
+	def memberOutput(self, index, lines):
+		if index == self.nextToRelease:
+			self.passOnOutput(index, lines);
+		else:
+			self.heldOutput[index] += lines;
+	
+	# pass on lines of output to a member's original output callbacks
+	def passOnOutput(self, index, lines):
+		proc = self.members[index];
+		outputCb, outputBatchCb = self.outputCbs[index];
+		
+		if outputBatchCb:
+			outputBatchCb(proc, lines);
+		elif outputCb:
+			for line in lines:
+				outputCb(proc, line);
+	
+	# a member has finished
+	def memberEnded(self, index):
+		# killed processes may still report that they've finished afterwards
+		if self.finished[index]:
+			return;
+		
+		proc = self.members[index];
+		self.finished[index] = True;
+		
+		self.timings.append((self.labels[index], time.time() - self.startTimes[index], proc.status));
+		
+		# nothing more to do once cancelled
+		if self.status != ProcessStatus.STATUS_WORKING:
+			return;
+		
+		# pass on output for all members up to the first unfinished one
+		while (self.nextToRelease < len(self.members)) and self.finished[self.nextToRelease]:
+			self.releaseMember(self.nextToRelease);
+			self.nextToRelease += 1;
+		
+		# output for the next member in line can now be passed on as it arrives
+		if self.nextToRelease < len(self.members):
+			self.releaseHeldOutput(self.nextToRelease);
+		
+		# keep going, or wrap up
+		if all(self.finished):
+			if any(proc.status != ProcessStatus.STATUS_DONE for proc in self.members):
+				self.status = ProcessStatus.STATUS_FAILED;
+				
+				if not self.silentErrors:
+					QMessageBox.warning(self.parent,
+						"Operation Error",
+						"%s operation was not completed successfully" % (self.opName));
+			else:
+				self.status = ProcessStatus.STATUS_DONE;
+			
+			self.doneProcess();
+		else:
+			self.startMembers();
+	
+	# pass on all held-back output for a member
+	def releaseHeldOutput(self, index):
+		held = self.heldOutput[index];
+		self.heldOutput[index] = [];
+		
+		if held:
+			self.passOnOutput(index, held);
+	
+	# pass on all output for a finished member, and run its post-end callback
+	def releaseMember(self, index):
+		self.releaseHeldOutput(index);
+		
+		if self.endCbs[index]:
+			self.endCbs[index](self.members[index]);
+	
+	# update start/end widgets
+	def setControlWidgetsRunning(self, running):
+		if self.wStart and self.wEnd:
+			if self.widgetVisibility:
+				self.wStart.setVisible(not running);
+				self.wEnd.setVisible(running);
+			else:
+				self.wStart.setEnabled(not running);
+				self.wEnd.setEnabled(running);
+	
+	# cleanup once everything is over
+	def doneProcess(self):
+		self.setControlWidgetsRunning(False);
+		
+		if self.postEndCb:
+			self.postEndCb(self);
+		
+		# let whoever is waiting on this know
+		if self.future:
+			self.future.resolve(self);
+	
+	# Reporting ===================================
+	
+	# get a summary of how long each member took
+	# > return[0]: (list<str>) one line per member, in the order they finished
+	def getTimingsReport(self):
+		statusNames = {
+			ProcessStatus.STATUS_DONE      : "done",
+			ProcessStatus.STATUS_FAILED    : "failed",
+			ProcessStatus.STATUS_CANCELLED : "cancelled",
+		};
+		
+		return ["%s: %.2f s (%s)" % (label, seconds, statusNames.get(status, "?"))
+		        for label, seconds, status in self.timings];
+
+#########################################
@@ -0,0 +1,304 @@
+# Duality SVN
+# Original Author: Joshua Leung
+#
+# Operation Scheduler - runs a set of operations which depend on each other,
+# running those that don't depend on each other at the same time
+
+from coreDefines import *
+
+import time
+
+#########################################
+# Defines
+
+# Resources that operations may need exclusive (or limited) use of
+class OperationResource:
+	# svn working copy metadata - only one operation may be changing it at a time
+	WC_LOCK = 'wc-lock';
+	# connection to repository
+	NETWORK = 'network';
+	# heavy local disk use (i.e. copying lots of files)
+	DISK = 'disk';
+	
+	# Number of operations that can be using each resource at once
+	# - anything not listed can only be used by one operation at a time
+	Capacities = {
+		WC_LOCK : 1,
+		NETWORK : 2,
+		DISK    : 1,
+	};
+
+# States of operations in the scheduler
+class NodeState:
+	STATE_WAITING, STATE_RUNNING, STATE_DONE, STATE_FAILED, STATE_CANCELLED, STATE_SKIPPED = range(6);
+	
+	# User-visible names for each state
+	Names = {
+		STATE_WAITING   : "Waiting",
+		STATE_RUNNING   : "Running",
+		STATE_DONE      : "Done",
+		STATE_FAILED    : "Failed",
+		STATE_CANCELLED : "Cancelled",
+		STATE_SKIPPED   : "Skipped",
+	};
+
+#########################################
+# Operation Node
+
+# An operation in the scheduler's graph
+class OperationNode(object):
+	__slots__ = (
+		'process',		# (AbstractOperationProcess) operation to run
+		'label',		# (str) user-visible name of the operation
+		
+		'deps',			# (list<OperationNode>) operations that must be done before this one can start
+		'dependents',	# (list<OperationNode>) operations that depend on this one
+		'resources',	# (tuple<str>) resources (OperationResource.*) that this operation needs while running
+		
+		'state',		# (NodeState.STATE_*) state of the operation
+		'startTime',	# (float) time that the operation started, or None
+		'endTime',		# (float) time that the operation ended, or None
+	);
+	
+	def __init__(self, process, deps, resources):
+		self.process = process;
+		self.label = process.opName;
+		
+		self.deps = list(deps);
+		self.dependents = [];
+		self.resources = tuple(resources);
+		
+		self.state = NodeState.STATE_WAITING;
+		self.startTime = None;
+		self.endTime = None;
+	
+	# check if the operation has finished (one way or another)
+	def isFinished(self):
+		return self.state not in (NodeState.STATE_WAITING, NodeState.STATE_RUNNING);
+	
+	# get how long the operation has been running for (or took)
+	# > return[0]: (float) seconds, or None if it hasn't started
+	def getElapsed(self):
+		if self.startTime is None:
+			return None;
+		elif self.endTime is None:
+			return time.time() - self.startTime;
+		else:
+			return self.endTime - self.startTime;
+
+#########################################
+# Scheduler
+
+# Runs operations once all the operations they depend on are done, with as many
+# running at once as their resources (and the overall limit) allow
+# - when an operation fails or is cancelled, everything depending on it gets skipped
+# - the owner must call processEnded() from the postEndCb of each operation's process
+class OperationScheduler(object):
+	# Class Defines =========================================
+	# Default maximum number of operations to run at once
+	MAX_CONCURRENT = 3;
+	
+	__slots__ = (
+		'nodes',			# (list<OperationNode>) all operations, in the order they were added
+		'processNodes',		# (dict<int, OperationNode>) node for each process (by id of process)
+		
+		'maxConcurrent',	# (int) maximum number of operations to run at once
+		'resourcesInUse',	# (dict<str, int>) number of running operations using each resource
+		
+		'status',			# (ProcessStatus.STATUS_*) state of the scheduler as a whole
+		'cancelled',		# (bool) whether everything has been cancelled
+		
+		'nodeChangedCb',	# (fn(OperationNode)) called when the state of an operation changes
+		'finishedCb',		# (fn(OperationScheduler)) called once all operations have finished
+	);
+	
+	# Setup =================================================
+	
+	# ctor
+	# < (maxConcurrent): (int) maximum number of operations to run at once
+	def __init__(self, maxConcurrent=MAX_CONCURRENT):
+		self.nodes = [];
+		self.processNodes = {};
+		
+		self.maxConcurrent = max(1, maxConcurrent);
+		self.resourcesInUse = {};
+		
+		self.status = ProcessStatus.STATUS_SETUP;
+		self.cancelled = False;
+		
+		self.nodeChangedCb = None;
+		self.finishedCb = None;
+	
+	# add an operation
+	# < process: (AbstractOperationProcess) operation to run
+	# < (deps): (list<AbstractOperationProcess>) operations that must be done before this one can start
+	# < (resources): (list<str>) resources (OperationResource.*) needed while the operation runs
+	# > return[0]: (OperationNode)
+	def addNode(self, process, deps=(), resources=()):
+		node = OperationNode(process, [self.getNode(dep) for dep in deps], resources);
+		
+		for dep in node.deps:
+			dep.dependents.append(node);
+		
+		self.nodes.append(node);
+		self.processNodes[id(process)] = node;
+		
+		return node;
+	
+	# get the node for a process
+	def getNode(self, process):
+		return self.processNodes[id(process)];
+	
+	# Queries ===============================================
+	
+	# get the nodes which are currently running
+	def getRunningNodes(self):
+		return [node for node in self.nodes if node.state == NodeState.STATE_RUNNING];
+	
+	# get the number of nodes which are currently running
+	def numRunning(self):
+		return sum(1 for node in self.nodes if node.state == NodeState.STATE_RUNNING);
+	
+	# Running ===============================================
+	
+	# start running operations
+	# > return[0]: (bool) whether there was anything to run
+	def start(self):
+		if not self.nodes:
+			return False;
+		
+		self.status = ProcessStatus.STATUS_WORKING;
+		self.schedule();
+		
+		return True;
+	
+	# cancel all operations - running ones are stopped, and the rest won't be started
+	def cancel(self):
+		if self.status != ProcessStatus.STATUS_WORKING:
+			return;
+		
+		self.cancelled = True;
+		
+		for node in self.nodes:
+			if node.state == NodeState.STATE_WAITING:
+				self.setNodeState(node, NodeState.STATE_CANCELLED);
+		
+		for node in self.getRunningNodes():
+			# this ends up in processEnded()
+			node.process.endProcess();
+		
+		self.checkFinished();
+	
+	# callback for when the process of an operation has ended
+	# < process: (AbstractOperationProcess)
+	def processEnded(self, process):
+		node = self.getNode(process);
+		
+		# killed processes may still report that they've finished afterwards
+		if node.state != NodeState.STATE_RUNNING:
+			return;
+		
+		node.endTime = time.time();
+		self.releaseResources(node);
+		
+		if process.status == ProcessStatus.STATUS_DONE:
+			self.setNodeState(node, NodeState.STATE_DONE);
+		else:
+			if process.status == ProcessStatus.STATUS_CANCELLED:
+				self.setNodeState(node, NodeState.STATE_CANCELLED);
+			else:
+				self.setNodeState(node, NodeState.STATE_FAILED);
+			
+			# nothing depending on this can run now
+			self.skipDependents(node);
+		
+		if not self.cancelled:
+			self.schedule();
+		
+		self.checkFinished();
+	
+	# Internal ==============================================
+	
+	# start whatever can be started now
+	def schedule(self):
+		for node in self.nodes:
+			if self.numRunning() >= self.maxConcurrent:
+				break;
+			
+			if self.canStart(node):
+				self.startNode(node);
+	
+	# check whether an operation is ready to start
+	def canStart(self, node):
+		if node.state != NodeState.STATE_WAITING:
+			return False;
+		
+		# everything it depends on must be done
+		for dep in node.deps:
+			if dep.state != NodeState.STATE_DONE:
+				return False;
+		
+		# resources must be available
+		for resource in node.resources:
+			capacity = OperationResource.Capacities.get(resource, 1);
+			if self.resourcesInUse.get(resource, 0) >= capacity:
+				return False;
+		
+		return True;
+	
+	# start running an operation
+	def startNode(self, node):
+		for resource in node.resources:
+			self.resourcesInUse[resource] = self.resourcesInUse.get(resource, 0) + 1;
+		
+		node.startTime = time.time();
+		self.setNodeState(node, NodeState.STATE_RUNNING);
+		
+		node.process.startProcess();
+		
+		if node.process.status == ProcessStatus.STATUS_FAILED:
+			# couldn't even start, so it won't report that it has ended
+			self.processEnded(node.process);
+	
+	# release the resources used by an operation
+	def releaseResources(self, node):
+		for resource in node.resources:
+			self.resourcesInUse[resource] -= 1;
+	
+	# mark everything that depends on an operation as skipped
+	def skipDependents(self, node):
+		pending = list(node.dependents);
+		
+		while pending:
+			dependent = pending.pop();
+			
+			if dependent.state == NodeState.STATE_WAITING:
+				self.setNodeState(dependent, NodeState.STATE_SKIPPED);
+				pending += dependent.dependents;
+	
+	# change the state of an operation
+	def setNodeState(self, node, state):
+		node.state = state;
+		
+		if self.nodeChangedCb:
+			self.nodeChangedCb(node);
+	
+	# wrap up once everything has finished
+	def checkFinished(self):
+		if self.status != ProcessStatus.STATUS_WORKING:
+			return;
+		
+		if not all(node.isFinished() for node in self.nodes):
+			return;
+		
+		if self.cancelled:
+			self.status = ProcessStatus.STATUS_CANCELLED;
+		elif all(node.state == NodeState.STATE_DONE for node in self.nodes):
+			self.status = ProcessStatus.STATUS_DONE;
+		else:
+			self.status = ProcessStatus.STATUS_FAILED;
+		
+		if self.finishedCb:
+			self.finishedCb(self);
+
+#########################################
@@ -39,6 +39,11 @@ class DualitySettings:
 		'skiplist',			# (list<str>) list of paths to ignore in our UI only - i.e. with temp changes we don't want shared yet
 		
 		'ignoreExternals',	# (bool) whether "external" repository links should be ignored when performing updates,etc.
+		'xmlStatus',		# (bool) whether status list refreshes should use the "svn status --xml" output
+		'builtinStatus',	# (bool) whether status list refreshes should read the working copy metadata directly instead of running svn
+		'builtinDiff',		# (bool) whether diffs should be worked out from the pristine copies directly instead of running svn
+		'watchWorkingCopy',	# (bool) whether changes to the working copy are watched for, to keep the status list up to date
+		'statusProcesses',	# (int) maximum number of status processes to run at once when refreshing the status list (1 = single process)
 	);
 	
 	# Setup =====================================
@@ -117,6 +122,21 @@ class DualitySettings:
 		# ignore externals is off by default to limit problems
 		self.ignoreExternals = False;
 		
+		# xml status output is more robust than parsing the columns of the plain text output
+		self.xmlStatus = True;
+		
+		# built-in status engine is opt-in, as svn remains the authority on what the status is
+		self.builtinStatus = False;
+		
+		# built-in diff engine is opt-in too, until its output has been checked against svn's
+		self.builtinDiff = False;
+		
+		# status list gets kept up to date by watching for changes to the working copy
+		self.watchWorkingCopy = True;
+		
+		# a single status process is the safest for working copies we know nothing about
+		self.statusProcesses = 1;
+		
 		# active tab index
 		self.activeTabIndex = 0;
 		
@@ -156,6 +176,11 @@ class DualitySettings:
 				
 				cfg.getint("Project", "ActiveTabIndex", self, 'activeTabIndex');
 				
+				# optional settings - defaults are kept when these aren't present
+				statusProcesses = cfg.getint("Project", "StatusProcesses");
+				if statusProcesses:
+					self.statusProcesses = statusProcesses;
+				
 				cfg.get("Trunk", "url", self, 'urlTrunk');
 				
 				if cfg.has_section("Branch"):
@@ -179,6 +204,7 @@ class DualitySettings:
 		cfg.set("Project", "TempFiles", self.tempFileDir);
 		
 		cfg.set("Project", "ActiveTabIndex", self.activeTabIndex);
+		cfg.set("Project", "StatusProcesses", self.statusProcesses);
 		
 		cfg.add_section("Trunk");
 		cfg.set("Trunk", "url", self.urlTrunk);
@@ -239,6 +265,11 @@ class DualitySettings:
 		self.activeTabIndex = int(value);
 		# no need to set "unsaved" as this is more of a UI state only
 	
+	# < value: (int) new value
+	def setStatusProcesses(self, value):
+		self.statusProcesses = max(1, int(value));
+		self.unsaved = True;
+	
 	# < value: (str) new value
 	def setUrlTrunk(self, value):
 		self.urlTrunk = str(value);
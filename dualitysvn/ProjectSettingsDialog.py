@@ -123,6 +123,30 @@ class ProjectSettingsDialog(QDialog):
 		# space ........
 		self.layout.addSpacing(20);
 		
+		# 3) Status Refresh ..................................................
+		
+		gb = QGroupBox("Status Refresh");
+		self.layout.addWidget(gb);
+		
+		grp = QGridLayout();
+		gb.setLayout(grp);
+		
+		# 3.1) number of status processes
+		grp.addWidget(QLabel("Parallel Processes:"), 1,1); # r1 c1
+		
+		self.wStatusProcesses = QSpinBox();
+		self.wStatusProcesses.setRange(1, 16);
+		self.wStatusProcesses.setValue(project.statusProcesses);
+		self.wStatusProcesses.setToolTip("Maximum number of 'svn status' processes to run at once when refreshing the status list.\n"
+		                                 "When more than 1, the working copy gets split up by its top-level directories.");
+		
+		self.wStatusProcesses.valueChanged.connect(self.setStatusProcesses);
+		
+		grp.addWidget(self.wStatusProcesses, 1,2); # r1 c2
+		
+		# space ........
+		self.layout.addSpacing(20);
+		
 		# X) close button ................................
 		
 		grp = QDialogButtonBox();
@@ -159,6 +183,13 @@ class ProjectSettingsDialog(QDialog):
 		else:
 			print "td paths same"
 		
+	# Status Refresh --------------------------------------
+	
+	# Set number of status processes callback wrapper
+	def setStatusProcesses(self, value):
+		if project.statusProcesses != value:
+			project.setStatusProcesses(value);
+	
 	# Skip-List -------------------------------------------
 	
 	# make sure that there is a valid skip path before allowing adding...
@@ -74,6 +74,9 @@ class SvnCommitDialog(QDialog):
 		self.wFileList.setFocusPolicy(Qt.NoFocus); # otherwise, log mesage doesn't get focus
 		grp.addWidget(self.wFileList);
 		
+		# changes often get looked over one last time before committing, so get their diffs ready
+		self.wFileList.prefetchDiffs(filesList);
+		
 		# .............................
 		
 		# 2) commit log box
@@ -143,10 +146,22 @@ class SvnCommitDialog(QDialog):
 	# override of 'commit' button
 	def accept(self):
 		# validate message length is necessary in case hotkey was used instead?
+		if not self.validateMessageLength():
+			return;
+		
 		# perform validation of files, including additional action if necessary...
-		if self.validateMessageLength() and self.validatePaths():
-			# now perform standard action
-			return super(SvnCommitDialog, self).accept();
+		future = self.validatePaths();
+		if future is None:
+			return;
+		
+		# don't let commit get pressed again while the fixups are being done
+		self.wCommit.setEnabled(False);
+		
+		def pathsValidated(value):
+			# now perform standard action, unless the user has given up in the meantime
+			if self.isVisible():
+				super(SvnCommitDialog, self).accept();
+		future.addDoneCb(pathsValidated);
 			
 	# ------------------------
 	
@@ -239,14 +254,15 @@ class SvnCommitDialog(QDialog):
 	# Path List Validation ------------------------------------
 	
 	# make sure all files to be committed are accounted for
+	# > return[0]: (OperationFuture) done once any fixups needed have been made, or None if the user backed out
 	def validatePaths(self):
 		# get lists of files to fix up
 			# "unversioned" == need to add
-		needAdd = self.wFileList.getOperationList().getFiltered(lambda x: x.file_status == SvnStatusListItem.FileStatusMap['?']);
+		needAdd = self.wFileList.getOperationList().getFiltered(lambda x: x.fileCode == '?');
 			# "missing" == already deleted from working copy (or manually renamed), just not noted in svn metadata
-		needDelete = self.wFileList.getOperationList().getFiltered(lambda x: x.file_status == SvnStatusListItem.FileStatusMap['!']);
+		needDelete = self.wFileList.getOperationList().getFiltered(lambda x: x.fileCode == '!');
 			# "conflicted" == resolved?
-		needResolve = self.wFileList.getOperationList().getFiltered(lambda x: x.file_status == SvnStatusListItem.FileStatusMap['C']);
+		needResolve = self.wFileList.getOperationList().getFiltered(lambda x: x.fileCode == 'C');
 		
 		# need to do anything?
 		if needAdd or needDelete or needResolve:
@@ -264,25 +280,26 @@ class SvnCommitDialog(QDialog):
 				
 			# proceed
 			if reply == QMessageBox.Apply:
-				# perform validation actions
-				self.validatePathsAdd(needAdd);
-				self.validatePathsDelete(needDelete);
-				self.validatePathsResolve(needResolve);
+				# perform validation actions - one after the other, as they all need the working copy
+				future = self.validatePathsAdd(needAdd);
+				future = future.then(lambda sop: self.validatePathsDelete(needDelete));
+				future = future.then(lambda sop: self.validatePathsResolve(needResolve));
 				
-				# can proceed with commit now
-				return True;
+				# can proceed with commit once these are done
+				return future;
 			else:
 				# don't perform actions, so user might want to go back and check
-				return False;
+				return None;
 		else:
 			# don't do anything
-			return True;
+			return OperationFuture.resolved();
 			
 	# helper for validatePaths - add paths that need adding
+	# > return[0]: (OperationFuture) done once the paths have been added
 	def validatePathsAdd(self, files):
 		# skip if nothing to do
 		if not files:
-			return;
+			return OperationFuture.resolved();
 		
 		# setup svn add process
 		ap = SvnOperationProcess(self, "Commit Add");
@@ -293,15 +310,19 @@ class SvnCommitDialog(QDialog):
 		ap.addDefaultArgs();
 		ap.setTargets(files);
 		
-		# run operation (blocking style) now
-		if not ap.runBlocking():
-			print "Error... auto-add failed"
+		# run operation once nothing else is using the working copy - the dialog keeps responding in the meantime
+		def addDone(sop):
+			if sop.status != ProcessStatus.STATUS_DONE:
+				print "Error... auto-add failed"
+		
+		return WcOperationCoordinator.forWorkingCopy().runProcess(ap).addDoneCb(addDone);
 			
 	# helper for validatePaths - delete paths that need deleting
+	# > return[0]: (OperationFuture) done once the paths have been deleted
 	def validatePathsDelete(self, files):
 		# skip if nothing to do
 		if not files:
-			return;
+			return OperationFuture.resolved();
 			
 		# setup svn delete process
 		dp = SvnOperationProcess(self, "Commit Delete");
@@ -312,9 +333,12 @@ class SvnCommitDialog(QDialog):
 		dp.addDefaultArgs();
 		dp.setTargets(files);
 		
-		# run operation (blocking style) now
-		if not dp.runBlocking():
-			print "Error... auto-delete failed"
+		# run operation once nothing else is using the working copy - the dialog keeps responding in the meantime
+		def deleteDone(sop):
+			if sop.status != ProcessStatus.STATUS_DONE:
+				print "Error... auto-delete failed"
+		
+		return WcOperationCoordinator.forWorkingCopy().runProcess(dp).addDoneCb(deleteDone);
 			
 	# helper for validatePaths - resolve paths that need resolving
 	def validatePathsResolve(self, files):
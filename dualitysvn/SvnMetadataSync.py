@@ -0,0 +1,330 @@
+# Duality SVN
+# Original Author: Joshua Leung
+#
+# Metadata Resync - brings the "_svn" metadata folders back in line with the
+# ".svn" ones, only touching what has changed since they were duplicated
+
+from coreDefines import *
+
+from InternalOperationProcess import *
+from SvnWcMetadata import scanDir, fileChecksum, readMetadataUrl
+
+import shutil
+
+#########################################
+# Sync Plan
+
+# Set of changes needed to bring "_svn" back in line with ".svn"
+# - paths to remove are done first, then directories get created (parents before
+#   their contents), and finally the files get copied
+class MetadataSyncPlan(object):
+	__slots__ = (
+		'root',			# (str) root of the source tree that the plan is for
+		
+		'srcUrl',		# (str) repository URL that ".svn" at the root is for (the side that gets copied), or None if unknown
+		'dstUrl',		# (str) repository URL that "_svn" at the root is for (the side that gets replaced), or None if unknown
+		'skippedDirs',	# (list<str>) directories whose ".svn" and "_svn" are for different URLs, so were left alone
+		
+		'removeDirs',	# (list<str>) "_svn" directories (or subdirectories) which no longer exist in ".svn"
+		'removeFiles',	# (list<str>) "_svn" files which no longer exist in ".svn", or need replacing
+		'makeDirs',		# (list<tuple>) (src, dst) directories to create in "_svn"
+		'copyFiles',	# (list<tuple>) (src, dst, size, reason, pristine) files to copy from ".svn" - reason is 'new' or 'changed'
+		
+		'filesChecked',	# (int) number of files which were compared
+	);
+	
+	def __init__(self, root):
+		self.root = root;
+		
+		self.srcUrl = None;
+		self.dstUrl = None;
+		self.skippedDirs = [];
+		
+		self.removeDirs = [];
+		self.removeFiles = [];
+		self.makeDirs = [];
+		self.copyFiles = [];
+		
+		self.filesChecked = 0;
+	
+	# check if the working copy has been branched, i.e. ".svn" is for the branch while "_svn" is
+	# still for the trunk - so the two can't be resynced without throwing away the trunk reference
+	def isBranched(self):
+		return (self.srcUrl is not None) and (self.dstUrl is not None) and (self.srcUrl != self.dstUrl);
+	
+	# check if there's nothing to do
+	def isEmpty(self):
+		return not (self.removeDirs or self.removeFiles or self.makeDirs or self.copyFiles);
+	
+	# get the total size of the files which need copying
+	def getCopySize(self):
+		return sum(work[2] for work in self.copyFiles);
+	
+	# get a one-line summary of the changes
+	def getSummary(self):
+		numNew = sum(1 for work in self.copyFiles if work[3] == 'new');
+		numChanged = len(self.copyFiles) - numNew;
+		
+		return "%d files checked: %d new, %d changed (%.1f MB), %d stale files, %d stale dirs, %d new dirs, %d dirs skipped" % (
+			self.filesChecked,
+			numNew, numChanged, self.getCopySize() / 1048576.0,
+			len(self.removeFiles) - numChanged, len(self.removeDirs), len(self.makeDirs), len(self.skippedDirs));
+	
+	# get a line for each change, for showing what will be done
+	# > return[0]: (list<str>)
+	def getReport(self):
+		relPath = lambda path: os.path.relpath(path, self.root);
+		
+		lines = [];
+		lines += ["Skip Dir:    %s (metadata is for different URLs)" % relPath(path) for path in self.skippedDirs];
+		lines += ["Remove Dir:  %s" % relPath(path) for path in self.removeDirs];
+		lines += ["Remove File: %s" % relPath(path) for path in self.removeFiles];
+		lines += ["Create Dir:  %s" % relPath(dst) for src, dst in self.makeDirs];
+		lines += ["%s: %s" % ("Copy New   " if reason == 'new' else "Copy Changed", relPath(dst))
+		          for src, dst, size, reason, pristine in self.copyFiles];
+		
+		return lines;
+
+#########################################
+# Planning
+
+# Check if a file in "_svn" differs from its counterpart in ".svn"
+# < srcEntry, dstEntry: (DirEntry) the two files
+# < checkContents: (bool) compare the contents of files which look the same too
+# > return[0]: (bool)
+def metadataFileChanged(srcEntry, dstEntry, checkContents):
+	srcStat = srcEntry.stat();
+	dstStat = dstEntry.stat();
+	
+	# shared pristine files are the same file
+	if (srcStat.st_ino == dstStat.st_ino) and (srcStat.st_dev == dstStat.st_dev) and srcStat.st_ino:
+		return False;
+	
+	# copies keep the modification time of the original, so anything else means it has changed since
+	if srcStat.st_size != dstStat.st_size:
+		return True;
+	if abs(srcStat.st_mtime - dstStat.st_mtime) > 0.001:
+		return True;
+	
+	if checkContents:
+		return fileChecksum(srcEntry.path, 'sha1') != fileChecksum(dstEntry.path, 'sha1');
+	else:
+		return False;
+
+# Work out what needs changing in one "_svn" folder to match its ".svn" one
+# < plan: (MetadataSyncPlan) plan to add the changes to
+# < src: (str) ".svn" folder
+# < dst: (str) "_svn" folder, which may not exist yet
+# < checkContents: (bool) compare the contents of files which look the same too
+def planMetadataDirSync(plan, src, dst, checkContents):
+	pending = [(src, dst, "", os.path.isdir(dst))];
+	
+	while pending:
+		srcDir, dstDir, relDir, dstExists = pending.pop();
+		
+		if dstExists:
+			dstEntries = dict((entry.name, entry) for entry in scanDir(dstDir));
+		else:
+			dstEntries = {};
+			plan.makeDirs.append((srcDir, dstDir));
+		
+		for entry in scanDir(srcDir):
+			dstEntry = dstEntries.pop(entry.name, None);
+			dstPath = os.path.join(dstDir, entry.name);
+			relPath = os.path.join(relDir, entry.name);
+			
+			if entry.is_dir():
+				# a file in the way of a directory has to go first
+				if (dstEntry is not None) and (not dstEntry.is_dir()):
+					plan.removeFiles.append(dstPath);
+					dstEntry = None;
+				
+				pending.append((entry.path, dstPath, relPath, dstEntry is not None));
+			else:
+				plan.filesChecked += 1;
+				size = entry.stat().st_size;
+				pristine = isPristinePath(relPath);
+				
+				if dstEntry is None:
+					plan.copyFiles.append((entry.path, dstPath, size, 'new', pristine));
+				elif dstEntry.is_dir():
+					plan.removeDirs.append(dstPath);
+					plan.copyFiles.append((entry.path, dstPath, size, 'new', pristine));
+				elif metadataFileChanged(entry, dstEntry, checkContents):
+					# old file gets removed first, as it may be shared with something else
+					plan.removeFiles.append(dstPath);
+					plan.copyFiles.append((entry.path, dstPath, size, 'changed', pristine));
+		
+		# whatever is left is no longer in ".svn"
+		for name, dstEntry in sorted(dstEntries.iteritems()):
+			if dstEntry.is_dir():
+				plan.removeDirs.append(dstEntry.path);
+			else:
+				plan.removeFiles.append(dstEntry.path);
+
+# Work out what needs changing for all the "_svn" folders to match the ".svn" ones
+# - "_svn" folders get added for newly versioned directories, and removed where the
+#   ".svn" folder has gone (i.e. the directory is no longer versioned)
+# - ".svn" is always the source. Once a branch has been made, ".svn" is for the branch and
+#   "_svn" for the trunk, so nothing gets planned at all when the two are for different
+#   URLs at the root (see MetadataSyncPlan.isBranched()), and other directories where they
+#   differ (i.e. switched ones) get skipped
+#
+# < root: (str) path to directory where root of source tree resides
+# < (checkContents): (bool) compare the contents of files which look the same too
+# > return[0]: (MetadataSyncPlan)
+# > return[1]: (list) summary of errors that occurred during this process (description+path)
+def planSvnMetadataSync(root, checkContents=False):
+	plan = MetadataSyncPlan(root);
+	
+	plan.srcUrl = readMetadataUrl(root, SVN_DIRNAME_BRANCH1);
+	plan.dstUrl = readMetadataUrl(root, SVN_DIRNAME_BRANCH2);
+	
+	if plan.isBranched():
+		return plan, [("Metadata is for different repository locations (%s: %s, %s: %s) - the working copy has been branched, so it can't be resynced" % (
+			SVN_DIRNAME_BRANCH1, plan.srcUrl, SVN_DIRNAME_BRANCH2, plan.dstUrl), root)];
+	
+	metadataDirs, errors = scanSvnMetadataDirs(root);
+	
+	for p, hasPrimary, hasSecondary in metadataDirs:
+		src = os.path.join(p, SVN_DIRNAME_BRANCH1);
+		dst = os.path.join(p, SVN_DIRNAME_BRANCH2);
+		
+		if not hasPrimary:
+			plan.removeDirs.append(dst);
+			continue;
+		
+		# only twins for the same place can be resynced
+		if hasSecondary and (p != root):
+			srcUrl = readMetadataUrl(p, SVN_DIRNAME_BRANCH1);
+			dstUrl = readMetadataUrl(p, SVN_DIRNAME_BRANCH2);
+			
+			if (srcUrl is not None) and (dstUrl is not None) and (srcUrl != dstUrl):
+				plan.skippedDirs.append(p);
+				errors.append(("Skipped - metadata is for different repository locations (%s: %s, %s: %s)" % (
+					SVN_DIRNAME_BRANCH1, srcUrl, SVN_DIRNAME_BRANCH2, dstUrl), p));
+				continue;
+		
+		try:
+			planMetadataDirSync(plan, src, dst, checkContents);
+		except (IOError, OSError), e:
+			errors.append(("Could not compare metadata - %s" % (e), p));
+	
+	return plan, errors;
+
+#########################################
+# Applying
+
+# Make the changes in a plan
+# < plan: (MetadataSyncPlan) changes to make
+# < (progressCb): (fn(MetadataCopyProgress)) callback for reporting progress every so often
+# < (numWorkers): (int) number of files to copy at once
+# < (pristineMode): (PristineCopyMode.MODE_*) how to duplicate pristine files, or None to use the best that works
+# > return[0]: (list) summary of errors that occurred during this process (description+path)
+def applySvnMetadataSync(plan, progressCb=None, numWorkers=8, pristineMode=None):
+	errors = [];
+	
+	# 1) get rid of what's no longer needed
+	for path in plan.removeDirs:
+		try:
+			shutil.rmtree(path);
+		except (IOError, OSError), e:
+			errors.append(("Could not remove stale directory - %s" % (e), path));
+	
+	for path in plan.removeFiles:
+		try:
+			os.remove(path);
+		except (IOError, OSError), e:
+			errors.append(("Could not remove stale file - %s" % (e), path));
+	
+	# 2) create the new directories - parents come before their contents
+	for srcDir, dstDir in plan.makeDirs:
+		try:
+			os.mkdir(dstDir);
+		except (IOError, OSError), e:
+			errors.append(("Could not create directory - %s" % (e), dstDir));
+	
+	# 3) copy the new and changed files
+	if (pristineMode is None) and plan.copyFiles:
+		pristineMode = choosePristineCopyMode(os.path.dirname(plan.copyFiles[0][0]));
+	
+	files = [(src, dst, size, 0, pristine) for src, dst, size, reason, pristine in plan.copyFiles];
+	
+	progress = MetadataCopyProgress();
+	progress.dirsTotal = 1;
+	progress.filesTotal = len(files);
+	progress.bytesTotal = plan.getCopySize();
+	
+	copyMetadataFiles(files, [len(files)], progress, errors, progressCb, numWorkers, pristineMode);
+	
+	# 4) new directories get the same stats as the originals, now that their contents are done
+	for srcDir, dstDir in plan.makeDirs:
+		try:
+			shutil.copystat(srcDir, dstDir);
+		except OSError:
+			pass;
+	
+	return errors;
+
+#########################################
+# Operation
+
+# Resync the "_svn" metadata folders with the ".svn" ones, as an operation that can be
+# run in an SvnOperationDialog
+# - args[0] is the root of the source tree
+# - in "dry run" mode, the changes that would be made are only reported
+class SvnMetadataSyncThread(ThreadAsFauxProcess):
+	__slots__ = (
+		'dryRun',			# (bool) only report what would be changed
+		'checkContents',	# (bool) compare the contents of files which look the same too
+		
+		'plan',				# (MetadataSyncPlan) changes that were found, once the thread has run
+	);
+	
+	# ctor
+	# < (dryRun): (bool) only report what would be changed
+	# < (checkContents): (bool) compare the contents of files which look the same too
+	def __init__(self, dryRun=False, checkContents=False):
+		ThreadAsFauxProcess.__init__(self);
+		
+		self.dryRun = dryRun;
+		self.checkContents = checkContents;
+		
+		self.plan = None;
+	
+	def run(self):
+		root = self.args[0];
+		
+		try:
+			self.write("Comparing metadata...");
+			plan, errors = planSvnMetadataSync(root, self.checkContents);
+			
+			if plan.isBranched():
+				# refuse, instead of replacing the trunk reference with the branch's metadata
+				for err in errors:
+					self.error(str(err));
+				self.done(1);
+				return;
+			
+			self.write("Source: %s (%s)" % (SVN_DIRNAME_BRANCH1, plan.srcUrl or "unknown URL"));
+			
+			for line in plan.getReport():
+				self.write(line);
+			self.write(plan.getSummary());
+			
+			if not (self.dryRun or plan.isEmpty()):
+				# progress gets shown in the operation log as it goes
+				errors += applySvnMetadataSync(plan, lambda progress: self.write(str(progress)));
+			
+			self.plan = plan;
+		except Exception, e:
+			self.error("Could not resync svn metadata: %s" % (e));
+			self.done(1);
+			return;
+		
+		for err in errors:
+			self.error(str(err));
+		
+		self.done(0);
+
+#########################################
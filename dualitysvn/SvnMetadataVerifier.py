@@ -0,0 +1,364 @@
+# Duality SVN
+# Original Author: Joshua Leung
+#
+# Metadata Verifier - checks that the ".svn" and "_svn" metadata folders of a
+# dual working copy are consistent (with each other, and with themselves)
+
+from coreDefines import *
+
+from InternalOperationProcess import *
+from SvnWcMetadata import detectWcFormat, fileChecksum
+
+from multiprocessing.pool import ThreadPool
+import multiprocessing
+import time
+
+#########################################
+# Defines
+
+# Problems that can be found
+class MetadataIssue:
+	ISSUE_MISSING_TWIN, ISSUE_ORPHANED_TWIN, ISSUE_LOCKED, ISSUE_PRISTINE_MISSING, ISSUE_PRISTINE_MISMATCH, ISSUE_UNREADABLE = range(6);
+	
+	# User-visible names for each issue
+	Names = {
+		ISSUE_MISSING_TWIN      : "Missing %s" % (SVN_DIRNAME_BRANCH2),
+		ISSUE_ORPHANED_TWIN     : "Orphaned %s" % (SVN_DIRNAME_BRANCH2),
+		ISSUE_LOCKED            : "Lock Left Behind",
+		ISSUE_PRISTINE_MISSING  : "Pristine Missing",
+		ISSUE_PRISTINE_MISMATCH : "Pristine Corrupt",
+		ISSUE_UNREADABLE        : "Unreadable",
+	};
+
+#########################################
+# Hash Cache
+#
+# Pristine files never get changed in place (see SvnTools), so once one has been
+# hashed, the result stays valid for as long as the same file (by inode) still
+# has the same modification time and size. These get saved beside the project
+# file, so that repeat checks only need to hash whatever is new. Hardlinked
+# pristines also end up sharing the same entry, so they only get hashed once.
+
+class PristineHashCache(object):
+	__slots__ = (
+		'entries',		# (dict<str, str>) hex digest for each key
+		'used',			# (set<str>) keys looked up or stored since loading - only these are kept when saving
+	);
+	
+	def __init__(self):
+		self.entries = {};
+		self.used = set();
+	
+	# get the file that the hashes are stored in
+	@staticmethod
+	def getFileName():
+		return "%s.hashes" % (project.fileN);
+	
+	# get the key that a file's hash is stored under
+	# < path: (str) path to file
+	# < st: (os.stat_result) stat info for file
+	# < algo: (str) 'md5' or 'sha1'
+	@staticmethod
+	def makeKey(path, st, algo):
+		# inodes aren't available everywhere (i.e. always 0 on Windows), so fall back to the path then
+		return "%s:%d:%d:%s" % (st.st_ino or os.path.normcase(path), int(st.st_mtime * 1000000), st.st_size, algo);
+	
+	# look up the hash for a key
+	# > return[0]: (str) hex digest, or None if not known
+	def lookup(self, key):
+		digest = self.entries.get(key);
+		if digest is not None:
+			self.used.add(key);
+		return digest;
+	
+	# store the hash for a key
+	def store(self, key, digest):
+		self.entries[key] = digest;
+		self.used.add(key);
+	
+	# load the hashes saved last time
+	def load(self):
+		try:
+			with open(PristineHashCache.getFileName(), 'r') as f:
+				for line in f:
+					key, sep, digest = line.rstrip("\n").rpartition("\t");
+					if sep:
+						self.entries[key] = digest;
+		except IOError:
+			pass;
+	
+	# save the hashes which are still in use
+	def save(self):
+		# only for projects that have been saved
+		if project.autofile:
+			return;
+		
+		fileN = PristineHashCache.getFileName();
+		tempFileN = fileN + ".tmp";
+		
+		try:
+			with open(tempFileN, 'w') as f:
+				for key in sorted(self.used):
+					f.write("%s\t%s\n" % (key, self.entries[key]));
+			
+			# replace old one
+			if os.path.exists(fileN):
+				os.remove(fileN);
+			os.rename(tempFileN, fileN);
+		except (IOError, OSError), e:
+			print "Could not save pristine hashes to '%s' - %s" % (fileN, e)
+
+#########################################
+# Verifying
+
+# Results of verifying the metadata
+class MetadataVerifyReport(object):
+	__slots__ = (
+		'issues',			# (list<tuple>) (MetadataIssue.ISSUE_*, path, details) for each problem found
+		
+		'adminDirs',		# (int) number of metadata folders checked
+		'pristines',		# (int) number of pristine files checked
+		'hashed',			# (int) number of pristine files which needed hashing
+		'cached',			# (int) number of pristine files whose hashes were already known
+		
+		'startTime',		# (float) time that verifying started
+	);
+	
+	def __init__(self):
+		self.issues = [];
+		
+		self.adminDirs = 0;
+		self.pristines = 0;
+		self.hashed = 0;
+		self.cached = 0;
+		
+		self.startTime = time.time();
+	
+	# record a problem
+	def addIssue(self, kind, path, details=""):
+		self.issues.append((kind, path, details));
+	
+	# get a line describing each problem
+	# > return[0]: (list<str>)
+	def getLines(self):
+		return [("%s: %s - %s" % (MetadataIssue.Names[kind], path, details)) if details else ("%s: %s" % (MetadataIssue.Names[kind], path))
+		        for kind, path, details in self.issues];
+	
+	# get a one-line summary of what was checked
+	def getSummary(self):
+		return "%d problems found - checked %d metadata folders and %d pristine files (%d hashed, %d cached) in %.1f s" % (
+			len(self.issues), self.adminDirs, self.pristines,
+			self.hashed, self.cached, time.time() - self.startTime);
+
+# Hash a pristine file
+# - this gets run in the worker processes, so it must be a plain module-level function
+# < work: (tuple) (path, algo)
+# > return: (tuple) work item, hex digest (or None), error (or None)
+def hashPristineFile(work):
+	path, algo = work;
+	
+	try:
+		return work, fileChecksum(path, algo), None;
+	except (IOError, OSError), e:
+		return work, None, str(e);
+
+# Read the locks and pristine files recorded in a metadata folder
+# - this gets run on several threads at once, so each one gets its own reader
+# - the pristine files get looked up on disk here too, as that's also mostly waiting on the disk
+# < work: (tuple) (path of directory containing the metadata folder, name of metadata folder)
+# > return: (tuple) work item, locks (list<str>), pristines (list<tuple>), error (or None)
+#			- pristines are (path, algo, expected digest, cache key), with the key being None if the file is missing
+def readMetadataChecks(work):
+	p, adminName = work;
+	
+	metadataType = detectWcFormat(p, adminName);
+	if metadataType is None:
+		return work, [], [], "unrecognised metadata format";
+	
+	try:
+		metadata = metadataType(p, adminName);
+		try:
+			locks = metadata.listLocks();
+			dirPristines = metadata.listPristines();
+		finally:
+			metadata.close();
+	except Exception, e:
+		return work, [], [], str(e);
+	
+	pristines = [];
+	for path, (algo, expected) in dirPristines:
+		try:
+			st = os.stat(path);
+		except OSError:
+			pristines.append((path, algo, expected, None));
+			continue;
+		
+		pristines.append((path, algo, expected, PristineHashCache.makeKey(path, st, algo)));
+	
+	return work, locks, pristines, None;
+
+# Check that the ".svn" and "_svn" metadata folders are consistent
+# - every ".svn" folder should have an "_svn" twin, and vice versa
+# - no locks should be left behind by operations that got interrupted
+# - every pristine file should exist, and have the checksum the metadata records for it
+#
+# < root: (str) path to directory where root of source tree resides
+# < (progressCb): (fn(str)) callback for reporting what's happening
+# < (numWorkers): (int) number of processes to hash files with, or None for one per cpu
+# < (useCache): (bool) whether to use the hashes from previous checks
+# > return[0]: (MetadataVerifyReport)
+def verifySvnMetadata(root, progressCb=None, numWorkers=None, useCache=True):
+	report = MetadataVerifyReport();
+	
+	if numWorkers is None:
+		try:
+			numWorkers = multiprocessing.cpu_count();
+		except NotImplementedError:
+			numWorkers = 2;
+	
+	# 1) twins - if there aren't any "_svn" folders at all, this isn't set up as a dual working copy yet
+	metadataDirs, errors = scanSvnMetadataDirs(root);
+	
+	for description, path in errors:
+		report.addIssue(MetadataIssue.ISSUE_UNREADABLE, path, description);
+	
+	isDual = any(hasSecondary for p, hasPrimary, hasSecondary in metadataDirs);
+	if not isDual:
+		report.addIssue(MetadataIssue.ISSUE_MISSING_TWIN, root, "working copy has not been set up for duality");
+	
+	work = [];
+	for p, hasPrimary, hasSecondary in metadataDirs:
+		if not hasPrimary:
+			report.addIssue(MetadataIssue.ISSUE_ORPHANED_TWIN, p);
+		elif isDual and not hasSecondary:
+			report.addIssue(MetadataIssue.ISSUE_MISSING_TWIN, p);
+		
+		if hasPrimary:
+			work.append((p, SVN_DIRNAME_BRANCH1));
+		if hasSecondary:
+			work.append((p, SVN_DIRNAME_BRANCH2));
+	
+	report.adminDirs = len(work);
+	
+	if progressCb:
+		progressCb("Reading %d metadata folders..." % (len(work)));
+	
+	# 2) locks + pristines, read from several metadata folders at once as this is mostly waiting on the disk
+	pristines = [];
+	
+	pool = ThreadPool(max(1, min(numWorkers * 2, 16)));
+	try:
+		for (p, adminName), locks, dirPristines, err in pool.imap_unordered(readMetadataChecks, work, 16):
+			if err:
+				report.addIssue(MetadataIssue.ISSUE_UNREADABLE, os.path.join(p, adminName), err);
+			
+			for lockPath in locks:
+				report.addIssue(MetadataIssue.ISSUE_LOCKED, lockPath, adminName);
+			
+			pristines += dirPristines;
+	finally:
+		pool.close();
+		pool.join();
+	
+	report.pristines = len(pristines);
+	
+	# 3) work out which pristines actually need hashing
+	cache = PristineHashCache();
+	if useCache:
+		cache.load();
+	
+	toHash = {};		# (path, algo) : [(path, expected digest, cache key)] - hardlinked pristines only need hashing once
+	keyWork = {};		# cache key : (path, algo) that is being hashed for it
+	
+	for path, algo, expected, key in pristines:
+		if key is None:
+			report.addIssue(MetadataIssue.ISSUE_PRISTINE_MISSING, path);
+			continue;
+		
+		digest = cache.lookup(key);
+		
+		if digest is not None:
+			report.cached += 1;
+			if digest != expected:
+				report.addIssue(MetadataIssue.ISSUE_PRISTINE_MISMATCH, path, "expected %s %s, found %s" % (algo, expected, digest));
+		else:
+			hashWork = keyWork.setdefault(key, (path, algo));
+			toHash.setdefault(hashWork, []).append((path, expected, key));
+	
+	# 4) hash them on several processes at once, as hashing a lot of files is too much work for one cpu
+	if toHash:
+		if progressCb:
+			progressCb("Hashing %d pristine files (%d already known)..." % (len(toHash), report.cached));
+		
+		# starting up processes takes a while, so only bother when there's enough to do
+		if (numWorkers > 1) and (len(toHash) > 64):
+			try:
+				pool = multiprocessing.Pool(numWorkers);
+			except (OSError, ImportError), e:
+				print "Could not start processes for hashing, so using threads instead - %s" % (e)
+				pool = ThreadPool(numWorkers);
+		else:
+			pool = ThreadPool(1);
+		
+		lastReport = time.time();
+		
+		try:
+			for (path, algo), digest, err in pool.imap_unordered(hashPristineFile, toHash.keys(), 64):
+				report.hashed += 1;
+				
+				for pristinePath, expected, key in toHash[(path, algo)]:
+					if err:
+						report.addIssue(MetadataIssue.ISSUE_UNREADABLE, pristinePath, err);
+						continue;
+					
+					cache.store(key, digest);
+					if digest != expected:
+						report.addIssue(MetadataIssue.ISSUE_PRISTINE_MISMATCH, pristinePath, "expected %s %s, found %s" % (algo, expected, digest));
+				
+				# don't flood whoever is listening
+				if progressCb and (time.time() - lastReport >= 0.5):
+					lastReport = time.time();
+					progressCb("Hashed %d/%d pristine files" % (report.hashed, len(toHash)));
+		finally:
+			pool.close();
+			pool.join();
+	
+	if useCache:
+		cache.save();
+	
+	return report;
+
+#########################################
+# Operation
+
+# Verify the metadata of the working copy, as an operation that can be run in an SvnOperationDialog
+# - args[0] is the root of the source tree
+# - problems get reported as error output
+class SvnMetadataVerifyThread(ThreadAsFauxProcess):
+	__slots__ = (
+		'report',		# (MetadataVerifyReport) results, once the thread has run
+	);
+	
+	def __init__(self):
+		ThreadAsFauxProcess.__init__(self);
+		
+		self.report = None;
+	
+	def run(self):
+		root = self.args[0];
+		
+		try:
+			report = verifySvnMetadata(root, self.write);
+		except Exception, e:
+			self.error("Could not verify svn metadata: %s" % (e));
+			self.done(1);
+			return;
+		
+		for line in report.getLines():
+			self.error(line);
+		self.write(report.getSummary());
+		
+		self.report = report;
+		self.done(0);
+
+#########################################
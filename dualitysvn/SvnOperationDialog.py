@@ -7,8 +7,12 @@
 
 from coreDefines import *
 
-import platform
+from collections import deque
+import tempfile
+
 from SvnOperationProcess import *
+from OperationScheduler import *
+from WcOperationCoordinator import *
 
 #########################################
 # Operation List Widget
@@ -31,6 +35,140 @@ class SvnOperationList(QTreeView):
 		
 """
 		
+#########################################
+# Operation Log
+
+# Buffers lines of output for a log widget (QPlainTextEdit), adding them
+# to it in one go each frame, instead of editing + scrolling for every line
+# - only the most recent lines are kept in the widget, with older ones being dropped
+# - every line also goes to a log file, so that nothing is lost when lines get dropped
+class OperationLogSink(QObject):
+	# Class Defines =========================================
+	# Maximum time (ms) that lines are held back for (i.e. roughly a frame)
+	FLUSH_INTERVAL = 33;
+	
+	# Maximum number of lines to keep in the widget
+	MAX_LINES = 5000;
+	
+	# Setup =================================================
+	
+	# ctor
+	# < widget: (QPlainTextEdit) widget that lines get shown in
+	# < (parent): (QObject) owner of the sink
+	def __init__(self, widget, parent=None):
+		super(OperationLogSink, self).__init__(parent);
+		
+		self.widget = widget;
+		self.widget.setMaximumBlockCount(OperationLogSink.MAX_LINES);
+		
+		# pending lines - (isError, line) pairs
+		# - anything that would be dropped from the widget anyway doesn't need to be kept
+		self.pending = deque(maxlen=OperationLogSink.MAX_LINES);
+		self.numLines = 0;
+		
+		# formats for normal + error output
+		self.outputFormat = QTextCharFormat(widget.currentCharFormat());
+		
+		self.errorFormat = QTextCharFormat(self.outputFormat);
+		self.errorFormat.setForeground(Qt.red);
+		
+		# full log
+		self.logFileN = None;
+		self.logFile = None;
+		
+		try:
+			fd, self.logFileN = tempfile.mkstemp(prefix="duality-", suffix=".log", dir=project.tempFileDir);
+			self.logFile = os.fdopen(fd, 'w');
+		except (IOError, OSError), e:
+			print "Could not create log file - %s" % (e)
+		
+		# timer for flushing what we've got so far
+		self.timer = QTimer(self);
+		self.timer.setSingleShot(True);
+		self.timer.timeout.connect(self.flush);
+	
+	# Methods ===============================================
+	
+	# queue up lines of standard output
+	# < lines: (list<str>) lines without EOL chars
+	def addOutput(self, lines):
+		self.addLines(lines, False);
+	
+	# queue up lines of error output
+	# < lines: (list<str>) lines without EOL chars
+	def addErrors(self, lines):
+		self.addLines(lines, True);
+	
+	# queue up lines
+	def addLines(self, lines, isError):
+		self.numLines += len(lines);
+		self.pending.extend((isError, line) for line in lines);
+		
+		if self.logFile:
+			self.logFile.writelines(line + '\n' for line in lines);
+		
+		if not self.timer.isActive():
+			self.timer.start(OperationLogSink.FLUSH_INTERVAL);
+	
+	# add all pending lines to the widget now
+	def flush(self):
+		self.timer.stop();
+		
+		if not self.pending:
+			return;
+		
+		# only follow the output if the user hasn't scrolled back to look at something
+		scrollbar = self.widget.verticalScrollBar();
+		atEnd = (scrollbar.value() == scrollbar.maximum());
+		
+		# add everything as a single edit, with consecutive lines of the same kind added together
+		cursor = QTextCursor(self.widget.document());
+		cursor.movePosition(QTextCursor.End);
+		cursor.beginEditBlock();
+		
+		runIsError = self.pending[0][0];
+		run = [];
+		
+		for isError, line in self.pending:
+			if isError != runIsError:
+				cursor.insertText("".join(run), self.errorFormat if runIsError else self.outputFormat);
+				runIsError = isError;
+				run = [];
+			run.append(line + '\n');
+		
+		cursor.insertText("".join(run), self.errorFormat if runIsError else self.outputFormat);
+		cursor.endEditBlock();
+		
+		self.pending.clear();
+		
+		if atEnd:
+			scrollbar.setValue(scrollbar.maximum());
+	
+	# check whether some lines have been dropped from the widget
+	def isTruncated(self):
+		return self.numLines > OperationLogSink.MAX_LINES;
+	
+	# finish up with the log
+	# > return[0]: (str) path to the full log, if it's worth keeping (i.e. lines were dropped), or None
+	def close(self):
+		self.flush();
+		
+		if self.logFile is None:
+			return None;
+		
+		self.logFile.close();
+		self.logFile = None;
+		
+		# no need to keep the log when the widget has all of it anyway
+		if not self.isTruncated():
+			try:
+				os.remove(self.logFileN);
+			except OSError:
+				pass;
+			return None;
+		
+		return self.logFileN;
+
 #########################################
 # Standard Operation Dialog
 
@@ -42,7 +180,19 @@ class SvnOperationDialog(QDialog):
 		'status',	# (ProcessStatus.STATUS_*) 
 		
 		# Processes -----------------------------------
-		'pQ',		# (list) process queue - processes to execute
+		'pQ',			# (list) process queue - processes to execute
+		'scheduler',	# (OperationScheduler) runs the processes, once whatever they depend on is done
+		'nodeItems',	# (dict<int, QTreeWidgetItem>) item showing the progress of each process (by id of process)
+		
+		# Working Copy --------------------------------
+		'wcTicket',		# (WcOperationTicket) turn with the working copy that the processes run in
+		'wcFuture',		# (OperationFuture) resolved once the processes are done with the working copy
+		
+		# Output --------------------------------------
+		'log',		# (OperationLogSink) buffers output for the progress log
+		
+		# Cancelling ----------------------------------
+		'cleanupFuture',	# (OperationFuture) cleanup being run after cancelling, if any
 	);
 	
 	# Setup ============================================
@@ -57,6 +207,17 @@ class SvnOperationDialog(QDialog):
 		
 		self.pQ = [];
 		
+		self.scheduler = OperationScheduler();
+		self.scheduler.nodeChangedCb = self.updateNodeWidget;
+		self.scheduler.finishedCb = self.processesFinished;
+		
+		self.nodeItems = {};
+		
+		self.wcTicket = None;
+		self.wcFuture = None;
+		
+		self.cleanupFuture = None;
+		
 		# toplevel stuff
 		self.setName();
 		self.setGeometry(150, 150, 600, 300);
@@ -69,6 +230,17 @@ class SvnOperationDialog(QDialog):
 		
 	# main widget setup
 	def setupUI(self):
+		# 0) status of each operation (only shown when there's more than one)
+		self.wNodes = QTreeWidget();
+		self.wNodes.setRootIsDecorated(False);
+		self.wNodes.setHeaderLabels(["Operation", "Status", "Time"]);
+		self.wNodes.setVisible(False);
+		self.layout.addWidget(self.wNodes);
+		
+		# timer for keeping times of running operations up to date
+		self.nodeTimer = QTimer(self);
+		self.nodeTimer.timeout.connect(self.updateNodeTimes);
+		
 		# 1) progress log group 
 		gb = QGroupBox("Progress...");
 		self.layout.addWidget(gb);
@@ -86,7 +258,15 @@ class SvnOperationDialog(QDialog):
 		font.setStyleHint(font.TypeWriter, font.PreferDefault);
 		self.wStatus.setFont(font);
 		
-		# 1b) progress bar?
+		self.log = OperationLogSink(self.wStatus, self);
+		
+		# 1b) note about where to find the full log, when it's too long to show
+		self.wLogFile = QLabel();
+		self.wLogFile.setTextInteractionFlags(Qt.TextSelectableByMouse);
+		self.wLogFile.setVisible(False);
+		grp.addWidget(self.wLogFile, 2,1); # r2 c1
+		
+		# 1c) progress bar?
 		# TODO
 		
 		# 3) ok/cancel
@@ -109,85 +289,83 @@ class SvnOperationDialog(QDialog):
 	
 	# Add a process to the tail of the queue
 	# < process: (SvnOperationProcess) an operation to queue
-	def addProcess(self, process):
+	# < (deps): (list<AbstractOperationProcess>) processes already added which must be done before this one
+	#			can start. By default, this is just the process added before this one (i.e. run in sequence)
+	# < (resources): (list<str>) resources (OperationResource.*) that the process needs while running
+	def addProcess(self, process, deps=None, resources=()):
+		# run after the previous process, unless told otherwise
+		if deps is None:
+			deps = self.pQ[-1:];
+		
 		# add to queue to first
 		self.pQ.append(process);
+		self.scheduler.addNode(process, deps, resources);
+		
+		item = QTreeWidgetItem([process.opName, "", ""]);
+		self.wNodes.addTopLevelItem(item);
+		self.nodeItems[id(process)] = item;
 		
 		# hook up the new process
 		process.wTarget = self.wStatus;
 		process.parent = self;
 		
 		# output redirection callbacks
-		def pushOutput(sop, line):
-			# linux hack: if no EOL char, add one
-			if (platform.system() == 'Linux') and (line[-1] != '\n'):
-				line += '\n';
-			
-			# insert adds without extra line padding, then scroll to this point
-			sop.wTarget.setReadOnly(False);
+		def pushOutput(sop, lines):
+			# tag output when it could get mixed up with that of others
+			if sop.parent.scheduler.numRunning() > 1:
+				lines = ["[%s] %s" % (sop.opName, line) for line in lines];
 			
-			sop.wTarget.insertPlainText(line);
-			sop.wTarget.ensureCursorVisible();
-			
-			sop.wTarget.setReadOnly(True);
-		process.handleOutputCb = pushOutput;
+			sop.parent.log.addOutput(lines);
+		process.handleOutputBatchCb = pushOutput;
 		
 		def pushErrors(sop, line):
-			# linux hack: if no EOL char, add one
-			if line[-1] != '\n':
-				line += '\n'
-			
-			# grab current formatting info so that we can add red text
-			cTFormat = sop.wTarget.currentCharFormat();
-			
-			eTFormat = QTextCharFormat(cTFormat);
-			eTFormat.setForeground(Qt.red);
-			sop.wTarget.setCurrentCharFormat(eTFormat);
+			if sop.parent.scheduler.numRunning() > 1:
+				line = "[%s] %s" % (sop.opName, line);
 			
-			# insert adds without extra line padding, then scroll to this point 
-			sop.wTarget.setReadOnly(False);
-			
-			sop.wTarget.insertPlainText(line);
-			sop.wTarget.ensureCursorVisible();
-			
-			sop.wTarget.setReadOnly(True);
-			
-			# reset original text colouring
-			sop.wTarget.setCurrentCharFormat(cTFormat);
+			sop.parent.log.addErrors([line]);
 		process.handleErrorCb = pushErrors;
 			
 		# process chaining callbacks
 		def procStart(sop):
 			# output to the widget what operation is being started
-			sop.handleOutputCb(sop, "[Starting Operation: " + sop.opName + ']\n'); 
+			sop.parent.log.addOutput(["[Starting Operation: " + sop.opName + ']']);
 		process.preStartCb = procStart;
 		
 		def procDone(sop):
-			# sanity check: nothing may need to be done here
-			if (sop.parent is not None) and len(sop.parent.pQ) > 0:
-				# remove process from stack of processes
-				del sop.parent.pQ[0];
+			# show everything this process had to say
+			sop.parent.log.flush();
+			sop.parent.updateLogFileWidgets();
+			
+			# start whatever was waiting on this
+			sop.parent.scheduler.processEnded(sop);
 			
-			# if didn't end with failure, try to start up next procedure
-			#	- stop the process if anything else happens
-			if ((sop.status == ProcessStatus.STATUS_FAILED) or 
-			    (sop.parent.startHeadProcess() == False)):
-				# no more processes to start, or cannot start any more, so tidy up and let user get out of here
-				self.status = sop.status;
-				
-				self.wOk.setEnabled(True);
-				self.setName();
-				
 		process.postEndCb = procDone;
 		
 	# Start running operations in this dialog, and show the dialog too if this is successful
 	def go(self):
-		# start running the first process on the queue
-		if self.startHeadProcess():
+		# start running the first process(es) on the queue
+		if self.pQ:
 			# update status
 			self.status = ProcessStatus.STATUS_WORKING;
 			self.setName();
 			
+			# only worth showing the status of each process when there's more than one
+			if len(self.pQ) > 1:
+				self.wNodes.setVisible(True);
+				self.nodeTimer.start(1000);
+			
+			# wait for our turn with the working copy - things changing it can't run at the same time
+			# (as svn locks it), though things just looking at it can
+			if any(p.getWcAccess() == WcAccess.ACCESS_WRITE for p in self.pQ):
+				access = WcAccess.ACCESS_WRITE;
+			else:
+				access = WcAccess.ACCESS_READ;
+			
+			self.wcTicket = WcOperationCoordinator.forWorkingCopy().request(self.opName, access, self.startProcesses);
+			
+			if self.wcTicket.startTime is None:
+				self.log.addOutput(["[Waiting for other operations on the working copy to finish...]"]);
+			
 			# show dialog now
 			self.exec_();
 		else:
@@ -198,15 +376,59 @@ class SvnOperationDialog(QDialog):
 		
 	# Internal ---------------------------------------
 	
-	# Start procedure at "head" of queue
-	def startHeadProcess(self):
-		# sanity check
-		if not self.pQ:
-			return False;
-			
-		# go!
-		self.pQ[0].startProcess();
-		return True;
+	# Start running the processes, once it's our turn with the working copy
+	# < ticket: (WcOperationTicket)
+	# > return[0]: (OperationFuture) resolved once the processes are done with the working copy
+	def startProcesses(self, ticket):
+		if ticket.getWaitTime() >= 1.0:
+			self.log.addOutput(["[Waited %.1f s for other operations on the working copy]" % (ticket.getWaitTime())]);
+		
+		self.wcFuture = OperationFuture();
+		self.scheduler.start();
+		
+		return self.wcFuture;
+	
+	# Let other operations have the working copy, now that we're done with it
+	def releaseWorkingCopy(self):
+		if self.wcFuture is not None:
+			self.wcFuture.resolve(self);
+		elif self.wcTicket is not None:
+			# still waiting for our turn
+			WcOperationCoordinator.forWorkingCopy().cancel(self.wcTicket);
+	
+	# Callback for when all processes have finished (or can't be run anymore)
+	def processesFinished(self, scheduler):
+		# tidy up and let user get out of here
+		self.status = scheduler.status;
+		
+		# when cancelled, the working copy is still needed for cleaning up (see reject())
+		if scheduler.status != ProcessStatus.STATUS_CANCELLED:
+			self.releaseWorkingCopy();
+		
+		self.nodeTimer.stop();
+		self.updateNodeTimes();
+		
+		self.wOk.setEnabled(True);
+		self.setName();
+	
+	# Update the status shown for a process
+	# < node: (OperationNode) node for the process in the scheduler
+	def updateNodeWidget(self, node):
+		item = self.nodeItems[id(node.process)];
+		item.setText(1, NodeState.Names[node.state]);
+		
+		if node.state in (NodeState.STATE_FAILED, NodeState.STATE_CANCELLED, NodeState.STATE_SKIPPED):
+			item.setForeground(1, QBrush(Qt.red));
+		
+		elapsed = node.getElapsed();
+		if elapsed is not None:
+			item.setText(2, "%.1f s" % (elapsed));
+	
+	# Update the times shown for processes that have started
+	def updateNodeTimes(self):
+		for node in self.scheduler.nodes:
+			if node.startTime is not None:
+				self.nodeItems[id(node.process)].setText(2, "%.1f s" % (node.getElapsed()));
 	
 	# Set name of dialog, as displayed in the titlebar
 	def setName(self):
@@ -219,31 +441,72 @@ class SvnOperationDialog(QDialog):
 		else:
 			self.setWindowTitle(self.opName + " Error! - Duality SVN");
 			
+	# Show where the full log is, once there's more than the progress log can show
+	def updateLogFileWidgets(self):
+		if self.log.isTruncated() and self.log.logFileN:
+			self.wLogFile.setText("Only the last %d lines are shown above. Full log: %s" % (OperationLogSink.MAX_LINES, self.log.logFileN));
+			self.wLogFile.setVisible(True);
+	
+	# callback called when dialog is closed (i.e. ok or cancel)
+	def done(self, result):
+		# finish up the log
+		logFileN = self.log.close();
+		if logFileN:
+			print "Full log for '%s' saved to '%s'" % (self.opName, logFileN)
+		
+		super(SvnOperationDialog, self).done(result);
+	
 	# callback called when cancelling dialog
 	def reject(self):
-		# stop active process
-		if self.pQ:
-			# stop head process
-			headP = self.pQ[0];
-			headP.endProcess();
-			
+		# already cancelled, and just waiting on the cleanup
+		if self.cleanupFuture is not None:
+			return;
+		
+		# stop active processes, and everything waiting to run
+		running = [node.process for node in self.scheduler.getRunningNodes()];
+		self.scheduler.cancel();
+		
+		if running:
 			# create new process now to just cleanup
 			# - reuse environment that the last op was in
 			# - only need to do this if the process was a SVN operation
+			svnProcesses = [p for p in running if isinstance(p, SvnOperationProcess)];
+			headP = svnProcesses[0] if svnProcesses else running[0];
+			
 			if isinstance(headP, SvnOperationProcess):
 				cp = SvnOperationProcess(self, "Cancelled Operation Cleanup");
-				cp.setupEnv(headP.process.processEnvironment);
+				cp.setupEnv(BranchType.TYPE_TRUNK);
+				cp.process.setProcessEnvironment(headP.process.processEnvironment());
 				
 				cp.setOp("cleanup");
 				cp.addDefaultArgs();
 				
-				# - run modal-blocking
+				# show what it's doing in the progress log
+				cp.silentErrors = True;
+				cp.handleOutputBatchCb = lambda sop, lines: self.log.addOutput(lines);
+				cp.handleErrorCb = lambda sop, line: self.log.addErrors([line]);
+				
+				# - dialog stays open (but can't be closed) until this is done, without freezing everything
 				print "Cancel cleanup..."
-				cp.runBlocking();
-				print "Cleanup done"
+				self.wOk.setEnabled(False);
+				self.wCancel.setEnabled(False);
+				
+				self.cleanupFuture = cp.startAsync();
+				self.cleanupFuture.addDoneCb(self.cleanupDone);
+				return;
 			else:
 				print "No need to run SVN Cleanup - not SvnOperationProcess (%s)" % type(headP)
 		
+		self.releaseWorkingCopy();
+		
+		# now, cancel the dialog using it's own version
+		super(SvnOperationDialog, self).reject();
+	
+	# callback called when the cleanup after cancelling is done
+	def cleanupDone(self, sop):
+		print "Cleanup done"
+		self.releaseWorkingCopy();
+		
 		# now, cancel the dialog using it's own version
 		super(SvnOperationDialog, self).reject();
 
@@ -14,6 +14,11 @@ from AbstractOperationProcess import *
 #	- progress % tracker + callbacks for determining this
 
 class SvnOperationProcess(AbstractOperationProcess):
+	# Class Defines ==============================
+	# svn subcommands which only look at the working copy, and so can run alongside each other
+	READ_ONLY_OPS = frozenset(['status', 'diff', 'info', 'log', 'cat', 'list', 'proplist', 'propget']);
+	
+	# Instance Settings ==========================
 	__slots__ = (
 		# SVN Settings --------------------
 		'svnOp',	# (str) name of svn subcommand to use
@@ -78,6 +83,15 @@ class SvnOperationProcess(AbstractOperationProcess):
 		if useSecondaryBranch:
 			env.insert(SVN_HACK_ENVVAR, "1");
 	
+	# Working Copy Access -----------------------
+	
+	# get how this operation uses the working copy - depends on the subcommand
+	def getWcAccess(self):
+		if self.svnOp in SvnOperationProcess.READ_ONLY_OPS:
+			return WcAccess.ACCESS_READ;
+		else:
+			return WcAccess.ACCESS_WRITE;
+			
 	# Callbacks =================================
 	
 	# Internal method for starting the process 
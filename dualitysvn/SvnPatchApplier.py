@@ -0,0 +1,859 @@
+# Duality SVN
+# Original Author: Joshua Leung
+#
+# Patch Applier - applies the changes in a patch file to the working copy, patching
+# several files at once, and only touching the working copy once every file has
+# been patched successfully
+
+from coreDefines import *
+
+from InternalOperationProcess import *
+from SvnOperationProcess import *
+from SvnWcDiff import splitLines
+from SvnWcMetadata import detectWcFormat, getAdminName, SvnWcDbMetadata
+
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+import gzip
+import mmap
+import re
+import shutil
+import tempfile
+import time
+
+#########################################
+# Defines
+
+# Maximum number of context lines that may be ignored at either end of a hunk to get it to fit
+MAX_FUZZ = 2;
+
+# "@@ -oldStart,oldLen +newStart,newLen @@" - lengths are left out when they're 1
+HUNK_HEADER_PATTERN = re.compile(r'^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@');
+
+# Suffix for the patched copies of files, until they get swapped in
+PATCH_TEMP_SUFFIX = ".duality-patch";
+
+# Problem with the contents of a patch
+class PatchError(Exception):
+	pass;
+
+#########################################
+# Patch Index
+#
+# Patches of vendor drops can be huge, so rather than reading them in, they get
+# memory-mapped and scanned through once, noting where each file's changes are.
+# The hunks of each file then only get parsed by whichever worker patches it.
+
+# A file's worth of changes in a patch
+class PatchSection(object):
+	__slots__ = (
+		'path',			# (str) path of file being patched, relative to the root of the working copy
+		'start',		# (int) offset of the first line of the section in the patch
+		'end',			# (int) offset just past the last line of the section
+		
+		'hunkStart',	# (int) offset of the first hunk ("@@" line), or None if there aren't any
+		'numHunks',		# (int) number of hunks
+		
+		'svnOnly',		# (str) why this has to be left for "svn patch", or None if it can be done in-process
+	);
+	
+	def __init__(self, start, path):
+		self.path = path;
+		self.start = start;
+		self.end = start;
+		
+		self.hunkStart = None;
+		self.numHunks = 0;
+		
+		self.svnOnly = None;
+
+# Index of the sections in a patch file
+class PatchIndex(object):
+	__slots__ = (
+		'fileN',		# (str) path of the patch file
+		'file',			# (file) patch file, while it's mapped
+		'map',			# (mmap) mapping of the patch file, or None if it was read in instead
+		'data',			# (mmap/str) contents of the patch
+		
+		'sections',		# (list<PatchSection>) sections in the order they appear
+		'files',		# (OrderedDict<str, list<PatchSection>>) sections which can be done in-process, for each file
+		'svnSections',	# (list<PatchSection>) sections which have to be left for "svn patch"
+	);
+	
+	# ctor
+	# ! may raise IOError if the patch can't be read
+	# < fileN: (str) path of the patch file - it gets decompressed first if this ends with ".gz"
+	def __init__(self, fileN):
+		self.fileN = fileN;
+		self.file = None;
+		self.map = None;
+		
+		if fileN.lower().endswith(".gz"):
+			# compressed patches can't be mapped, so they have to be read in
+			with gzip.open(fileN, 'rb') as f:
+				self.data = f.read();
+		else:
+			self.file = open(fileN, 'rb');
+			
+			# empty files can't be mapped
+			if os.fstat(self.file.fileno()).st_size:
+				self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ);
+				self.data = self.map;
+			else:
+				self.data = "";
+		
+		self.sections = [];
+		self.scan();
+		
+		# group up what's left to do
+		self.files = OrderedDict();
+		self.svnSections = [];
+		
+		for section in self.sections:
+			if section.path is None:
+				continue;
+			elif section.svnOnly:
+				self.svnSections.append(section);
+			elif section.numHunks:
+				self.files.setdefault(os.path.normpath(section.path), []).append(section);
+	
+	# release the patch file
+	def close(self):
+		if self.map is not None:
+			self.map.close();
+			self.map = None;
+		if self.file is not None:
+			self.file.close();
+			self.file = None;
+		
+		self.data = "";
+	
+	# Scanning ============================================
+	
+	# start a new section, ending the previous one
+	def startSection(self, pos, path):
+		if self.sections:
+			self.sections[-1].end = pos;
+		
+		section = PatchSection(pos, path);
+		self.sections.append(section);
+		
+		return section;
+	
+	# find all the sections in the patch, in one pass through it
+	def scan(self):
+		data = self.data;
+		size = len(data);
+		
+		section = None;
+		headerSeen = False;		# whether the current section has had its "---"/"+++" lines yet
+		oldLeft = newLeft = 0;	# number of lines of the current hunk still to come, for each side
+		
+		pos = 0;
+		while pos < size:
+			end = data.find("\n", pos);
+			end = size if (end < 0) else (end + 1);
+			
+			# hunk lines can look like anything (i.e. a removed "-- " line looks like a header), so they just get counted off
+			if oldLeft or newLeft:
+				c = data[pos];
+				
+				if c in " \r\n":
+					oldLeft -= 1;
+					newLeft -= 1;
+				elif c == '-':
+					oldLeft -= 1;
+				elif c == '+':
+					newLeft -= 1;
+				elif c != '\\':
+					# hunk was cut short, so this line needs to be looked at again as a header
+					section.svnOnly = "Malformed hunk";
+					oldLeft = newLeft = 0;
+					continue;
+				
+				if (oldLeft < 0) or (newLeft < 0):
+					section.svnOnly = "Malformed hunk";
+					oldLeft = newLeft = 0;
+				
+				pos = end;
+				continue;
+			
+			line = data[pos:end];
+			
+			if line.startswith("Index: "):
+				section = self.startSection(pos, line[7:].strip());
+				headerSeen = False;
+			elif line.startswith("--- ") and (data[end:end + 4] == "+++ "):
+				# a file without an "Index:" line (i.e. from other tools)
+				if (section is None) or headerSeen or section.numHunks:
+					section = self.startSection(pos, None);
+				headerSeen = True;
+				
+				if ("(revision 0)" in line) or ("(nonexistent)" in line):
+					section.svnOnly = "Added file";
+			elif line.startswith("+++ ") and (section is not None):
+				if section.path is None:
+					section.path = line[4:].rstrip("\r\n").split("\t")[0];
+				
+				if "(nonexistent)" in line:
+					section.svnOnly = "Deleted file";
+			elif line.startswith("@@ ") and (section is not None):
+				m = HUNK_HEADER_PATTERN.match(line);
+				if m is None:
+					section.svnOnly = "Malformed hunk header";
+				else:
+					oldStart, oldLen, newStart, newLen = [int(value) if value is not None else 1 for value in m.groups()];
+					
+					oldLeft = oldLen;
+					newLeft = newLen;
+					
+					if section.hunkStart is None:
+						section.hunkStart = pos;
+					section.numHunks += 1;
+					
+					if (newStart == 0) and (newLen == 0):
+						section.svnOnly = "Deleted file";
+			elif line.startswith("Property changes on: "):
+				path = line[21:].strip();
+				if (section is None) or (section.path != path):
+					section = self.startSection(pos, path);
+				
+				section.svnOnly = "Property changes";
+			elif line.startswith(("Cannot display: ", "GIT binary patch")) and (section is not None):
+				section.svnOnly = "Binary file";
+			
+			pos = end;
+		
+		if self.sections:
+			self.sections[-1].end = size;
+	
+	# Access ==============================================
+	
+	# get the hunks part of a section
+	# > return[0]: (str)
+	def getHunkData(self, section):
+		return self.data[section.hunkStart:section.end];
+	
+	# write some of the sections out to a patch file of their own
+	# < fileN: (str) path of file to write
+	# < sections: (list<PatchSection>)
+	def writeSections(self, fileN, sections):
+		with open(fileN, 'wb') as f:
+			for section in sections:
+				f.write(self.data[section.start:section.end]);
+
+#########################################
+# Hunks
+
+# A set of changes to one part of a file
+class PatchHunk(object):
+	__slots__ = (
+		'oldStart',		# (int) 1-based line number the hunk starts at in the original file (or the line before it, if it's empty)
+		'oldLen',		# (int) number of lines in the original file covered by the hunk
+		
+		'lines',		# (list<tuple>) (tag, text) for each line - tag is ' ', '-', or '+', and texts include line endings
+		
+		'old',			# (list<str>) lines that should be in the original file (context + removed)
+		'new',			# (list<str>) lines to replace them with (context + added)
+		'leading',		# (int) number of context lines before the first change
+		'trailing',		# (int) number of context lines after the last change
+	);
+	
+	def __init__(self, oldStart, oldLen):
+		self.oldStart = oldStart;
+		self.oldLen = oldLen;
+		
+		self.lines = [];
+	
+	# work out the two sides once all the lines have been added
+	def finish(self):
+		self.old = [text for tag, text in self.lines if tag != '+'];
+		self.new = [text for tag, text in self.lines if tag != '-'];
+		
+		tags = "".join(tag for tag, text in self.lines);
+		self.leading = len(tags) - len(tags.lstrip(' '));
+		self.trailing = len(tags) - len(tags.rstrip(' ')) if tags.strip(' ') else 0;
+
+# Parse the hunks of a section
+# ! raises PatchError if the hunks are malformed
+# < data: (str) hunks part of a section, starting from the first "@@" line
+# > return[0]: (list<PatchHunk>)
+def parseHunks(data):
+	hunks = [];
+	hunk = None;
+	oldLeft = newLeft = 0;
+	
+	for line in splitLines(data):
+		if line.startswith("\\"):
+			# "\ No newline at end of file" - the line before it doesn't really have a line ending
+			if hunk and hunk.lines:
+				tag, text = hunk.lines[-1];
+				if line.endswith("\r\n") and text.endswith("\r\n"):
+					text = text[:-2];
+				elif text.endswith(("\n", "\r")):
+					text = text[:-1];
+				hunk.lines[-1] = (tag, text);
+		elif oldLeft or newLeft:
+			c = line[0];
+			
+			if c == ' ':
+				hunk.lines.append((' ', line[1:]));
+				oldLeft -= 1;
+				newLeft -= 1;
+			elif line in ("\n", "\r\n"):
+				# empty context line, which has lost its space
+				hunk.lines.append((' ', line));
+				oldLeft -= 1;
+				newLeft -= 1;
+			elif c == '-':
+				hunk.lines.append(('-', line[1:]));
+				oldLeft -= 1;
+			elif c == '+':
+				hunk.lines.append(('+', line[1:]));
+				newLeft -= 1;
+			else:
+				raise PatchError("Hunk #%d is cut short" % (len(hunks)));
+			
+			if (oldLeft < 0) or (newLeft < 0):
+				raise PatchError("Hunk #%d has more lines than its header says" % (len(hunks)));
+		elif line.startswith("@@"):
+			m = HUNK_HEADER_PATTERN.match(line);
+			if m is None:
+				raise PatchError("Malformed hunk header - %s" % (line.rstrip()));
+			
+			oldStart, oldLen, newStart, newLen = [int(value) if value is not None else 1 for value in m.groups()];
+			
+			hunk = PatchHunk(oldStart, oldLen);
+			hunks.append(hunk);
+			
+			oldLeft = oldLen;
+			newLeft = newLen;
+	
+	if oldLeft or newLeft:
+		raise PatchError("Hunk #%d is cut short" % (len(hunks)));
+	
+	for hunk in hunks:
+		hunk.finish();
+	
+	return hunks;
+
+# Find where a run of lines is in a file, looking outwards from where it's expected to be
+# < lines: (list<str>) lines of file
+# < match: (list<str>) lines to look for
+# < expected: (int) index where they're expected to start
+# < minPos: (int) first index they may start at (i.e. after the previous hunk)
+# > return[0]: (int) index where they start, or None if they couldn't be found
+def findLines(lines, match, expected, minPos):
+	n = len(match);
+	last = len(lines) - n;
+	if last < minPos:
+		return None;
+	
+	expected = min(max(expected, minPos), last);
+	if not n:
+		return expected;
+	
+	first = match[0];
+	for dist in xrange(max(expected - minPos, last - expected) + 1):
+		p = expected - dist;
+		if (p >= minPos) and (lines[p] == first) and (lines[p:p + n] == match):
+			return p;
+		
+		p = expected + dist;
+		if dist and (p <= last) and (lines[p] == first) and (lines[p:p + n] == match):
+			return p;
+	
+	return None;
+
+# Apply hunks to the lines of a file
+# - like "patch", each hunk is looked for near where it says it should be (allowing for
+#   the offset of the previous hunk), and then with some of the context at either end
+#   left out if it can't be found as-is
+#
+# < lines: (list<str>) lines of file, including line endings
+# < hunks: (list<PatchHunk>) hunks to apply, in order
+# < (maxFuzz): (int) maximum number of context lines that can be left out at either end
+# > return[0]: (list<str>) patched lines
+# > return[1]: (list<tuple>) (1-based line it was applied at, fuzz, offset) for each hunk - the line is None if it failed
+def applyHunks(lines, hunks, maxFuzz=MAX_FUZZ):
+	out = [];
+	results = [];
+	
+	pos = 0;		# lines before this one are done with
+	offset = 0;		# how far the last hunk was from where it said it would be
+	
+	for hunk in hunks:
+		base = (hunk.oldStart - 1) if hunk.oldLen else hunk.oldStart;
+		at = None;
+		
+		for fuzz in xrange(min(maxFuzz, max(hunk.leading, hunk.trailing)) + 1):
+			lead = min(fuzz, hunk.leading);
+			trail = min(fuzz, hunk.trailing);
+			
+			at = findLines(lines, hunk.old[lead:len(hunk.old) - trail], base + offset + lead, pos);
+			if at is not None:
+				break;
+		
+		if at is None:
+			results.append((None, 0, 0));
+			continue;
+		
+		out += lines[pos:at];
+		out += hunk.new[lead:len(hunk.new) - trail];
+		pos = at + len(hunk.old) - lead - trail;
+		
+		offset = (at - lead) - base;
+		results.append((at - lead + 1, fuzz, offset));
+	
+	out += lines[pos:];
+	return out, results;
+
+#########################################
+# Applying
+
+# Find the file that a patch path refers to
+# < wcRoot: (str) root directory of working copy
+# < path: (str) path given in the patch
+# > return[0]: (str) full path of file, or None if it can't be found
+def findPatchTarget(wcRoot, path):
+	path = os.path.normpath(path);
+	if os.path.isabs(path) or (path.split(os.sep)[0] == os.pardir):
+		return None;
+	
+	candidates = [path];
+	
+	# patches from git have "a/" and "b/" in front of the paths
+	if path.split(os.sep)[0] in ("a", "b"):
+		candidates.append(path[2:]);
+	
+	for candidate in candidates:
+		fileN = os.path.join(wcRoot, candidate);
+		if os.path.isfile(fileN):
+			return fileN;
+	
+	return None;
+
+# Patch a file, writing the result to a temp file beside it (unless it's a dry run)
+# < work: (tuple) (PatchIndex, wcRoot, path, list<PatchSection>, dryRun, maxFuzz, isCancelled)
+# > return[0]: (tuple) (path, target, temp file, list<str> messages, list<str> failures, hunks applied, error)
+#	- temp file is None unless the patched file was written; error is None unless the file couldn't be patched at all
+def patchFile(work):
+	index, wcRoot, path, sections, dryRun, maxFuzz, isCancelled = work;
+	
+	if isCancelled():
+		return (path, None, None, [], [], 0, "Cancelled");
+	
+	target = findPatchTarget(wcRoot, path);
+	if target is None:
+		return (path, None, None, [], [], 0, "Could not find file in working copy");
+	
+	try:
+		hunks = [];
+		for section in sections:
+			hunks += parseHunks(index.getHunkData(section));
+		
+		with open(target, 'rb') as f:
+			lines = splitLines(f.read());
+	except (IOError, OSError, PatchError), e:
+		return (path, target, None, [], [], 0, str(e));
+	
+	newLines, results = applyHunks(lines, hunks, maxFuzz);
+	
+	# report anything which didn't go exactly to plan, like "patch" does
+	messages = [];
+	failures = [];
+	
+	for i, (hunk, (lineNo, fuzz, offset)) in enumerate(zip(hunks, results)):
+		if lineNo is None:
+			failures.append("Hunk #%d FAILED at %d" % (i + 1, hunk.oldStart));
+		elif fuzz or offset:
+			message = "Hunk #%d succeeded at %d" % (i + 1, lineNo);
+			if fuzz:
+				message += " with fuzz %d" % (fuzz);
+			if offset:
+				message += " (offset %d line%s)" % (offset, "s" if abs(offset) != 1 else "");
+			messages.append(message);
+	
+	numApplied = len(hunks) - len(failures);
+	
+	if dryRun or failures:
+		return (path, target, None, messages, failures, numApplied, None);
+	
+	# write out the patched file beside the original, so that it can just be renamed over it later
+	dirName, baseName = os.path.split(target);
+	try:
+		fd, tempFileN = tempfile.mkstemp(prefix="." + baseName + ".", suffix=PATCH_TEMP_SUFFIX, dir=dirName);
+	except (IOError, OSError), e:
+		return (path, target, None, messages, failures, numApplied, "Could not create patched file - %s" % (e));
+	
+	try:
+		with os.fdopen(fd, 'wb') as f:
+			f.writelines(newLines);
+		shutil.copymode(target, tempFileN);
+	except (IOError, OSError), e:
+		os.remove(tempFileN);
+		return (path, target, None, messages, failures, numApplied, "Could not write patched file - %s" % (e));
+	
+	return (path, target, tempFileN, messages, failures, numApplied, None);
+
+# Swap patched files in for the originals, putting everything back if any of them can't be
+# < prepared: (list<tuple>) (temp file, target) for each file
+# > return[0]: (list) summary of errors that occurred during this process (description+path)
+def commitPatchedFiles(prepared):
+	swapped = [];	# (target, backup) for each file swapped in so far
+	
+	for tempFileN, target in prepared:
+		backup = tempFileN + ".orig";
+		
+		try:
+			os.rename(target, backup);
+			try:
+				os.rename(tempFileN, target);
+			except OSError:
+				os.rename(backup, target);
+				raise;
+		except OSError, e:
+			errors = [("Could not replace file - %s" % (e), target)];
+			
+			# undo the ones which have already been done
+			for doneTarget, doneBackup in reversed(swapped):
+				try:
+					os.remove(doneTarget);
+					os.rename(doneBackup, doneTarget);
+				except OSError, e:
+					errors.append(("Could not restore original file (kept as '%s') - %s" % (doneBackup, e), doneTarget));
+			
+			discardPatchedFiles(prepared);
+			return errors;
+		
+		swapped.append((target, backup));
+	
+	# the originals aren't needed anymore
+	for target, backup in swapped:
+		try:
+			os.remove(backup);
+		except OSError, e:
+			print "Could not remove backup of patched file '%s' - %s" % (backup, e)
+	
+	return [];
+
+# Get rid of patched files which won't be used
+# < prepared: (list<tuple>) (temp file, target) for each file
+def discardPatchedFiles(prepared):
+	for tempFileN, target in prepared:
+		try:
+			if os.path.exists(tempFileN):
+				os.remove(tempFileN);
+		except OSError, e:
+			print "Could not remove patched file '%s' - %s" % (tempFileN, e)
+
+# Results of applying a patch
+class PatchApplyReport(object):
+	__slots__ = (
+		'dryRun',			# (bool) whether the changes were only checked
+		
+		'filesTotal',		# (int) number of files to patch
+		'filesPatched',		# (int) number of files which all of the hunks could be applied to
+		'hunksApplied',		# (int) number of hunks which could be applied
+		'hunksFailed',		# (int) number of hunks which couldn't
+		
+		'messages',			# (list<tuple>) (path, message) for hunks which needed an offset or fuzz to apply
+		'errors',			# (list<tuple>) (description, path) for each problem
+		
+		'committed',		# (bool) whether the patched files were swapped into the working copy
+	);
+	
+	def __init__(self, dryRun):
+		self.dryRun = dryRun;
+		
+		self.filesTotal = 0;
+		self.filesPatched = 0;
+		self.hunksApplied = 0;
+		self.hunksFailed = 0;
+		
+		self.messages = [];
+		self.errors = [];
+		
+		self.committed = False;
+	
+	# check whether everything could be patched
+	def isSuccess(self):
+		return (self.filesPatched == self.filesTotal) and not self.errors;
+	
+	# get a one-line summary
+	def getSummary(self):
+		if self.dryRun:
+			outcome = "checked only, nothing was changed";
+		elif self.committed:
+			outcome = "working copy updated";
+		else:
+			outcome = "working copy left untouched";
+		
+		return "%d/%d files %s, %d hunks applied (%d with offset/fuzz), %d failed - %s" % (
+			self.filesPatched, self.filesTotal, "can be patched" if self.dryRun else "patched",
+			self.hunksApplied, len(self.messages), self.hunksFailed,
+			outcome);
+
+# Apply the in-process part of a patch to the working copy
+# - Files get patched several at once, each into a temp file beside the original.
+#   Only once every one of them has been patched successfully do they get swapped in
+#   for the originals, so a patch which doesn't apply cleanly leaves nothing changed.
+#
+# < index: (PatchIndex) patch to apply
+# < wcRoot: (str) root directory of working copy
+# < (dryRun): (bool) only check that the hunks can be applied
+# < (progressCb): (fn(filesDone, filesTotal)) callback for reporting progress every so often
+# < (numWorkers): (int) number of files to patch at once
+# < (maxFuzz): (int) maximum number of context lines that can be left out at either end of a hunk
+# < (isCancelled): (fn() -> bool) check whether to give up
+# > return[0]: (PatchApplyReport)
+def applyPatch(index, wcRoot, dryRun=False, progressCb=None, numWorkers=8, maxFuzz=MAX_FUZZ, isCancelled=None):
+	if isCancelled is None:
+		isCancelled = lambda: False;
+	
+	report = PatchApplyReport(dryRun);
+	report.filesTotal = len(index.files);
+	
+	work = [(index, wcRoot, path, sections, dryRun, maxFuzz, isCancelled) for path, sections in index.files.iteritems()];
+	prepared = [];
+	
+	# 1) patch each file into a copy of its own
+	filesDone = 0;
+	lastReport = time.time();
+	
+	pool = ThreadPool(max(1, numWorkers));
+	try:
+		for path, target, tempFileN, messages, failures, numApplied, err in pool.imap_unordered(patchFile, work, 16):
+			if tempFileN:
+				prepared.append((tempFileN, target));
+			
+			if err:
+				report.errors.append((err, path));
+			elif not failures:
+				report.filesPatched += 1;
+			
+			report.hunksApplied += numApplied;
+			report.hunksFailed += len(failures);
+			
+			report.messages += [(path, message) for message in messages];
+			report.errors += [(failure, path) for failure in failures];
+			
+			filesDone += 1;
+			
+			# don't flood whoever is listening
+			if progressCb and (time.time() - lastReport >= 0.5):
+				lastReport = time.time();
+				progressCb(filesDone, report.filesTotal);
+	finally:
+		pool.close();
+		pool.join();
+	
+	# files finish in any order
+	report.messages.sort();
+	report.errors.sort(key=lambda err: err[1]);
+	
+	# 2) swap them all in, but only if every one of them could be done
+	if not dryRun:
+		if report.isSuccess() and not isCancelled():
+			report.errors += commitPatchedFiles(prepared);
+			report.committed = not report.errors;
+		else:
+			discardPatchedFiles(prepared);
+	
+	return report;
+
+#########################################
+# Operations
+
+# Thread applying the in-process part of a patch, as an operation that can be run in an SvnOperationDialog
+# - args[0] is the root of the working copy
+# - in "dry run" mode, the hunks are only checked
+class SvnPatchApplyThread(ThreadAsFauxProcess):
+	__slots__ = (
+		'index',		# (PatchIndex) patch to apply
+		'dryRun',		# (bool) only check that the hunks can be applied
+		
+		'report',		# (PatchApplyReport) results, once the thread has run
+	);
+	
+	# ctor
+	# < index: (PatchIndex) patch to apply
+	# < (dryRun): (bool) only check that the hunks can be applied
+	def __init__(self, index, dryRun=False):
+		ThreadAsFauxProcess.__init__(self);
+		
+		self.index = index;
+		self.dryRun = dryRun;
+		
+		self.report = None;
+	
+	def run(self):
+		wcRoot = self.args[0];
+		verb = "Checked" if self.dryRun else "Patched";
+		
+		try:
+			report = applyPatch(self.index, wcRoot, self.dryRun,
+			                    lambda done, total: self.write("%s %d/%d files" % (verb, done, total)),
+			                    isCancelled=self.isStopping);
+		except Exception, e:
+			self.error("Could not apply patch: %s" % (e));
+			self.done(1);
+			return;
+		
+		self.report = report;
+		
+		for path, message in report.messages:
+			self.write("%s: %s" % (path, message));
+		for err in report.errors:
+			self.error(str(err));
+		self.write(report.getSummary());
+		
+		# applyPatch() never stops part way through swapping the patched files in, so if
+		# that has started, the patch has been applied regardless of any request to stop
+		if self.isStopping() and not report.committed:
+			self.done(-1, QProcess.CrashExit);
+		else:
+			self.done(0 if report.isSuccess() else 1);
+
+#########################################
+# Applier
+
+# Version of the svn client, once it has been found (see getSvnClientVersion())
+_svnClientVersion = [];
+
+# Get the version of the svn client which gets run for operations
+# - this is only checked once, as "svn --version" is fairly slow to start
+# > return[0]: (tuple<int>) version numbers (i.e. (1, 6, 17)), or None if svn couldn't be run
+def getSvnClientVersion():
+	if not _svnClientVersion:
+		version = None;
+		
+		proc = QProcess();
+		proc.start("svn", ["--version", "--quiet"]);
+		if proc.waitForFinished(5000) and (proc.exitCode() == 0):
+			match = re.match(r"(\d+)\.(\d+)(?:\.(\d+))?", str(proc.readAllStandardOutput()).strip());
+			if match:
+				version = tuple(int(x) for x in match.groups() if x is not None);
+		else:
+			proc.kill();
+			proc.waitForFinished(1000);
+		
+		_svnClientVersion.append(version);
+	
+	return _svnClientVersion[0];
+
+# Applies a patch file to the working copy
+#
+# Changes to the contents of existing files get done in-process (see applyPatch()), while
+# everything else (added/deleted files, property changes, binary files) is left to
+# "svn patch", which only runs once the rest has been applied successfully.
+class SvnPatchApplier(object):
+	__slots__ = (
+		'branchType',		# (BranchType.TYPE_*) branch whose metadata "svn patch" uses
+		'fileN',			# (str) path of the patch file
+		'index',			# (PatchIndex) sections of the patch
+		
+		'svnPatchFileN',	# (str) path of the patch file with the sections left for "svn patch", once written
+		'thread',			# (SvnPatchApplyThread) in-process part of the last run, if there was one
+	);
+	
+	# ctor
+	# ! may raise IOError if the patch can't be read
+	# < branchType: (BranchType.TYPE_*) branch whose metadata "svn patch" uses
+	# < fileN: (str) path of the patch file
+	def __init__(self, branchType, fileN):
+		self.branchType = branchType;
+		self.fileN = fileN;
+		self.index = PatchIndex(fileN);
+		
+		self.svnPatchFileN = None;
+		self.thread = None;
+	
+	# get the number of files the patch changes
+	def numFiles(self):
+		return len(self.index.files) + len(self.index.svnSections);
+	
+	# check whether the patch has anything in it that can be applied
+	def isEmpty(self):
+		return self.numFiles() == 0;
+	
+	# get the report for the in-process part of the last run
+	# > return[0]: (PatchApplyReport) or None if there wasn't one
+	def getReport(self):
+		return self.thread.report if self.thread else None;
+	
+	# check whether the parts of the patch that need "svn patch" can be applied
+	# - "svn patch" only exists from svn 1.7 on, and only works with 1.7+ working copies,
+	#   whereas "_svn" duplicates are usually made of 1.6 ones
+	# > return[0]: (str) description of why not, or None if they can (or there aren't any)
+	def checkSvnPatch(self):
+		if not self.index.svnSections:
+			return None;
+		
+		# describe what needs it, as that may well be left out of the patch instead
+		paths = [section.path for section in self.index.svnSections];
+		what = "%d files in the patch can only be applied by 'svn patch' (%s%s)" % (
+			len(paths), ", ".join(paths[:5]), ", ..." if len(paths) > 5 else "");
+		
+		version = getSvnClientVersion();
+		if version is None:
+			return "%s, but the svn client could not be run to check its version" % (what);
+		elif version < (1, 7):
+			return "%s, which needs Subversion 1.7 or newer (this client is %s)" % (what, ".".join(str(x) for x in version));
+		
+		wcFormat = detectWcFormat(project.workingCopyDir, getAdminName(self.branchType));
+		if wcFormat is not SvnWcDbMetadata:
+			return "%s, which needs a Subversion 1.7 or newer working copy (this one uses the 1.6 or older format)" % (what);
+		
+		return None;
+	
+	# Running ===============================================
+	
+	# add the operations to a dialog, which will run them
+	# ! may raise IOError if the sections for "svn patch" can't be written out
+	# < dlg: (SvnOperationDialog) dialog to run the operations in
+	# < (dryRun): (bool) only check that the patch can be applied
+	def addToDialog(self, dlg, dryRun=False):
+		title = "Check Patch" if dryRun else "Apply Patch";
+		
+		# 1) everything that can be done in-process
+		if self.index.files:
+			self.thread = SvnPatchApplyThread(self.index, dryRun);
+			
+			p1 = InternalOperationProcess(dlg, "%s (%d files)" % (title, len(self.index.files)), self.thread);
+			p1.addArgs([project.workingCopyDir]);
+			
+			dlg.addProcess(p1);
+		
+		# 2) whatever is left goes to "svn patch"
+		if self.index.svnSections:
+			if self.svnPatchFileN is None:
+				fd, self.svnPatchFileN = tempfile.mkstemp(prefix="duality-", suffix=".patch", dir=project.tempFileDir);
+				os.close(fd);
+				
+				self.index.writeSections(self.svnPatchFileN, self.index.svnSections);
+			
+			p2 = SvnOperationProcess(dlg, "%s - svn patch (%d files)" % (title, len(self.index.svnSections)));
+			p2.setupEnv(self.branchType);
+			
+			p2.setOp("patch");
+			p2.addDefaultArgs();
+			if dryRun:
+				p2.addArgs(['--dry-run']);
+			p2.addArgs([self.svnPatchFileN]);
+			
+			# when checking, everything should get checked, otherwise this only goes ahead if the rest worked
+			dlg.addProcess(p2, deps=([] if dryRun else None));
+	
+	# finish up, once there's nothing more to run
+	def finish(self):
+		if self.svnPatchFileN is not None:
+			try:
+				os.remove(self.svnPatchFileN);
+			except OSError:
+				pass;
+			self.svnPatchFileN = None;
+		
+		self.index.close();
+
+#########################################
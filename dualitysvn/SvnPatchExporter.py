@@ -0,0 +1,374 @@
+# Duality SVN
+# Original Author: Joshua Leung
+#
+# Patch Exporter - writes the changes to a set of paths out to a patch file,
+# diffing batches of them at the same time
+
+from coreDefines import *
+
+from InternalOperationProcess import *
+from SvnOperationProcess import *
+from SvnWcDiff import *
+
+import gzip
+import tempfile
+
+#########################################
+# Ordered Writing
+#
+# Batches finish in whatever order they like, but the patch needs to have the
+# diffs in the same order every time (sorted by path). The output of whichever
+# batch is next in line gets written straight to the patch, while the output of
+# the others gets spooled to temp files until it's their turn, so only a chunk
+# of output ever needs to be held in memory at once.
+
+# Writes the output of a sequence of batches to a file, in batch order
+class PatchStreamWriter(object):
+	__slots__ = (
+		'fileN',		# (str) path of the patch file
+		'partFileN',	# (str) path that the patch gets written to until it's complete
+		'compress',		# (bool) whether the patch is gzipped
+		
+		'rawFile',		# (file) file being written to
+		'file',			# (file/GzipFile) what gets written to (i.e. the compressor)
+		
+		'numBatches',	# (int) number of batches
+		'nextBatch',	# (int) index of batch whose output goes straight to the file
+		'finished',		# (list<bool>) whether each batch has finished
+		'spools',		# (dict<int, file>) temp file holding the output of each batch that isn't next in line
+		
+		'bytesWritten',	# (int) amount of (uncompressed) output written to the file
+		'failed',		# (bool) whether a batch failed, so the patch won't be complete
+	);
+	
+	# ctor
+	# ! may raise IOError if the file can't be created
+	# < fileN: (str) path of the patch file
+	# < numBatches: (int) number of batches that output will come from
+	# < (compress): (bool) whether the patch should be gzipped
+	def __init__(self, fileN, numBatches, compress=False):
+		self.fileN = fileN;
+		self.partFileN = fileN + ".part";
+		self.compress = compress;
+		
+		self.rawFile = open(self.partFileN, 'wb');
+		if compress:
+			# name stored in the header is what it gets uncompressed to
+			name = os.path.basename(fileN[:-3] if fileN.endswith(".gz") else fileN);
+			self.file = gzip.GzipFile(name, 'wb', 6, self.rawFile);
+		else:
+			self.file = self.rawFile;
+		
+		self.numBatches = numBatches;
+		self.nextBatch = 0;
+		self.finished = [False] * numBatches;
+		self.spools = {};
+		
+		self.bytesWritten = 0;
+		self.failed = False;
+	
+	# Methods ===============================================
+	
+	# add some output from a batch
+	# < index: (int) index of batch
+	# < chunks: (list<str>) output, exactly as it should appear in the file
+	def addOutput(self, index, chunks):
+		if self.failed:
+			return;
+		
+		if index == self.nextBatch:
+			data = "".join(chunks);
+			self.file.write(data);
+			self.bytesWritten += len(data);
+		else:
+			spool = self.spools.get(index);
+			if spool is None:
+				spool = self.spools[index] = tempfile.TemporaryFile(prefix="duality-", suffix=".diff", dir=project.tempFileDir);
+			
+			spool.writelines(chunks);
+	
+	# note that a batch has finished
+	# < index: (int) index of batch
+	# < (success): (bool) whether the batch got all of its output out
+	# > return[0]: (int) number of batches which have been written out completely
+	def batchDone(self, index, success=True):
+		if not success:
+			self.failed = True;
+		if self.failed:
+			return self.nextBatch;
+		
+		self.finished[index] = True;
+		
+		# write out everything that's now ready, up to the first batch that's still going
+		while (self.nextBatch < self.numBatches) and self.finished[self.nextBatch]:
+			self.nextBatch += 1;
+			
+			if self.nextBatch < self.numBatches:
+				self.releaseSpool(self.nextBatch);
+		
+		return self.nextBatch;
+	
+	# copy the spooled output of a batch to the file, now that it's that batch's turn
+	def releaseSpool(self, index):
+		spool = self.spools.pop(index, None);
+		if spool is None:
+			return;
+		
+		spool.seek(0);
+		
+		while True:
+			data = spool.read(1024 * 1024);
+			if not data:
+				break;
+			
+			self.file.write(data);
+			self.bytesWritten += len(data);
+		
+		spool.close();
+	
+	# check whether everything has been written
+	def isComplete(self):
+		return (not self.failed) and (self.nextBatch == self.numBatches);
+	
+	# finish up, keeping the patch only if everything got written
+	# > return[0]: (bool) whether the patch was kept
+	def close(self):
+		for spool in self.spools.itervalues():
+			spool.close();
+		self.spools = {};
+		
+		keep = self.isComplete();
+		
+		try:
+			if self.file is not self.rawFile:
+				self.file.close();
+			self.rawFile.close();
+			
+			if keep:
+				# replace old one
+				if os.path.exists(self.fileN):
+					os.remove(self.fileN);
+				os.rename(self.partFileN, self.fileN);
+		finally:
+			if os.path.exists(self.partFileN):
+				os.remove(self.partFileN);
+		
+		return keep;
+
+#########################################
+# Batch Processes
+
+# "svn diff" for a batch of paths, passing on the output exactly as it comes
+# (as patches of files with CRLF line endings need to keep them)
+class SvnPatchDiffProcess(SvnOperationProcess):
+	# Internal (Reading) ------------------------
+	
+	# read output from process - overridden to pass chunks through as-is
+	def readOutput(self):
+		data = str(self.process.readAllStandardOutput());
+		if data:
+			self.handleOutputLines([data]);
+
+# Thread diffing a batch of files using the built-in diff engine
+# - args are the paths of the files
+class SvnPatchEngineThread(ThreadAsFauxProcess):
+	__slots__ = (
+		'engine',	# (SvnWcDiffEngine)
+	);
+	
+	def __init__(self, engine):
+		ThreadAsFauxProcess.__init__(self);
+		
+		self.engine = engine;
+	
+	def run(self):
+		try:
+			metadata = self.engine.openMetadata();
+		except Exception, e:
+			self.error("Could not read working copy metadata: %s" % (e));
+			self.done(1);
+			return;
+		
+		exitCode = 0;
+		
+		try:
+			for path in self.args:
+				# the rest of the batch isn't needed once the patch has been cancelled
+				if self.isStopping():
+					exitCode = -1;
+					break;
+				
+				try:
+					result = self.engine.diffFile(path, metadata);
+				except Exception, e:
+					self.error("Could not diff '%s' - %s" % (path, e));
+					exitCode = 1;
+					continue;
+				
+				if result is not None:
+					self.write(result.getUnified());
+				else:
+					# it could be handled when the batches were planned, so it must have changed since
+					self.error("Could not diff '%s' - it has changed since the patch was started" % (path));
+					exitCode = 1;
+		finally:
+			metadata.close();
+		
+		self.done(exitCode, QProcess.CrashExit if (exitCode == -1) else QProcess.NormalExit);
+
+# Operation wrapper for diffing a batch of files using the built-in diff engine
+class SvnPatchEngineProcess(InternalOperationProcess):
+	# Internal Setup ==============================
+	
+	# < paths: (list<str>) paths of files relative to the root of the working copy
+	def __init__(self, parent, name, branchType, paths):
+		engine = SvnWcDiffEngine(project.workingCopyDir, getAdminName(branchType));
+		super(SvnPatchEngineProcess, self).__init__(parent, name, SvnPatchEngineThread(engine));
+		
+		self.addArgs(paths);
+	
+	# the engine only ever reads the working copy
+	def getWcAccess(self):
+		return WcAccess.ACCESS_READ;
+	
+	# Internal (Reading) ------------------------
+	
+	# read output from thread - overridden to pass diffs through as-is
+	def readOutput(self):
+		self.handleOutputLines(self.process.readOutputEntries());
+
+#########################################
+# Exporter
+
+# Writes the changes to a set of paths out to a patch file
+#
+# The paths get sorted, and split into batches which are run by an SvnOperationDialog,
+# several at a time. Runs of files that the built-in diff engine can handle get done
+# in-process, while everything else (added/deleted files, property changes, binary
+# files, etc.) is left to "svn diff".
+class SvnPatchExporter(object):
+	# Class Defines =========================================
+	# Maximum number of paths in each batch
+	BATCH_SIZE = 64;
+	
+	# Maximum number of batches to run at once
+	MAX_CONCURRENT = 4;
+	
+	# Instance Settings =====================================
+	__slots__ = (
+		'branchType',	# (BranchType.TYPE_*) branch whose metadata the paths get diffed against
+		'fileN',		# (str) path of the patch file
+		'compress',		# (bool) whether the patch gets gzipped
+		
+		'batches',		# (list<tuple>) (uses engine, list<str> paths) for each batch, in path order
+		'writer',		# (PatchStreamWriter) where the output goes, once started
+		'numWritten',	# (int) number of paths whose diffs have been written out
+	);
+	
+	# ctor
+	# < branchType: (BranchType.TYPE_*) branch whose metadata the paths get diffed against
+	# < paths: (list<str>) paths relative to the root of the working copy
+	# < fileN: (str) path of the patch file - it gets gzipped if this ends with ".gz"
+	def __init__(self, branchType, paths, fileN):
+		self.branchType = branchType;
+		self.fileN = fileN;
+		self.compress = fileN.lower().endswith(".gz");
+		
+		self.batches = self.planBatches(sorted(set(paths)));
+		self.writer = None;
+		self.numWritten = 0;
+	
+	# split the paths into batches
+	# < paths: (list<str>) sorted paths
+	# > return[0]: (list<tuple>) (uses engine, paths) for each batch
+	def planBatches(self, paths):
+		# find out which files the built-in engine can do - all at once, so that each directory only gets read once
+		canUseEngine = [False] * len(paths);
+		
+		if project.builtinDiff and SvnWcDiffProcess.canHandle(self.branchType):
+			engine = SvnWcDiffEngine(project.workingCopyDir, getAdminName(self.branchType));
+			metadata = engine.openMetadata();
+			dirCache = {};
+			
+			try:
+				for i, path in enumerate(paths):
+					try:
+						canUseEngine[i] = engine.checkFile(metadata, path, dirCache) is not None;
+					except (IOError, OSError, KeyError):
+						pass;
+			finally:
+				metadata.close();
+		
+		# consecutive runs of paths that can be done the same way
+		batches = [];
+		for useEngine, path in zip(canUseEngine, paths):
+			if batches and (batches[-1][0] == useEngine) and (len(batches[-1][1]) < SvnPatchExporter.BATCH_SIZE):
+				batches[-1][1].append(path);
+			else:
+				batches.append((useEngine, [path]));
+		
+		return batches;
+	
+	# get the number of paths being diffed
+	def numPaths(self):
+		return sum(len(paths) for useEngine, paths in self.batches);
+	
+	# Running ===============================================
+	
+	# add the batches to a dialog, which will run them
+	# ! may raise IOError if the patch file can't be created
+	# < dlg: (SvnOperationDialog) dialog to run the batches in
+	def addToDialog(self, dlg):
+		self.writer = PatchStreamWriter(self.fileN, len(self.batches), self.compress);
+		
+		dlg.scheduler.maxConcurrent = SvnPatchExporter.MAX_CONCURRENT;
+		
+		first = 0;
+		for index, (useEngine, paths) in enumerate(self.batches):
+			name = "Diff %d-%d of %d" % (first + 1, first + len(paths), self.numPaths());
+			first += len(paths);
+			
+			if useEngine:
+				p = SvnPatchEngineProcess(dlg, name, self.branchType, paths);
+			else:
+				p = SvnPatchDiffProcess(dlg, name);
+				p.setupEnv(self.branchType);
+				
+				p.setOp("diff");
+				p.addDefaultArgs();
+				p.addArgs(['--depth=empty'] + paths); # directories only for their own property changes
+			
+			# none of them depend on each other
+			dlg.addProcess(p, deps=[]);
+			
+			# diffs go to the patch, instead of the log
+			p.handleOutputBatchCb = lambda sop, chunks, index=index: self.writer.addOutput(index, chunks);
+			p.postEndCb = self.makeBatchDoneCb(index, p.postEndCb);
+	
+	# get a callback for a batch finishing, which also does what the dialog needs done
+	def makeBatchDoneCb(self, index, dialogCb):
+		def batchDone(sop):
+			numBatchesDone = self.writer.nextBatch;
+			
+			if self.writer.batchDone(index, sop.status == ProcessStatus.STATUS_DONE) > numBatchesDone:
+				# report how far through the patch we are
+				self.numWritten = sum(len(paths) for useEngine, paths in self.batches[:self.writer.nextBatch]);
+				sop.parent.log.addOutput(["Written %d/%d paths to patch (%.1f MB)" % (
+					self.numWritten, self.numPaths(), self.writer.bytesWritten / 1048576.0)]);
+			
+			dialogCb(sop);
+		return batchDone;
+	
+	# finish up, once the dialog is done
+	# > return[0]: (bool) whether the patch was written out completely
+	def finish(self):
+		if self.writer is None:
+			return False;
+		
+		try:
+			return self.writer.close();
+		except (IOError, OSError), e:
+			print "Could not save patch to '%s' - %s" % (self.fileN, e)
+			return False;
+
+#########################################
@@ -5,16 +5,25 @@
 
 from coreDefines import *
 
+import xml.parsers.expat
+
+from array import array
+from collections import OrderedDict
+
 from DiffViewer import *
 from SvnOperationProcess import *
+from SvnWcDiff import *
+from SvnWcDiffCache import *
 
 #########################################
-# List Item Datatypes
+# Status Codes
 
-# Data item that occurs in SvnStatusList's model
-class SvnStatusListItem:
-	# Class Defines ======================================
-	# File Status
+# Registry of the status codes used by svn, along with everything needed
+# to display them. All lookup tables are built once (when the module is
+# loaded) so that they can be used directly when painting the status list.
+class SvnStatusCodes:
+	# Code Maps =========================================
+	# File Status (code -> name)
 	FileStatusMap = {
 		' ':"Unchanged",
 		'A':"Added",
@@ -29,25 +38,245 @@ class SvnStatusListItem:
 		'~':"Obstructed" #versioned item obstructed by some item of a different kind
 	}
 	
-	# Property Status
+	# Property Status (code -> name)
 	PropStatusMap = {
 		' ':"Unchanged",
 		'C':"Conflicted",
 		'M':"Modified"
 	}
 	
+	# Text color for each file status
+	FileStatusColorMap = {
+		' ':Qt.lightGray,
+		'A':Qt.darkCyan,
+		'C':Qt.red,
+		'D':Qt.darkMagenta,
+		'I':Qt.darkYellow,
+		'M':Qt.blue,
+		'R':Qt.darkCyan,
+		'X':Qt.yellow,
+		'?':Qt.gray,
+		'!':Qt.darkRed,
+		'~':Qt.darkRed
+	}
+	
+	# Text color for everything, while the list is out of date
+	StaleColor = Qt.gray;
+	
+	# Tooltip shown for each path
+	TooltipTemplate = "\n".join([
+		"<b>Path:</b> %s",
+		"<b>File Status:</b> %s",
+		"<b>Property Status:</b> %s"]);
+	
+	# Derived Tables ====================================
+	# - these are all filled in by buildTables()
+	
+	FileStatusCodes = None;		# (dict<str, str>) name -> code, for file status
+	PropStatusCodes = None;		# (dict<str, str>) name -> code, for property status
+	
+	FileStatusColors = None;	# (dict<str, QColor>) text color for each file status code
+	FileStatusBrushes = None;	# (dict<str, QBrush>) text brush for each file status code
+	StaleBrush = None;			# (QBrush) text brush for everything, while the list is out of date
+	
+	FileStatusDisplay = None;	# (dict<str, QVariant>) display value for each file status code
+	PropStatusDisplay = None;	# (dict<str, QVariant>) display value for each property status code
+	
+	TooltipTemplates = None;	# (dict<str, str>) tooltip with only the path to fill in, for each pair of file+property status codes
+	
+	# build all the derived tables from the code maps
+	@classmethod
+	def buildTables(cls):
+		# reverse maps
+		cls.FileStatusCodes = dict((name, code) for code, name in cls.FileStatusMap.iteritems());
+		cls.PropStatusCodes = dict((name, code) for code, name in cls.PropStatusMap.iteritems());
+		
+		# decorations
+		cls.FileStatusColors = dict((code, QColor(color)) for code, color in cls.FileStatusColorMap.iteritems());
+		cls.FileStatusBrushes = dict((code, QBrush(color)) for code, color in cls.FileStatusColors.iteritems());
+		cls.StaleBrush = QBrush(QColor(cls.StaleColor));
+		
+		# display values
+		cls.FileStatusDisplay = dict((code, QVariant(name)) for code, name in cls.FileStatusMap.iteritems());
+		cls.PropStatusDisplay = dict((code, QVariant(name)) for code, name in cls.PropStatusMap.iteritems());
+		
+		# tooltips - "%" in status names would need escaping, but there aren't any
+		cls.TooltipTemplates = {};
+		for fileCode, fileName in cls.FileStatusMap.iteritems():
+			for propCode, propName in cls.PropStatusMap.iteritems():
+				cls.TooltipTemplates[fileCode + propCode] = cls.TooltipTemplate % ("%s", fileName, propName);
+
+SvnStatusCodes.buildTables();
+
+#########################################
+# Record Storage
+
+# Columnar storage for status records
+#
+# Rather than having a full Python object per status list row, the data
+# for all rows is kept in a few flat arrays (with one entry per record),
+# with SvnStatusListItem's acting as lightweight views onto a record.
+#
+# Records are only ever appended, so a record id (index into the arrays)
+# remains valid for as long as the store is alive.
+class SvnStatusRecordStore(object):
+	# Class Defines ======================================
+	# Flags - bitfield values
+	FLAG_ENABLED	= 0x01	# item is included in operations by default
+	FLAG_REVISION	= 0x08	# revision is known
+	
+	# Node kind - 2 bits within the flags
+	KIND_MASK		= 0x06
+	KindFlags = {
+		None   : 0x00,
+		'file' : 0x02,
+		'dir'  : 0x04,
+		'none' : 0x06
+	}
+	FlagKinds = dict((v, k) for k, v in KindFlags.iteritems())
+	
+	# Instance Settings ==================================
+	__slots__ = (
+		'paths',		# (list<str>) interned path of each record
+		'fileCodes',	# (array<char>) file status code of each record (i.e. key in SvnStatusListItem.FileStatusMap)
+		'propCodes',	# (array<char>) property status code of each record (i.e. key in SvnStatusListItem.PropStatusMap)
+		'flags',		# (array<uint8>) FLAG_* and kind bits of each record
+		'revisions',	# (array<long>) working revision of each record (only valid with FLAG_REVISION)
+	);
+	
 	# Setup ==============================================
 	
-	# ctor
-	# < (initStr): (str) optional string to parse to get relevant info
-	def __init__(self, initStr=None):
-		# init placeholders
-		self.defaultEnabled = True;
+	def __init__(self):
+		self.paths = [];
+		self.fileCodes = array('c');
+		self.propCodes = array('c');
+		self.flags = array('B');
+		self.revisions = array('l');
+		
+	# create a store from existing columns (i.e. as loaded from a file)
+	# ! the columns are used directly rather than being copied
+	@classmethod
+	def fromColumns(cls, paths, fileCodes, propCodes, flags, revisions):
+		store = cls();
+		
+		store.paths = [intern(path) for path in paths];
+		store.fileCodes = fileCodes;
+		store.propCodes = propCodes;
+		store.flags = flags;
+		store.revisions = revisions;
+		
+		return store;
+		
+	def __len__(self):
+		return len(self.paths);
+	
+	# Methods ============================================
+	
+	# add a new record
+	# > return[0]: (int) id of the new record
+	def addRecord(self, path, fileCode, propCode, flags, revision):
+		rid = len(self.paths);
+		
+		self.paths.append(intern(path));
+		self.fileCodes.append(fileCode);
+		self.propCodes.append(propCode);
+		self.flags.append(flags);
+		self.revisions.append(revision);
+		
+		return rid;
+		
+	# get the values of a record, in the same order as for addRecord()
+	# > return[0]: (tuple)
+	def getRecord(self, rid):
+		return (self.paths[rid], self.fileCodes[rid], self.propCodes[rid], self.flags[rid], self.revisions[rid]);
+		
+	# overwrite the values of an existing record, in the same order as for addRecord()
+	def setRecord(self, rid, path, fileCode, propCode, flags, revision):
+		self.paths[rid] = intern(path);
+		self.fileCodes[rid] = fileCode;
+		self.propCodes[rid] = propCode;
+		self.flags[rid] = flags;
+		self.revisions[rid] = revision;
+		
+	# Utilities ------------------------------------------
+	
+	# approximate number of bytes used by the store
+	def memoryUsage(self):
+		# arrays + path list
+		total = sum(sys.getsizeof(col) for col in (self.paths, self.fileCodes, self.propCodes, self.flags, self.revisions));
 		
-		self.path = "";
+		# strings for the paths
+		total += sum(sys.getsizeof(path) for path in self.paths);
 		
-		self.file_status = SvnStatusListItem.FileStatusMap[' '];
-		self.prop_status = SvnStatusListItem.PropStatusMap[' '];
+		return total;
+
+#########################################
+# List Item Datatypes
+
+# Data item that occurs in SvnStatusList's model
+#
+# This is only a view onto a record in a SvnStatusRecordStore, so the same
+# record may be represented by several item objects (which compare equal).
+# Whatever produces lots of items (i.e. status parsers) should create them all
+# in a store of its own, as a store per item costs far more than the record
+# does. Adding an item to a list copies its record into the list's store.
+class SvnStatusListItem(object):
+	# Class Defines ======================================
+	# File Status (see SvnStatusCodes)
+	FileStatusMap = SvnStatusCodes.FileStatusMap;
+	
+	# Property Status (see SvnStatusCodes)
+	PropStatusMap = SvnStatusCodes.PropStatusMap;
+	
+	# "svn status --xml" item/props attribute values -> status codes used above
+	XmlFileStatusCodes = {
+		'normal':' ',
+		'none':' ',
+		'added':'A',
+		'conflicted':'C',
+		'deleted':'D',
+		'ignored':'I',
+		'modified':'M',
+		'merged':'M',
+		'replaced':'R',
+		'external':'X',
+		'unversioned':'?',
+		'missing':'!',
+		'incomplete':'!',
+		'obstructed':'~'
+	}
+	
+	XmlPropStatusCodes = {
+		'normal':' ',
+		'none':' ',
+		'conflicted':'C',
+		'modified':'M'
+	}
+	
+	# File status codes for items which aren't included in operations by default
+	DisabledFileCodes = frozenset((' ', 'C', 'I', 'X', '?', '!'));
+	
+	# Instance Settings ==================================
+	__slots__ = (
+		'store',	# (SvnStatusRecordStore) store where the data for the item lives
+		'rid',		# (int) id of the item's record within the store
+	);
+	
+	# Setup ==============================================
+	
+	# ctor
+	# < (initStr): (str) optional string to parse to get relevant info
+	# < (store): (SvnStatusRecordStore) store to add the item's record to, otherwise the item gets a store of its own
+	# < (rid): (int) existing record in store to provide a view for, instead of adding a new one
+	def __init__(self, initStr=None, store=None, rid=None):
+		if rid is not None:
+			# view of an existing record
+			self.store = store;
+			self.rid = rid;
+		else:
+			# init placeholders in a new record
+			self.store = store if (store is not None) else SvnStatusRecordStore();
+			self.rid = self.store.addRecord("", ' ', ' ', SvnStatusRecordStore.FLAG_ENABLED, 0);
 		
 		# initialise from string
 		if initStr:
@@ -63,67 +292,385 @@ class SvnStatusListItem:
 			
 			# decipher status string
 				# col 1: file status
-			self.file_status = SvnStatusListItem.FileStatusMap[statusStr[0]];
+			if statusStr[0] not in SvnStatusListItem.FileStatusMap:
+				raise KeyError, statusStr[0];
+			self.fileCode = statusStr[0];
+			
 				# col 2: property status
-			self.prop_status = SvnStatusListItem.PropStatusMap[statusStr[1]];
+			if statusStr[1] not in SvnStatusListItem.PropStatusMap:
+				raise KeyError, statusStr[1];
+			self.propCode = statusStr[1];
 			
 			# modify enabled status from placeholder
 			self.setAutoDefaultEnabledStatus();
 		except:
 			pass;
+			
+	# set settings from the attributes of an "svn status --xml" entry
+	# < path: (str) path of the entry
+	# < attrs: (dict) attributes of the entry's <wc-status> element
+	def fromXmlAttrs(self, path, attrs):
+		self.path = path;
+		
+		# status codes - unknown values are treated as having no changes
+		self.fileCode = SvnStatusListItem.XmlFileStatusCodes.get(attrs.get('item'), ' ');
+		self.propCode = SvnStatusListItem.XmlPropStatusCodes.get(attrs.get('props'), ' ');
+		
+		# revision - not present for unversioned items
+		if 'revision' in attrs:
+			self.revision = int(attrs['revision']);
+		
+		# node kind - newer clients report this, otherwise we need to check what's on disk
+		if 'kind' in attrs:
+			self.kind = attrs['kind'];
+		else:
+			fullPath = os.path.join(project.workingCopyDir, path);
+			
+			if os.path.isdir(fullPath):
+				self.kind = 'dir';
+			elif os.path.exists(fullPath):
+				self.kind = 'file';
+			else:
+				self.kind = 'none';
+		
+		# modify enabled status from placeholder
+		self.setAutoDefaultEnabledStatus();
+		
+	# Identity =================================================
+	
+	# items are the same if they refer to the same record
+	def __eq__(self, other):
+		return isinstance(other, SvnStatusListItem) and (self.store is other.store) and (self.rid == other.rid);
+	
+	def __ne__(self, other):
+		return not self.__eq__(other);
+	
+	def __hash__(self):
+		return hash((id(self.store), self.rid));
+	
+	# Record Access ============================================
+	
+	# (str) path relative to working copy
+	def _getPath(self):
+		return self.store.paths[self.rid];
+	def _setPath(self, value):
+		self.store.paths[self.rid] = intern(value);
+	path = property(_getPath, _setPath);
+	
+	# (str) file status code - key in FileStatusMap
+	def _getFileCode(self):
+		return self.store.fileCodes[self.rid];
+	def _setFileCode(self, value):
+		self.store.fileCodes[self.rid] = value;
+	fileCode = property(_getFileCode, _setFileCode);
+	
+	# (str) property status code - key in PropStatusMap
+	def _getPropCode(self):
+		return self.store.propCodes[self.rid];
+	def _setPropCode(self, value):
+		self.store.propCodes[self.rid] = value;
+	propCode = property(_getPropCode, _setPropCode);
+	
+	# (str) user-visible file status (read-only - set fileCode instead)
+	@property
+	def file_status(self):
+		return SvnStatusListItem.FileStatusMap[self.store.fileCodes[self.rid]];
+	
+	# (str) user-visible property status (read-only - set propCode instead)
+	@property
+	def prop_status(self):
+		return SvnStatusListItem.PropStatusMap[self.store.propCodes[self.rid]];
+	
+	# (bool) whether item is included in operations by default
+	def _getDefaultEnabled(self):
+		return bool(self.store.flags[self.rid] & SvnStatusRecordStore.FLAG_ENABLED);
+	def _setDefaultEnabled(self, value):
+		if value:
+			self.store.flags[self.rid] |= SvnStatusRecordStore.FLAG_ENABLED;
+		else:
+			self.store.flags[self.rid] &= ~SvnStatusRecordStore.FLAG_ENABLED;
+	defaultEnabled = property(_getDefaultEnabled, _setDefaultEnabled);
+	
+	# (str) 'file', 'dir', or 'none' - only known when parsed from xml, otherwise None
+	def _getKind(self):
+		return SvnStatusRecordStore.FlagKinds[self.store.flags[self.rid] & SvnStatusRecordStore.KIND_MASK];
+	def _setKind(self, value):
+		flags = self.store.flags[self.rid] & ~SvnStatusRecordStore.KIND_MASK;
+		self.store.flags[self.rid] = flags | SvnStatusRecordStore.KindFlags[value];
+	kind = property(_getKind, _setKind);
+	
+	# (int) working revision - only known when parsed from xml, otherwise None
+	def _getRevision(self):
+		if self.store.flags[self.rid] & SvnStatusRecordStore.FLAG_REVISION:
+			return self.store.revisions[self.rid];
+		else:
+			return None;
+	def _setRevision(self, value):
+		if value is None:
+			self.store.flags[self.rid] &= ~SvnStatusRecordStore.FLAG_REVISION;
+			self.store.revisions[self.rid] = 0;
+		else:
+			self.store.flags[self.rid] |= SvnStatusRecordStore.FLAG_REVISION;
+			self.store.revisions[self.rid] = value;
+	revision = property(_getRevision, _setRevision);
 	
 	# Enabled Status ===========================================
 	
 	# automatically determine whether "default enabled" status is on
 	def setAutoDefaultEnabledStatus(self):
 		# disable based on file status, so check on each of the bad ones...
-		badKeys = (' ', 'C', 'I', 'X', '?', '!');
-		
-		for k in badKeys:	
-			if self.file_status == SvnStatusListItem.FileStatusMap[k]:
-				self.defaultEnabled = False;
-				break;
-		else:
-			# by default (i.e. if nothing caught), this is on
-			self.defaultEnabled = True;
+		self.defaultEnabled = (self.fileCode not in SvnStatusListItem.DisabledFileCodes);
 			
 	# Utility Methods ==========================================
 	
 	# Check if path is a directory or file
 	# > returns: (bool) True if path is a directory
 	def isDir(self):
+		# use node kind if we've already got it
+		kind = self.kind;
+		if kind is not None:
+			return kind == 'dir';
+		
 		# get full pathname
 		fullPath = os.path.join(project.workingCopyDir, self.path);
 		
 		# check if this is a directory
 		return os.path.isdir(fullPath);
 
+#########################################
+# Status Output Parsing
+
+# Incremental parser for the output of "svn status --xml"
+#
+# Data can be fed in as it arrives from the process (in chunks of any size),
+# with an SvnStatusListItem getting passed to the callback as soon as each
+# <entry> element has been closed.
+class SvnStatusXmlParser:
+	__slots__ = (
+		'itemCb',		# (fn(SvnStatusListItem)) callback for each completed item
+		'store',		# (SvnStatusRecordStore) store that the items get created in
+		
+		'parser',		# (xml.parsers.expat.xmlparser) underlying incremental parser
+		'failed',		# (bool) whether parsing has stopped due to malformed input
+		
+		'curPath',		# (str) path of <entry> currently being parsed
+		'curAttrs',		# (dict) attributes of <wc-status> for the current entry
+	);
+	
+	# Setup ==============================================
+	
+	# ctor
+	# < itemCb: (fn(SvnStatusListItem)) callback for each completed item
+	def __init__(self, itemCb):
+		self.itemCb = itemCb;
+		self.store = SvnStatusRecordStore();
+		
+		self.failed = False;
+		
+		self.curPath = None;
+		self.curAttrs = None;
+		
+		# set up parser - we want utf-8 strings back, not unicode
+		self.parser = xml.parsers.expat.ParserCreate();
+		self.parser.returns_unicode = False;
+		self.parser.buffer_text = True;
+		
+		self.parser.StartElementHandler = self.startElement;
+		self.parser.EndElementHandler = self.endElement;
+		
+	# Methods ============================================
+	
+	# feed some more data to the parser
+	# < data: (str) chunk of xml text
+	def feed(self, data):
+		self._parse(data, False);
+	
+	# no more data is coming - flush out the last of the items
+	def close(self):
+		self._parse('', True);
+		
+	# Internal ===========================================
+	
+	# wrapper around parser which stops parsing for good on the first error
+	def _parse(self, data, isFinal):
+		if self.failed:
+			return;
+		
+		try:
+			self.parser.Parse(data, isFinal);
+		except xml.parsers.expat.ExpatError, e:
+			print "SvnStatusXmlParser: malformed status output - %s" % (e)
+			self.failed = True;
+	
+	# Expat Callbacks ------------------------------------
+	
+	def startElement(self, name, attrs):
+		if name == 'entry':
+			self.curPath = attrs.get('path', "");
+			self.curAttrs = {};
+		elif (name == 'wc-status') and (self.curPath is not None):
+			self.curAttrs = attrs;
+	
+	def endElement(self, name):
+		if (name == 'entry') and (self.curPath is not None):
+			item = SvnStatusListItem(store=self.store);
+			item.fromXmlAttrs(self.curPath, self.curAttrs);
+			
+			self.curPath = None;
+			self.curAttrs = None;
+			
+			self.itemCb(item);
+
 #########################################
 # Reusable List Datatype
 
-# A list of SvnStatusListItem's - subclass of list
-class SvnStatusListDatalist(list):
+# A list of SvnStatusListItem's
+#
+# Only the ids of records are kept in the list, with the records themselves
+# living in a SvnStatusRecordStore which may be shared with other lists
+# (i.e. copies and filtered versions of a list). Items are returned as views
+# onto these records.
+class SvnStatusListDatalist(object):
 	# Class Defines =========================================
 	# Name of file to output own data to
 	TARGETS_FILENAME = "duality_targets.oplist"; # FIXME: move out of this function
 	
+	# Instance Settings =====================================
+	__slots__ = (
+		'store',	# (SvnStatusRecordStore) where the records for the items live
+		'rids',		# (array<long>) ids of the records in the list, in list order
+	);
+	
+	# Setup =================================================
+	
+	# ctor
+	# < (store): (SvnStatusRecordStore) store to share with another list, otherwise a new one is created
+	# < (rids): (iterable<int>) ids of records in store to populate list with
+	def __init__(self, store=None, rids=None):
+		if store is not None:
+			self.store = store;
+		else:
+			self.store = SvnStatusRecordStore();
+		
+		if rids is not None:
+			self.rids = array('l', rids);
+		else:
+			self.rids = array('l');
+	
+	# get an item view for a record
+	def _item(self, rid):
+		return SvnStatusListItem(store=self.store, rid=rid);
+		
+	# get the id of the record for an item in this list's store, copying the record across if necessary
+	# - the item itself is left alone, so it still refers to the original record
+	def _adopt(self, item):
+		if item.store is not self.store:
+			return self.store.addRecord(*item.store.getRecord(item.rid));
+		
+		return item.rid;
+		
+	# Container Protocol ====================================
+	
+	def __len__(self):
+		return len(self.rids);
+		
+	def __iter__(self):
+		for rid in self.rids:
+			yield SvnStatusListItem(store=self.store, rid=rid);
+	
+	def __getitem__(self, index):
+		if isinstance(index, slice):
+			# slices are lists sharing the same store
+			return SvnStatusListDatalist(self.store, self.rids[index]);
+		else:
+			return self._item(self.rids[index]);
+			
+	def __delitem__(self, index):
+		del self.rids[index];
+	
+	def __contains__(self, item):
+		return (item.store is self.store) and (item.rid in self.rids);
+	
 	# List Ops ==============================================
 	
+	# add item to end of list
+	# > return[0]: (int) id of the item's record in the list's store
+	def append(self, item):
+		rid = self._adopt(item);
+		self.rids.append(rid);
+		return rid;
+	
+	# add items to end of list
+	# > return[0]: (list<int>) ids of the items' records in the list's store
+	def extend(self, items):
+		rids = [self._adopt(item) for item in items];
+		self.rids.extend(rids);
+		return rids;
+	
+	# insert item before the given index
+	# > return[0]: (int) id of the item's record in the list's store
+	def insert(self, index, item):
+		rid = self._adopt(item);
+		self.rids.insert(index, rid);
+		return rid;
+	
+	# get index of item in the list
+	# ! raises ValueError if item isn't in the list
+	def index(self, item):
+		if item.store is not self.store:
+			raise ValueError, "item is not in list";
+		
+		return self.rids.index(item.rid);
+		
+	# remove item from the list
+	# ! raises ValueError if item isn't in the list
+	def remove(self, item):
+		del self.rids[self.index(item)];
+	
+	# sort the list in place
+	# < key: (fn(SvnStatusListItem)) key function
+	# < (reverse): (bool) whether sort is in descending order
+	def sort(self, key, reverse=False):
+		store = self.store;
+		self.rids = array('l', sorted(self.rids, key=lambda rid: key(SvnStatusListItem(store=store, rid=rid)), reverse=reverse));
+	
 	# make a copy of self
 	def copy(self):
-		nList = SvnStatusListDatalist();
-		nList[:] = self[:];
-		
-		return nList;
+		return SvnStatusListDatalist(self.store, self.rids);
 	
 	# populate from given list
 	# ! makes a copy of the new list's contents
 	def replaceAll(self, newList):
-		self[:] = newList[:];
+		if isinstance(newList, SvnStatusListDatalist) and (newList.store is self.store):
+			self.rids = array('l', newList.rids);
+		else:
+			self.rids = array('l');
+			self.extend(newList);
 	
 	# clear list
+	# ! the list gets a fresh store, so that any lists still sharing the old one are unaffected
 	def clearAll(self):
-		self[:] = [];
+		self.store = SvnStatusRecordStore();
+		self.rids = array('l');
+	
+	# get the number of records in the list's store which aren't in the list (anymore)
+	def numUnusedRecords(self):
+		return len(self.store) - len(self.rids);
+	
+	# move the list's records into a fresh store, leaving behind those which aren't in the list anymore
+	# ! like clearAll(), any lists still sharing the old store are unaffected
+	# > return[0]: (dict<int, int>) new record id for each old one in the list
+	def compact(self):
+		oldStore = self.store;
+		self.store = SvnStatusRecordStore();
+		
+		newRids = {};
+		for rid in self.rids:
+			if rid not in newRids:
+				newRids[rid] = self.store.addRecord(*oldStore.getRecord(rid));
+		
+		self.rids = array('l', (newRids[rid] for rid in self.rids));
+		return newRids;
 	
 	# Special Ops ============================================
 	
@@ -133,13 +680,8 @@ class SvnStatusListDatalist(list):
 	# < cb: (fn(SvnStatusListItem)=bool) predicate function to apply
 	# > return[0]: (SvnStatusListDatalist) a new list with the unwanted items filtered out 
 	def getFiltered(self, cb):
-		nList = SvnStatusListDatalist();
-		
-		for item in self:
-			if cb(item):
-				nList.append(item);
-		
-		return nList;
+		store = self.store;
+		return SvnStatusListDatalist(store, [rid for rid in self.rids if cb(SvnStatusListItem(store=store, rid=rid))]);
 	
 	# Outputting to File --------------------------------------
 	
@@ -162,13 +704,93 @@ class SvnStatusListDatalist(list):
 		fileN = self.getPathsFileName(opName);
 		
 		# write (full) paths only to file
+		paths = self.store.paths;
 		with open(fileN, 'w') as f:
-			for item in self:
-				f.write(item.path + '\n');
+			for rid in self.rids:
+				f.write(paths[rid] + '\n');
 		
 		# return the full filename
 		return fileN;
 
+#########################################
+# Selection Datatype
+
+# Set of (checked) SvnStatusListItem's, which remembers the order that items were added in
+# - membership tests, adding and removing are all O(1), as these get performed for every 
+#   painted checkbox or toggled item
+# - only record ids are kept, so all items must come from the same store
+class SvnStatusListSelection(object):
+	__slots__ = (
+		'store',	# (SvnStatusRecordStore) store that the selected items belong to
+		'rids',		# (OrderedDict<int, bool>) ids of selected records, in the order they were added
+	);
+	
+	# Setup =================================================
+	
+	# ctor
+	# < store: (SvnStatusRecordStore) store that the selected items belong to
+	def __init__(self, store):
+		self.store = store;
+		self.rids = OrderedDict();
+	
+	# Container Protocol ====================================
+	
+	def __contains__(self, item):
+		return item.rid in self.rids;
+	
+	def __len__(self):
+		return len(self.rids);
+	
+	def __iter__(self):
+		for rid in self.rids:
+			yield SvnStatusListItem(store=self.store, rid=rid);
+	
+	# List Ops ==============================================
+	
+	# add an item (which is kept in its original position if already present)
+	def append(self, item):
+		self.rids[item.rid] = True;
+	
+	# add all the given items
+	def extend(self, items):
+		for item in items:
+			self.rids[item.rid] = True;
+	
+	# remove an item - nothing happens if item wasn't present
+	def remove(self, item):
+		self.rids.pop(item.rid, None);
+	
+	# clear selection
+	# < (store): (SvnStatusRecordStore) new store for items, if the old one has been replaced
+	def clearAll(self, store=None):
+		self.rids.clear();
+		
+		if store is not None:
+			self.store = store;
+	
+	# replace selection with the given items
+	def replaceAll(self, newItems):
+		self.rids.clear();
+		self.extend(newItems);
+	
+	# make a copy of the selected items as a plain list (in selection order)
+	# > return[0]: (SvnStatusListDatalist)
+	def copy(self):
+		return SvnStatusListDatalist(self.store, self.rids.iterkeys());
+	
+	# Range Ops =============================================
+	
+	# select a range of items (i.e. a slice of the model's list)
+	# < items: (iterable<SvnStatusListItem>) items to select
+	def selectRange(self, items):
+		self.extend(items);
+	
+	# deselect a range of items (i.e. a slice of the model's list)
+	# < items: (iterable<SvnStatusListItem>) items to deselect
+	def deselectRange(self, items):
+		for item in items:
+			self.rids.pop(item.rid, None);
+
 #########################################
 # Data Model (Tailored for UI)
 
@@ -179,6 +801,10 @@ class SvnStatusListItemModel(QAbstractItemModel):
 	# Header labels
 	HeaderLabels = ("Path", "Status", "Prop Status");
 	
+	# Number of records of removed rows that can be left lying around before they get cleared out
+	# (or the number of rows, if that's more - i.e. the store never ends up more than twice the size needed)
+	MIN_COMPACT_RECORDS = 1024;
+	
 	# Setup =================================================
 	
 	# ctor
@@ -192,11 +818,14 @@ class SvnStatusListItemModel(QAbstractItemModel):
 			self.listItems = listItems;
 		else:
 			self.listItems = SvnStatusListDatalist();
-		self.checked = SvnStatusListDatalist();
+		self.checked = SvnStatusListSelection(self.listItems.store);
 		
 		# checkboxes will only be shown if we're not being supplied with
 		# a list to simply display again (in another place)
 		self.checksOn = (listItems is None);
+		
+		# items are from an old snapshot, and may no longer be accurate
+		self.stale = False;
 	
 	# Methods ===============================================
 	
@@ -207,38 +836,134 @@ class SvnStatusListItemModel(QAbstractItemModel):
 		self.beginInsertRows(QModelIndex(), idx, idx);
 		
 		# add to list
-		self.listItems.append(item);
+		rid = self.listItems.append(item);
 		
 		# if "defaultEnabled", add to checked list
 		if item.defaultEnabled:
-			self.checked.append(item);
+			self.checked.rids[rid] = True;
+		
+		# done updating
+		self.endInsertRows();
+		
+	# add a batch of entries, using only a single insert notification for the lot
+	# < items: (list<SvnStatusListItem>) items to append to the end of the list
+	def addBatch(self, items):
+		# nothing to do?
+		if not items:
+			return;
+		
+		# warn everybody to update
+		first = len(self.listItems);
+		last = first + len(items) - 1;
+		self.beginInsertRows(QModelIndex(), first, last);
+		
+		# add to lists, with "defaultEnabled" items being checked
+		rids = self.listItems.extend(items);
+		for rid, item in zip(rids, items):
+			if item.defaultEnabled:
+				self.checked.rids[rid] = True;
 		
 		# done updating
 		self.endInsertRows();
 		
 	# remove entry
 	def remove(self, item):
-		# get index for item, and use this to continue if valid
-		ind = self.index(item);
-		if ind.isValid() == False:
+		# get row for item, and use this to continue if valid
+		try:
+			idx = self.listItems.index(item);
+		except ValueError:
 			print "SvnStatusListItemModel doesn't have this item to remove"
 			return;
 			
 		# warn everyone to update
-		idx = ind.row();
 		self.beginRemoveRows(QModelIndex(), idx, idx);
 		
 		# remove item from lists
-		# 	- try catch is needed just in case item doesn't exist in one of these lists still
-		try:
-			self.listItems.remove(item);
-			self.checked.remove(item);
-		except:
-			pass;
+		del self.listItems[idx];
+		self.checked.remove(item);
 		
 		# done 
 		self.endRemoveRows();
 		
+		self.compactIfNeeded();
+		
+		
+	# merge the results of a partial refresh into the list, updating existing rows in place
+	# < items: (iterable<SvnStatusListItem>) fresh status for the paths covered by the refresh
+	# < inScopeCb: (fn(path:str)=bool) whether the refresh covered the given path
+	#	- rows within scope that don't have a fresh item no longer have a status to show, so get removed
+	def mergeItems(self, items, inScopeCb):
+		fresh = OrderedDict((item.path, item) for item in items);
+		
+		store = self.listItems.store;
+		rids = self.listItems.rids;
+		
+		# update rows which still have a status, and find the ones which don't
+		firstChanged = lastChanged = None;
+		stale = [];
+		
+		for row, rid in enumerate(rids):
+			path = store.paths[rid];
+			item = fresh.pop(path, None);
+			
+			if item is not None:
+				record = item.store.getRecord(item.rid);
+				
+				if record != store.getRecord(rid):
+					# checked state is only reset when the status itself changes, so that user's choices are kept
+					if (record[1] != store.fileCodes[rid]) and self.checksOn:
+						if item.defaultEnabled:
+							self.checked.rids[rid] = True;
+						else:
+							self.checked.rids.pop(rid, None);
+					
+					store.setRecord(rid, *record);
+					
+					if firstChanged is None:
+						firstChanged = row;
+					lastChanged = row;
+			elif inScopeCb(path):
+				stale.append(row);
+		
+		if firstChanged is not None:
+			self.dataChanged.emit(self.index(firstChanged, 0, QModelIndex()), 
+			                      self.index(lastChanged, len(SvnStatusListItemModel.HeaderLabels) - 1, QModelIndex()));
+		
+		# remove stale rows - in contiguous runs, from the end so that row numbers stay valid
+		while stale:
+			last = stale.pop();
+			first = last;
+			while stale and (stale[-1] == first - 1):
+				first = stale.pop();
+			
+			self.beginRemoveRows(QModelIndex(), first, last);
+			
+			for rid in rids[first:last+1]:
+				self.checked.rids.pop(rid, None);
+			del rids[first:last+1];
+			
+			self.endRemoveRows();
+		
+		# anything left is new
+		self.addBatch(fresh.values());
+		
+		self.compactIfNeeded();
+	
+	# get rid of the records of rows which have been removed, once there are enough of them to be worth it
+	# - rows stay where they are, so nothing needs to be told about this
+	def compactIfNeeded(self):
+		unused = self.listItems.numUnusedRecords();
+		if unused < max(SvnStatusListItemModel.MIN_COMPACT_RECORDS, len(self.listItems)):
+			return;
+		
+		# the selection needs to refer to the new records too (keeping the order things were checked in)
+		newRids = self.listItems.compact();
+		
+		checked = SvnStatusListSelection(self.listItems.store);
+		for rid in self.checked.rids:
+			if rid in newRids:
+				checked.rids[newRids[rid]] = True;
+		self.checked = checked;
 		
 	# clear all entries
 	def clearAll(self):
@@ -247,12 +972,36 @@ class SvnStatusListItemModel(QAbstractItemModel):
 		self.beginRemoveRows(QModelIndex(), 0, totLen);
 		
 		# clear lists
+		# - the list gets a new store for its records, which the selection needs to use too
 		self.listItems.clearAll();
-		self.checked.clearAll();
+		self.checked.clearAll(self.listItems.store);
 		
 		# done
 		self.endRemoveRows();
 		
+	# replace all entries with the given list (e.g. one loaded from a snapshot)
+	# < listItems: (SvnStatusListDatalist) list to show - this is used directly, not copied
+	# < (stale): (bool) whether the items may no longer be accurate
+	def setItems(self, listItems, stale=False):
+		self.beginResetModel();
+		
+		self.listItems = listItems;
+		self.checked = SvnStatusListSelection(listItems.store);
+		self.checked.extend(listItems.getFiltered(lambda item: item.defaultEnabled));
+		
+		self.stale = stale;
+		
+		self.endResetModel();
+		
+	# set whether the items may no longer be accurate (in which case they're shown greyed out)
+	def setStale(self, stale):
+		if stale != self.stale:
+			self.stale = stale;
+			
+			if len(self.listItems):
+				self.dataChanged.emit(self.index(0, 0, QModelIndex()), 
+				                      self.index(len(self.listItems) - 1, len(SvnStatusListItemModel.HeaderLabels) - 1, QModelIndex()));
+		
 	# get the item associated with the given index
 	# < index: (QModelIndex) cell id wrapper
 	# > return[0]: (SvnStatusListItem) item at this index (corresponding to row only)
@@ -274,6 +1023,26 @@ class SvnStatusListItemModel(QAbstractItemModel):
 			self.checked.replaceAll(self.listItems);
 			
 		self.endResetModel();
+		
+	# check or uncheck a contiguous range of rows
+	# < first: (int) first row of range
+	# < last: (int) last row of range (inclusive)
+	# < state: (bool) whether the rows should be checked
+	def setRowsChecked(self, first, last, state):
+		# can only be done when there are checkboxes
+		if not self.checksOn:
+			return;
+		
+		# apply to the selection
+		items = self.listItems[first:last+1];
+		
+		if state:
+			self.checked.selectRange(items);
+		else:
+			self.checked.deselectRange(items);
+		
+		# only the checkbox column needs redrawing
+		self.dataChanged.emit(self.index(first, 0, QModelIndex()), self.index(last, 0, QModelIndex()));
 	
 	# QAbstractItemMode implementation ======================
 	
@@ -310,7 +1079,8 @@ class SvnStatusListItemModel(QAbstractItemModel):
 			return QModelIndex();
 			
 		# create model-index wrapper for this cell
-		return self.createIndex(row, col, self.listItems[row]); # last arg err...
+		# - items are only views created on demand, so there's nothing to keep a pointer to
+		return self.createIndex(row, col);
 	
 	# get QtCore.Qt.ItemFlags
 	def flags(self, index):
@@ -335,61 +1105,40 @@ class SvnStatusListItemModel(QAbstractItemModel):
 		if not index.isValid():
 			return None;
 		
-		# get item
-		item = self.getItem(index);
+		# get record for item - the lookup tables work directly off this
+		store = self.listItems.store;
+		rid = self.listItems.rids[index.row()];
+		
+		col = index.column();
 		
 		# what data to return
 		if role == Qt.DisplayRole:
 			# display data - depends on the index
-			if index.column() == 2:
+			if col == 2:
 				# property status
-				return QVariant(item.prop_status);
-			elif index.column() == 1:
+				return SvnStatusCodes.PropStatusDisplay[store.propCodes[rid]];
+			elif col == 1:
 				# status
-				return QVariant(item.file_status);
+				return SvnStatusCodes.FileStatusDisplay[store.fileCodes[rid]];
 			else:
 				# path
-				return QVariant(item.path);
+				return QVariant(store.paths[rid]);
 		elif role == Qt.ForegroundRole:
-			# text color
-			if index.column() == 1:
-				# status of file = color
-				colorMap = {
-					' ':QColor(Qt.lightGray),
-					'A':QColor(Qt.darkCyan),
-					'C':QColor(Qt.red),
-					'D':QColor(Qt.darkMagenta),
-					'I':QColor(Qt.darkYellow),
-					'M':QColor(Qt.blue),
-					'R':QColor(Qt.darkCyan),
-					'X':QColor(Qt.yellow),
-					'?':QColor(Qt.gray),
-					'!':QColor(Qt.darkRed),
-					'~':QColor(Qt.darkRed) #versioned item obstructed by some item of a different kind
-				}
-				
-				# find the right one that matches for this item
-				# FIXME: a bimap would solve this easily...
-				for shortKey,longKey in SvnStatusListItem.FileStatusMap.iteritems():
-					if longKey == item.file_status:
-						return colorMap[shortKey];
-				else:
-					# no appropriate decoration found
-					return None;
+			# text color - status of file only (unless everything is out of date)
+			if self.stale:
+				return SvnStatusCodes.StaleBrush;
+			elif col == 1:
+				return SvnStatusCodes.FileStatusBrushes.get(store.fileCodes[rid]);
 			else:
 				return None;
 		elif role == Qt.ToolTipRole:
-			# construct tooltip for all entries
-			tooltipTemplate = "\n".join([
-				"<b>Path:</b> %s",
-				"<b>File Status:</b> %s",
-				"<b>Property Status:</b> %s"]);
-			
-			return QVariant(tooltipTemplate % (item.path, item.file_status, item.prop_status));
+			# tooltip for all entries
+			template = SvnStatusCodes.TooltipTemplates[store.fileCodes[rid] + store.propCodes[rid]];
+			return QVariant(template % (store.paths[rid]));
 		elif (role == Qt.CheckStateRole) and (self.checksOn):
 			# checkable - for first column only
-			if index.column() == 0:
-				return Qt.Checked if item in self.checked else Qt.Unchecked;
+			if col == 0:
+				return Qt.Checked if rid in self.checked.rids else Qt.Unchecked;
 			else:
 				return None;
 		else:
@@ -445,12 +1194,75 @@ class SvnStatusListItemModel(QAbstractItemModel):
 		# done!
 		self.endResetModel(); 
 
+#########################################
+# Bulk Loading
+
+# Buffers items for a SvnStatusListItemModel, adding them to the model in
+# chunks (when enough have accumulated or a short while after the first
+# arrives), so that views only need to relayout once per chunk
+class SvnStatusListBatcher(QObject):
+	# Class Defines =========================================
+	# Number of items that will trigger a flush
+	FLUSH_SIZE = 2000;
+	
+	# Maximum time (ms) that items are held back for
+	FLUSH_INTERVAL = 100;
+	
+	# Setup =================================================
+	
+	# ctor
+	# < model: (SvnStatusListItemModel) model that items get added to
+	# < (parent): (QObject) owner of the batcher
+	def __init__(self, model, parent=None):
+		super(SvnStatusListBatcher, self).__init__(parent);
+		
+		self.model = model;
+		self.pending = [];
+		
+		# timer for flushing what we've got so far
+		self.timer = QTimer(self);
+		self.timer.setSingleShot(True);
+		self.timer.timeout.connect(self.flush);
+	
+	# Methods ===============================================
+	
+	# queue up an item to add to the model
+	# < item: (SvnStatusListItem) item to add
+	def add(self, item):
+		self.pending.append(item);
+		
+		if len(self.pending) >= SvnStatusListBatcher.FLUSH_SIZE:
+			# enough for a chunk already
+			self.flush();
+		elif not self.timer.isActive():
+			# make sure that the first items show up soon
+			self.timer.start(SvnStatusListBatcher.FLUSH_INTERVAL);
+	
+	# add all pending items to the model now
+	def flush(self):
+		self.timer.stop();
+		
+		if self.pending:
+			items = self.pending;
+			self.pending = [];
+			
+			self.model.addBatch(items);
+	
+	# throw away all pending items without adding them
+	def discard(self):
+		self.timer.stop();
+		self.pending = [];
+
 #########################################
 # UI Widget
 
 # Show "status" of files/directories within working copy,
 # allowing some to be included/excluded from SVN operations
 class SvnStatusList(QTreeView):
+	# Class Defines =====================================
+	# Number of rows either side of the current one to prefetch diffs for
+	PREFETCH_NEIGHBOURS = 2;
+	
 	# Setup =============================================
 	
 	# ctor
@@ -467,6 +1279,9 @@ class SvnStatusList(QTreeView):
 		self.setAlternatingRowColors(True);
 		self.setUniformRowHeights(True);
 		
+		# allow ranges of rows to be selected, for (un)checking them all at once
+		self.setSelectionMode(QAbstractItemView.ExtendedSelection);
+		
 		# QAbstractItemView settings
 		# 	tweak for making long paths more useful:
 		#		- only the end of the name matters, so show dots on left to preserve end as much as possible
@@ -522,6 +1337,13 @@ class SvnStatusList(QTreeView):
 		# now restore normal mode so that users can still edit
 		head.setResizeMode(0, QHeaderView.Interactive); # <-- make it editable again
 	
+	# override current item changes to get diffs ready for wherever the user is browsing
+	def currentChanged(self, current, previous):
+		super(SvnStatusList, self).currentChanged(current, previous);
+		
+		if current.isValid():
+			self.prefetchDiffsAround(current.row());
+	
 	# double-click event handler -> get diff for file
 	# < index: (QModelIndex) the index of the item double-clicked on
 	def dblClickHandler(self, index):
@@ -583,15 +1405,18 @@ class SvnStatusList(QTreeView):
 		
 		# 	- dummy define all actions first
 		aDiff = None;
+		aResolve = None;
 		aAddSkip = None;
 		aFreeSkips = None;
+		aCheckSel = None;
+		aUncheckSel = None;
 		
 		# - now the menu items
 		if self.canDiffItem(item):
 			aDiff = menu.addAction("Show changes (diff)");
 			menu.setDefaultAction(aDiff);
 			
-		if "Conflicted" in (item.file_status, item.prop_status):
+		if 'C' in (item.fileCode, item.propCode):
 			aResolve = menu.addAction("Conflicts Resolved");
 		
 		# - 'canBeModified' defines whether the list of items in the list can be changed by user actions
@@ -600,6 +1425,12 @@ class SvnStatusList(QTreeView):
 				aAddSkip = menu.addAction("Hide Path as 'Local-Only Modification' (Hotkey: H)");
 			
 			aFreeSkips = menu.addAction("Show All 'Local-Only Modifications' (Hotkey: Alt H)");
+			
+		# - (un)checking all selected rows at once
+		if self.model.checksOn and self.selectionModel().hasSelection():
+			menu.addSeparator();
+			aCheckSel = menu.addAction("Include Selected Paths");
+			aUncheckSel = menu.addAction("Exclude Selected Paths");
 		
 		# process menu
 		if menu.isEmpty():
@@ -609,7 +1440,10 @@ class SvnStatusList(QTreeView):
 		action = menu.exec_(self.mapToGlobal(event.pos()))
 		
 		# handle events
-		if action == aDiff:
+		if action is None:
+			# menu was dismissed
+			return;
+		elif action == aDiff:
 			self.svnDiff(item);
 		elif action == aAddSkip:
 			project.addSkipPath(item.path);
@@ -618,13 +1452,33 @@ class SvnStatusList(QTreeView):
 			project.clearSkipList();
 			self.emit(SIGNAL('skiplistChanged()'));
 		elif action == aResolve:
-			self.svnResolved(item);
-			self.emit(SIGNAL('skiplistChanged()')); # FIXME: temporary hack for now
+			# only the resolved path needs its status checked again
+			self.svnResolved(item).addDoneCb(lambda sop: self.emit(SIGNAL('pathsChanged'), [item]));
+		elif action in (aCheckSel, aUncheckSel):
+			self.setSelectionChecked(action == aCheckSel);
 	
 	# Methods ===========================================
 	
 	# External API --------------------------------------
 	
+	# Check or uncheck all rows selected in the view
+	# < state: (bool) whether the rows should be checked
+	def setSelectionChecked(self, state):
+		# selections are stored as ranges of rows already, so apply each one in one go
+		for selRange in self.selectionModel().selection():
+			self.model.setRowsChecked(selRange.top(), selRange.bottom(), state);
+		
+		# let others know that the list of items to operate on has changed
+		self.emit(SIGNAL('checkedChanged()'));
+	
+	# Get number of items that operations will be performed on
+	# - cheaper version of len(getOperationList()), for checking whether there's anything to do
+	def getOperationCount(self):
+		if self.model.checksOn:
+			return len(self.model.checked);
+		else:
+			return len(self.model.listItems);
+	
 	# Get list of selected items to operate on
 	def getOperationList(self):
 		# just return a copy of the model's list...
@@ -633,6 +1487,38 @@ class SvnStatusList(QTreeView):
 		else:
 			return self.model.listItems.copy();
 			
+	# Diff Prefetching ----------------------------------
+	
+	# Check whether the built-in diff engine is likely to be able to diff an item
+	# < item: (SvnStatusListItem) status list item to check
+	def canPrefetchDiff(self, item):
+		# only plain changes to the contents of files are handled
+		return (item is not None) and (item.fileCode == 'M') and (item.propCode != 'M') and not item.isDir();
+	
+	# Get diffs for some items ready in the background
+	# < items: (iterable<SvnStatusListItem>) items to prefetch diffs for, most important first
+	# < (urgent): (bool) whether these replace the items that were prefetched before, instead of being done when there's nothing else to do
+	def prefetchDiffs(self, items, urgent=False):
+		branchType = project.getActiveBranchType();
+		if not (project.builtinDiff and SvnWcDiffProcess.canHandle(branchType)):
+			return;
+		
+		paths = [str(item.path) for item in items if self.canPrefetchDiff(item)];
+		if paths:
+			SvnWcDiffPrefetcher.shared().request(branchType, paths, urgent);
+	
+	# Get diffs ready for the item in a row, and those around it, as they're likely to be looked at next
+	# < row: (int) row of the current item
+	def prefetchDiffsAround(self, row):
+		items = self.model.listItems;
+		
+		# nearest ones first
+		rows = [row];
+		for i in xrange(1, SvnStatusList.PREFETCH_NEIGHBOURS + 1):
+			rows += [row + i, row - i];
+		
+		self.prefetchDiffs([items[r] for r in rows if 0 <= r < len(items)], urgent=True);
+	
 	# SVN Diff Operation --------------------------------
 	
 	# Can a diff be performed on the given item?
@@ -655,11 +1541,11 @@ class SvnStatusList(QTreeView):
 			
 		# if only properties changed cannot diff?
 		# XXX: what about for file properties?
-		if item.file_status == SvnStatusListItem.FileStatusMap[' ']:
+		if item.fileCode == ' ':
 			if verbose: 
 				QMessageBox.warning(self, "Show SVN Diff", "File hasn't changed. No changes to display");
 			return False;
-		elif item.file_status == SvnStatusListItem.FileStatusMap['?']:
+		elif item.fileCode == '?':
 			if verbose: 
 				QMessageBox.warning(self, "Show SVN Diff", "File is unversioned. Cannot compare changes against thin air!");
 			return False;
@@ -675,6 +1561,49 @@ class SvnStatusList(QTreeView):
 		if item is None:
 			return;
 		
+		branchType = project.getActiveBranchType();
+		
+		# set up viewer dialog
+		diffView = DiffViewer(self);
+		diffView.show();
+		
+		# try the built-in diff engine first - it reads the pristine copy directly, so it's
+		# much quicker than starting up svn, but it only handles plain changes to text files
+		if project.builtinDiff and SvnWcDiffProcess.canHandle(branchType):
+			# it may have been worked out already
+			cache = SvnWcDiffCache.shared();
+			generation = cache.getGeneration(branchType);
+			cacheKey = cache.makeKey(project.workingCopyDir, branchType, str(item.path));
+			
+			result = cache.lookup(cacheKey);
+			if result is not None:
+				diffView.displayDiffResult(result);
+				return;
+			
+			process = SvnWcDiffProcess(self, "Diff", branchType, str(item.path));
+			process.silentErrors = True;
+			
+			def procDone(sop):
+				# viewer was closed (or loading was cancelled)
+				if sop.status == ProcessStatus.STATUS_CANCELLED:
+					return;
+				
+				if sop.getResult() is not None:
+					cache.store(cacheKey, sop.getResult(), generation=generation);
+					diffView.displayDiffResult(sop.getResult());
+				elif diffView.isVisible():
+					# couldn't handle it, so leave it to svn
+					self.svnDiffProcess(item, diffView);
+			
+			diffView.process = process;
+			process.startAsync().addDoneCb(procDone);
+		else:
+			self.svnDiffProcess(item, diffView);
+	
+	# Get a diff for the file using "svn diff", and display it
+	# < item: (SvnStatusListItem) status list item to show diff for
+	# < diffView: (DiffViewer) viewer to show the diff in
+	def svnDiffProcess(self, item, diffView):
 		# setup process for svn diff operation
 		process = SvnOperationProcess(self, "Diff");
 		branchType = project.getActiveBranchType();
@@ -684,48 +1613,29 @@ class SvnStatusList(QTreeView):
 		process.addDefaultArgs();
 		process.addArgs([str(item.path)]);
 		
+		# stopping it from the viewer (or by closing the viewer) shouldn't count as a failure
+		process.silentErrors = True;
 		
-		# set up viewer dialog
-		diffView = DiffViewer(self);
-		
-		
-		# hook up output redirection code
-		# - output gets stored to a temp list as the "model"
-		process.model = [];
-		# - viewer dialog is used as the "target", for the final stage
-		process.wTarget = diffView;
-		
-		def pushOutput(sop, line):
-			sop.model.append(line);
-		process.handleOutputCb = pushOutput;
-		
-		# - when process exits, diff viewer should be given the concatenated output text (from the model), and then get shown
-		def procDone(sop):
-			sop.wTarget.displayDiff_fromString('\n'.join(sop.model));
-			sop.wTarget.show();
-		process.postEndCb = procDone;
-		
-		
-		# run process (dialog gets shown while this happens)
-		#	- this is run in a blocking manner, since there's no way to cancel this operation
-		#	  from UI, and user probably won't expect anything else
-		process.runBlocking();
+		# run process - the viewer shows the output as it arrives, and can cancel it
+		# (i.e. diffs of generated files can take a long time to come through)
+		diffView.displayDiff_fromProcess(process);
 		
 	# Mark file as having all conflicts resolved already
 	# < item: (SvnStatusListItem) status list item to clear "conflicted" status flags for
+	# > return[0]: (OperationFuture) done once svn has finished
 	# TODO: for now, we can't tell when a file is a textfile, otherwise, 
 	# 		we should check if there are still conflict markers in the file...
 	def svnResolved(self, item):
 		# sanity check
 		if item is None:
-			return;
-			
+			return OperationFuture.resolved();
+		
 		# assume for now that branch type is valid
 		branchType = project.getActiveBranchType();
 		
-		# setup process for svn resolved operation .
-		#	- this is run in a blocking manner, since there's no way to cancel this operation
-		#	  from UI, and user probably won't expect anything else
+		# setup process for svn resolved operation
+		#	- there's no way to cancel this operation from the UI, but the window
+		#	  still needs to keep responding while svn is busy
 		p1 = SvnOperationProcess(self, "Conflict Resolved");
 		p1.setupEnv(branchType);
 		
@@ -733,7 +1643,7 @@ class SvnStatusList(QTreeView):
 		p1.addDefaultArgs();
 		p1.addArgs([str(item.path)]);
 		
-		# run as blocking, since nothing else can happen now
-		p1.runBlocking();
+		# this changes the working copy, so it waits for anything else using it
+		return WcOperationCoordinator.forWorkingCopy().runProcess(p1);
 
 #########################################
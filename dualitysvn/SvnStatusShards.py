@@ -0,0 +1,165 @@
+# Duality SVN
+# Original Author: Joshua Leung
+#
+# Status Shards - splitting up a working copy so that its status can be
+# checked by several "svn status" processes at once
+
+from coreDefines import *
+
+from SvnWcMetadata import detectWcFormat
+
+#########################################
+# Shard Planning
+#
+# The working copy gets split up by its top-level directories:
+#	- the root itself (with "--depth=immediates") is always the first shard, which
+#	  covers all the top-level files and the top-level directories themselves
+#	- the top-level directories get grouped into the remaining shards, with each
+#	  shard being a contiguous run of directories (in sorted order), so that
+#	  joining the output of the shards together keeps everything in order
+#
+# How long each directory took last time is saved beside the project file,
+# so that shards can be balanced by how much work they have, instead of just
+# by the number of directories in each.
+
+class SvnStatusShards:
+	# Class Defines =========================================
+	# Number of shards per allowed process - having a few more shards than processes
+	# means that a slow shard doesn't hold everything else up as much
+	SHARDS_PER_PROCESS = 2;
+	
+	# Weight used for directories that we don't know anything about yet
+	DEFAULT_WEIGHT = 1.0;
+	
+	# Paths ==============================================
+	
+	# get the file that the directory weights are stored in
+	@staticmethod
+	def getFileName():
+		return "%s.shards" % (project.fileN);
+	
+	# get the top-level versioned directories of the working copy of a branch
+	# < adminName: (str) name of admin directories used by the branch
+	# > return[0]: (list<str>) sorted directory names, or None if the metadata couldn't be read
+	@staticmethod
+	def getTopLevelDirs(adminName):
+		wcRoot = project.workingCopyDir;
+		
+		metadataType = detectWcFormat(wcRoot, adminName);
+		if metadataType is None:
+			return None;
+		
+		metadata = metadataType(wcRoot, adminName);
+		try:
+			dirNode, children = metadata.readDir("");
+		except Exception, e:
+			print "Could not read working copy metadata for status shards - %s" % (e)
+			return None;
+		finally:
+			metadata.close();
+		
+		if dirNode is None:
+			return None;
+		
+		# only directories which are actually there can be checked separately
+		# (missing ones still get reported by the root's shard)
+		return sorted(name for name, node in children.iteritems()
+		              if (node.kind == 'dir') and os.path.isdir(os.path.join(wcRoot, name)));
+	
+	# Weights ============================================
+	
+	# load the weights of the top-level directories
+	# > return[0]: (dict<str, float>) seconds taken by each directory last time
+	@staticmethod
+	def loadWeights():
+		weights = {};
+		
+		try:
+			with open(SvnStatusShards.getFileName(), 'r') as f:
+				for line in f:
+					seconds, sep, name = line.rstrip("\n").partition("\t");
+					if sep:
+						weights[name] = float(seconds);
+		except (IOError, ValueError):
+			pass;
+		
+		return weights;
+	
+	# save the weights of the top-level directories
+	# < weights: (dict<str, float>) seconds taken by each directory
+	@staticmethod
+	def saveWeights(weights):
+		# only for projects that have been saved
+		if project.autofile:
+			return;
+		
+		fileN = SvnStatusShards.getFileName();
+		try:
+			with open(fileN, 'w') as f:
+				for name in sorted(weights):
+					f.write("%.3f\t%s\n" % (weights[name], name));
+		except IOError, e:
+			print "Could not save status shard weights to '%s' - %s" % (fileN, e)
+	
+	# update the weights of directories from how long their shards took
+	# - the time for a shard gets shared out between its directories in proportion to their old weights
+	# < weights: (dict<str, float>) weights to update
+	# < shard: (list<str>) directories in the shard
+	# < seconds: (float) time the shard took
+	@staticmethod
+	def updateWeights(weights, shard, seconds):
+		oldWeights = [weights.get(name, SvnStatusShards.DEFAULT_WEIGHT) for name in shard];
+		total = sum(oldWeights);
+		
+		for name, weight in zip(shard, oldWeights):
+			weights[name] = seconds * weight / total;
+	
+	# Partitioning =======================================
+	
+	# split directories into shards with roughly equal amounts of work
+	# < dirs: (list<str>) sorted directory names
+	# < weights: (dict<str, float>) weight for each directory
+	# < numShards: (int) maximum number of shards to create
+	# > return[0]: (list<list<str>>) contiguous runs of directories
+	@staticmethod
+	def partition(dirs, weights, numShards):
+		dirWeights = [max(weights.get(name, SvnStatusShards.DEFAULT_WEIGHT), 0.001) for name in dirs];
+		
+		shards = [];
+		current = [];
+		remaining = sum(dirWeights);
+		accumulated = 0.0;
+		
+		for name, weight in zip(dirs, dirWeights):
+			current.append(name);
+			accumulated += weight;
+			
+			# close off the shard once it has its share of what's left
+			shardsLeft = numShards - len(shards);
+			if (shardsLeft > 1) and (accumulated >= remaining / shardsLeft):
+				shards.append(current);
+				remaining -= accumulated;
+				
+				current = [];
+				accumulated = 0.0;
+		
+		if current:
+			shards.append(current);
+		
+		return shards;
+	
+	# work out the shards for refreshing the status of a branch
+	# < adminName: (str) name of admin directories used by the branch
+	# < maxProcesses: (int) maximum number of processes that will be run at once
+	# > return[0]: (list<list<str>>) directories for each shard after the root's, or None if the
+	#			   working copy shouldn't be split up
+	@staticmethod
+	def plan(adminName, maxProcesses):
+		dirs = SvnStatusShards.getTopLevelDirs(adminName);
+		if not dirs:
+			return None;
+		
+		numShards = maxProcesses * SvnStatusShards.SHARDS_PER_PROCESS;
+		return SvnStatusShards.partition(dirs, SvnStatusShards.loadWeights(), numShards);
+
+#########################################
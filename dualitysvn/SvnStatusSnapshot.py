@@ -0,0 +1,178 @@
+# Duality SVN
+# Original Author: Joshua Leung
+#
+# Status Snapshots - the last status list of each branch gets saved beside
+# the project file, so that it can be shown straight away next time
+
+from coreDefines import *
+
+from array import array
+import hashlib
+import struct
+import zlib
+
+from SvnStatusList import SvnStatusRecordStore, SvnStatusListDatalist
+
+#########################################
+# Snapshot File Format
+#
+# Everything is stored column by column, as in SvnStatusRecordStore, so that
+# loading is just a matter of reading the arrays back in:
+#	- header (see HEADER below)
+#	- file status codes (1 byte each)
+#	- property status codes (1 byte each)
+#	- flags (1 byte each)
+#	- revisions (int32 each, little-endian)
+#	- paths (newline separated, zlib compressed)
+
+class SvnStatusSnapshot:
+	# Class Defines =========================================
+	# Magic bytes identifying snapshot files
+	MAGIC = "DSSC";
+	
+	# Version of file format (bump when changing the layout)
+	VERSION = 1;
+	
+	# Header: magic, version, fingerprint (sha1 digest), number of records
+	HEADER = struct.Struct("<4sH20sI");
+	
+	# File name suffixes for each type of branch
+	BranchSuffixes = {
+		BranchType.TYPE_TRUNK     : "trunk",
+		BranchType.TYPE_TRUNK_REF : "trunk-ref",
+		BranchType.TYPE_BRANCH    : "branch",
+	};
+	
+	# Paths ==============================================
+	
+	# get the file that the snapshot for a branch is stored in
+	# < branchType: (BranchType.TYPE_*)
+	@staticmethod
+	def getFileName(branchType):
+		return "%s.%s.status" % (project.fileN, SvnStatusSnapshot.BranchSuffixes[branchType]);
+	
+	# get the fingerprint identifying the working copy that a snapshot belongs to
+	# - this is only about which working copy (and branch) it is, not its state, as
+	#   snapshots are always treated as being out of date anyway
+	# < branchType: (BranchType.TYPE_*)
+	# > return[0]: (str) sha1 digest
+	@staticmethod
+	def getFingerprint(branchType):
+		if branchType == BranchType.TYPE_BRANCH:
+			url = project.urlBranch;
+		else:
+			url = project.urlTrunk;
+		
+		# the metadata format matters too, as different clients may report things differently
+		adminName = SVN_DIRNAME_BRANCH2 if (branchType == BranchType.TYPE_TRUNK_REF) else SVN_DIRNAME_BRANCH1;
+		adminDir = os.path.join(project.workingCopyDir, adminName);
+		
+		if os.path.exists(os.path.join(adminDir, "wc.db")):
+			wcFormat = "wc.db";
+		else:
+			try:
+				with open(os.path.join(adminDir, "entries"), 'rb') as f:
+					wcFormat = f.readline().strip();
+			except IOError:
+				wcFormat = "";
+		
+		key = "\n".join((os.path.realpath(project.workingCopyDir), adminName, str(url), wcFormat));
+		return hashlib.sha1(key).digest();
+	
+	# Save/Load ==========================================
+	
+	# save the items in a list as the snapshot for a branch
+	# < branchType: (BranchType.TYPE_*)
+	# < listItems: (SvnStatusListDatalist) items to save
+	@staticmethod
+	def save(branchType, listItems):
+		store = listItems.store;
+		rids = listItems.rids;
+		
+		# gather up the columns for the items in the list (as the store may also have records for removed ones)
+		fileCodes = array('c', (store.fileCodes[rid] for rid in rids));
+		propCodes = array('c', (store.propCodes[rid] for rid in rids));
+		flags = array('B', (store.flags[rid] for rid in rids));
+		
+		revisions = array('i', (store.revisions[rid] for rid in rids));
+		if sys.byteorder != 'little':
+			revisions.byteswap();
+		
+		paths = zlib.compress("\n".join(store.paths[rid] for rid in rids));
+		
+		# write to a temp file first, so that there's never a half-written snapshot
+		fileN = SvnStatusSnapshot.getFileName(branchType);
+		tempFileN = fileN + ".tmp";
+		
+		try:
+			with open(tempFileN, 'wb') as f:
+				f.write(SvnStatusSnapshot.HEADER.pack(SvnStatusSnapshot.MAGIC, SvnStatusSnapshot.VERSION,
+				                                       SvnStatusSnapshot.getFingerprint(branchType), len(rids)));
+				
+				for col in (fileCodes, propCodes, flags, revisions):
+					col.tofile(f);
+				f.write(paths);
+			
+			# Windows won't rename over an existing file
+			if os.path.exists(fileN):
+				os.remove(fileN);
+			os.rename(tempFileN, fileN);
+		except (IOError, OSError), e:
+			print "Could not save status snapshot to '%s' - %s" % (fileN, e)
+	
+	# load the snapshot for a branch
+	# < branchType: (BranchType.TYPE_*)
+	# > return[0]: (SvnStatusListDatalist) items in snapshot, or None if there's no usable snapshot
+	@staticmethod
+	def load(branchType):
+		fileN = SvnStatusSnapshot.getFileName(branchType);
+		
+		try:
+			with open(fileN, 'rb') as f:
+				data = f.read();
+		except IOError:
+			return None;
+		
+		try:
+			# header - snapshot must be for this working copy, in a format we know
+			magic, version, fingerprint, count = SvnStatusSnapshot.HEADER.unpack_from(data, 0);
+			
+			if (magic != SvnStatusSnapshot.MAGIC) or (version != SvnStatusSnapshot.VERSION):
+				return None;
+			if fingerprint != SvnStatusSnapshot.getFingerprint(branchType):
+				return None;
+			
+			# columns
+			pos = SvnStatusSnapshot.HEADER.size;
+			
+			columns = [];
+			for typecode in ('c', 'c', 'B', 'i'):
+				col = array(typecode);
+				size = count * col.itemsize;
+				
+				col.fromstring(data[pos:pos+size]);
+				pos += size;
+				
+				columns.append(col);
+			
+			fileCodes, propCodes, flags, revisions = columns;
+			if sys.byteorder != 'little':
+				revisions.byteswap();
+			
+			paths = zlib.decompress(data[pos:]).split("\n") if count else [];
+			if len(paths) != count:
+				return None;
+		except (struct.error, zlib.error, ValueError):
+			return None;
+		
+		# build list directly from the columns
+		store = SvnStatusRecordStore.fromColumns(paths, fileCodes, propCodes, flags, array('l', revisions));
+		listItems = SvnStatusListDatalist(store, xrange(count));
+		
+		# paths may have been added to the skiplist since
+		if project.skiplist:
+			listItems = listItems.getFiltered(lambda item: item.path not in project.skiplist);
+		
+		return listItems;
+
+#########################################
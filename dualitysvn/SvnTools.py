@@ -5,41 +5,369 @@
 
 from coreDefines import *
 
+from multiprocessing.pool import ThreadPool
 import shutil
+import tempfile
+import time
+
+# file cloning is only available on some platforms
+try:
+	import fcntl
+except ImportError:
+	fcntl = None;
+
+from SvnWcMetadata import scanDir
+
+#######################################
+# Pristine File Sharing
+#
+# Pristine copies of files (".svn/text-base/*.svn-base" for 1.6 and earlier,
+# ".svn/pristine/xx/*.svn-base" for 1.7+) are never modified in place by svn -
+# new versions get written elsewhere and moved into place instead. So rather
+# than making full copies of them for "_svn", they can be shared:
+#	- reflinks (copy-on-write clones) are proper copies as far as anything
+#	  else is concerned, but take no extra space or time to make
+#	- hardlinks are the same file, which is only safe as long as changes
+#	  replace the file instead of writing to it
+
+# Ways of duplicating pristine files
+class PristineCopyMode:
+	MODE_COPY, MODE_REFLINK, MODE_HARDLINK = range(3);
+	
+	# User-visible names for each mode
+	Names = {
+		MODE_COPY     : "copies",
+		MODE_REFLINK  : "reflinks",
+		MODE_HARDLINK : "hardlinks",
+	};
+
+# ioctl for cloning a file (Linux - btrfs, xfs, etc.)
+FICLONE = 0x40049409;
+
+# check whether a path (relative to an admin directory) is for a pristine file
+# < relPath: (str) path relative to the ".svn" directory
+def isPristinePath(relPath):
+	first = relPath.split(os.sep, 1)[0];
+	return (first in ('text-base', 'pristine')) and relPath.endswith('.svn-base');
+
+# make a copy-on-write clone of a file
+# ! raises IOError/OSError when the filesystem (or platform) doesn't support this
+def reflinkFile(src, dst):
+	if fcntl is None:
+		raise OSError("File cloning is not supported on this platform");
+	
+	with open(src, 'rb') as srcFile:
+		with open(dst, 'wb') as dstFile:
+			try:
+				fcntl.ioctl(dstFile.fileno(), FICLONE, srcFile.fileno());
+			except IOError:
+				dstFile.close();
+				os.remove(dst);
+				raise;
+	
+	shutil.copystat(src, dst);
+
+# duplicate a pristine file using the given mode
+# ! raises IOError/OSError when this can't be done
+def sharePristineFile(src, dst, mode):
+	if mode == PristineCopyMode.MODE_REFLINK:
+		reflinkFile(src, dst);
+	elif mode == PristineCopyMode.MODE_HARDLINK:
+		os.link(src, dst);
+	else:
+		shutil.copy2(src, dst);
+
+# work out the best way to duplicate pristine files in a directory, checking that it actually works there
+# - a test file is duplicated each way, and then changed the way svn changes pristine files
+#   (i.e. by replacing it), to make sure the other copy is unaffected
+# < testDir: (str) directory to test in (i.e. a ".svn" directory, so that it's on the same filesystem)
+# > return[0]: (PristineCopyMode.MODE_*) best mode that works
+def choosePristineCopyMode(testDir):
+	for mode in (PristineCopyMode.MODE_REFLINK, PristineCopyMode.MODE_HARDLINK):
+		if (mode == PristineCopyMode.MODE_HARDLINK) and not hasattr(os, 'link'):
+			continue;
+		
+		fd, src = tempfile.mkstemp(prefix="duality-", suffix=".tmp", dir=testDir);
+		dst = src + ".shared";
+		replacement = src + ".new";
+		
+		try:
+			with os.fdopen(fd, 'wb') as f:
+				f.write("original");
+			
+			sharePristineFile(src, dst, mode);
+			
+			with open(dst, 'rb') as f:
+				if f.read() != "original":
+					continue;
+			
+			# hardlinks must really be links, otherwise some other way of copying is being faked
+			if mode == PristineCopyMode.MODE_HARDLINK:
+				if (os.stat(src).st_ino != os.stat(dst).st_ino) or (os.stat(dst).st_nlink != 2):
+					continue;
+			
+			# replacing one must leave the other alone
+			with open(replacement, 'wb') as f:
+				f.write("replaced");
+			
+			if os.name == 'nt':
+				os.remove(src);
+			os.rename(replacement, src);
+			
+			with open(dst, 'rb') as f:
+				if f.read() == "original":
+					return mode;
+		except (IOError, OSError):
+			pass;
+		finally:
+			for path in (src, dst, replacement):
+				try:
+					os.remove(path);
+				except OSError:
+					pass;
+	
+	return PristineCopyMode.MODE_COPY;
 
 #######################################
 # Branch Setup Utilities
 
-# Duplicate all ".svn" folders (and their contents) to "_svn" ones recursively
-# - Used for setting up local copy of branch
+# Progress of a metadata copy, as passed to progress callbacks
+class MetadataCopyProgress(object):
+	__slots__ = (
+		'dirsDone', 'dirsTotal',		# (int) metadata directories fully copied / to copy
+		'filesDone', 'filesTotal',		# (int) files copied / to copy
+		'bytesDone', 'bytesTotal',		# (int) bytes copied / to copy
+		'filesShared',					# (int) files which were shared (reflinked/hardlinked) instead of being copied
+		'pristineMode',					# (PristineCopyMode.MODE_*) how pristine files are being duplicated
+		'startTime',					# (float) time when copying started
+	);
+	
+	def __init__(self):
+		self.dirsDone = self.dirsTotal = 0;
+		self.filesDone = self.filesTotal = 0;
+		self.bytesDone = self.bytesTotal = 0;
+		self.filesShared = 0;
+		self.pristineMode = PristineCopyMode.MODE_COPY;
+		self.startTime = time.time();
+	
+	# estimate the number of seconds left, based on how many bytes have been copied so far
+	# > return[0]: (float) seconds, or None if it's too early to tell
+	def getEta(self):
+		if not self.bytesDone:
+			return None;
+		
+		elapsed = time.time() - self.startTime;
+		return elapsed * (self.bytesTotal - self.bytesDone) / self.bytesDone;
+	
+	def __str__(self):
+		eta = self.getEta();
+		if eta is not None:
+			etaStr = "%d:%02d" % divmod(int(eta), 60);
+		else:
+			etaStr = "?";
+		
+		if self.pristineMode != PristineCopyMode.MODE_COPY:
+			sharedStr = "%d shared as %s" % (self.filesShared, PristineCopyMode.Names[self.pristineMode]);
+		else:
+			sharedStr = "none shared";
+		
+		return "Copied %d/%d dirs, %d/%d files (%s, %.1f/%.1f MB) - ETA %s" % (
+			self.dirsDone, self.dirsTotal,
+			self.filesDone, self.filesTotal, sharedStr,
+			self.bytesDone / 1048576.0, self.bytesTotal / 1048576.0,
+			etaStr);
+
+# Find all directories with svn metadata folders for either branch
 #
 # < root: (str) path to directory where root of source tree resides
-# > return[0]: (list) summary of errors that occurred during this process (description+path)
-def duplicateSvnMetadata(root):
-	# error stack
+# > return[0]: (list<tuple>) (path, has ".svn" folder, has "_svn" folder) for each directory with either of these
+# > return[1]: (list) summary of errors that occurred during this process (description+path)
+def scanSvnMetadataDirs(root):
+	dirs = [];
 	errors = [];
 	
-	# traverse directory tree
-	# 	- p: (str) path of the current directory being traversed
-	#	- d: (list<str>) names of directories in current directory being traversed
-	#	- f: (list<str>) names of files in current directory
-	for p,d,f in os.walk(root):
+	pending = [root];
+	while pending:
+		p = pending.pop();
+		
+		# symlinked directories are left alone, as they could lead anywhere (including back up the tree)
+		try:
+			entries = [entry for entry in scanDir(p) if entry.is_dir(follow_symlinks=False)];
+		except OSError, e:
+			errors.append(("Could not read directory - %s" % (e), p));
+			continue;
+		
+		names = set(entry.name for entry in entries);
+		
+		hasPrimary = SVN_DIRNAME_BRANCH1 in names;
+		hasSecondary = SVN_DIRNAME_BRANCH2 in names;
+		
+		if hasPrimary or hasSecondary:
+			dirs.append((p, hasPrimary, hasSecondary));
+		
+		# we mustn't ever enter the metadata folders themselves
+		for entry in entries:
+			if entry.name not in (SVN_DIRNAME_BRANCH1, SVN_DIRNAME_BRANCH2):
+				pending.append(entry.path);
+	
+	return dirs, errors;
+
+# Find all ".svn" folders that need to be duplicated as "_svn" ones
+#
+# < root: (str) path to directory where root of source tree resides
+# > return[0]: (list<str>) directories containing a ".svn" folder to be duplicated
+# > return[1]: (list) summary of errors that occurred during this process (description+path)
+def findSvnMetadataDirs(root):
+	dirs = [];
+	
+	metadataDirs, errors = scanSvnMetadataDirs(root);
+	
+	for p, hasPrimary, hasSecondary in metadataDirs:
 		# at each directory level, we can perform a copy if the data is present
-		# BUT we mustn't ever enter one of these subdirs that we're handling
-		if SVN_DIRNAME_BRANCH1 in d:
-			d.remove(SVN_DIRNAME_BRANCH1);
-			
-			# we have a target directory to copy, so copy it
-			shutil.copytree(os.path.join(p, SVN_DIRNAME_BRANCH1), os.path.join(p, SVN_DIRNAME_BRANCH2));
-		elif SVN_DIRNAME_BRANCH2 in d:
-			d.remove(SVN_DIRNAME_BRANCH2);
-			
+		if hasPrimary:
+			dirs.append(p);
+		else:
 			# only target directory exists, so we've got an error
 			errors.append(("Path only has target directory. Inconsistent repository copy.", p));
-		else:
-			# data not present... skip this directory
-			pass;
+	
+	return dirs, errors;
+
+# Copy a batch of metadata files, several at once
+# - Pristine files are shared instead of copied when this is possible
+# - Nothing may exist at any of the destinations yet
+#
+# < files: (list<tuple>) files to copy - (src, dst, size, group, pristine)
+# < remaining: (list<int>) number of files left to copy for each group of files, updated as they get done
+# < progress: (MetadataCopyProgress) progress info to update, with the totals already set
+# < errors: (list) summary of errors (description+path) to add to
+# < (progressCb): (fn(MetadataCopyProgress)) callback for reporting progress every so often
+# < (numWorkers): (int) number of files to copy at once
+# < (pristineMode): (PristineCopyMode.MODE_*) how to duplicate pristine files
+def copyMetadataFiles(files, remaining, progress, errors, progressCb=None, numWorkers=8, pristineMode=PristineCopyMode.MODE_COPY):
+	# > return: (tuple) work item, error (or None), whether the file was shared
+	def copyFile(work):
+		src, dst, size, group, pristine = work;
+		
+		if pristine and (pristineMode != PristineCopyMode.MODE_COPY):
+			try:
+				sharePristineFile(src, dst, pristineMode);
+				return work, None, True;
+			except (IOError, OSError):
+				# fall back to copying (i.e. in case this is on a different filesystem to the test)
+				pass;
+		
+		try:
+			shutil.copy2(src, dst);
+			return work, None, False;
+		except (IOError, OSError), e:
+			return work, e, False;
+	
+	if not files:
+		return;
+	
+	progress.pristineMode = pristineMode;
+	lastReport = time.time();
+	
+	pool = ThreadPool(max(1, numWorkers));
+	try:
+		for (src, dst, size, group, pristine), err, shared in pool.imap_unordered(copyFile, files, 64):
+			if err:
+				errors.append(("Could not copy file - %s" % (err), src));
+			elif shared:
+				progress.filesShared += 1;
+			
+			progress.filesDone += 1;
+			progress.bytesDone += size;
 			
+			remaining[group] -= 1;
+			if remaining[group] == 0:
+				progress.dirsDone += 1;
+			
+			# don't flood whoever is listening
+			if progressCb and (time.time() - lastReport >= 0.5):
+				lastReport = time.time();
+				progressCb(progress);
+	finally:
+		pool.close();
+		pool.join();
+
+# Duplicate all ".svn" folders (and their contents) to "_svn" ones recursively
+# - Used for setting up local copy of branch
+# - The files get copied using several threads at once, as there can be a lot of them
+# - Pristine files are shared instead of copied when this is possible (see PristineCopyMode)
+#
+# < root: (str) path to directory where root of source tree resides
+# < (progressCb): (fn(MetadataCopyProgress)) callback for reporting progress every so often
+# < (numWorkers): (int) number of files to copy at once
+# < (pristineMode): (PristineCopyMode.MODE_*) how to duplicate pristine files, or None to use the best that works
+# > return[0]: (list) summary of errors that occurred during this process (description+path)
+def duplicateSvnMetadata(root, progressCb=None, numWorkers=8, pristineMode=None):
+	progress = MetadataCopyProgress();
+	
+	# 1) find what needs copying
+	adminDirs, errors = findSvnMetadataDirs(root);
+	
+	if (pristineMode is None) and adminDirs:
+		pristineMode = choosePristineCopyMode(os.path.join(adminDirs[0], SVN_DIRNAME_BRANCH1));
+	
+	# 2) work out the full list of files, and create the target directories for them
+	# 	- these are done in order, so that parents always exist before their contents
+	files = [];			# (src, dst, size, adminIndex, pristine)
+	remaining = [];		# number of files left to copy for each metadata directory
+	dirPairs = [];		# (src, dst) for every directory created, for copying their stats afterwards
+	
+	for adminIndex, p in enumerate(adminDirs):
+		src = os.path.join(p, SVN_DIRNAME_BRANCH1);
+		dst = os.path.join(p, SVN_DIRNAME_BRANCH2);
+		
+		if os.path.exists(dst):
+			errors.append(("Path already has target directory. Not overwriting it.", p));
+			remaining.append(0);
+			continue;
+		
+		numFiles = 0;
+		pending = [(src, dst, "")];
+		
+		try:
+			while pending:
+				srcDir, dstDir, relDir = pending.pop();
+				
+				os.mkdir(dstDir);
+				dirPairs.append((srcDir, dstDir));
+				
+				for entry in scanDir(srcDir):
+					relPath = os.path.join(relDir, entry.name);
+					
+					if entry.is_dir(follow_symlinks=False):
+						pending.append((entry.path, os.path.join(dstDir, entry.name), relPath));
+					else:
+						size = entry.stat().st_size;
+						files.append((entry.path, os.path.join(dstDir, entry.name), size, adminIndex, isPristinePath(relPath)));
+						
+						numFiles += 1;
+						progress.bytesTotal += size;
+		except (IOError, OSError), e:
+			errors.append(("Could not set up target directory - %s" % (e), p));
+		
+		remaining.append(numFiles);
+	
+	progress.dirsTotal = len(adminDirs);
+	progress.dirsDone = sum(1 for count in remaining if count == 0);
+	progress.filesTotal = len(files);
+	
+	# 3) copy the files
+	copyMetadataFiles(files, remaining, progress, errors, progressCb, numWorkers, pristineMode);
+	
+	# 4) directories get the same stats as the originals (as copytree does), now that their contents are done
+	for srcDir, dstDir in dirPairs:
+		try:
+			shutil.copystat(srcDir, dstDir);
+		except OSError:
+			pass;
+	
+	if progressCb:
+		progressCb(progress);
+	
 	# return list of errors
 	return errors;
 
@@ -83,6 +411,9 @@ SvnOp_Args = {
 		
 	'diff' :
 		[],
+	
+	'patch' :
+		[],
 		
 	'resolved' :
 		[]
@@ -0,0 +1,486 @@
+# Duality SVN
+# Original Author: Joshua Leung
+#
+# Built-in Diff Engine - diffs files against their pristine copies directly,
+# instead of starting up "svn diff" for every file
+
+from coreDefines import *
+
+from InternalOperationProcess import *
+from SvnWcMetadata import *
+
+import re
+
+#######################################
+# Line Diffing
+#
+# svn produces minimal diffs (i.e. the longest common subsequence of lines), so
+# to get the same output, Myers' O(ND) algorithm is used. However, that gets
+# slow when there are lots of differences, so once the number of edits gets too
+# large, the engine gives up on the file, and "svn diff" gets used for it instead
+# (as anything else wouldn't be minimal, so wouldn't match).
+#
+# NOTE: when there are several equally short ways of lining things up, which one
+#       gets picked may still differ from what svn picks.
+
+# Maximum number of edits that Myers' algorithm is allowed to look for before giving up
+MYERS_MAX_COST = 400;
+
+# Splits text into lines, keeping the line endings (which svn treats as part of each line)
+LINE_PATTERN = re.compile(r'[^\r\n]*(?:\r\n|\r|\n)|[^\r\n]+');
+
+# Split text into lines
+# < data: (str) text
+# > return[0]: (list<str>) lines, including their line endings
+def splitLines(data):
+	return LINE_PATTERN.findall(data);
+
+# Find the matching lines between two ranges, using Myers' algorithm
+# < a, b: (list<int>) line ids for each side
+# < aLo, aHi, bLo, bHi: (int) ranges of lines to compare
+# < maxCost: (int) maximum number of edits to look for, or None for no limit
+# > return[0]: (list<tuple>) (aIndex, bIndex) for matching lines in order, or None if the limit was reached
+def myersMatches(a, b, aLo, aHi, bLo, bHi, maxCost=None):
+	n = aHi - aLo;
+	m = bHi - bLo;
+	maxD = n + m;
+	
+	if maxCost is not None:
+		maxD = min(maxD, maxCost);
+	
+	# furthest x reached on each diagonal k (= x - y), stored at [k + offset]
+	offset = maxD + 1;
+	v = [0] * (2 * offset + 1);
+	
+	# v around the diagonals that could be reached, before each round (for backtracking)
+	trace = [];
+	
+	for d in xrange(maxD + 1):
+		trace.append(v[offset - d - 1 : offset + d + 2]);
+		
+		for k in xrange(-d, d + 1, 2):
+			# move down (insertion) or across (deletion), whichever gets further
+			if (k == -d) or ((k != d) and (v[offset + k - 1] < v[offset + k + 1])):
+				x = v[offset + k + 1];
+			else:
+				x = v[offset + k - 1] + 1;
+			y = x - k;
+			
+			# follow the diagonal while lines match
+			while (x < n) and (y < m) and (a[aLo + x] == b[bLo + y]):
+				x += 1;
+				y += 1;
+			
+			v[offset + k] = x;
+			
+			if (x >= n) and (y >= m):
+				return myersBacktrack(trace, n, m, aLo, bLo);
+	
+	return None;
+
+# Work out the matching lines from the path found by myersMatches()
+def myersBacktrack(trace, n, m, aLo, bLo):
+	matches = [];
+	x, y = n, m;
+	
+	for d in xrange(len(trace) - 1, -1, -1):
+		vd = trace[d];
+		k = x - y;
+		
+		# vd covers the diagonals -d-1 .. d+1
+		if (k == -d) or ((k != d) and (vd[k - 1 + d + 1] < vd[k + 1 + d + 1])):
+			prevK = k + 1;
+		else:
+			prevK = k - 1;
+		
+		if d > 0:
+			prevX = vd[prevK + d + 1];
+		else:
+			prevX = 0;
+		prevY = prevX - prevK;
+		
+		while (x > prevX) and (y > prevY):
+			x -= 1;
+			y -= 1;
+			matches.append((aLo + x, bLo + y));
+		
+		x, y = prevX, prevY;
+	
+	matches.reverse();
+	return matches;
+
+# Find the matching lines between two ranges
+# < matches: (list<tuple>) list to add (aIndex, bIndex) pairs to, in order
+# < (maxCost): (int) maximum number of edits to look for, or None for no limit
+# > return[0]: (bool) whether the matching lines were found - False if the limit was reached
+def diffRange(a, b, aLo, aHi, bLo, bHi, matches, maxCost=None):
+	# common prefix + suffix
+	while (aLo < aHi) and (bLo < bHi) and (a[aLo] == b[bLo]):
+		matches.append((aLo, bLo));
+		aLo += 1;
+		bLo += 1;
+	
+	suffix = [];
+	while (aLo < aHi) and (bLo < bHi) and (a[aHi - 1] == b[bHi - 1]):
+		aHi -= 1;
+		bHi -= 1;
+		suffix.append((aHi, bHi));
+	
+	if (aLo < aHi) and (bLo < bHi):
+		found = myersMatches(a, b, aLo, aHi, bLo, bHi, maxCost);
+		if found is None:
+			return False;
+		
+		matches += found;
+	
+	suffix.reverse();
+	matches += suffix;
+	
+	return True;
+
+# Diff two lists of lines
+# < oldLines, newLines: (list<str>) lines on each side
+# < (maxCost): (int) maximum number of edits to look for, or None for no limit
+# > return[0]: (list<tuple>) (tag, i1, i2, j1, j2) opcodes, as for difflib - tag is 'equal', 'replace', 'delete', or 'insert'
+#			   or None if there were more than maxCost edits
+def diffLines(oldLines, newLines, maxCost=None):
+	# compare lines by id instead of text
+	ids = {};
+	a = [ids.setdefault(line, len(ids)) for line in oldLines];
+	b = [ids.setdefault(line, len(ids)) for line in newLines];
+	
+	matches = [];
+	if not diffRange(a, b, 0, len(a), 0, len(b), matches, maxCost):
+		return None;
+	
+	# convert matching lines to opcodes
+	opcodes = [];
+	i = j = 0;
+	
+	for mi, mj in matches + [(len(a), len(b))]:
+		if (i < mi) and (j < mj):
+			opcodes.append(('replace', i, mi, j, mj));
+		elif i < mi:
+			opcodes.append(('delete', i, mi, j, j));
+		elif j < mj:
+			opcodes.append(('insert', i, i, j, mj));
+		
+		if mi < len(a):
+			if opcodes and (opcodes[-1][0] == 'equal'):
+				tag, i1, i2, j1, j2 = opcodes[-1];
+				opcodes[-1] = (tag, i1, mi + 1, j1, mj + 1);
+			else:
+				opcodes.append(('equal', mi, mi + 1, mj, mj + 1));
+		
+		i, j = mi + 1, mj + 1;
+	
+	return opcodes;
+
+#######################################
+# Diff Results
+
+# Differences between the pristine copy of a file and the working file
+class SvnWcDiffResult(object):
+	# Class Defines ======================================
+	# Number of lines of context around each change
+	CONTEXT = 3;
+	
+	# svn uses the native line ending for the lines it adds itself
+	EOL = os.linesep;
+	
+	# marker for lines without a line ending (i.e. last line in a file)
+	NO_EOL = "\\ No newline at end of file";
+	
+	# Instance Settings ==================================
+	__slots__ = (
+		'path',			# (str) path of file, as it should be shown
+		'revision',		# (int) revision of the pristine copy
+		
+		'oldLines',		# (list<str>) lines of pristine copy, including line endings
+		'newLines',		# (list<str>) lines of working file, including line endings
+		'opcodes',		# (list<tuple>) (tag, i1, i2, j1, j2) differences between them, or None if there were too many to work out
+	);
+	
+	def __init__(self, path, revision, oldData, newData):
+		self.path = path;
+		self.revision = revision;
+		
+		self.oldLines = splitLines(oldData);
+		self.newLines = splitLines(newData);
+		self.opcodes = diffLines(self.oldLines, self.newLines, MYERS_MAX_COST);
+	
+	# check whether there are any differences
+	def hasChanges(self):
+		return any(tag != 'equal' for tag, i1, i2, j1, j2 in self.opcodes);
+	
+	# get a rough idea of the amount of memory used (in bytes)
+	# - str objects have an overhead of about 40 bytes each (on top of their contents)
+	def memoryUsage(self):
+		lines = len(self.oldLines) + len(self.newLines);
+		return sum(map(len, self.oldLines)) + sum(map(len, self.newLines)) + (lines * 48) + (len(self.opcodes) * 80);
+	
+	# Unified ============================================
+	
+	# get the opcodes grouped into hunks, with the equal parts trimmed down to the context around changes
+	# > return[0]: (list<list<tuple>>)
+	def getHunks(self, context=CONTEXT):
+		codes = list(self.opcodes);
+		if not self.hasChanges():
+			return [];
+		
+		# only the context is needed from the equal parts at either end
+		if codes[0][0] == 'equal':
+			tag, i1, i2, j1, j2 = codes[0];
+			codes[0] = (tag, max(i1, i2 - context), i2, max(j1, j2 - context), j2);
+		if codes[-1][0] == 'equal':
+			tag, i1, i2, j1, j2 = codes[-1];
+			codes[-1] = (tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context));
+		
+		# split into separate hunks wherever changes are far enough apart
+		hunks = [];
+		hunk = [];
+		for tag, i1, i2, j1, j2 in codes:
+			if (tag == 'equal') and (i2 - i1 > context * 2):
+				hunk.append((tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)));
+				hunks.append(hunk);
+				
+				hunk = [];
+				i1, j1 = max(i1, i2 - context), max(j1, j2 - context);
+			
+			hunk.append((tag, i1, i2, j1, j2));
+		
+		if hunk and not ((len(hunk) == 1) and (hunk[0][0] == 'equal')):
+			hunks.append(hunk);
+		
+		return hunks;
+	
+	# get the diff in the same form as "svn diff" produces
+	# > return[0]: (str) unified diff, or an empty string if there are no differences
+	def getUnified(self, context=CONTEXT):
+		hunks = self.getHunks(context);
+		if not hunks:
+			return "";
+		
+		eol = SvnWcDiffResult.EOL;
+		
+		out = [];
+		out.append("Index: %s%s" % (self.path, eol));
+		out.append("=" * 67 + eol);
+		out.append("--- %s\t(revision %s)%s" % (self.path, self.revision, eol));
+		out.append("+++ %s\t(working copy)%s" % (self.path, eol));
+		
+		# ranges are 1-based, with the length left out when it's 1 (and the line before the range used when it's empty)
+		def hunkRange(start, end):
+			if end - start == 1:
+				return "%d" % (start + 1);
+			elif end == start:
+				return "%d,0" % (start);
+			else:
+				return "%d,%d" % (start + 1, end - start);
+		
+		def addLine(prefix, line):
+			out.append(prefix + line);
+			if not line.endswith(("\n", "\r")):
+				out.append(eol + SvnWcDiffResult.NO_EOL + eol);
+		
+		for hunk in hunks:
+			out.append("@@ -%s +%s @@%s" % (hunkRange(hunk[0][1], hunk[-1][2]), hunkRange(hunk[0][3], hunk[-1][4]), eol));
+			
+			for tag, i1, i2, j1, j2 in hunk:
+				if tag == 'equal':
+					for line in self.oldLines[i1:i2]:
+						addLine(" ", line);
+				else:
+					for line in self.oldLines[i1:i2]:
+						addLine("-", line);
+					for line in self.newLines[j1:j2]:
+						addLine("+", line);
+		
+		return "".join(out);
+	
+	# Side-by-Side =======================================
+	
+	# get the lines of both files lined up against each other
+	# > return[0]: (list<tuple>) (old line number, old text, new line number, new text, tag) for each row
+	#	- line numbers are 1-based, or None when there's no line on that side; texts don't have line endings
+	def getSideBySide(self):
+		strip = lambda line: line.rstrip("\r\n");
+		rows = [];
+		
+		for tag, i1, i2, j1, j2 in self.opcodes:
+			for k in xrange(max(i2 - i1, j2 - j1)):
+				i = i1 + k;
+				j = j1 + k;
+				
+				if i >= i2:
+					rows.append((None, "", j + 1, strip(self.newLines[j]), 'insert'));
+				elif j >= j2:
+					rows.append((i + 1, strip(self.oldLines[i]), None, "", 'delete'));
+				else:
+					rows.append((i + 1, strip(self.oldLines[i]), j + 1, strip(self.newLines[j]), tag));
+		
+		return rows;
+
+#######################################
+# Diff Engine
+
+# Diffs files in a working copy against their pristine copies
+# - only plain text changes to files are handled; everything else (property changes,
+#   binary files, added/deleted files, etc.) should be left for "svn diff"
+class SvnWcDiffEngine(object):
+	__slots__ = (
+		'wcRoot',			# (str) root directory of working copy
+		'adminName',		# (str) name of admin directories to use (i.e. ".svn" or "_svn")
+		'metadataType',		# (class) reader for the working copy's metadata format
+	);
+	
+	def __init__(self, wcRoot, adminName):
+		self.wcRoot = wcRoot;
+		self.adminName = adminName;
+		self.metadataType = detectWcFormat(wcRoot, adminName);
+	
+	# check whether the working copy can be handled by the engine
+	def isSupported(self):
+		return self.metadataType is not None;
+	
+	# get a reader for the working copy's metadata, which can be used for several files
+	# ! When the reader uses sqlite, this must be run in the thread that it is used from
+	# > return[0]: (SvnEntriesMetadata/SvnWcDbMetadata) reader, which must be closed when done with
+	def openMetadata(self):
+		return self.metadataType(self.wcRoot, self.adminName);
+	
+	# check whether a file can be diffed by the engine
+	# < metadata: (SvnEntriesMetadata/SvnWcDbMetadata) reader from openMetadata()
+	# < path: (str) path of file relative to the root of the working copy
+	# < (dirCache): (dict<str, tuple>) results of reading each directory, for when lots of files are being checked
+	# > return[0]: (tuple) (node, props, pristine path) for the file, or None if it can't be handled
+	def checkFile(self, metadata, path, dirCache=None):
+		relDir, name = os.path.split(os.path.normpath(path));
+		
+		if dirCache is None:
+			dirNode, children = metadata.readDir(relDir);
+		elif relDir in dirCache:
+			dirNode, children = dirCache[relDir];
+		else:
+			dirNode, children = dirCache[relDir] = metadata.readDir(relDir);
+		
+		node = children.get(name);
+		if (node is None) or (node.kind != 'file') or (node.schedule != 'normal'):
+			return None;
+		if node.propMods or node.textConflict or node.propConflict:
+			return None;
+		
+		# "svn diff" doesn't show the contents of binary files
+		props = metadata.getProps(relDir, node);
+		mimeType = props.get('svn:mime-type');
+		if mimeType and not mimeType.startswith("text/"):
+			return None;
+		
+		pristinePath = metadata.getPristinePath(relDir, node);
+		if (pristinePath is None) or not os.path.exists(pristinePath):
+			return None;
+		
+		return node, props, pristinePath;
+	
+	# diff a file
+	# ! When the reader uses sqlite, this must be run in the thread that it is used from
+	# < path: (str) path of file relative to the root of the working copy
+	# < (metadata): (SvnEntriesMetadata/SvnWcDbMetadata) reader from openMetadata() to use, instead of opening a new one just for this
+	# > return[0]: (SvnWcDiffResult) or None if the file can't be handled
+	def diffFile(self, path, metadata=None):
+		if metadata is None:
+			metadata = self.openMetadata();
+			try:
+				return self.diffFile(path, metadata);
+			finally:
+				metadata.close();
+		
+		info = self.checkFile(metadata, path);
+		if info is None:
+			return None;
+		node, props, pristinePath = info;
+		
+		with open(pristinePath, 'rb') as f:
+			oldData = f.read();
+		with open(os.path.join(self.wcRoot, path), 'rb') as f:
+			newData = f.read();
+		
+		# compare in the same form as the pristine copy is stored in
+		if node.translated:
+			newData = detranslate(newData, props);
+		
+		# too many differences to be sure of matching svn's output
+		result = SvnWcDiffResult(path, node.revision, oldData, newData);
+		if result.opcodes is None:
+			return None;
+		
+		return result;
+
+#######################################
+# Process Wrappers
+
+# Thread running the diff engine
+class SvnWcDiffThread(ThreadAsFauxProcess):
+	__slots__ = (
+		'engine',	# (SvnWcDiffEngine)
+		'result',	# (SvnWcDiffResult) result of diffing the file, or None if it couldn't be handled
+	);
+	
+	def __init__(self, engine):
+		ThreadAsFauxProcess.__init__(self);
+		
+		self.engine = engine;
+		self.result = None;
+	
+	# diff the file given as the first arg
+	# - diffing a single file can't be stopped part way through, but it doesn't take long (as the
+	#   engine gives up on files with lots of differences), so kill() only gets checked around it
+	def run(self):
+		if self.isStopping():
+			self.done(-1, QProcess.CrashExit);
+			return;
+		
+		try:
+			result = self.engine.diffFile(self.args[0]);
+		except Exception, e:
+			self.error("Built-in diff engine failed: %s" % (e));
+			self.done(1);
+			return;
+		
+		if self.isStopping():
+			self.done(-1, QProcess.CrashExit);
+			return;
+		
+		self.result = result;
+		self.done(0);
+
+# Operation wrapper for running the diff engine on a file in a branch's working copy
+# - when the process is done, getResult() gives the differences, or None when the
+#   file needs to be diffed using "svn diff" instead
+class SvnWcDiffProcess(InternalOperationProcess):
+	# Internal Setup ==============================
+	
+	# < path: (str) path of file relative to the root of the working copy
+	def __init__(self, parent, name, branchType, path):
+		engine = SvnWcDiffEngine(project.workingCopyDir, getAdminName(branchType));
+		super(SvnWcDiffProcess, self).__init__(parent, name, SvnWcDiffThread(engine));
+		
+		self.addArgs([path]);
+	
+	# check whether the working copy of the branch can be handled by the diff engine
+	@staticmethod
+	def canHandle(branchType):
+		if not project.workingCopyDir:
+			return False;
+		return detectWcFormat(project.workingCopyDir, getAdminName(branchType)) is not None;
+	
+	# the engine only ever reads the working copy
+	def getWcAccess(self):
+		return WcAccess.ACCESS_READ;
+		
+	# get the differences found
+	# > return[0]: (SvnWcDiffResult) or None
+	def getResult(self):
+		return self.process.result;
+
+#######################################
@@ -0,0 +1,373 @@
+# Duality SVN
+# Original Author: Joshua Leung
+#
+# Diff Cache - keeps diffs from the built-in diff engine around, and works them
+# out in the background for files that are likely to be looked at next, so that
+# showing them is instant
+
+from coreDefines import *
+
+from SvnWcDiff import *
+
+from collections import OrderedDict
+
+#######################################
+# Cache
+
+# Size-bounded cache of diff results, with the least recently used ones being dropped first
+#
+# Results are keyed by the state of the working file (see makeKey()), so edits to a file
+# make the old result unreachable on their own. Changes to the pristine copies (i.e. from
+# commits, updates, and reverts) can't be spotted that way though, so the cache needs to
+# be invalidated whenever the status list gets refreshed.
+#
+# Diffs which were still being worked out when the cache got invalidated may have been read
+# from the old pristine copies, so each invalidation bumps a generation counter. Whoever works
+# out a diff gets the generation (see getGeneration()) before reading anything, and results
+# from before the latest invalidation get dropped instead of being stored.
+#
+# ! This gets used from both the main thread and the prefetcher's thread
+class SvnWcDiffCache(object):
+	# Class Defines ======================================
+	# Default total size (bytes) of the results to keep
+	DEFAULT_MAX_BYTES = 64 * 1024 * 1024;
+	
+	# Shared instance
+	_shared = None;
+	
+	# Instance Settings ==================================
+	__slots__ = (
+		'maxBytes',		# (int) total size of results to keep
+		'size',			# (int) total size of the results currently kept
+		'entries',		# (OrderedDict<tuple, tuple>) key : (SvnWcDiffResult, size) - least recently used first
+		'mutex',		# (QMutex) lock for the entries
+		
+		'generation',	# (int) number of times that the whole cache has been invalidated
+		'generations',	# (dict<BranchType.TYPE_*, int>) number of times that the diffs against each branch have been invalidated (on their own)
+		
+		'hits',			# (int) number of lookups which found a result
+		'misses',		# (int) number of lookups which didn't
+		'prefetched',	# (int) number of results stored by the prefetcher
+		'evictions',	# (int) number of results dropped to make room for others
+		'stale',		# (int) number of results dropped as they were worked out before an invalidation
+	);
+	
+	def __init__(self, maxBytes=DEFAULT_MAX_BYTES):
+		self.maxBytes = maxBytes;
+		self.size = 0;
+		self.entries = OrderedDict();
+		self.mutex = QMutex();
+		
+		self.generation = 0;
+		self.generations = {};
+		
+		self.hits = 0;
+		self.misses = 0;
+		self.prefetched = 0;
+		self.evictions = 0;
+		self.stale = 0;
+	
+	# get the shared cache instance
+	@classmethod
+	def shared(cls):
+		if cls._shared is None:
+			cls._shared = cls();
+		return cls._shared;
+	
+	# Keys =============================================
+	
+	# get the key that the diff of a file is stored under
+	# < wcRoot: (str) root directory of working copy
+	# < branchType: (BranchType.TYPE_*) branch whose metadata the file gets diffed against
+	# < path: (str) path of file relative to the root of the working copy
+	# > return[0]: (tuple) (wcRoot, path, branchType, size, mtime) or None if the file can't be found
+	@staticmethod
+	def makeKey(wcRoot, branchType, path):
+		path = os.path.normpath(path);
+		
+		try:
+			st = os.stat(os.path.join(wcRoot, path));
+		except OSError:
+			return None;
+		
+		return (wcRoot, path, branchType, st.st_size, int(st.st_mtime * 1000000));
+	
+	# get the current generation of the diffs against a branch's metadata, which
+	# changes whenever they get invalidated
+	# < branchType: (BranchType.TYPE_*)
+	# > return[0]: (int)
+	def getGeneration(self, branchType):
+		self.mutex.lock();
+		try:
+			# both only ever go up, so the total changes whenever either does
+			return self.generation + self.generations.get(branchType, 0);
+		finally:
+			self.mutex.unlock();
+	
+	# Access ===========================================
+	
+	# look up the diff stored for a key
+	# < key: (tuple) key from makeKey()
+	# > return[0]: (SvnWcDiffResult) or None if there isn't one
+	def lookup(self, key):
+		self.mutex.lock();
+		try:
+			entry = self.entries.pop(key, None) if key is not None else None;
+			
+			if entry is None:
+				self.misses += 1;
+				return None;
+			
+			# now the most recently used
+			self.entries[key] = entry;
+			self.hits += 1;
+			
+			return entry[0];
+		finally:
+			self.mutex.unlock();
+	
+	# check if there's a diff stored for a key, without it counting as a use
+	def contains(self, key):
+		self.mutex.lock();
+		try:
+			return key in self.entries;
+		finally:
+			self.mutex.unlock();
+	
+	# store the diff for a key
+	# < key: (tuple) key from makeKey(), as it was before the file was read
+	# < result: (SvnWcDiffResult)
+	# < (prefetched): (bool) whether the diff was worked out before it was needed
+	# < (generation): (int) getGeneration() from before the file was read - if the cache has been
+	#				  invalidated since, the result gets dropped (as it may be from the old pristine copy)
+	def store(self, key, result, prefetched=False, generation=None):
+		if (key is None) or (result is None):
+			return;
+		
+		size = result.memoryUsage();
+		
+		# huge diffs would push everything else out
+		if size > self.maxBytes / 4:
+			return;
+		
+		self.mutex.lock();
+		try:
+			if (generation is not None) and (generation != self.generation + self.generations.get(key[2], 0)):
+				self.stale += 1;
+				return;
+			
+			oldEntry = self.entries.pop(key, None);
+			if oldEntry is not None:
+				self.size -= oldEntry[1];
+			
+			self.entries[key] = (result, size);
+			self.size += size;
+			
+			if prefetched:
+				self.prefetched += 1;
+			
+			# make room
+			while self.size > self.maxBytes:
+				oldKey, (oldResult, oldSize) = self.entries.popitem(last=False);
+				self.size -= oldSize;
+				self.evictions += 1;
+		finally:
+			self.mutex.unlock();
+	
+	# drop stored diffs, as the pristine copies may have changed
+	# < (branchType): (BranchType.TYPE_*) only drop the diffs against this branch's metadata, or None for all
+	# < (inScopeCb): (fn(path) -> bool) only drop diffs of files this is true for, or None for all
+	def invalidate(self, branchType=None, inScopeCb=None):
+		self.mutex.lock();
+		try:
+			# diffs still being worked out may not be in the scope given, but they're from before this
+			if branchType is None:
+				self.generation += 1;
+			else:
+				self.generations[branchType] = self.generations.get(branchType, 0) + 1;
+			
+			for key in self.entries.keys():
+				if (branchType is not None) and (key[2] != branchType):
+					continue;
+				if (inScopeCb is not None) and not inScopeCb(key[1]):
+					continue;
+				
+				self.size -= self.entries.pop(key)[1];
+		finally:
+			self.mutex.unlock();
+	
+	# Stats ============================================
+	
+	# get a one-line summary of how well the cache is doing
+	def getStats(self):
+		lookups = self.hits + self.misses;
+		
+		return "%d hits, %d misses (%.0f%% hit rate), %d prefetched, %d evicted, %d stale - %d diffs (%.1f MB) kept" % (
+			self.hits, self.misses, (100.0 * self.hits / lookups) if lookups else 0.0,
+			self.prefetched, self.evictions, self.stale,
+			len(self.entries), self.size / 1048576.0);
+
+#######################################
+# Prefetcher
+
+# Background thread which works out diffs for files before they're asked for
+#
+# There are two queues of files to do:
+#	- "urgent" ones are the files around the one the user is looking at, which get
+#	  replaced whenever they move on (as they probably don't matter anymore)
+#	- "background" ones are batches of files which are likely to be looked at
+#	  sometime (i.e. everything being committed), which get done when there's
+#	  nothing more urgent
+#
+# There's only one prefetcher shared by all status lists (as they all operate on
+# the same working copy), which is retrieved using SvnWcDiffPrefetcher.shared()
+class SvnWcDiffPrefetcher(QThread):
+	# Class Defines ======================================
+	# Shared instance
+	_shared = None;
+	
+	# Setup ==============================================
+	
+	# ctor
+	# < cache: (SvnWcDiffCache) cache that diffs get stored in
+	def __init__(self, cache, parent=None):
+		super(SvnWcDiffPrefetcher, self).__init__(parent);
+		
+		self.cache = cache;
+		
+		# queues of (wcRoot, branchType, path) to do
+		self.mutex = QMutex();
+		self.waitCond = QWaitCondition();
+		
+		self.urgent = OrderedDict();
+		self.background = OrderedDict();
+		self.stopping = False;
+		
+		# engines for each branch of the working copy the last files came from - only used from the thread
+		self.engines = {};
+	
+	# get the shared prefetcher instance
+	@classmethod
+	def shared(cls):
+		if cls._shared is None:
+			cls._shared = cls(SvnWcDiffCache.shared());
+		return cls._shared;
+	
+	# stop the shared prefetcher (if it was ever started), waiting for it to finish what it's doing
+	@classmethod
+	def shutdown(cls):
+		if cls._shared is not None:
+			cls._shared.stop();
+	
+	# Control ============================================
+	
+	# queue up files to be diffed
+	# < branchType: (BranchType.TYPE_*) branch whose metadata the files get diffed against
+	# < paths: (list<str>) paths of files relative to the root of the working copy, most important first
+	# < (urgent): (bool) whether these replace the previous urgent files, instead of being done in the background
+	def request(self, branchType, paths, urgent=False):
+		wcRoot = project.workingCopyDir;
+		if not wcRoot:
+			return;
+		
+		self.mutex.lock();
+		try:
+			if urgent:
+				self.urgent.clear();
+			
+			queue = self.urgent if urgent else self.background;
+			for path in paths:
+				queue[(wcRoot, branchType, path)] = True;
+			
+			self.stopping = False;
+			self.waitCond.wakeOne();
+		finally:
+			self.mutex.unlock();
+		
+		if not self.isRunning():
+			self.start(QThread.LowPriority);
+	
+	# forget about all the files which haven't been done yet
+	def clearQueue(self):
+		self.mutex.lock();
+		try:
+			self.urgent.clear();
+			self.background.clear();
+		finally:
+			self.mutex.unlock();
+	
+	# stop the thread, waiting for it to finish the file it's on
+	def stop(self):
+		self.mutex.lock();
+		try:
+			self.urgent.clear();
+			self.background.clear();
+			self.stopping = True;
+			self.waitCond.wakeAll();
+		finally:
+			self.mutex.unlock();
+		
+		self.wait();
+	
+	# Thread =============================================
+	
+	# get the next file to do, waiting until there is one
+	# > return[0]: (tuple) (wcRoot, branchType, path), or None when the thread should stop
+	def nextJob(self):
+		self.mutex.lock();
+		try:
+			while not (self.stopping or self.urgent or self.background):
+				self.waitCond.wait(self.mutex);
+			
+			if self.stopping:
+				return None;
+			
+			queue = self.urgent if self.urgent else self.background;
+			job, dummy = queue.popitem(last=False);
+			
+			return job;
+		finally:
+			self.mutex.unlock();
+	
+	# diff a file, if there isn't a result for it already
+	# < job: (tuple) (wcRoot, branchType, path)
+	def prefetch(self, job):
+		wcRoot, branchType, path = job;
+		
+		# state of the file (and the pristine copies) from before it gets read, so that any
+		# changes made while it's being read mean that the result won't get used
+		generation = self.cache.getGeneration(branchType);
+		key = SvnWcDiffCache.makeKey(wcRoot, branchType, path);
+		if (key is None) or self.cache.contains(key):
+			return;
+		
+		engine = self.engines.get((wcRoot, branchType));
+		if engine is None:
+			# unsupported ones aren't kept, as the metadata may be set up later (i.e. when branching)
+			engine = SvnWcDiffEngine(wcRoot, getAdminName(branchType));
+			if not engine.isSupported():
+				return;
+			
+			# engines for other working copies are no use once the project has changed
+			if any((root != wcRoot) for root, dummy in self.engines):
+				self.engines.clear();
+			self.engines[(wcRoot, branchType)] = engine;
+		
+		# any problems will get reported if the diff is ever shown, as it'll be worked out again then
+		try:
+			result = engine.diffFile(path);
+		except Exception:
+			return;
+		
+		self.cache.store(key, result, prefetched=True, generation=generation);
+	
+	# QThread.run()
+	def run(self):
+		while True:
+			job = self.nextJob();
+			if job is None:
+				break;
+			
+			self.prefetch(job);
+
+#######################################
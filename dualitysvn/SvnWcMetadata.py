@@ -0,0 +1,759 @@
+# Duality SVN
+# Original Author: Joshua Leung
+#
+# SVN Working Copy Metadata - readers for the metadata that svn keeps in
+# the admin directories (i.e. ".svn" or "_svn") of a working copy
+
+from coreDefines import *
+
+import calendar
+import ConfigParser
+import fnmatch
+import hashlib
+import re
+import stat
+import time
+
+# sqlite3 is only needed for 1.7+ working copies, and may not be present in all Python builds
+try:
+	import sqlite3
+except ImportError:
+	sqlite3 = None;
+
+# os.scandir() isn't part of Python 2.x, but is available as a separate package
+try:
+	from scandir import scandir
+except ImportError:
+	scandir = None;
+
+#######################################
+# Directory Scanning
+
+# Minimal stand-in for scandir's DirEntry, for when scandir isn't available
+# - stat info is fetched lazily (and only once), as with the real thing
+# - symlinks are followed unless follow_symlinks=False, as with the real thing
+class ListdirEntry(object):
+	__slots__ = (
+		'name',		# (str) name of file/directory
+		'path',		# (str) full path to file/directory
+		'_stat',	# (os.stat_result) cached lstat() result
+	);
+
+	def __init__(self, dirPath, name):
+		self.name = name;
+		self.path = os.path.join(dirPath, name);
+		self._stat = None;
+
+	def stat(self, follow_symlinks=True):
+		if self._stat is None:
+			self._stat = os.lstat(self.path);
+
+		if follow_symlinks and stat.S_ISLNK(self._stat.st_mode):
+			return os.stat(self.path);
+		return self._stat;
+
+	def is_dir(self, follow_symlinks=True):
+		try:
+			return stat.S_ISDIR(self.stat(follow_symlinks).st_mode);
+		except OSError:
+			# broken symlink
+			return False;
+
+	def is_file(self, follow_symlinks=True):
+		try:
+			return stat.S_ISREG(self.stat(follow_symlinks).st_mode);
+		except OSError:
+			# broken symlink
+			return False;
+
+	def is_symlink(self):
+		return stat.S_ISLNK(self.stat(follow_symlinks=False).st_mode);
+
+# Get the contents of a directory as DirEntry-like objects
+# < path: (str) directory to scan
+# > return[0]: (iterable<DirEntry>)
+def scanDir(path):
+	if scandir is not None:
+		return scandir(path);
+	else:
+		return [ListdirEntry(path, name) for name in os.listdir(path)];
+
+#######################################
+# Parsing Utilities
+
+# Parse a timestamp as stored by svn (i.e. "2010-12-01T10:20:30.123456Z")
+# > return[0]: (int) microseconds since epoch, or None if not valid
+def parseSvnTime(value):
+	if not value:
+		return None;
+
+	try:
+		datePart, sep, frac = value.rstrip('Z').partition('.');
+		secs = calendar.timegm(time.strptime(datePart, "%Y-%m-%dT%H:%M:%S"));
+
+		return secs * 1000000 + int((frac + "000000")[:6]);
+	except ValueError:
+		return None;
+
+# Get the modification time of a file in microseconds, as svn records it
+# < st: (os.stat_result)
+def statTimeMicro(st):
+	return int(round(st.st_mtime * 1000000));
+
+# Parse a property file in svn's "hash dump" format
+# (K <len>\n<key>\nV <len>\n<value>\n ... END\n)
+# > return[0]: (dict<str, str>) properties
+def parseHashDump(data):
+	props = {};
+	pos = 0;
+
+	while pos < len(data):
+		# header line - "K 123"
+		eol = data.index('\n', pos);
+		header = data[pos:eol].split(' ');
+		pos = eol + 1;
+
+		if header[0] == 'END':
+			break;
+
+		# key
+		keyLen = int(header[1]);
+		key = data[pos:pos+keyLen];
+		pos += keyLen + 1;
+
+		# value header + value
+		eol = data.index('\n', pos);
+		valLen = int(data[pos:eol].split(' ')[1]);
+		pos = eol + 1;
+
+		props[key] = data[pos:pos+valLen];
+		pos += valLen + 1;
+
+	return props;
+
+# Parse an svn "skel" (as used for properties in wc.db)
+# > return[0]: (list|str) nested lists of atoms
+def parseSkel(data):
+	# stack of lists being built, with an outer list to catch the result
+	stack = [[]];
+	pos = 0;
+	size = len(data);
+
+	while pos < size:
+		c = data[pos];
+
+		if c in " \t\n\r\f":
+			pos += 1;
+		elif c == '(':
+			stack.append([]);
+			pos += 1;
+		elif c == ')':
+			done = stack.pop();
+			stack[-1].append(done);
+			pos += 1;
+		elif c.isdigit():
+			# explicit-length atom: "<len> <bytes>"
+			end = pos;
+			while data[end].isdigit():
+				end += 1;
+			atomLen = int(data[pos:end]);
+			pos = end + 1;
+
+			stack[-1].append(data[pos:pos+atomLen]);
+			pos += atomLen;
+		else:
+			# implicit-length atom: runs until whitespace or paren
+			end = pos;
+			while (end < size) and (data[end] not in " \t\n\r\f()"):
+				end += 1;
+
+			stack[-1].append(data[pos:end]);
+			pos = end;
+
+	return stack[0][0] if stack[0] else None;
+
+# Convert a skel property list to a dict
+def parseSkelProps(data):
+	if not data:
+		return {};
+
+	skel = parseSkel(str(data));
+	return dict(zip(skel[0::2], skel[1::2]));
+
+#######################################
+# Ignore Patterns
+
+# Default value of "global-ignores" used by the svn 1.6 client
+DEFAULT_GLOBAL_IGNORES = "*.o *.lo *.la *.al .libs *.so *.so.[0-9]* *.a *.pyc *.pyo *.rej *~ #*# .#* .*.swp .DS_Store";
+
+# Get the list of global-ignores patterns, from the user's svn config where possible
+# > return[0]: (list<str>) patterns
+def getGlobalIgnores():
+	# location of user's config depends on platform
+	if sys.platform == 'win32':
+		cfgFile = os.path.join(os.environ.get('APPDATA', ""), "Subversion", "config");
+	else:
+		cfgFile = os.path.expanduser(os.path.join("~", ".subversion", "config"));
+
+	patterns = DEFAULT_GLOBAL_IGNORES;
+
+	try:
+		cfg = ConfigParser.RawConfigParser();
+		if cfg.read(cfgFile) and cfg.has_option('miscellany', 'global-ignores'):
+			patterns = cfg.get('miscellany', 'global-ignores');
+	except ConfigParser.Error:
+		pass;
+
+	return patterns.split();
+
+# Check whether a name matches any of the given ignore patterns
+def isIgnored(name, patterns):
+	for pattern in patterns:
+		if fnmatch.fnmatchcase(name, pattern):
+			return True;
+	return False;
+
+# Get the local directory names defined in an svn:externals property value
+# - only those directly inside the directory that the property is set on are returned
+def getExternalsDirs(value):
+	names = set();
+
+	for line in value.splitlines():
+		parts = line.split();
+		if not parts or parts[0].startswith('#'):
+			continue;
+
+		# old format is "dir [-r N] URL", new one is "[-r N] URL[@peg] dir"
+		if ('://' in parts[0]) or parts[0].startswith(('^/', '/', '../', '-r')):
+			name = parts[-1];
+		else:
+			name = parts[0];
+
+		if '/' not in name:
+			names.add(name);
+
+	return names;
+
+#######################################
+# Keyword/EOL Translation
+
+# Keywords (and their aliases) that may be expanded by svn:keywords
+KeywordAliases = {
+	'Date'                : ('Date', 'LastChangedDate'),
+	'LastChangedDate'     : ('Date', 'LastChangedDate'),
+	'Revision'            : ('Revision', 'Rev', 'LastChangedRevision'),
+	'Rev'                 : ('Revision', 'Rev', 'LastChangedRevision'),
+	'LastChangedRevision' : ('Revision', 'Rev', 'LastChangedRevision'),
+	'Author'              : ('Author', 'LastChangedBy'),
+	'LastChangedBy'       : ('Author', 'LastChangedBy'),
+	'URL'                 : ('URL', 'HeadURL'),
+	'HeadURL'             : ('URL', 'HeadURL'),
+	'Id'                  : ('Id',),
+	'Header'              : ('Header',),
+};
+
+# Convert contents of a working file back to the "normal form" stored in the text-base,
+# by undoing eol-style conversion and keyword expansion
+# < data: (str) working file contents
+# < props: (dict<str, str>) versioned properties of the file
+def detranslate(data, props):
+	# eol-style - normal form uses LF line endings
+	if 'svn:eol-style' in props:
+		data = data.replace('\r\n', '\n').replace('\r', '\n');
+
+	# keywords - contract "$Keyword: value $" back to "$Keyword$"
+	if 'svn:keywords' in props:
+		names = set();
+		for kw in props['svn:keywords'].split():
+			names.update(KeywordAliases.get(kw, (kw,)));
+
+		if names:
+			pattern = re.compile(r'\$(%s)::? [^$\n]* \$' % '|'.join(re.escape(n) for n in names));
+			data = pattern.sub(r'$\1$', data);
+
+	return data;
+
+# Compute the checksum of a file, in the same form as svn records it
+# < fileN: (str) path to file
+# < algo: (str) 'md5' or 'sha1'
+# < (props): (dict) versioned properties - when given, the contents are detranslated first
+# > return[0]: (str) hex digest
+def fileChecksum(fileN, algo, props=None):
+	h = hashlib.new(algo);
+
+	with open(fileN, 'rb') as f:
+		if props:
+			# translated files need to be processed as a whole (line endings could straddle chunks)
+			h.update(detranslate(f.read(), props));
+		else:
+			while True:
+				chunk = f.read(1 << 20);
+				if not chunk:
+					break;
+				h.update(chunk);
+
+	return h.hexdigest();
+
+#######################################
+# Node Records
+
+# Summary of what the metadata records about a versioned path
+class SvnWcNode(object):
+	__slots__ = (
+		'name',				# (str) name of file/directory within its parent
+		'kind',				# (str) 'file' or 'dir'
+		'schedule',			# (str) 'normal', 'add', 'delete', or 'replace'
+		'revision',			# (int) working revision, or None if unknown
+
+		'checksum',			# (tuple<str, str>) (algo, hexdigest) for text-base, or None
+		'recordedSize',		# (int) size of working file when last known to be unmodified, or None
+		'recordedTime',		# (int) mtime (us) of working file when last known to be unmodified, or None
+
+		'textConflict',		# (bool) file has unresolved text conflicts
+		'propConflict',		# (bool) path has unresolved property conflicts
+		'propMods',			# (bool) properties have been modified locally
+		'translated',		# (bool) file has eol-style/keywords props, so contents need detranslating before comparing
+		'incomplete',		# (bool) directory is incomplete (i.e. interrupted update)
+	);
+
+	def __init__(self, name, kind):
+		self.name = name;
+		self.kind = kind;
+		self.schedule = 'normal';
+		self.revision = None;
+
+		self.checksum = None;
+		self.recordedSize = None;
+		self.recordedTime = None;
+
+		self.textConflict = False;
+		self.propConflict = False;
+		self.propMods = False;
+		self.translated = False;
+		self.incomplete = False;
+
+#######################################
+# 1.4-1.6 Working Copies ("entries" file)
+
+# Metadata for working copies using the entries-file format, where each
+# versioned directory has its own admin directory
+class SvnEntriesMetadata(object):
+	# Class Defines ======================================
+	# Supported entries-file formats (1.4, 1.5, 1.6)
+	FORMATS = (8, 9, 10);
+
+	# Indices of the fields we're interested in, within each entry
+	F_NAME, F_KIND, F_REVISION, F_URL, F_REPOS, F_SCHEDULE, F_TEXT_TIME, F_CHECKSUM = range(8);
+	F_HAS_PROPS, F_HAS_PROP_MODS, F_CACHABLE_PROPS, F_PRESENT_PROPS = range(11, 15);
+	F_CONFLICT_OLD, F_CONFLICT_NEW, F_CONFLICT_WRK, F_PROP_REJECT = range(15, 19);
+	F_DELETED, F_ABSENT, F_INCOMPLETE = range(22, 25);
+	F_WORKING_SIZE = 32;
+
+	# Instance Settings ==================================
+	__slots__ = (
+		'wcRoot',		# (str) root directory of working copy
+		'adminName',	# (str) name of admin directories
+	);
+
+	# Setup ==============================================
+
+	def __init__(self, wcRoot, adminName):
+		self.wcRoot = wcRoot;
+		self.adminName = adminName;
+
+	# check whether the admin directory of the given directory is in this format
+	@classmethod
+	def detect(cls, dirPath, adminName):
+		return cls.readFormat(os.path.join(dirPath, adminName, "entries")) in cls.FORMATS;
+
+	# get the format number from the first line of an entries file
+	# > return[0]: (int) format, or None if file isn't valid
+	@staticmethod
+	def readFormat(entriesFile):
+		try:
+			with open(entriesFile, 'rb') as f:
+				return int(f.readline().strip());
+		except (IOError, ValueError):
+			return None;
+
+	def close(self):
+		pass;
+
+	# Paths ==============================================
+
+	# get admin directory for a directory within the working copy
+	def adminDir(self, relDir):
+		return os.path.join(self.wcRoot, relDir, self.adminName);
+
+	# get path of the text-base (pristine copy) for a file
+	def getPristinePath(self, relDir, node):
+		return os.path.join(self.adminDir(relDir), "text-base", node.name + ".svn-base");
+
+	# Reading ============================================
+
+	# read the entries file for a directory
+	# > return[0]: (list<list<str>>) fields for each entry, with "this dir" first, or None
+	def readEntries(self, relDir):
+		try:
+			with open(os.path.join(self.adminDir(relDir), "entries"), 'rb') as f:
+				data = f.read();
+		except IOError:
+			return None;
+
+		# first line is format, then each entry is terminated by a formfeed line
+		fmtLine, sep, data = data.partition('\n');
+		if int(fmtLine) not in SvnEntriesMetadata.FORMATS:
+			return None;
+
+		return [rec.split('\n') for rec in data.split('\f\n') if rec];
+
+	# get the metadata for a directory and its children
+	# < relDir: (str) directory relative to working copy root
+	# > return[0]: (SvnWcNode) node for the directory itself, or None if it isn't versioned in this format
+	# > return[1]: (dict<str, SvnWcNode>) nodes for the versioned children
+	def readDir(self, relDir):
+		entries = self.readEntries(relDir);
+		if not entries:
+			return None, {};
+
+		# "this dir" entry first - its revision is the default for the rest
+		dirNode = self.makeNode(entries[0], None);
+		children = {};
+
+		for fields in entries[1:]:
+			node = self.makeNode(fields, dirNode.revision);
+			if node is not None:
+				children[node.name] = node;
+
+		return dirNode, children;
+
+	# create a node from the fields of an entry
+	# > return[0]: (SvnWcNode) or None if entry isn't present in working copy
+	def makeNode(self, fields, defaultRevision):
+		field = lambda i: fields[i] if i < len(fields) else "";
+
+		# skip placeholders for things not actually in working copy
+		if field(SvnEntriesMetadata.F_DELETED) or field(SvnEntriesMetadata.F_ABSENT):
+			return None;
+
+		node = SvnWcNode(field(SvnEntriesMetadata.F_NAME), field(SvnEntriesMetadata.F_KIND) or 'file');
+
+		node.schedule = field(SvnEntriesMetadata.F_SCHEDULE) or 'normal';
+
+		rev = field(SvnEntriesMetadata.F_REVISION);
+		node.revision = int(rev) if rev else defaultRevision;
+
+		if field(SvnEntriesMetadata.F_CHECKSUM):
+			node.checksum = ('md5', field(SvnEntriesMetadata.F_CHECKSUM));
+		node.recordedTime = parseSvnTime(field(SvnEntriesMetadata.F_TEXT_TIME));
+
+		size = field(SvnEntriesMetadata.F_WORKING_SIZE);
+		if size and (int(size) >= 0):
+			node.recordedSize = int(size);
+
+		node.textConflict = bool(field(SvnEntriesMetadata.F_CONFLICT_OLD) or field(SvnEntriesMetadata.F_CONFLICT_NEW) or field(SvnEntriesMetadata.F_CONFLICT_WRK));
+		node.propConflict = bool(field(SvnEntriesMetadata.F_PROP_REJECT));
+		node.propMods = bool(field(SvnEntriesMetadata.F_HAS_PROP_MODS));
+
+		presentProps = field(SvnEntriesMetadata.F_PRESENT_PROPS).split();
+		node.translated = ('svn:eol-style' in presentProps) or ('svn:keywords' in presentProps);
+
+		node.incomplete = bool(field(SvnEntriesMetadata.F_INCOMPLETE));
+
+		return node;
+
+	# get the (working) properties for a node
+	# < relDir: (str) directory containing the node (or the directory itself when node.name is "")
+	# > return[0]: (dict<str, str>)
+	def getProps(self, relDir, node):
+		adminDir = self.adminDir(relDir);
+
+		if node.name:
+			candidates = (os.path.join(adminDir, "props", node.name + ".svn-work"),
+			              os.path.join(adminDir, "prop-base", node.name + ".svn-base"));
+		else:
+			candidates = (os.path.join(adminDir, "dir-props"),
+			              os.path.join(adminDir, "dir-prop-base"));
+
+		for fileN in candidates:
+			try:
+				with open(fileN, 'rb') as f:
+					return parseHashDump(f.read());
+			except IOError:
+				continue;
+
+		return {};
+
+	# Checking ===========================================
+	
+	# get the pristine copies that the metadata for a directory refers to
+	# < (relDir): (str) directory relative to working copy root
+	# > return[0]: (list<tuple>) (path, (algo, hexdigest)) for each pristine copy
+	def listPristines(self, relDir=""):
+		dirNode, children = self.readDir(relDir);
+		
+		return [(self.getPristinePath(relDir, node), node.checksum)
+		        for name, node in sorted(children.iteritems())
+		        if (node.kind == 'file') and (node.checksum is not None)];
+	
+	# get any locks which are being held on a directory (i.e. left behind by an interrupted operation)
+	# < (relDir): (str) directory relative to working copy root
+	# > return[0]: (list<str>) paths of the locked directories
+	def listLocks(self, relDir=""):
+		if os.path.exists(os.path.join(self.adminDir(relDir), "lock")):
+			return [os.path.normpath(os.path.join(self.wcRoot, relDir))];
+		else:
+			return [];
+
+#######################################
+# 1.7+ Working Copies ("wc.db")
+
+# Metadata for working copies using a single sqlite database at the root
+class SvnWcDbMetadata(object):
+	# Instance Settings ==================================
+	__slots__ = (
+		'wcRoot',		# (str) root directory of working copy
+		'adminName',	# (str) name of admin directory
+
+		'db',			# (sqlite3.Connection) connection to wc.db
+		'wcId',			# (int) id of working copy root in database
+		'conflictCols',	# (list<str>) columns in ACTUAL_NODE describing conflicts (these vary by version)
+		'props',		# (dict<str, str>) raw property skels for nodes read so far, by relpath
+	);
+
+	# Setup ==============================================
+
+	# ! must be created in the thread it will be used in (sqlite restriction)
+	def __init__(self, wcRoot, adminName):
+		self.wcRoot = wcRoot;
+		self.adminName = adminName;
+
+		self.db = sqlite3.connect(os.path.join(wcRoot, adminName, "wc.db"));
+		self.db.text_factory = str;
+
+		self.wcId = self.db.execute("SELECT id FROM wcroot LIMIT 1").fetchone()[0];
+
+		# 1.7 has separate columns for the conflict files, 1.8+ only has a skel
+		cols = [row[1] for row in self.db.execute("PRAGMA table_info(actual_node)")];
+		self.conflictCols = [c for c in ('conflict_old', 'conflict_new', 'conflict_working', 'prop_reject', 'conflict_data') if c in cols];
+
+		self.props = {};
+
+	# check whether the admin directory of the given directory is in this format
+	@classmethod
+	def detect(cls, dirPath, adminName):
+		return (sqlite3 is not None) and os.path.exists(os.path.join(dirPath, adminName, "wc.db"));
+
+	def close(self):
+		self.db.close();
+
+	# Paths ==============================================
+
+	# convert a path in the working copy to the form used in the database
+	@staticmethod
+	def relpath(relDir, name=""):
+		path = os.path.join(relDir, name) if name else relDir;
+		return path.replace(os.sep, '/');
+
+	# get path of the pristine copy for a file
+	def getPristinePath(self, relDir, node):
+		if (node.checksum is None) or (node.checksum[0] != 'sha1'):
+			return None;
+
+		digest = node.checksum[1];
+		return os.path.join(self.wcRoot, self.adminName, "pristine", digest[:2], digest + ".svn-base");
+
+	# Reading ============================================
+
+	# get the metadata for a directory and its children
+	# < relDir: (str) directory relative to working copy root
+	# > return[0]: (SvnWcNode) node for the directory itself, or None if it isn't versioned
+	# > return[1]: (dict<str, SvnWcNode>) nodes for the versioned children
+	def readDir(self, relDir):
+		dirPath = SvnWcDbMetadata.relpath(relDir);
+
+		# all layers of the nodes for the dir and its children, lowest layer first
+		rows = {};
+		for row in self.db.execute(
+				"SELECT local_relpath, op_depth, presence, kind, revision, checksum, translated_size, last_mod_time, properties "
+				"FROM nodes WHERE wc_id = ? AND (parent_relpath = ? OR local_relpath = ?) "
+				"ORDER BY local_relpath, op_depth", (self.wcId, dirPath, dirPath)):
+			rows.setdefault(row[0], []).append(row);
+
+		# local changes to props + conflicts
+		actual = {};
+		for row in self.db.execute(
+				"SELECT local_relpath, properties, %s FROM actual_node "
+				"WHERE wc_id = ? AND (parent_relpath = ? OR local_relpath = ?)" % (', '.join(self.conflictCols) or "NULL"),
+				(self.wcId, dirPath, dirPath)):
+			actual[row[0]] = row;
+
+		# build nodes
+		dirNode = None;
+		children = {};
+
+		for path, layers in rows.iteritems():
+			node = self.makeNode(path, layers, actual.get(path));
+
+			if node is None:
+				continue;
+			elif path == dirPath:
+				dirNode = node;
+			else:
+				children[node.name] = node;
+
+		return dirNode, children;
+
+	# create a node from its layers in the NODES table
+	def makeNode(self, path, layers, actual):
+		base = layers[0] if layers[0][1] == 0 else None;
+		top = layers[-1];
+
+		presence = top[2];
+		opDepth = top[1];
+
+		# things which aren't in the working copy
+		if presence in ('not-present', 'excluded', 'server-excluded', 'absent') and (opDepth == 0):
+			return None;
+
+		# for deleted nodes, the details are in the layer being deleted
+		info = top;
+		if presence == 'base-deleted':
+			info = layers[-2] if len(layers) > 1 else top;
+
+		node = SvnWcNode(path.rpartition('/')[2], 'dir' if info[3] == 'dir' else 'file');
+
+		# schedule
+		if opDepth == 0:
+			node.incomplete = (presence == 'incomplete');
+		elif presence in ('base-deleted', 'not-present'):
+			node.schedule = 'delete';
+		elif opDepth == (path.count('/') + 1 if path else 0):
+			# root of an add/copy - replaced if there's still something underneath
+			if (base is not None) and (base[2] == 'normal'):
+				node.schedule = 'replace';
+			else:
+				node.schedule = 'add';
+
+		# text details
+		node.revision = base[4] if (base is not None) else None;
+		if info[5] and info[5].startswith('$sha1$'):
+			node.checksum = ('sha1', info[5][6:]);
+		node.recordedSize = info[6];
+		node.recordedTime = info[7];
+
+		# props
+		rawProps = info[8] or "";
+		if actual is not None:
+			node.propMods = actual[1] is not None;
+			if actual[1] is not None:
+				rawProps = actual[1];
+
+			# conflicts
+			conflicts = dict(zip(self.conflictCols, actual[2:]));
+			if conflicts.get('conflict_data'):
+				node.textConflict = "text" in conflicts['conflict_data'];
+				node.propConflict = "prop" in conflicts['conflict_data'];
+			else:
+				node.textConflict = bool(conflicts.get('conflict_old') or conflicts.get('conflict_new') or conflicts.get('conflict_working'));
+				node.propConflict = bool(conflicts.get('prop_reject'));
+
+		node.translated = ('svn:eol-style' in rawProps) or ('svn:keywords' in rawProps);
+		self.props[path] = rawProps;
+
+		return node;
+
+	# get the (working) properties for a node
+	# < relDir: (str) directory containing the node (or the directory itself when node.name is "")
+	# > return[0]: (dict<str, str>)
+	def getProps(self, relDir, node):
+		return parseSkelProps(self.props.get(SvnWcDbMetadata.relpath(relDir, node.name)));
+
+	# Checking ===========================================
+	
+	# get the pristine copies that the database knows about
+	# - these are shared by the whole working copy, so there's nothing for subdirectories
+	# < (relDir): (str) directory relative to working copy root
+	# > return[0]: (list<tuple>) (path, (algo, hexdigest)) for each pristine copy
+	def listPristines(self, relDir=""):
+		if relDir:
+			return [];
+		
+		pristines = [];
+		for (checksum,) in self.db.execute("SELECT checksum FROM pristine ORDER BY checksum"):
+			if checksum.startswith('$sha1$'):
+				digest = checksum[6:];
+				path = os.path.join(self.wcRoot, self.adminName, "pristine", digest[:2], digest + ".svn-base");
+				pristines.append((path, ('sha1', digest)));
+		
+		return pristines;
+	
+	# get any locks which are being held within a directory (i.e. left behind by an interrupted operation)
+	# < (relDir): (str) directory relative to working copy root
+	# > return[0]: (list<str>) paths of the locked directories
+	def listLocks(self, relDir=""):
+		dirPath = SvnWcDbMetadata.relpath(relDir);
+		
+		locks = [];
+		for (lockPath,) in self.db.execute("SELECT local_dir_relpath FROM wc_lock WHERE wc_id = ?", (self.wcId,)):
+			if (not dirPath) or (lockPath == dirPath) or lockPath.startswith(dirPath + '/'):
+				locks.append(os.path.normpath(os.path.join(self.wcRoot, lockPath.replace('/', os.sep))));
+		
+		return locks;
+
+#######################################
+# Format Detection
+
+# Get the name of the admin directories used by a branch
+# < branchType: (BranchType.TYPE_*)
+# > return[0]: (str) ".svn" or "_svn"
+def getAdminName(branchType):
+	if branchType == BranchType.TYPE_TRUNK_REF:
+		return SVN_DIRNAME_BRANCH2;
+	else:
+		return SVN_DIRNAME_BRANCH1;
+
+# Find a metadata reader for the working copy
+# < wcRoot: (str) root directory of working copy
+# < adminName: (str) name of admin directories to use (i.e. ".svn" or "_svn")
+# > return[0]: (class) SvnEntriesMetadata or SvnWcDbMetadata, or None if format isn't recognised
+def detectWcFormat(wcRoot, adminName):
+	for cls in (SvnWcDbMetadata, SvnEntriesMetadata):
+		if cls.detect(wcRoot, adminName):
+			return cls;
+	return None;
+
+# Get the repository URL that a directory's metadata says it is a working copy of
+# - ".svn" and "_svn" only point at the same place until a branch has been made
+# < dirPath: (str) directory containing the admin directory
+# < adminName: (str) name of admin directory to use (i.e. ".svn" or "_svn")
+# > return[0]: (str) URL, or None if it couldn't be read
+def readMetadataUrl(dirPath, adminName):
+	if SvnWcDbMetadata.detect(dirPath, adminName):
+		try:
+			db = sqlite3.connect(os.path.join(dirPath, adminName, "wc.db"));
+			try:
+				row = db.execute(
+					"SELECT repository.root, nodes.repos_path FROM nodes JOIN repository ON nodes.repos_id = repository.id "
+					"WHERE nodes.local_relpath = '' AND nodes.op_depth = 0 LIMIT 1").fetchone();
+			finally:
+				db.close();
+		except sqlite3.Error:
+			return None;
+		
+		if (row is None) or (row[0] is None):
+			return None;
+		
+		root, reposPath = str(row[0]).rstrip('/'), str(row[1] or "");
+		return (root + '/' + reposPath) if reposPath else root;
+	elif SvnEntriesMetadata.detect(dirPath, adminName):
+		# "this dir" entry comes first
+		entries = SvnEntriesMetadata(dirPath, adminName).readEntries("");
+		if not entries or (len(entries[0]) <= SvnEntriesMetadata.F_URL):
+			return None;
+		
+		return entries[0][SvnEntriesMetadata.F_URL] or None;
+	else:
+		return None;
+
+#######################################
@@ -0,0 +1,310 @@
+# Duality SVN
+# Original Author: Joshua Leung
+#
+# Built-in Status Engine - computes working copy status directly from the
+# metadata in the admin directories, instead of running "svn status"
+
+from coreDefines import *
+
+from InternalOperationProcess import *
+from SvnStatusList import SvnStatusListItem, SvnStatusRecordStore
+from SvnWcMetadata import *
+
+#######################################
+# Status Engine
+
+# Walks a working copy, comparing what's on disk against what the metadata records
+class SvnWcStatusEngine(object):
+	__slots__ = (
+		'wcRoot',			# (str) root directory of working copy
+		'adminName',		# (str) name of admin directories to use (i.e. ".svn" or "_svn")
+		'metadataType',		# (class) reader for the working copy's metadata format
+
+		'globalIgnores',	# (list<str>) patterns for unversioned files that aren't reported
+		'cancelled',		# (bool) stop walking as soon as possible
+
+		'store',			# (SvnStatusRecordStore) store that the status items get created in
+		
+		'numHashed',		# (int) number of files whose contents had to be checked
+	);
+
+	# Setup ==============================================
+
+	def __init__(self, wcRoot, adminName):
+		self.wcRoot = wcRoot;
+		self.adminName = adminName;
+		self.metadataType = detectWcFormat(wcRoot, adminName);
+
+		self.globalIgnores = getGlobalIgnores();
+		self.cancelled = False;
+		
+		self.store = SvnStatusRecordStore();
+
+		self.numHashed = 0;
+
+	# check whether the working copy can be handled by the engine
+	def isSupported(self):
+		return self.metadataType is not None;
+
+	# request that the walk stops
+	def cancel(self):
+		self.cancelled = True;
+
+	# Status =============================================
+
+	# Generate status items for all paths with "interesting" status
+	# ! When the reader uses sqlite, this must be run in the thread that it is used from
+	# < (relDirs): (list<str>) directories to limit the status check to, without recursing
+	#	into their subdirectories (i.e. like "svn status --depth=immediates"), or None for everything
+	# > yields: (SvnStatusListItem)
+	def iterStatus(self, relDirs=None):
+		metadata = self.metadataType(self.wcRoot, self.adminName);
+
+		try:
+			# the root is reported as "."
+			pending = [];
+			for relDir in (relDirs if relDirs is not None else [""]):
+				dirNode, children = metadata.readDir(relDir);
+				if dirNode is None:
+					continue;
+				
+				item = self.makeItem(relDir or ".", dirNode, self.dirStatus(dirNode));
+				if item:
+					yield item;
+
+				pending.append((relDir, dirNode, children));
+			
+			# walk the tree, one directory at a time
+			while pending and not self.cancelled:
+				relDir, dirNode, children = pending.pop();
+
+				for item, subdir in self.walkDir(metadata, relDir, dirNode, children):
+					if item:
+						yield item;
+					if subdir and (relDirs is None):
+						pending.append(subdir);
+		finally:
+			metadata.close();
+
+	# Get status for the contents of a directory
+	# > yields: (SvnStatusListItem, tuple) status item and/or info for a subdirectory to recurse into
+	def walkDir(self, metadata, relDir, dirNode, children):
+		absDir = os.path.join(self.wcRoot, relDir);
+
+		# what's actually on disk
+		try:
+			onDisk = dict((entry.name, entry) for entry in scanDir(absDir));
+		except OSError:
+			onDisk = {};
+
+		# versioned children
+		for name, node in children.iteritems():
+			path = os.path.join(relDir, name);
+			entry = onDisk.get(name);
+
+			if node.kind == 'dir':
+				if (entry is None) or not entry.is_dir():
+					# missing, or obstructed by something else
+					yield self.makeItem(path, node, self.missingStatus(node, entry)), None;
+					continue;
+
+				# the directory's own metadata has the details
+				subNode, subChildren = metadata.readDir(path);
+				if subNode is None:
+					# not versioned (in this format) anymore
+					yield self.makeItem(path, node, ('~', ' ')), None;
+				else:
+					if node.schedule != 'normal':
+						subNode.schedule = node.schedule;
+
+					yield self.makeItem(path, subNode, self.dirStatus(subNode)), (path, subNode, subChildren);
+			else:
+				if (entry is None) or entry.is_dir():
+					yield self.makeItem(path, node, self.missingStatus(node, entry)), None;
+				else:
+					yield self.makeItem(path, node, self.fileStatus(metadata, relDir, node, entry)), None;
+
+		# unversioned stuff - only check ignore patterns + externals when there's something to report
+		unversioned = [name for name in onDisk if (name not in children) and (name not in (SVN_DIRNAME_BRANCH1, SVN_DIRNAME_BRANCH2))];
+
+		if unversioned:
+			props = metadata.getProps(relDir, dirNode) if dirNode else {};
+			ignores = self.globalIgnores + props.get('svn:ignore', "").split();
+			externals = getExternalsDirs(props.get('svn:externals', ""));
+
+			for name in unversioned:
+				if name in externals:
+					yield self.makeUnversionedItem(os.path.join(relDir, name), 'X', onDisk[name]), None;
+				elif not isIgnored(name, ignores):
+					yield self.makeUnversionedItem(os.path.join(relDir, name), '?', onDisk[name]), None;
+
+	# Status Codes -------------------------------------
+
+	# get status codes for an item that isn't where it's supposed to be
+	# < entry: (DirEntry) whatever's on disk at that path instead, or None
+	# > return: (tuple<str, str>) file and prop status codes
+	def missingStatus(self, node, entry):
+		if node.schedule == 'delete':
+			return ('D', ' ');
+		elif entry is None:
+			return ('!', ' ');
+		else:
+			return ('~', ' ');
+
+	# get status codes for a directory
+	def dirStatus(self, node):
+		return (self.scheduleCode(node) or ('!' if node.incomplete else ' '), self.propCode(node));
+
+	# get status codes for a file which is present on disk
+	def fileStatus(self, metadata, relDir, node, entry):
+		fileCode = self.scheduleCode(node);
+
+		if not fileCode:
+			if node.textConflict:
+				fileCode = 'C';
+			elif self.isModified(metadata, relDir, node, entry):
+				fileCode = 'M';
+			else:
+				fileCode = ' ';
+
+		return (fileCode, self.propCode(node));
+
+	# status code for scheduled changes
+	def scheduleCode(self, node):
+		return {'add': 'A', 'delete': 'D', 'replace': 'R'}.get(node.schedule);
+
+	# status code for properties
+	def propCode(self, node):
+		if node.propConflict:
+			return 'C';
+		elif node.propMods:
+			return 'M';
+		else:
+			return ' ';
+
+	# Modification Checks ------------------------------
+
+	# check if the contents of a file differ from its text-base
+	# - stat info is checked first, and the contents only need to be hashed when that's inconclusive
+	def isModified(self, metadata, relDir, node, entry):
+		st = entry.stat();
+
+		# unchanged since svn last checked it
+		if (node.recordedSize == st.st_size) and (node.recordedTime is not None):
+			if abs(statTimeMicro(st) - node.recordedTime) <= 1:
+				return False;
+
+		# size difference is conclusive, unless contents get translated
+		if (node.recordedSize is not None) and (node.recordedSize != st.st_size) and not node.translated:
+			return True;
+
+		# nothing to compare against
+		if node.checksum is None:
+			return True;
+
+		# compare checksums
+		props = metadata.getProps(relDir, node) if node.translated else None;
+		algo, digest = node.checksum;
+
+		self.numHashed += 1;
+		try:
+			return fileChecksum(entry.path, algo, props) != digest;
+		except IOError:
+			return True;
+
+	# Items --------------------------------------------
+
+	# create status item for a versioned path
+	# < codes: (tuple<str, str>) file and prop status codes
+	# > return[0]: (SvnStatusListItem) or None when there's nothing to report
+	def makeItem(self, path, node, codes):
+		if codes == (' ', ' '):
+			return None;
+
+		item = SvnStatusListItem(store=self.store);
+		item.path = path;
+		item.fileCode, item.propCode = codes;
+		item.kind = node.kind;
+		item.revision = node.revision;
+		item.setAutoDefaultEnabledStatus();
+
+		return item;
+
+	# create status item for an unversioned path
+	def makeUnversionedItem(self, path, code, entry):
+		item = SvnStatusListItem(store=self.store);
+		item.path = path;
+		item.fileCode = code;
+		item.kind = 'dir' if entry.is_dir() else 'file';
+		item.setAutoDefaultEnabledStatus();
+
+		return item;
+
+#######################################
+# Process Wrappers
+
+# Thread running the status engine, producing status items as its output
+class SvnWcStatusThread(ThreadAsFauxProcess):
+	__slots__ = (
+		'engine',	# (SvnWcStatusEngine)
+	);
+
+	def __init__(self, engine):
+		ThreadAsFauxProcess.__init__(self);
+		self.engine = engine;
+
+	# QProcess-style "kill" - ask engine to stop too, as it may be a while before the next item
+	def kill(self):
+		ThreadAsFauxProcess.kill(self);
+		self.engine.cancel();
+
+	# walk the working copy
+	def run(self):
+		try:
+			# any args are the directories to limit the check to
+			for item in self.engine.iterStatus(self.args or None):
+				self.write(item);
+		except Exception, e:
+			if not self.engine.cancelled:
+				self.error("Built-in status engine failed: %s" % (e));
+				self.done(1);
+				return;
+
+		if self.engine.cancelled:
+			self.done(-1, QProcess.CrashExit);
+		else:
+			self.done(0);
+
+# Operation wrapper for running the status engine on a branch's working copy
+# - the output callback receives SvnStatusListItems instead of lines of text
+class SvnWcStatusProcess(InternalOperationProcess):
+	# Internal Setup ==============================
+
+	def __init__(self, parent, name, branchType):
+		engine = SvnWcStatusEngine(project.workingCopyDir, SvnWcStatusProcess.adminName(branchType));
+		super(SvnWcStatusProcess, self).__init__(parent, name, SvnWcStatusThread(engine));
+
+	# get the name of the admin directories used by a branch
+	@staticmethod
+	def adminName(branchType):
+		return getAdminName(branchType);
+
+	# check whether the working copy of the branch can be handled by the status engine,
+	# or whether the svn client needs to be used instead
+	@staticmethod
+	def canHandle(branchType):
+		if not project.workingCopyDir:
+			return False;
+		return detectWcFormat(project.workingCopyDir, SvnWcStatusProcess.adminName(branchType)) is not None;
+
+	# the engine only ever reads the working copy
+	def getWcAccess(self):
+		return WcAccess.ACCESS_READ;
+		
+	# Internal (Reading) ------------------------
+
+	# read output items from engine - overridden to pass items through as-is
+	def readOutput(self):
+		self.handleOutputLines(self.process.readOutputEntries());
+
+#######################################
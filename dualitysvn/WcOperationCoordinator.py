@@ -0,0 +1,329 @@
+# Duality SVN
+# Original Author: Joshua Leung
+#
+# Working Copy Operation Coordinator - makes operations on the same working copy
+# take turns, so that they don't trip over each other's locks
+
+from coreDefines import *
+
+from OperationFuture import *
+
+from collections import deque
+import time
+
+#########################################
+# Access Types
+
+# How an operation uses the working copy
+# - reads only look at the working copy (i.e. status, diff), so may run alongside other reads
+# - writes change the working copy (or take its locks), so need it all to themselves
+class WcAccess:
+	ACCESS_READ, ACCESS_WRITE = range(2);
+	
+	# User-visible names of each type
+	Names = {
+		ACCESS_READ  : "Read",
+		ACCESS_WRITE : "Write",
+	};
+
+#########################################
+# Tickets
+
+# Place in line for an operation on the working copy
+class WcOperationTicket(object):
+	__slots__ = (
+		# Request -------------------------
+		'label',		# (str) user-visible name of the operation
+		'access',		# (WcAccess.ACCESS_*) how the operation uses the working copy
+		'key',			# (hashable) requests with the same key are duplicates of each other, or None
+		'startCb',		# (fn(WcOperationTicket) -> OperationFuture) starts the operation, returning its future (or None if there was nothing to do)
+		'preemptible',	# (bool) whether the operation may be stopped (and requeued) to let a write go ahead
+		
+		# Progress ------------------------
+		'operation',	# (OperationFuture) future of the operation, once started
+		'future',		# (OperationFuture) done once the operation is over (or dropped from the queue) - value is the operation's result
+		'preempted',	# (bool) whether the operation was stopped to let a write go ahead
+		
+		# Timing --------------------------
+		'queuedTime',	# (float) time that the request was made
+		'startTime',	# (float) time that the operation was started, or None
+		'endTime',		# (float) time that the operation was over, or None
+	);
+	
+	def __init__(self, label, access, startCb, key=None, preemptible=False):
+		self.label = label;
+		self.access = access;
+		self.key = key;
+		self.startCb = startCb;
+		self.preemptible = preemptible;
+		
+		self.operation = None;
+		self.future = OperationFuture();
+		self.preempted = False;
+		
+		self.queuedTime = time.time();
+		self.startTime = None;
+		self.endTime = None;
+	
+	# get how long the operation has been (or was) waiting for its turn
+	# > return[0]: (float) seconds
+	def getWaitTime(self):
+		return (self.startTime or self.endTime or time.time()) - self.queuedTime;
+
+#########################################
+# Coordinator
+
+# Decides when operations on a working copy get to run
+#
+# Operations are run in the order that they're asked for, except that:
+#	- writes only run once nothing else is running, and nothing queued after a write
+#	  may jump ahead of it
+#	- reads run alongside each other (and start straight away, unless a write is
+#	  running or waiting)
+#	- duplicate requests (i.e. with the same key) which are still waiting get
+#	  merged into the one already waiting, so that status refreshes asked for by
+#	  several actions in a row only happen once
+#	- duplicates of an operation which is already running wait for it to end
+#	  before being run (once), instead of running alongside it, as they were asked
+#	  for because things changed after it started (and would trip over it anyway,
+#	  i.e. by clearing the status list that it's filling)
+#	- preemptible operations (i.e. status refreshes) which are holding up a write
+#	  get stopped, and requeued after it, instead of making the write wait for them
+#
+# There's one coordinator per working copy, retrieved using forWorkingCopy()
+class WcOperationCoordinator(object):
+	# Class Defines ======================================
+	# Coordinator for each working copy
+	_coordinators = {};
+	
+	# Instance Settings ==================================
+	__slots__ = (
+		'wcDir',		# (str) root directory of the working copy
+		
+		# Scheduling ----------------------
+		'queue',		# (deque<WcOperationTicket>) operations waiting for their turn, in the order they were asked for
+		'running',		# (list<WcOperationTicket>) operations which have been started and aren't over yet
+		
+		'scheduling',	# (bool) whether operations are being started at the moment (i.e. when operations end straight away)
+		'reschedule',	# (bool) whether things changed while starting operations, so another look is needed
+		
+		# Stats ---------------------------
+		'numRequests',	# (int) number of operations asked for
+		'numCoalesced',	# (int) number of requests merged into one already waiting
+		'numPreempted',	# (int) number of operations stopped to let a write go ahead
+		'numStarted',	# (int) number of operations started
+		'totalWait',	# (float) total time that started operations waited for their turn
+		'maxWait',		# (float) longest time that an operation waited for its turn
+	);
+	
+	# ctor
+	# < wcDir: (str) root directory of the working copy
+	def __init__(self, wcDir):
+		self.wcDir = wcDir;
+		
+		self.queue = deque();
+		self.running = [];
+		
+		self.scheduling = False;
+		self.reschedule = False;
+		
+		self.numRequests = 0;
+		self.numCoalesced = 0;
+		self.numPreempted = 0;
+		self.numStarted = 0;
+		self.totalWait = 0.0;
+		self.maxWait = 0.0;
+	
+	# get the coordinator for a working copy
+	# < (wcDir): (str) root directory of the working copy - defaults to the project's one
+	@classmethod
+	def forWorkingCopy(cls, wcDir=None):
+		wcDir = os.path.normcase(os.path.abspath(wcDir or project.workingCopyDir or "."));
+		
+		coordinator = cls._coordinators.get(wcDir);
+		if coordinator is None:
+			coordinator = cls._coordinators[wcDir] = cls(wcDir);
+		return coordinator;
+	
+	# Requests ===========================================
+	
+	# ask for an operation to be run once it's its turn
+	# < label: (str) user-visible name of the operation
+	# < access: (WcAccess.ACCESS_*) how the operation uses the working copy
+	# < startCb: (fn(WcOperationTicket) -> OperationFuture) starts the operation - it should only be set up
+	#			 in here (not beforehand), so that it works from the state of things when it actually gets run
+	# < (key): (hashable) requests with the same key are duplicates of each other, so only one of them needs to wait
+	# < (preemptible): (bool) whether the operation may be stopped (and requeued) to let a write go ahead
+	# > return[0]: (WcOperationTicket) ticket for the operation - may be shared with a duplicate request
+	def request(self, label, access, startCb, key=None, preemptible=False):
+		self.numRequests += 1;
+		
+		return self.enqueue(WcOperationTicket(label, access, startCb, key, preemptible));
+	
+	# run an operation process once it's its turn
+	# < process: (AbstractOperationProcess) process to run - how it uses the working copy is given by its getWcAccess()
+	# < (key): (hashable) see request()
+	# < (preemptible): (bool) see request()
+	# > return[0]: (OperationFuture) done once the process is over - value is the process, or None if it never got run
+	def runProcess(self, process, key=None, preemptible=False):
+		ticket = self.request(process.opName, process.getWcAccess(), lambda ticket: process.startAsync(), key, preemptible);
+		return ticket.future;
+	
+	# drop an operation, stopping it if it's running
+	# < ticket: (WcOperationTicket)
+	def cancel(self, ticket):
+		if ticket in self.queue:
+			self.queue.remove(ticket);
+			
+			ticket.endTime = time.time();
+			ticket.future.resolve(None);
+		elif (ticket in self.running) and (ticket.operation is not None):
+			# this ends up in release() once the operation has stopped
+			ticket.operation.cancel();
+	
+	# Status =============================================
+	
+	# get the number of operations waiting for their turn
+	def queueDepth(self):
+		return len(self.queue);
+	
+	# get the number of operations running
+	def numRunning(self):
+		return len(self.running);
+	
+	# check whether an operation (with the given key) is waiting for its turn
+	def isQueued(self, key):
+		return any(ticket.key == key for ticket in self.queue);
+	
+	# check whether an operation (with the given key) is running
+	def isRunning(self, key):
+		return any(ticket.key == key for ticket in self.running);
+	
+	# check whether an operation (with the given key) is either waiting for its turn or running
+	def isPending(self, key):
+		return self.isQueued(key) or self.isRunning(key);
+	
+	# get how long each waiting operation has been waiting so far
+	# > return[0]: (list<tuple>) (label, seconds) for each, in queue order
+	def getWaitTimes(self):
+		return [(ticket.label, ticket.getWaitTime()) for ticket in self.queue];
+	
+	# get a one-line summary of how things are going
+	def getStats(self):
+		return "%d requests (%d coalesced), %d started, %d preempted - wait %.2f s avg, %.2f s max - %d running, %d queued" % (
+			self.numRequests, self.numCoalesced, self.numStarted, self.numPreempted,
+			(self.totalWait / self.numStarted) if self.numStarted else 0.0, self.maxWait,
+			len(self.running), len(self.queue));
+	
+	# Internal ===========================================
+	
+	# add an operation to the end of the queue, unless a duplicate of it is already waiting
+	# > return[0]: (WcOperationTicket) the ticket that will be run
+	def enqueue(self, ticket):
+		if ticket.key is not None:
+			for other in self.queue:
+				if other.key == ticket.key:
+					self.numCoalesced += 1;
+					return other;
+		
+		self.queue.append(ticket);
+		
+		self.schedule();
+		return ticket;
+		
+	# start whatever operations can run now
+	def schedule(self):
+		# starting operations may end up back in here (i.e. when they end straight away)
+		if self.scheduling:
+			self.reschedule = True;
+			return;
+		
+		self.scheduling = True;
+		try:
+			self.reschedule = True;
+			while self.reschedule:
+				self.reschedule = False;
+				self.startReady();
+		finally:
+			self.scheduling = False;
+	
+	# start the operations at the head of the queue, as far as the rules allow
+	def startReady(self):
+		writing = any(ticket.access == WcAccess.ACCESS_WRITE for ticket in self.running);
+		
+		for ticket in list(self.queue):
+			# starting operations may have changed things (i.e. if they ended straight away)
+			if self.reschedule:
+				return;
+			
+			if ticket.access == WcAccess.ACCESS_WRITE:
+				if self.running:
+					# refreshes don't need to finish if they're just going to be out of date anyway
+					for other in list(self.running):
+						if other.preemptible and not other.preempted:
+							self.preempt(other);
+					return;
+				
+				self.start(ticket);
+				return;
+			elif writing:
+				return;
+			elif (ticket.key is not None) and self.isRunning(ticket.key):
+				# a duplicate is still running, so this waits for it (with any more duplicates being
+				# merged into it in the meantime) - other reads may go ahead of it though
+				continue;
+			else:
+				self.start(ticket);
+	
+	# start an operation
+	def start(self, ticket):
+		self.queue.remove(ticket);
+		self.running.append(ticket);
+		
+		ticket.startTime = time.time();
+		
+		wait = ticket.getWaitTime();
+		self.numStarted += 1;
+		self.totalWait += wait;
+		self.maxWait = max(self.maxWait, wait);
+		
+		try:
+			ticket.operation = ticket.startCb(ticket);
+		except:
+			# it can't ever end, so it mustn't hold up everything else
+			self.release(ticket);
+			raise;
+		
+		if ticket.operation is None:
+			# nothing to do
+			self.release(ticket);
+		else:
+			ticket.operation.addDoneCb(lambda value: self.release(ticket, value));
+	
+	# stop an operation to let a write go ahead, requeueing it to run after that
+	def preempt(self, ticket):
+		ticket.preempted = True;
+		self.numPreempted += 1;
+		
+		self.enqueue(WcOperationTicket(ticket.label, ticket.access, ticket.startCb, ticket.key, ticket.preemptible));
+		
+		# it shouldn't complain about being stopped
+		if ticket.operation.process is not None:
+			ticket.operation.process.silentErrors = True;
+		
+		ticket.operation.cancel();
+	
+	# an operation is over
+	# < (value): result of the operation
+	def release(self, ticket, value=None):
+		if ticket not in self.running:
+			return;
+		
+		self.running.remove(ticket);
+		ticket.endTime = time.time();
+		
+		ticket.future.resolve(value);
+		
+		self.schedule();
+
+#########################################
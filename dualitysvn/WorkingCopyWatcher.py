@@ -0,0 +1,447 @@
+# Duality SVN
+# Original Author: Joshua Leung
+#
+# Working Copy Watcher - keeps track of which directories in the working copy
+# have had changes made to them, so that only those need their status refreshed
+
+from coreDefines import *
+
+from collections import deque
+import ctypes
+import ctypes.util
+import errno
+import struct
+
+from SvnWcMetadata import scanDir
+
+#########################################
+# Utilities
+
+# Names of directories which never get watched
+ADMIN_DIRNAMES = (SVN_DIRNAME_BRANCH1, SVN_DIRNAME_BRANCH2);
+
+# Get a predicate for checking whether a status list path is covered by a refresh of the given directories
+# (i.e. it is one of the directories, or directly inside one of them)
+# < relDirs: (list<str>) directories that were refreshed ("" for the root)
+# < (removedDirs): (list<str>) directories which no longer exist - everything under these is covered too,
+#				   as there's nothing left in them to refresh (and so nothing else that would clear their rows)
+# > return[0]: (fn(path:str)=bool)
+def dirScopeChecker(relDirs, removedDirs=()):
+	scope = frozenset(relDirs);
+	prefixes = tuple(os.path.normpath(d) + os.sep for d in removedDirs if d);
+	
+	def inScope(path):
+		if path == ".":
+			return "" in scope;
+		elif (path in scope) or (os.path.dirname(path) in scope):
+			return True;
+		else:
+			return bool(prefixes) and os.path.normpath(path).startswith(prefixes);
+	return inScope;
+
+# Find the closest directory that svn can be asked about for a changed directory
+# - with entries-file working copies, directories without their own admin dir aren't versioned,
+#   while with wc.db ones, there's only the admin dir at the root to go by
+# < wcRoot: (str) root directory of working copy
+# < relDir: (str) changed directory, relative to the root
+# < adminName: (str) name of admin directories
+# > return[0]: (str) relDir or one of its parents
+def nearestVersionedDir(wcRoot, relDir, adminName):
+	perDirAdmin = not os.path.exists(os.path.join(wcRoot, adminName, "wc.db"));
+	
+	while relDir:
+		fullPath = os.path.join(wcRoot, relDir);
+		
+		if os.path.isdir(fullPath) and ((not perDirAdmin) or os.path.isdir(os.path.join(fullPath, adminName))):
+			break;
+		
+		relDir = os.path.dirname(relDir);
+	
+	return relDir;
+
+#########################################
+# Inotify Backend (Linux)
+
+# Raised when inotify can't be used (or can't watch any more directories)
+class WatchError(Exception):
+	pass;
+
+# Watches each directory in the tree using inotify
+class InotifyBackend(object):
+	# Class Defines =========================================
+	# inotify event masks
+	IN_MODIFY		= 0x00000002
+	IN_ATTRIB		= 0x00000004
+	IN_CLOSE_WRITE	= 0x00000008
+	IN_MOVED_FROM	= 0x00000040
+	IN_MOVED_TO		= 0x00000080
+	IN_CREATE		= 0x00000100
+	IN_DELETE		= 0x00000200
+	IN_DELETE_SELF	= 0x00000400
+	IN_MOVE_SELF	= 0x00000800
+	IN_Q_OVERFLOW	= 0x00004000
+	IN_IGNORED		= 0x00008000
+	IN_ONLYDIR		= 0x01000000
+	IN_ISDIR		= 0x40000000
+	
+	# inotify_init1() flags
+	IN_NONBLOCK		= 0x00000800
+	IN_CLOEXEC		= 0x00080000
+	
+	# Events we're interested in for each directory
+	WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+	              IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR);
+	
+	# Size of the fixed part of "struct inotify_event" (wd, mask, cookie, len)
+	EVENT_HEADER = struct.Struct("iIII");
+	
+	# Number of directories to start watching per pass while setting up
+	SETUP_BATCH = 500;
+	
+	# Instance Settings =====================================
+	__slots__ = (
+		'watcher',		# (WorkingCopyWatcher) owner that changes get reported to
+		
+		'libc',			# (ctypes.CDLL) where the inotify functions live
+		'fd',			# (int) inotify instance
+		'notifier',		# (QSocketNotifier) notifies when events can be read
+		
+		'wds',			# (dict<int, str>) watch descriptor -> relative path of directory
+		'toWatch',		# (deque<str>) directories still to be watched (and scanned for subdirectories)
+		'setupTimer',	# (QTimer) timer for watching the next batch of directories
+	);
+	
+	# Setup =================================================
+	
+	# ! raises WatchError if inotify isn't available
+	def __init__(self, watcher):
+		self.watcher = watcher;
+		
+		if not sys.platform.startswith('linux'):
+			raise WatchError, "inotify is only available on Linux";
+		
+		try:
+			self.libc = ctypes.CDLL(ctypes.util.find_library('c') or "libc.so.6", use_errno=True);
+			self.fd = self.libc.inotify_init1(InotifyBackend.IN_NONBLOCK | InotifyBackend.IN_CLOEXEC);
+		except (OSError, AttributeError), e:
+			raise WatchError, "inotify not available (%s)" % (e);
+		
+		if self.fd < 0:
+			raise WatchError, os.strerror(ctypes.get_errno());
+		
+		self.notifier = QSocketNotifier(self.fd, QSocketNotifier.Read, watcher);
+		self.notifier.activated.connect(self.readEvents);
+		
+		# watching directories involves walking the whole tree, so this is done in batches
+		self.wds = {};
+		self.toWatch = deque([""]);
+		
+		self.setupTimer = QTimer(watcher);
+		self.setupTimer.timeout.connect(self.watchBatch);
+		self.setupTimer.start(0);
+	
+	# stop watching everything
+	def close(self):
+		self.setupTimer.stop();
+		self.notifier.setEnabled(False);
+		
+		os.close(self.fd);
+		self.fd = -1;
+	
+	# Watches ===============================================
+	
+	# start watching the next batch of directories
+	def watchBatch(self):
+		try:
+			for i in xrange(InotifyBackend.SETUP_BATCH):
+				if not self.toWatch:
+					self.setupTimer.stop();
+					break;
+				
+				self.watchDir(self.toWatch.popleft());
+		except WatchError, e:
+			# out of watches - the whole tree needs to be polled instead
+			print "Working Copy Watcher: %s, falling back to polling" % (e)
+			self.watcher.fallBackToPolling();
+	
+	# start watching a directory, and queue up its subdirectories
+	def watchDir(self, relDir):
+		fullPath = os.path.join(self.watcher.rootDir, relDir);
+		
+		wd = self.libc.inotify_add_watch(self.fd, fullPath, InotifyBackend.WATCH_MASK);
+		if wd < 0:
+			err = ctypes.get_errno();
+			
+			if err in (errno.ENOSPC, errno.ENOMEM):
+				raise WatchError, "Could not watch '%s' (%s)" % (fullPath, os.strerror(err));
+			else:
+				# directory went away already
+				return;
+		
+		self.wds[wd] = relDir;
+		
+		try:
+			for entry in scanDir(fullPath):
+				if (entry.name not in ADMIN_DIRNAMES) and entry.is_dir() and not entry.is_symlink():
+					self.toWatch.append(os.path.join(relDir, entry.name));
+		except OSError:
+			pass;
+	
+	# Events ================================================
+	
+	# read and handle all events that have arrived
+	def readEvents(self):
+		while True:
+			try:
+				data = os.read(self.fd, 65536);
+			except OSError, e:
+				if e.errno == errno.EINTR:
+					continue;
+				break; # EAGAIN - nothing left to read
+			
+			if not data:
+				break;
+			
+			self.handleEvents(data);
+		
+		# pick up any new directories
+		if self.toWatch and not self.setupTimer.isActive():
+			self.setupTimer.start(0);
+	
+	# decode a block of events
+	def handleEvents(self, data):
+		pos = 0;
+		headerSize = InotifyBackend.EVENT_HEADER.size;
+		
+		while pos + headerSize <= len(data):
+			wd, mask, cookie, nameLen = InotifyBackend.EVENT_HEADER.unpack_from(data, pos);
+			name = data[pos+headerSize : pos+headerSize+nameLen].rstrip('\0');
+			pos += headerSize + nameLen;
+			
+			if mask & InotifyBackend.IN_Q_OVERFLOW:
+				# events were lost, so anything could have changed
+				self.watcher.markOverflowed();
+				continue;
+			
+			relDir = self.wds.get(wd);
+			if relDir is None:
+				continue;
+			
+			if mask & InotifyBackend.IN_IGNORED:
+				# watch removed (i.e. directory was deleted)
+				del self.wds[wd];
+				continue;
+			
+			if name in ADMIN_DIRNAMES:
+				continue;
+			
+			if (mask & InotifyBackend.IN_ISDIR) and (mask & (InotifyBackend.IN_CREATE | InotifyBackend.IN_MOVED_TO)):
+				# new directories need watching too
+				self.toWatch.append(os.path.join(relDir, name));
+			
+			if mask & (InotifyBackend.IN_DELETE_SELF | InotifyBackend.IN_MOVE_SELF):
+				# directory itself is gone - the parent will report that
+				continue;
+			
+			self.watcher.markDirty(relDir);
+
+#########################################
+# Polling Backend (Fallback)
+
+# Periodically checks the directories in the tree for changes
+# - only a limited number of directories are checked on each pass, so that large
+#   trees don't hold up the UI, at the expense of noticing changes later
+class PollingBackend(object):
+	# Class Defines =========================================
+	# Interval (ms) between passes
+	POLL_INTERVAL = 500;
+	
+	# Number of directories to check per pass
+	POLL_BATCH = 100;
+	
+	# Instance Settings =====================================
+	__slots__ = (
+		'watcher',		# (WorkingCopyWatcher) owner that changes get reported to
+		
+		'signatures',	# (dict<str, int>) relative path of directory -> hash of its contents' stat info
+		'seen',			# (set<str>) directories found during the current cycle
+		'toCheck',		# (deque<str>) directories still to be checked in the current cycle
+		
+		'timer',		# (QTimer) timer for checking the next batch of directories
+	);
+	
+	# Setup =================================================
+	
+	def __init__(self, watcher):
+		self.watcher = watcher;
+		
+		self.signatures = {};
+		self.seen = set();
+		self.toCheck = deque([""]);
+		
+		self.timer = QTimer(watcher);
+		self.timer.timeout.connect(self.checkBatch);
+		self.timer.start(PollingBackend.POLL_INTERVAL);
+	
+	# stop checking for changes
+	def close(self):
+		self.timer.stop();
+	
+	# Polling ===============================================
+	
+	# check the next batch of directories
+	def checkBatch(self):
+		for i in xrange(PollingBackend.POLL_BATCH):
+			if not self.toCheck:
+				self.endCycle();
+				break;
+			
+			self.checkDir(self.toCheck.popleft());
+	
+	# check whether a directory has changed since the last cycle
+	def checkDir(self, relDir):
+		fullPath = os.path.join(self.watcher.rootDir, relDir);
+		stats = [];
+		
+		try:
+			for entry in scanDir(fullPath):
+				if entry.name in ADMIN_DIRNAMES:
+					continue;
+				
+				st = entry.stat();
+				stats.append((entry.name, st.st_mtime, st.st_size));
+				
+				if entry.is_dir() and not entry.is_symlink():
+					self.toCheck.append(os.path.join(relDir, entry.name));
+		except OSError:
+			# gone - its parent will notice
+			return;
+		
+		signature = hash(frozenset(stats));
+		self.seen.add(relDir);
+		
+		# only changes since the first cycle count
+		oldSignature = self.signatures.get(relDir);
+		if (oldSignature is not None) and (oldSignature != signature):
+			self.watcher.markDirty(relDir);
+		
+		self.signatures[relDir] = signature;
+	
+	# start the next cycle, forgetting directories that have disappeared
+	def endCycle(self):
+		for relDir in set(self.signatures) - self.seen:
+			del self.signatures[relDir];
+		
+		self.seen = set();
+		self.toCheck.append("");
+
+#########################################
+# Watcher
+
+# Collects the directories in the working copy which have changed, reporting
+# them (after a short delay, so that bursts of changes get handled together)
+# using the "dirtyDirs" signal - fn(dirs:list<str>, overflowed:bool)
+#
+# There's only one watcher shared by all branch panels (as they all operate on
+# the same working copy), which is retrieved using WorkingCopyWatcher.shared()
+class WorkingCopyWatcher(QObject):
+	# Class Defines =========================================
+	# Delay (ms) before changes are reported
+	REPORT_DELAY = 300;
+	
+	# Shared instance
+	_shared = None;
+	
+	# Setup =================================================
+	
+	def __init__(self, parent=None):
+		super(WorkingCopyWatcher, self).__init__(parent);
+		
+		self.rootDir = None;
+		self.backend = None;
+		
+		# changes since the last report
+		self.dirty = set();
+		self.overflowed = False;
+		
+		self.reportTimer = QTimer(self);
+		self.reportTimer.setSingleShot(True);
+		self.reportTimer.timeout.connect(self.report);
+	
+	# get the shared watcher instance
+	@classmethod
+	def shared(cls):
+		if cls._shared is None:
+			cls._shared = cls();
+		return cls._shared;
+	
+	# Control ===============================================
+	
+	# start watching the given directory (if not doing so already)
+	# < rootDir: (str) root of working copy
+	def watch(self, rootDir):
+		if (rootDir == self.rootDir) and (self.backend is not None):
+			return;
+		
+		self.stop();
+		
+		if not rootDir or not os.path.isdir(rootDir):
+			return;
+		self.rootDir = rootDir;
+		
+		try:
+			self.backend = InotifyBackend(self);
+		except WatchError, e:
+			print "Working Copy Watcher: %s, using polling instead" % (e)
+			self.backend = PollingBackend(self);
+	
+	# stop watching for changes
+	def stop(self):
+		if self.backend is not None:
+			self.backend.close();
+			self.backend = None;
+		
+		self.rootDir = None;
+		self.reportTimer.stop();
+		self.dirty.clear();
+		self.overflowed = False;
+	
+	# check whether a directory is being watched
+	def isWatching(self):
+		return self.backend is not None;
+	
+	# switch to polling when native notifications can't cope
+	def fallBackToPolling(self):
+		if self.backend is not None:
+			self.backend.close();
+		
+		self.backend = PollingBackend(self);
+	
+	# Changes ===============================================
+	
+	# note that the contents of a directory have changed
+	def markDirty(self, relDir):
+		self.dirty.add(relDir);
+		
+		if not self.reportTimer.isActive():
+			self.reportTimer.start(WorkingCopyWatcher.REPORT_DELAY);
+	
+	# note that changes may have been missed, so everything needs checking
+	def markOverflowed(self):
+		self.overflowed = True;
+		
+		if not self.reportTimer.isActive():
+			self.reportTimer.start(WorkingCopyWatcher.REPORT_DELAY);
+	
+	# let everyone know what has changed
+	def report(self):
+		dirs = sorted(self.dirty);
+		overflowed = self.overflowed;
+		
+		self.dirty.clear();
+		self.overflowed = False;
+		
+		if dirs or overflowed:
+			self.emit(SIGNAL('dirtyDirs'), dirs, overflowed);
+
+#########################################
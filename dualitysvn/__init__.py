@@ -15,8 +15,22 @@ from SvnTools import *
 # FIXME: make proper use of namespaces...
 from SvnOperationProcess import *
 from InternalOperationProcess import *
+from OperationProcessGroup import *
+from OperationScheduler import *
+from OperationFuture import *
+from WcOperationCoordinator import *
+from SvnMetadataSync import *
+from SvnMetadataVerifier import *
 
 from SvnStatusList import *
+from SvnWcStatus import *
+from SvnWcDiff import *
+from SvnWcDiffCache import *
+from SvnPatchExporter import *
+from SvnPatchApplier import *
+from SvnStatusSnapshot import *
+from SvnStatusShards import *
+from WorkingCopyWatcher import *
 
 from SvnOperationDialog import *
 from SvnCommitDialog import *
@@ -15,11 +15,6 @@ import os
 from PyQt4.QtCore import *
 from PyQt4.QtGui import *
 
-####################################
-# Own includes for use everywhere
-
-from SvnTools import *
-
 ####################################
 # "Project" Global
 
@@ -58,3 +53,9 @@ class ProcessStatus:
 	STATUS_SETUP, STATUS_WORKING, STATUS_DONE, STATUS_FAILED, STATUS_CANCELLED = range(5);
 
 ####################################
+# Own includes for use everywhere
+# - these come last, as they use the defines above
+
+from SvnTools import *
+
+####################################
@@ -0,0 +1,122 @@
+####################################
+# Benchmark for diff highlighting
+#
+# Reports the cost of working out the styling (line kinds + changed words) per
+# 1k lines of diff, and compares how long it takes to open + show diffs in the
+# viewer with highlighting on and off
+
+import random
+import time
+
+from dualitysvn.coreDefines import *
+
+from dualitysvn.DiffViewer import *
+
+########################################
+# Setup
+
+NUM_LINES_LARGE = 50000;	# shown using the line-indexed view
+NUM_LINES_SMALL = 15000;	# shown using the text document
+
+# make a fake unified diff, with roughly the given number of lines
+def makeDiff(numLines):
+	rng = random.Random(42);
+	words = ["foo", "bar", "baz", "x", "y", "return", "if", "(", ")", ";", "=", "+", "1", "2"];
+	makeLine = lambda: " ".join(rng.choice(words) for i in xrange(rng.randint(3, 12)));
+
+	lines = ["Index: src/file.c",
+	         "===================================================================",
+	         "--- src/file.c\t(revision 1234)",
+	         "+++ src/file.c\t(working copy)"];
+	lineNo = 1;
+
+	while len(lines) < numLines:
+		numChanged = rng.randint(1, 8);
+		lines.append("@@ -%d,%d +%d,%d @@" % (lineNo, numChanged + 6, lineNo, numChanged + 6));
+
+		old = [makeLine() for i in xrange(numChanged)];
+
+		lines += [" " + makeLine() for i in xrange(3)];
+		lines += ["-" + line for line in old];
+		lines += ["+" + (line.replace("foo", "qux") if rng.random() < 0.8 else makeLine()) for line in old];
+		lines += [" " + makeLine() for i in xrange(3)];
+
+		lineNo += numChanged + 20;
+
+	return lines;
+
+# style every line, as if they were all being shown
+def styleAll(styler, lines):
+	for index, line in enumerate(lines):
+		kind = styler.getKind(index, line);
+		if kind in (DiffLineKind.KIND_ADDED, DiffLineKind.KIND_REMOVED):
+			styler.getChanges(index);
+
+# time opening a diff in the viewer, until it's ready to be shown
+def timeOpen(lines, highlighting):
+	viewer = DiffViewer();
+	viewer.show();
+	viewer.wDisplay.setHighlighting(highlighting);
+	app.processEvents();
+
+	start = time.time();
+
+	viewer.displayDiff_fromString("\n".join(lines));
+	viewer.wDisplay.highlightVisible();
+	viewer.wLargeDisplay.viewport().repaint();
+	app.processEvents();
+
+	elapsed = time.time() - start;
+
+	viewer.close();
+	return elapsed;
+
+########################################
+
+app = QApplication(sys.argv)
+
+# 1) styling cost, without any drawing
+lines = makeDiff(NUM_LINES_LARGE);
+
+styler = DiffLineStyler(lambda index: lines[index], lambda: len(lines));
+
+start = time.time();
+styleAll(styler, lines);
+cold = time.time() - start;
+
+start = time.time();
+styleAll(styler, lines);
+warm = time.time() - start;
+
+print "Styling %d lines: %.3f s first time (%.2f ms per 1k lines), %.3f s cached (%.2f ms per 1k lines)" % (
+	len(lines), cold, cold * 1000000 / len(lines), warm, warm * 1000000 / len(lines))
+
+# 2) opening diffs - highlighting should only cost what's in view
+for numLines in (NUM_LINES_SMALL, NUM_LINES_LARGE):
+	testLines = makeDiff(numLines);
+
+	plain = timeOpen(testLines, False);
+	highlighted = timeOpen(testLines, True);
+
+	print "Opening %d line diff: %.3f s plain, %.3f s highlighted" % (len(testLines), plain, highlighted)
+
+# 3) scrolling through the large view - every screen gets styled as it comes into view
+viewer = DiffViewer();
+viewer.show();
+viewer.displayDiff_fromString("\n".join(lines));
+app.processEvents();
+
+view = viewer.wLargeDisplay;
+numScreens = 0;
+
+start = time.time();
+for value in xrange(0, view.verticalScrollBar().maximum(), view.visibleLines()):
+	view.verticalScrollBar().setValue(value);
+	view.viewport().repaint();
+	numScreens += 1;
+elapsed = time.time() - start;
+
+print "Scrolling through %d screens: %.2f ms per screen (%.2f ms per 1k lines)" % (
+	numScreens, elapsed * 1000 / max(numScreens, 1), elapsed * 1000000 / len(lines))
+
+viewer.close();
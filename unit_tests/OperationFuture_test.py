@@ -0,0 +1,144 @@
+####################################
+# Test for running operations without blocking the GUI
+#
+# Runs operations against a slow fake "svn" (a script put first on the path, which
+# just dawdles for a while), and checks that the event loop keeps ticking while
+# they run when they're started using startAsync(), unlike with runBlocking().
+# Also checks that chained futures run in order, and that cancelling works.
+#
+# Usage: python -m unit_tests.OperationFuture_test
+
+import shutil
+import stat
+import tempfile
+import time
+
+from dualitysvn.coreDefines import *
+
+from dualitysvn.SvnOperationProcess import *
+
+########################################
+# Setup
+
+# how long each fake svn call takes
+FAKE_SVN_TIME = 1.0;
+
+# how often the event loop should get to do something else
+TICK_MS = 20;
+
+FAKE_SVN = """#!%s
+import sys, time
+for i in xrange(10):
+	print "fake svn %%s: %%d" %% (sys.argv[1], i)
+	sys.stdout.flush()
+	time.sleep(%f / 10)
+""";
+
+failures = [];
+
+def check(ok, msg):
+	print "%s: %s" % ("PASS" if ok else "FAIL", msg)
+	if not ok:
+		failures.append(msg);
+
+# make an operation which runs the fake svn
+def makeProcess(name):
+	p = SvnOperationProcess(owner, name);
+	p.silentErrors = True;
+	p.setupEnv(BranchType.TYPE_TRUNK);
+
+	p.setOp("resolved");
+	p.addDefaultArgs();
+	p.addArgs(["foo.c"]);
+
+	order.append(name);
+	return p;
+
+# run the event loop until a future is done (or it's clearly never going to be)
+def runUntilDone(future):
+	future.addDoneCb(lambda value: app.quit());
+	QTimer.singleShot(int(FAKE_SVN_TIME * 10000), app.quit);
+
+	if not future.isDone():
+		app.exec_();
+
+########################################
+
+tempDir = tempfile.mkdtemp();
+
+fakeSvn = os.path.join(tempDir, "svn");
+with open(fakeSvn, 'w') as f:
+	f.write(FAKE_SVN % (sys.executable, FAKE_SVN_TIME));
+os.chmod(fakeSvn, os.stat(fakeSvn).st_mode | stat.S_IEXEC);
+
+os.environ['PATH'] = tempDir + os.pathsep + os.environ.get('PATH', "");
+project.workingCopyDir = tempDir;
+
+app = QApplication(sys.argv)
+owner = QWidget();
+
+order = [];
+
+ticks = [0];
+def tick():
+	ticks[0] += 1;
+
+timer = QTimer();
+timer.timeout.connect(tick);
+timer.start(TICK_MS);
+
+expectedTicks = FAKE_SVN_TIME * 1000 / TICK_MS;
+
+try:
+	# 1) runBlocking() - nothing else gets a look in until it's done
+	ticks[0] = 0;
+	makeProcess("Blocking").runBlocking();
+	app.processEvents();
+
+	check(ticks[0] <= 1, "event loop is frozen by runBlocking() (%d ticks)" % (ticks[0]));
+
+	# 2) startAsync() - the event loop keeps going, and chained steps run in order
+	ticks[0] = 0;
+	del order[:];
+	start = time.time();
+
+	future = makeProcess("First").startAsync();
+	future = future.then(lambda sop: makeProcess("Second").startAsync());
+
+	check(order == ["First"], "second step doesn't start until the first is done");
+
+	runUntilDone(future);
+	elapsed = time.time() - start;
+
+	check(future.succeeded(), "chained operations succeed");
+	check(order == ["First", "Second"], "chained operations run in order");
+	check(ticks[0] >= expectedTicks, "event loop keeps ticking while they run (%d ticks in %.2f s)" % (ticks[0], elapsed));
+
+	# 3) cancelling - should be done long before the fake svn would have finished
+	ticks[0] = 0;
+	start = time.time();
+
+	# status as it was when the future was done, as killed processes may still report that they've finished afterwards
+	statuses = [];
+
+	future = makeProcess("Cancelled").startAsync();
+	future.addDoneCb(lambda sop: statuses.append(sop.status));
+	QTimer.singleShot(100, future.cancel);
+
+	runUntilDone(future);
+	elapsed = time.time() - start;
+
+	check(statuses == [ProcessStatus.STATUS_CANCELLED], "cancelled operation reports that it was cancelled");
+	check(elapsed < FAKE_SVN_TIME, "cancelling doesn't wait for the operation (%.2f s)" % (elapsed));
+
+	# 4) gathering - done once all of them are
+	futures = [makeProcess("Gather %d" % (i)).startAsync() for i in xrange(3)];
+	future = OperationFuture.gather(futures);
+
+	runUntilDone(future);
+
+	check(future.isDone() and all(f.succeeded() for f in futures), "gathered future is done once all operations are");
+finally:
+	shutil.rmtree(tempDir);
+
+sys.exit(1 if failures else 0);
@@ -0,0 +1,72 @@
+####################################
+# Benchmark for verifying dual working copy metadata
+#
+# Reports how long a full check takes on a fake (1.6-style) working copy when
+# all the pristine files need hashing, and how long repeat checks take once
+# their hashes have been cached
+
+import hashlib
+import shutil
+import tempfile
+import time
+
+from dualitysvn.coreDefines import *
+
+from dualitysvn.SvnMetadataVerifier import *
+
+########################################
+# Setup
+
+# hashes are cached beside the project file, so use a throwaway one
+tempDir = tempfile.mkdtemp();
+
+project.fileN = os.path.join(tempDir, "bench.duality");
+project.autofile = False;
+
+# create a fake working copy with the given number of versioned files
+# < numDirs: (int) number of directories
+# < filesPerDir: (int) number of files in each directory
+# > return[0]: (str) root of working copy
+def makeWorkingCopy(numDirs, filesPerDir):
+	root = os.path.join(tempDir, "wc%d" % (numDirs * filesPerDir));
+
+	for i in xrange(numDirs):
+		adminDir = os.path.join(root, "dir%04d" % (i), SVN_DIRNAME_BRANCH1);
+		os.makedirs(os.path.join(adminDir, "text-base"));
+
+		records = ["\ndir\n1\n"];
+		for j in xrange(filesPerDir):
+			name = "file%04d.c" % (j);
+			contents = ("/* %d %d */\n" % (i, j)) * 200;
+
+			with open(os.path.join(adminDir, "text-base", name + ".svn-base"), 'wb') as f:
+				f.write(contents);
+
+			records.append("%s\nfile\n\n\n\n\n\n%s\n" % (name, hashlib.md5(contents).hexdigest()));
+
+		with open(os.path.join(adminDir, "entries"), 'wb') as f:
+			f.write("10\n" + "".join(record + "\f\n" for record in records));
+
+	duplicateSvnMetadata(root);
+	return root;
+
+########################################
+
+for numDirs, filesPerDir in ((100, 100), (500, 100)):
+	root = makeWorkingCopy(numDirs, filesPerDir);
+
+	if os.path.exists(PristineHashCache.getFileName()):
+		os.remove(PristineHashCache.getFileName());
+
+	start = time.time();
+	report = verifySvnMetadata(root);
+	coldTime = time.time() - start;
+
+	start = time.time();
+	report = verifySvnMetadata(root);
+	warmTime = time.time() - start;
+
+	print "%7d files: cold = %6.3f s, cached = %6.3f s (%d problems)" % (
+		numDirs * filesPerDir, coldTime, warmTime, len(report.issues))
+
+shutil.rmtree(tempDir);
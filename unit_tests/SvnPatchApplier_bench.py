@@ -0,0 +1,146 @@
+####################################
+# Benchmark for applying patches
+#
+# Makes a "vendor drop" style patch (changes to thousands of files) in a throwaway
+# working copy, and compares how long the built-in patch engine takes to check and
+# apply it against "svn patch" doing the same, checking that both end up with the
+# same files. This needs the svn command-line tools (svn + svnadmin) to be on the
+# path.
+#
+# Usage: python -m unit_tests.SvnPatchApplier_bench [numFiles]
+
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+
+from dualitysvn.coreDefines import *
+
+from dualitysvn.SvnPatchApplier import *
+
+########################################
+# Setup
+
+FILES_PER_DIR = 50;
+
+# lines that files get made from
+WORDS = ["{\n", "}\n", "\n", "\treturn 0;\n", "\tx += 1;\n", "else\n", "/* comment */\n", "#endif\n"];
+
+def run(args, cwd, stdout=None):
+	p = subprocess.Popen(args, cwd=cwd, stdout=(stdout or subprocess.PIPE), stderr=subprocess.STDOUT);
+	out = p.communicate()[0];
+
+	if p.returncode != 0:
+		raise RuntimeError("%s failed:\n%s" % (" ".join(args), out));
+	return out;
+
+# make a random file
+def makeFile(rng, numLines):
+	return "".join((rng.choice(WORDS) if rng.random() < 0.6 else "line %d\n" % rng.randint(0, 5000))
+	               for i in xrange(numLines));
+
+# make a random set of changes to a file, spread out so that there are several hunks
+def editFile(rng, data, numEdits):
+	lines = data.splitlines(True);
+
+	for i in xrange(numEdits):
+		pos = rng.randint(0, len(lines));
+		if (rng.random() < 0.5) and lines:
+			lines[min(pos, len(lines) - 1)] = "changed %d\n" % (i);
+		else:
+			lines.insert(pos, "added %d\n" % (i));
+
+	return "".join(lines);
+
+# get the contents of all the files in the working copy
+def readFiles(wcDir, names):
+	contents = {};
+	for name in names:
+		with open(os.path.join(wcDir, name), 'rb') as f:
+			contents[name] = f.read();
+	return contents;
+
+########################################
+
+numFiles = int(sys.argv[1]) if len(sys.argv) > 1 else 5000;
+rng = random.Random(42);
+
+tempDir = tempfile.mkdtemp();
+repoDir = os.path.join(tempDir, "repo");
+wcDir = os.path.join(tempDir, "wc");
+patchFileN = os.path.join(tempDir, "drop.patch");
+
+try:
+	# 1) working copy with the original vendor drop committed
+	run(["svnadmin", "create", repoDir], tempDir);
+	run(["svn", "checkout", "-q", "file://" + repoDir.replace(os.sep, "/"), wcDir], tempDir);
+
+	names = [];
+	for i in xrange(numFiles):
+		name = os.path.join("vendor%03d" % (i / FILES_PER_DIR), "file%05d.c" % (i));
+		names.append(name);
+
+		if not os.path.isdir(os.path.join(wcDir, os.path.dirname(name))):
+			os.makedirs(os.path.join(wcDir, os.path.dirname(name)));
+
+		with open(os.path.join(wcDir, name), 'wb') as f:
+			f.write(makeFile(rng, rng.randint(50, 400)));
+
+	run(["svn", "add", "-q"] + sorted(set(os.path.dirname(name) for name in names)), wcDir);
+	run(["svn", "commit", "-q", "-m", "vendor drop 1"], wcDir);
+
+	# 2) the next vendor drop, as a patch
+	for name in names:
+		with open(os.path.join(wcDir, name), 'rb') as f:
+			data = f.read();
+		with open(os.path.join(wcDir, name), 'wb') as f:
+			f.write(editFile(rng, data, rng.randint(1, 12)));
+
+	expected = readFiles(wcDir, names);
+
+	with open(patchFileN, 'wb') as f:
+		run(["svn", "diff"], wcDir, stdout=f);
+	run(["svn", "revert", "-q", "-R", "."], wcDir);
+
+	print "Patch of %d files: %.1f MB" % (numFiles, os.path.getsize(patchFileN) / 1048576.0)
+
+	# 3) built-in engine
+	start = time.time();
+	index = PatchIndex(patchFileN);
+	indexTime = time.time() - start;
+
+	start = time.time();
+	report = applyPatch(index, wcDir, dryRun=True);
+	checkTime = time.time() - start;
+
+	start = time.time();
+	report = applyPatch(index, wcDir);
+	applyTime = time.time() - start;
+
+	index.close();
+
+	engineMatches = (readFiles(wcDir, names) == expected);
+
+	print "built-in: index = %.3f s, check = %.3f s, apply = %.3f s - %s, results %s" % (
+		indexTime, checkTime, applyTime, report.getSummary(), "match" if engineMatches else "DIFFER")
+
+	run(["svn", "revert", "-q", "-R", "."], wcDir);
+
+	# 4) svn patch
+	start = time.time();
+	run(["svn", "patch", "--dry-run", patchFileN], wcDir);
+	svnCheckTime = time.time() - start;
+
+	start = time.time();
+	run(["svn", "patch", patchFileN], wcDir);
+	svnApplyTime = time.time() - start;
+
+	svnMatches = (readFiles(wcDir, names) == expected);
+
+	print "svn patch: check = %.3f s, apply = %.3f s - results %s" % (
+		svnCheckTime, svnApplyTime, "match" if svnMatches else "DIFFER")
+finally:
+	shutil.rmtree(tempDir);
+
+sys.exit(0 if (engineMatches and svnMatches) else 1);
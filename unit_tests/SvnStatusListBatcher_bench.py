@@ -0,0 +1,82 @@
+####################################
+# Benchmark comparing per-item vs batched insertion of status list items
+#
+# Populates a (visible) status list with synthetic items, and reports
+# the number of rows added per second for each method. The per-item figures
+# are the "before" (i.e. how refreshes used to add rows), and the batched ones
+# are the "after". This needs PyQt4 + a display.
+#
+# Usage: python -m unit_tests.SvnStatusListBatcher_bench
+
+import time
+
+from dualitysvn.coreDefines import *
+
+from dualitysvn.SvnStatusList import *
+
+########################################
+# Synthetic Data
+
+# create a list of fake status items
+# < count: (int) number of items to create
+def makeItems(count):
+	codes = ('M', 'A', '?', 'D', '!');
+	items = [];
+	
+	for i in xrange(count):
+		line = "%s       src/module%04d/file%06d.c" % (codes[i % len(codes)], i % 1000, i);
+		items.append(SvnStatusListItem(line));
+	
+	return items;
+
+########################################
+# Benchmarks
+
+# add items one at a time - the old refresh behaviour
+def benchPerItem(view, items):
+	model = view.model;
+	
+	for item in items:
+		model.add(item);
+		
+		# let the view catch up as it would while a process is running
+		QApplication.processEvents();
+
+# add items through the batcher, flushing on size only (as timer needs the event loop)
+def benchBatched(view, items):
+	batcher = SvnStatusListBatcher(view.model);
+	
+	for item in items:
+		batcher.add(item);
+		
+		# let the view catch up as it would while a process is running
+		QApplication.processEvents();
+	batcher.flush();
+
+# time a benchmark, returning the number of rows per second
+def timeIt(benchCb, count):
+	view = SvnStatusList();
+	view.show();
+	
+	items = makeItems(count);
+	
+	start = time.time();
+	benchCb(view, items);
+	QApplication.processEvents();
+	elapsed = time.time() - start;
+	
+	view.close();
+	return count / max(elapsed, 1e-6);
+
+########################################
+
+app = QApplication(sys.argv)
+
+for count in (10000, 100000, 500000):
+	batched = timeIt(benchBatched, count);
+	print "%7d items: batched  = %12.1f rows/s" % (count, batched)
+	
+	# per-item insertion becomes unbearably slow for the larger sizes
+	if count <= 100000:
+		perItem = timeIt(benchPerItem, count);
+		print "%7d items: per-item = %12.1f rows/s" % (count, perItem)
@@ -0,0 +1,64 @@
+####################################
+# Micro-benchmark of SvnStatusListItemModel.data() throughput for each role
+#
+# Simulates what a view does when painting: querying data() for every cell
+# of a block of rows, once for each of the roles that get requested. This
+# needs PyQt4.
+#
+# For "before" figures, run it with the parent of the commit which added the
+# precomputed tables checked out (as the model already had addBatch() then).
+#
+# Usage: python -m unit_tests.SvnStatusListItemModel_data_bench
+
+import time
+
+from dualitysvn.coreDefines import *
+
+from dualitysvn.SvnStatusList import *
+
+########################################
+# Setup
+
+NUM_ROWS = 10000;
+NUM_PASSES = 5;
+
+Roles = (
+	("DisplayRole", Qt.DisplayRole),
+	("ForegroundRole", Qt.ForegroundRole),
+	("ToolTipRole", Qt.ToolTipRole),
+	("CheckStateRole", Qt.CheckStateRole),
+);
+
+# create model with some fake status items
+def makeModel(count):
+	codes = ('M', 'A', '?', 'D', '!', 'C');
+	model = SvnStatusListItemModel();
+	
+	items = [];
+	for i in xrange(count):
+		items.append(SvnStatusListItem("%s       src/module%04d/file%06d.c" % (codes[i % len(codes)], i % 1000, i)));
+	model.addBatch(items);
+	
+	return model;
+
+########################################
+
+app = QApplication(sys.argv)
+
+model = makeModel(NUM_ROWS);
+numCols = model.columnCount(None);
+
+# create indices up front, so that only data() is being timed
+indices = [model.index(row, col, QModelIndex()) for row in xrange(NUM_ROWS) for col in xrange(numCols)];
+
+for roleName, role in Roles:
+	start = time.time();
+	
+	for x in xrange(NUM_PASSES):
+		for index in indices:
+			model.data(index, role);
+	
+	elapsed = time.time() - start;
+	numCalls = len(indices) * NUM_PASSES;
+	
+	print "%-15s: %10.0f calls/s (%.2f us/call)" % (roleName, numCalls / max(elapsed, 1e-6), elapsed * 1e6 / numCalls)
@@ -0,0 +1,84 @@
+####################################
+# Memory benchmark comparing per-item status objects vs the columnar record store
+#
+# The "legacy" representation is a replica of the old SvnStatusListItem (a full
+# object per row, with the long status strings as attributes), stored in a plain
+# list. Sizes are estimated with sys.getsizeof(), and the number of objects the
+# garbage collector needs to track is reported too.
+
+import gc
+
+from dualitysvn.coreDefines import *
+
+from dualitysvn.SvnStatusList import *
+
+########################################
+# Legacy Representation
+
+class LegacyStatusListItem:
+	def __init__(self, path, fileCode, propCode):
+		self.defaultEnabled = True;
+		self.path = path;
+		self.file_status = SvnStatusListItem.FileStatusMap[fileCode];
+		self.prop_status = SvnStatusListItem.PropStatusMap[propCode];
+		self.kind = None;
+		self.revision = None;
+
+########################################
+# Synthetic Data
+
+codes = ('M', 'A', '?', 'D', '!');
+
+def makePath(i):
+	return "src/module%04d/file%06d.c" % (i % 1000, i);
+
+# legacy list of items, with estimate of its size
+def buildLegacy(count):
+	items = [];
+	for i in xrange(count):
+		items.append(LegacyStatusListItem(makePath(i), codes[i % len(codes)], ' '));
+
+	size = sys.getsizeof(items);
+	for item in items:
+		size += sys.getsizeof(item) + sys.getsizeof(item.__dict__) + sys.getsizeof(item.path);
+
+	return items, size;
+
+# datalist backed by record store, with estimate of its size
+def buildStore(count):
+	items = SvnStatusListDatalist();
+	for i in xrange(count):
+		items.append(SvnStatusListItem("%s       %s" % (codes[i % len(codes)], makePath(i)), store=items.store));
+
+	size = items.store.memoryUsage() + sys.getsizeof(items.rids);
+
+	return items, size;
+
+# number of objects tracked by the gc after building the data
+def trackedObjects(buildCb, count):
+	gc.collect();
+	before = len(gc.get_objects());
+
+	data = buildCb(count);
+
+	gc.collect();
+	after = len(gc.get_objects());
+
+	return after - before;
+
+########################################
+
+for count in (10000, 100000, 500000):
+	legacy, legacySize = buildLegacy(count);
+	del legacy;
+
+	store, storeSize = buildStore(count);
+	del store;
+
+	legacyObjs = trackedObjects(buildLegacy, count);
+	storeObjs = trackedObjects(buildStore, count);
+
+	print "%7d items: legacy = %7.1f MB (%7d gc objects), store = %7.1f MB (%7d gc objects)" % (
+		count,
+		legacySize / 1048576.0, legacyObjs,
+		storeSize / 1048576.0, storeObjs)
@@ -0,0 +1,64 @@
+####################################
+# Benchmark for status list snapshots
+#
+# Reports how long it takes to save a snapshot, and the time-to-first-paint
+# when starting up with one (i.e. loading it, and getting a status list to
+# show its first screenful of rows)
+
+import tempfile
+import time
+
+from dualitysvn.coreDefines import *
+
+from dualitysvn.SvnStatusList import *
+from dualitysvn.SvnStatusSnapshot import *
+
+########################################
+# Setup
+
+# snapshots live beside the project file, so use a throwaway one
+project.fileN = os.path.join(tempfile.mkdtemp(), "bench.duality");
+project.urlTrunk = "http://example.com/svn/trunk";
+
+# create a list of fake status items
+def makeList(count):
+	codes = ('M', 'A', '?', 'D', '!');
+	items = SvnStatusListDatalist();
+
+	for i in xrange(count):
+		items.append(SvnStatusListItem("%s       src/module%04d/file%06d.c" % (codes[i % len(codes)], i % 1000, i)));
+
+	return items;
+
+########################################
+
+app = QApplication(sys.argv)
+
+for count in (10000, 100000, 500000):
+	items = makeList(count);
+
+	# save
+	start = time.time();
+	SvnStatusSnapshot.save(BranchType.TYPE_TRUNK, items);
+	saveTime = time.time() - start;
+
+	fileSize = os.path.getsize(SvnStatusSnapshot.getFileName(BranchType.TYPE_TRUNK));
+
+	# startup: load + show
+	view = SvnStatusList();
+	view.show();
+	QApplication.processEvents();
+
+	start = time.time();
+
+	snapshot = SvnStatusSnapshot.load(BranchType.TYPE_TRUNK);
+	loadTime = time.time() - start;
+
+	view.model.setItems(snapshot, stale=True);
+	view.repaint();
+	paintTime = time.time() - start;
+
+	view.close();
+
+	print "%7d items: save = %6.3f s (%6.1f KB), load = %6.3f s, first paint = %6.3f s" % (
+		count, saveTime, fileSize / 1024.0, loadTime, paintTime)
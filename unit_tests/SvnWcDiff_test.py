@@ -0,0 +1,166 @@
+####################################
+# Test for the built-in diff engine
+#
+# Checks that the built-in diff engine gives exactly the same output as
+# "svn diff" does, over a corpus of files with all sorts of changes made to
+# them. This needs the svn command-line tools (svn + svnadmin) to be on the
+# path, as a throwaway repository + working copy get set up for this.
+#
+# Files that the engine gives up on (i.e. too many differences) are fine, as
+# "svn diff" gets used for those instead - they just get counted.
+#
+# Usage: python -m unit_tests.SvnWcDiff_test [numRandomFiles]
+
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+
+from dualitysvn.coreDefines import *
+
+from dualitysvn.SvnWcDiff import *
+
+########################################
+# Corpus
+
+# lines that files get made from - lots of repeats, so that there are plenty of ways to line things up
+WORDS = ["{\n", "}\n", "\n", "\treturn 0;\n", "\tx += 1;\n", "else\n", "/* comment */\n", "#endif\n"];
+
+# make a random file
+def makeFile(rng, numLines):
+	return "".join((rng.choice(WORDS) if rng.random() < 0.6 else "line %d\n" % rng.randint(0, 200))
+	               for i in xrange(numLines));
+
+# make a random set of changes to a file
+def editFile(rng, data, numEdits):
+	lines = splitLines(data);
+
+	for i in xrange(numEdits):
+		pos = rng.randint(0, len(lines));
+		op = rng.random();
+
+		if (op < 0.3) and lines:
+			del lines[min(pos, len(lines) - 1)];
+		elif op < 0.6:
+			lines.insert(pos, rng.choice(WORDS));
+		elif op < 0.8:
+			lines[pos:pos] = ["added %d.%d\n" % (i, j) for j in xrange(rng.randint(1, 10))];
+		elif lines:
+			lines[min(pos, len(lines) - 1)] = "changed %d\n" % (i);
+
+	return "".join(lines);
+
+# get the files to test with
+# > return[0]: (list<tuple>) (name, original contents, changed contents, props)
+def makeCorpus(numRandom):
+	rng = random.Random(42);
+	corpus = [];
+
+	# special cases
+	corpus.append(("empty-to-text.txt", "", "a\nb\n", {}));
+	corpus.append(("text-to-empty.txt", "a\nb\n", "", {}));
+	corpus.append(("no-eol-added.txt", "a\nb", "a\nb\n", {}));
+	corpus.append(("no-eol-removed.txt", "a\nb\n", "a\nb", {}));
+	corpus.append(("no-eol-both.txt", "a\nb\nc", "a\nB\nc", {}));
+	corpus.append(("crlf.txt", "a\r\nb\r\nc\r\n", "a\r\nB\r\nc\r\n", {}));
+	corpus.append(("crlf-mixed.txt", "a\r\nb\nc\r\n", "a\nb\nc\r\n", {}));
+	corpus.append(("eol-native.txt", "a\nb\nc\n", "a\nb\nC\n", {'svn:eol-style': 'native'}));
+	corpus.append(("keywords.txt", "$Id$\na\nb\n", "$Id$\na\nB\n", {'svn:keywords': 'Id'}));
+	corpus.append(("far-apart.txt", "".join("%d\n" % i for i in xrange(100)),
+	               "".join(("%d\n" % i) if i not in (10, 50, 57, 90) else "x\n" for i in xrange(100)), {}));
+	corpus.append(("reversed.txt", "".join("%d\n" % i for i in xrange(2000)),
+	               "".join("%d\n" % i for i in reversed(xrange(2000))), {}));
+
+	# random ones
+	for i in xrange(numRandom):
+		original = makeFile(rng, rng.randint(0, 300));
+		changed = editFile(rng, original, rng.randint(1, 20));
+
+		if rng.random() < 0.1:
+			changed = changed.rstrip("\n");
+
+		corpus.append(("random%04d.txt" % (i), original, changed, {}));
+
+	return corpus;
+
+########################################
+# Testing
+
+def run(args, cwd):
+	p = subprocess.Popen(args, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT);
+	out = p.communicate()[0];
+
+	if p.returncode != 0:
+		raise RuntimeError("%s failed:\n%s" % (" ".join(args), out));
+	return out;
+
+numRandom = int(sys.argv[1]) if len(sys.argv) > 1 else 500;
+corpus = makeCorpus(numRandom);
+
+tempDir = tempfile.mkdtemp();
+repoDir = os.path.join(tempDir, "repo");
+wcDir = os.path.join(tempDir, "wc");
+
+try:
+	# set up a working copy with the original files committed
+	run(["svnadmin", "create", repoDir], tempDir);
+	run(["svn", "checkout", "-q", "file://" + repoDir.replace(os.sep, "/"), wcDir], tempDir);
+
+	for name, original, changed, props in corpus:
+		with open(os.path.join(wcDir, name), 'wb') as f:
+			f.write(original);
+
+	run(["svn", "add", "-q"] + [name for name, original, changed, props in corpus], wcDir);
+	for name, original, changed, props in corpus:
+		for prop, value in props.iteritems():
+			run(["svn", "propset", "-q", prop, value, name], wcDir);
+
+	run(["svn", "commit", "-q", "-m", "corpus"], wcDir);
+	run(["svn", "update", "-q"], wcDir);
+
+	# make the changes
+	for name, original, changed, props in corpus:
+		with open(os.path.join(wcDir, name), 'wb') as f:
+			f.write(changed);
+
+	# compare
+	engine = SvnWcDiffEngine(wcDir, SVN_DIRNAME_BRANCH1);
+	if not engine.isSupported():
+		print "Working copy format isn't supported by the built-in diff engine"
+		sys.exit(1);
+
+	failures = [];
+	fallbacks = [];
+	svnTime = engineTime = 0.0;
+
+	for name, original, changed, props in corpus:
+		start = time.time();
+		expected = run(["svn", "diff", name], wcDir);
+		svnTime += time.time() - start;
+
+		start = time.time();
+		result = engine.diffFile(name);
+		engineTime += time.time() - start;
+
+		if result is None:
+			fallbacks.append(name);
+			continue;
+
+		actual = result.getUnified();
+
+		if actual != expected:
+			failures.append(name);
+
+			print "MISMATCH: %s" % (name)
+			print "--- svn diff ---"
+			print expected
+			print "--- built-in ---"
+			print actual
+
+	print "%d/%d files matched (%d left to svn diff) - svn diff = %.3f s, built-in = %.3f s" % (
+		len(corpus) - len(failures), len(corpus), len(fallbacks), svnTime, engineTime)
+finally:
+	shutil.rmtree(tempDir);
+
+sys.exit(1 if failures else 0);
@@ -0,0 +1,135 @@
+####################################
+# Test for coordinating operations on a working copy
+#
+# Runs stand-in operations (which only finish when told to) through a coordinator,
+# and checks the order they get started in: reads run alongside each other, writes
+# get the working copy to themselves, refreshes in the way of a write get stopped
+# and requeued, and duplicate refreshes get merged.
+#
+# Usage: python -m unit_tests.WcOperationCoordinator_test
+
+from dualitysvn.coreDefines import *
+
+from dualitysvn.WcOperationCoordinator import *
+
+########################################
+# Setup
+
+failures = [];
+
+def check(ok, msg):
+	print "%s: %s" % ("PASS" if ok else "FAIL", msg)
+	if not ok:
+		failures.append(msg);
+
+# stand-in for an operation process, which runs until it's told to finish
+class FakeOperation(object):
+	def __init__(self, name):
+		self.opName = name;
+		self.status = ProcessStatus.STATUS_SETUP;
+		self.silentErrors = False;
+		self.future = None;
+
+	def startAsync(self):
+		self.status = ProcessStatus.STATUS_WORKING;
+		self.future = OperationFuture(self);
+
+		events.append("start " + self.opName);
+		operations[self.opName] = self;
+		return self.future;
+
+	def endProcess(self):
+		self.status = ProcessStatus.STATUS_CANCELLED;
+
+		events.append("stop " + self.opName);
+		self.future.resolve(self);
+
+	def finish(self):
+		self.status = ProcessStatus.STATUS_DONE;
+		self.future.resolve(self);
+
+# ask for an operation, which gets set up once it starts
+def request(name, access, key=None, preemptible=False):
+	return coordinator.request(name, access, lambda ticket: FakeOperation(name).startAsync(), key, preemptible);
+
+########################################
+
+READ = WcAccess.ACCESS_READ;
+WRITE = WcAccess.ACCESS_WRITE;
+
+events = [];
+operations = {};
+
+coordinator = WcOperationCoordinator("/not/a/real/wc");
+
+# 1) reads run alongside each other
+request("Refresh", READ, key="refresh", preemptible=True);
+request("Diff", READ);
+
+check(events == ["start Refresh", "start Diff"], "reads run at the same time");
+
+# 2) a write stops the refresh (but waits for the diff), and nothing jumps ahead of it
+request("Update", WRITE);
+request("Info", READ);
+
+check(events[2:] == ["stop Refresh"], "refresh in the way of a write gets stopped");
+check(coordinator.queueDepth() == 3, "write waits for reads which can't be stopped (%d queued)" % (coordinator.queueDepth()));
+
+# 3) refreshes asked for while one is already waiting get merged into it
+t1 = request("Refresh", READ, key="refresh", preemptible=True);
+t2 = request("Refresh", READ, key="refresh", preemptible=True);
+
+check((t1 is t2) and (coordinator.numCoalesced == 2), "duplicate refreshes are merged (%d coalesced)" % (coordinator.numCoalesced));
+
+# 4) write runs by itself once the diff is done
+del events[:];
+operations["Diff"].finish();
+
+check(events == ["start Update"], "write starts once the working copy is free");
+
+# 5) everything after the write starts once it's done - including a single refresh
+del events[:];
+operations["Update"].finish();
+
+check(events == ["start Refresh", "start Info"], "waiting reads start after the write, in order (%s)" % (events));
+
+operations["Refresh"].finish();
+operations["Info"].finish();
+
+check((coordinator.numRunning() == 0) and (coordinator.queueDepth() == 0), "nothing left running or waiting");
+
+# 6) operations still waiting can be dropped
+request("Commit", WRITE);
+request("Revert", WRITE);
+ticket = request("Add", WRITE);
+coordinator.cancel(ticket);
+
+check(ticket.future.isDone() and (ticket.future.value is None) and (coordinator.queueDepth() == 1), "waiting operations can be cancelled");
+
+operations["Commit"].finish();
+operations["Revert"].finish();
+
+# 7) refreshes asked for while one is running wait for it to end (instead of running alongside it), and only run once
+del events[:];
+request("Refresh", READ, key="refresh", preemptible=True);
+request("Refresh", READ, key="refresh", preemptible=True);
+request("Diff", READ);
+t3 = request("Refresh", READ, key="refresh", preemptible=True);
+
+check(events == ["start Refresh", "start Diff"], "refresh waits for the one already running, other reads don't (%s)" % (events));
+check(coordinator.isRunning("refresh") and coordinator.isQueued("refresh") and coordinator.isPending("refresh"), "waiting refresh shows up as queued + running");
+
+first = operations["Refresh"];
+first.finish();
+
+check(events[2:] == ["start Refresh"] and (operations["Refresh"] is not first), "refresh runs again once the running one is done");
+
+del events[:];
+operations["Refresh"].finish();
+operations["Diff"].finish();
+
+check(t3.future.isDone() and (events == []) and (coordinator.numRunning() == 0) and (coordinator.queueDepth() == 0), "duplicates only run once more");
+
+print coordinator.getStats()
+
+sys.exit(1 if failures else 0);